@@ -7,6 +7,12 @@ class AIMetricsDashboard {
     constructor() {
         this.socket = null;
         this.isConnected = false;
+        // Session de métriques (?metrics_session=ID) et URL de redirection vers son processus
+        this.metricsSession = new URLSearchParams(window.location.search).get('metrics_session');
+        this.redirectUrl = null;
+        // Protocole d'état versionné (snapshot puis deltas) du serveur de métriques
+        this.metricsState = null;
+        this.stateResyncPending = false;
         this.sessionData = {
             events: [],
             globalMetrics: [],
@@ -104,7 +110,9 @@ class AIMetricsDashboard {
             return;
         }
         
-        const wsUrl = `ws://${window.location.hostname}:5005/metrics`;
+        // Session de métriques du canevas (?metrics_session=ID), session par défaut sinon
+        const wsUrl = this.redirectUrl || `ws://${window.location.hostname}:5005/metrics`
+            + (this.metricsSession ? `/${encodeURIComponent(this.metricsSession)}` : '');
         console.log('[AIMetrics] Connecting to', wsUrl);
         
         try {
@@ -116,7 +124,10 @@ class AIMetricsDashboard {
                 this.updateConnectionStatus(true);
                 
                 // Request current state (inclut les paramètres de stratégie)
-                this.socket.send(JSON.stringify({ type: 'get_state' }));
+                // protocol 'delta' : un snapshot versionné puis des deltas compacts
+                this.metricsState = null;
+                this.stateResyncPending = false;
+                this.socket.send(JSON.stringify({ type: 'get_state', protocol: 'delta' }));
                 
                 // Charger les paramètres depuis localStorage au démarrage
                 const uThreshold = localStorage.getItem('strategy_u_threshold') || '70';
@@ -138,10 +149,13 @@ class AIMetricsDashboard {
                 }
             };
             
-            this.socket.onclose = () => {
+            this.socket.onclose = (event) => {
                 console.log('[AIMetrics] Disconnected');
                 this.isConnected = false;
                 this.updateConnectionStatus(false);
+                if (event.code === 4307 && this.redirectUrl) {
+                    this.connect();
+                }
             };
             
             this.socket.onerror = (error) => {
@@ -188,6 +202,14 @@ class AIMetricsDashboard {
             case 'state_update':
                 this.handleStateUpdate(msg.data);
                 break;
+            case 'state_snapshot':
+                this.metricsState = { version: msg.version, data: msg.data || {} };
+                this.stateResyncPending = false;
+                this.handleStateUpdate(this.metricsState.data);
+                break;
+            case 'state_delta':
+                this.handleStateDelta(msg);
+                break;
             case 'strategy_params_update':
                 this.handleStrategyParamsUpdate(msg.params);
                 break;
@@ -204,6 +226,15 @@ class AIMetricsDashboard {
                 this.handleIterationEvent(msg.data);
                 break;
                 
+            case 'rank_changes':
+                this.handleRankChanges(msg);
+                break;
+                
+            case 'session_redirect':
+                // Session servie par un autre processus : se reconnecter à son URL
+                this.redirectUrl = msg.url;
+                break;
+                
             case 'o_snapshot_update':
                 this.handleOSnapshot(msg.data);
                 break;
@@ -254,6 +285,48 @@ class AIMetricsDashboard {
         this.popupManager.updateAll(this.sessionData);
     }
     
+    handleRankChanges(msg) {
+        // Changements de rang seulement (le classement complet suit dans session_iteration_event)
+        const rankings = this.sessionData.rankings || {};
+        (msg.changes || []).forEach(change => {
+            if (change.rank === null) {
+                delete rankings[change.agent_id];
+            } else if (rankings[change.agent_id]) {
+                rankings[change.agent_id].rank = change.rank;
+            }
+        });
+        this.sessionData.rankings = rankings;
+    }
+    
+    handleStateDelta(msg) {
+        const state = this.metricsState;
+        if (state && msg.version <= state.version) return;  // déjà appliqué
+        if (!state || msg.base !== state.version) {
+            // Trou dans la séquence : demander les deltas manquants (ou un snapshot)
+            if (!this.stateResyncPending && this.socket && this.socket.readyState === WebSocket.OPEN) {
+                this.stateResyncPending = true;
+                this.socket.send(JSON.stringify({ type: 'state_resync', version: state ? state.version : -1 }));
+            }
+            return;
+        }
+        const data = state.data;
+        const delta = msg.data || {};
+        data.agents = data.agents || {};
+        for (const [id, agent] of Object.entries(delta.agents || {})) {
+            data.agents[id] = agent;
+        }
+        for (const id of delta.removed || []) {
+            delete data.agents[id];
+        }
+        data.history = (data.history || []).concat(delta.history || []).slice(-50);
+        for (const key of ['averages', 'update_count', 'o_snapshots_count', 'n_snapshots_count', 'latest_o', 'latest_n']) {
+            if (key in delta) data[key] = delta[key];
+        }
+        state.version = msg.version;
+        this.stateResyncPending = false;
+        this.handleStateUpdate(data);
+    }
+    
     handleSessionSummary(data) {
         if (!data) return;
         
@@ -457,8 +530,14 @@ class AIMetricsDashboard {
     
     async exportSession() {
         if (this.isConnected && this.socket) {
-            // Demander l'export via WebSocket
-            this.socket.send(JSON.stringify({ type: 'get_session_export' }));
+            // Export en flux par HTTP (même processus que la WebSocket, après redirection éventuelle) :
+            // le navigateur l'écrit sur disque au fil de l'eau, la boucle du serveur n'est pas bloquée
+            const base = this.socket.url.replace(/^ws/, 'http').replace(/\/metrics(\/.*)?$/, '');
+            const query = this.metricsSession ? `?session=${encodeURIComponent(this.metricsSession)}` : '';
+            const a = document.createElement('a');
+            a.href = `${base}/api/session/export${query}`;
+            a.click();
+            this.showToast('Session export started', 'success');
         } else {
             // Exporter les données locales
             const exportData = {
@@ -570,7 +649,8 @@ class AIMetricsDashboard {
         // Demander au serveur de clear si connecté
         if (this.isConnected && this.socket) {
             try {
-                await fetch(`http://${window.location.hostname}:5005/api/session/clear`, {
+                const sessionQuery = this.metricsSession ? `?session=${encodeURIComponent(this.metricsSession)}` : '';
+                await fetch(`http://${window.location.hostname}:5005/api/session/clear${sessionQuery}`, {
                     method: 'POST'
                 });
             } catch (e) {
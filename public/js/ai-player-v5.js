@@ -38,8 +38,14 @@ class AIPlayerV5 {
     // V5: O-N-machine server on port 8005
     this.O_API_BASE = loc.origin.replace(/:\d+$/, ':8005');
     // V5: Metrics server on port 5005
-    this.METRICS_WS_URL = `${WS_PROTOCOL}//${WS_HOST.replace(/:\d+$/, '')}:5005/metrics`;
+    // Session de métriques du canevas (?metrics_session=ID), session par défaut sinon
+    const metricsSession = new URLSearchParams(loc.search).get('metrics_session');
+    this.METRICS_WS_URL = `${WS_PROTOCOL}//${WS_HOST.replace(/:\d+$/, '')}:5005/metrics`
+      + (metricsSession ? `/${encodeURIComponent(metricsSession)}` : '');
     this.metricsSocket = null;
+    // Protocole d'état versionné (snapshot puis deltas) du serveur de métriques
+    this.metricsState = null;
+    this.metricsResyncPending = false;
 
     this.elements = {
       apiKey: document.getElementById('api-key'),
@@ -688,6 +694,7 @@ class AIPlayerV5 {
         if (message.type === 'initial_state' && !this.myUserId) {
           if (message.my_user_id) {
             this.myUserId = message.my_user_id;
+            if (window.GeminiV5Adapter) window.GeminiV5Adapter.agentId = this.myUserId;
             if (this.elements.userIdDisplay) this.elements.userIdDisplay.textContent = this.myUserId.substring(0,8) + '…';
           }
           // positions
@@ -1817,16 +1824,29 @@ class AIPlayerV5 {
       
       this.metricsSocket.onopen = () => {
         console.log('[V5] ✅ Connecté au serveur de métriques');
-        // Demander l'état actuel
-        this.metricsSocket.send(JSON.stringify({ type: 'get_state' }));
+        // Demander l'état actuel (snapshot versionné puis deltas compacts)
+        this.metricsState = null;
+        this.metricsResyncPending = false;
+        this.metricsSocket.send(JSON.stringify({ type: 'get_state', protocol: 'delta' }));
       };
       
       this.metricsSocket.onmessage = (event) => {
         try {
           const msg = JSON.parse(event.data);
+          if (msg.type === 'session_redirect' && msg.url) {
+            // Session servie par un autre processus : la reconnexion ira à son URL
+            this.METRICS_WS_URL = msg.url;
+            return;
+          }
           if (msg.type === 'state_update' && msg.data) {
             // Mettre à jour l'affichage avec les métriques agrégées
             this.updateMetricsDisplay(msg.data);
+          } else if (msg.type === 'state_snapshot') {
+            this.metricsState = { version: msg.version, data: msg.data || {} };
+            this.metricsResyncPending = false;
+            this.updateMetricsDisplay(this.metricsState.data);
+          } else if (msg.type === 'state_delta') {
+            this.applyMetricsDelta(msg);
           } else if (msg.type === 'o_snapshot_update' || msg.type === 'n_snapshot_update') {
             // Snapshots O/N mis à jour - STOCKER dans this.Osnapshot pour utilisation immédiate
             if (msg.data && msg.data.version !== undefined) {
@@ -1924,6 +1944,35 @@ class AIPlayerV5 {
     }
   }
   
+  // === V5: Application d'un delta d'état (resync si trou de version) ===
+  applyMetricsDelta(msg) {
+    const state = this.metricsState;
+    if (state && msg.version <= state.version) return;  // déjà appliqué
+    if (!state || msg.base !== state.version) {
+      if (!this.metricsResyncPending && this.metricsSocket && this.metricsSocket.readyState === WebSocket.OPEN) {
+        this.metricsResyncPending = true;
+        this.metricsSocket.send(JSON.stringify({ type: 'state_resync', version: state ? state.version : -1 }));
+      }
+      return;
+    }
+    const data = state.data;
+    const delta = msg.data || {};
+    data.agents = data.agents || {};
+    for (const [id, agent] of Object.entries(delta.agents || {})) {
+      data.agents[id] = agent;
+    }
+    for (const id of delta.removed || []) {
+      delete data.agents[id];
+    }
+    data.history = (data.history || []).concat(delta.history || []).slice(-50);
+    for (const key of ['averages', 'update_count', 'o_snapshots_count', 'n_snapshots_count', 'latest_o', 'latest_n']) {
+      if (key in delta) data[key] = delta[key];
+    }
+    state.version = msg.version;
+    this.metricsResyncPending = false;
+    this.updateMetricsDisplay(data);
+  }
+
   // === V5: Mise à jour affichage métriques agrégées ===
   updateMetricsDisplay(data) {
     if (!data.averages) return;
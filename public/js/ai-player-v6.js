@@ -685,6 +685,7 @@ class AIPlayerV6 {
       
       if (data.type === 'initial_state') {
         this.myUserId = data.my_user_id;
+        if (window.GeminiV6Adapter) window.GeminiV6Adapter.agentId = this.myUserId;
         if (this.elements.userIdDisplay) {
           this.elements.userIdDisplay.textContent = this.myUserId?.substring(0, 8) || '-';
         }
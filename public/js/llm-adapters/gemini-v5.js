@@ -2,6 +2,7 @@ export const GeminiV5Adapter = {
   name: 'Gemini V5',
   version: '2025-01-27-v5-33',
   apiKey: null,
+  agentId: null, // user_id de l'agent (fixe par le player) : cle de round-robin de l'ordonnanceur serveur
   prompts: null,
   strategies: null, // Cache pour strategies-v5.json (compatibilité)
   strategiesCache: null, // Cache séparé par type (safe/advanced)
@@ -187,7 +188,11 @@ export const GeminiV5Adapter = {
       model,
       messages: [{ role: 'user', content }],
       max_tokens: maxTokens,
-      temperature: 1.2
+      temperature: 1.2,
+      // Voie de priorite de l'ordonnanceur serveur (seed avant action)
+      lane: isSeed ? 'w_seed' : 'w_action',
+      // Agent servi a tour de role dans sa voie (les connexions keep-alive sont partagees)
+      agent_id: this.agentId || undefined
     };
     
     // Retry avec backoff exponentiel pour erreurs 503/429 (rate limit)
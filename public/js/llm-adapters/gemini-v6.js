@@ -17,6 +17,7 @@ export const GeminiV6Adapter = {
   name: 'Gemini V6 Quantum',
   version: '20250127-v6-02',
   apiKey: null,
+  agentId: null, // user_id de l'agent (fixe par le player) : cle de round-robin de l'ordonnanceur serveur
   prompts: null,
   strategies: null,
   strategiesCache: null,
@@ -146,7 +147,11 @@ export const GeminiV6Adapter = {
       model,
       messages: [{ role: 'user', content }],
       max_tokens: maxTokens,
-      temperature: 1.2
+      temperature: 1.2,
+      // Voie de priorite de l'ordonnanceur serveur (seed avant action)
+      lane: isSeed ? 'w_seed' : 'w_action',
+      // Agent servi a tour de role dans sa voie (les connexions keep-alive sont partagees)
+      agent_id: this.agentId || undefined
     };
     
     const maxRetries = 3;
@@ -967,13 +967,15 @@ class PopupManager {
         const ctx = canvas.getContext('2d');
         const latest = snapshots[snapshots.length - 1];
         
-        if (latest.data) {
+        // Image inline (anciens exports) ou référence vers le blob store du serveur de métriques
+        const src = latest.data || (latest.url ? `http://${window.location.hostname}:5005${latest.url}` : null);
+        if (src) {
             const img = new Image();
             img.onload = () => {
                 ctx.clearRect(0, 0, canvas.width, canvas.height);
                 ctx.drawImage(img, 0, 0, canvas.width, canvas.height);
             };
-            img.src = latest.data;
+            img.src = src;
         }
         
         // Mettre à jour la timeline
@@ -19,6 +19,7 @@
       this.canvasEl = document.getElementById('live-canvas');
       this.engine = null;
       this.currentSessionId = null;
+      this.utteranceCursor = null;
       this.eventSource = null;
     }
 
@@ -135,11 +136,14 @@
       if (!this.currentSessionId) return;
 
       try {
-        const res = await fetch(`${UTTERANCES_BASE}/api/utterances/${this.currentSessionId}`);
+        // Curseur : seuls les énoncés postérieurs au dernier reçu sont relus
+        const since = this.utteranceCursor ? `?since=${encodeURIComponent(this.utteranceCursor)}` : '';
+        const res = await fetch(`${UTTERANCES_BASE}/api/utterances/${this.currentSessionId}${since}`);
         if (!res.ok) return;
         const data = await res.json();
         const list = data.utterances || [];
-        if (list.length > 0) this.setStatus(`Connecté — ${list.length} énoncé(s)`);
+        if (data.cursor) this.utteranceCursor = data.cursor;
+        if (data.total > 0) this.setStatus(`Connecté — ${data.total} énoncé(s)`);
         for (const u of list) this.onUtterance(u);
       } catch (_) {}
     }
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""Classement incremental des agents par erreur de prediction moyenne (V5, V6).
+
+Remplace le recalcul complet (moyenne de tout l'historique de chaque agent,
+puis tri de tous les agents) fait a chaque snapshot N :
+
+- par agent, nombre d'erreurs, moyenne, variance, EWMA et quantiles tenus a
+  jour (`stream_stats.StreamingStats`) : une nouvelle erreur coute O(1),
+  quelle que soit la duree de la session ;
+- index ordonne (moyenne, agent) : le rang d'un agent est une recherche
+  dichotomique, une mise a jour est un retrait + une insertion
+  (`sortedcontainers.SortedList` si disponible, liste triee + bisect sinon) ;
+- fenetre glissante optionnelle (`window`) : l'erreur la plus ancienne est
+  retiree des sommes (Welford inverse) ;
+- `rank_changes` compare un classement au precedent publie et retourne les
+  changements de rang (diffuses aux dashboards par les serveurs).
+"""
+from __future__ import annotations
+
+from bisect import bisect_left, insort
+from collections import deque
+from typing import Dict, Hashable, Iterator, List, Optional, Set, Tuple
+
+from stream_stats import StreamingStats, is_number
+
+try:
+    from sortedcontainers import SortedList
+    SORTEDCONTAINERS_AVAILABLE = True
+except ImportError:
+    SORTEDCONTAINERS_AVAILABLE = False
+
+
+class _SortedIndex:
+    """Liste triee minimale (repli sans sortedcontainers)."""
+
+    def __init__(self) -> None:
+        self._items: list = []
+
+    def add(self, item) -> None:
+        insort(self._items, item)
+
+    def remove(self, item) -> None:
+        self._items.pop(bisect_left(self._items, item))
+
+    def bisect_left(self, item) -> int:
+        return bisect_left(self._items, item)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class ErrorStats(StreamingStats):
+    """Statistiques des erreurs d'un agent (Welford, EWMA, quantiles) et fenetre optionnelle."""
+
+    __slots__ = ("recent",)
+
+    def __init__(self, window: Optional[int] = None) -> None:
+        super().__init__()
+        self.recent: Optional[deque] = deque() if window else None
+
+    def add(self, value: float) -> bool:
+        if self.recent is not None:
+            self.recent.append(value)
+        return super().add(value)
+
+
+class AgentRanking:
+    """Classement des agents (rang 1 = plus petite erreur moyenne).
+
+    Seuls les agents *membres* sont classes. Avec `auto_join`, un agent
+    devient membre a sa premiere erreur (V6) ; sinon il faut `join` (V5 :
+    agents actifs du tracker), les erreurs recues avant etant conservees.
+    """
+
+    def __init__(self, window: Optional[int] = None, auto_join: bool = True) -> None:
+        self.window = window
+        self.auto_join = auto_join
+        self._stats: Dict[str, ErrorStats] = {}
+        self._keys: Dict[str, Set[Hashable]] = {}  # cles deja vues (versions) par agent
+        self._members: Set[str] = set()
+        self._index = SortedList() if SORTEDCONTAINERS_AVAILABLE else _SortedIndex()
+        self._indexed: Dict[str, Tuple[float, str]] = {}  # agent -> entree courante de l'index
+        self._published: Dict[str, int] = {}
+        self.updates = 0
+
+    def __contains__(self, agent_id: str) -> bool:
+        return agent_id in self._stats
+
+    def __len__(self) -> int:
+        return len(self._stats)
+
+    def agents(self) -> List[str]:
+        """Agents ayant au moins une erreur enregistree."""
+        return list(self._stats)
+
+    def stats(self, agent_id: str) -> Optional[ErrorStats]:
+        return self._stats.get(agent_id)
+
+    def errors(self, agent_id: str) -> List[float]:
+        """Erreurs de la fenetre (vide sans `window`)."""
+        stats = self._stats.get(agent_id)
+        return list(stats.recent) if stats is not None and stats.recent is not None else []
+
+    def _reindex(self, agent_id: str) -> None:
+        entry = self._indexed.pop(agent_id, None)
+        if entry is not None:
+            self._index.remove(entry)
+        stats = self._stats.get(agent_id)
+        if stats is not None and stats.count and agent_id in self._members:
+            entry = (stats.mean, agent_id)
+            self._index.add(entry)
+            self._indexed[agent_id] = entry
+
+    def record(self, agent_id: str, error, key: Optional[Hashable] = None) -> bool:
+        """Ajoute une erreur. Avec `key` (version), une seule erreur par cle. False si ignoree."""
+        if not is_number(error):
+            return False
+        if key is not None:
+            seen = self._keys.setdefault(agent_id, set())
+            if key in seen:
+                return False
+            seen.add(key)
+        stats = self._stats.get(agent_id)
+        if stats is None:
+            stats = self._stats[agent_id] = ErrorStats(self.window)
+        stats.add(float(error))
+        if self.window and len(stats.recent) > self.window:
+            stats.discard(stats.recent.popleft())
+        if self.auto_join:
+            self._members.add(agent_id)
+        self.updates += 1
+        self._reindex(agent_id)
+        return True
+
+    def record_errors(self, prediction_errors: dict, key: Optional[Hashable] = None,
+                      default: Optional[float] = 1.0) -> int:
+        """`{agent_id: {'error': float, ...}}` (format des snapshots N). Retourne le nombre retenu.
+
+        `default` : erreur d'une entree sans cle 'error' (None = ignoree).
+        """
+        recorded = 0
+        for agent_id, error_data in prediction_errors.items():
+            if isinstance(error_data, dict) and self.record(agent_id, error_data.get('error', default), key):
+                recorded += 1
+        return recorded
+
+    def join(self, agent_id: str) -> None:
+        if agent_id not in self._members:
+            self._members.add(agent_id)
+            self._reindex(agent_id)
+
+    def reset(self, agent_id: str) -> None:
+        """Oublie les erreurs d'un agent (il reste membre)."""
+        self._stats.pop(agent_id, None)
+        self._keys.pop(agent_id, None)
+        self._reindex(agent_id)
+
+    def remove(self, agent_id: str) -> None:
+        self._members.discard(agent_id)
+        self.reset(agent_id)
+        self._published.pop(agent_id, None)
+
+    def clear(self) -> None:
+        self.__init__(self.window, self.auto_join)
+
+    def rank(self, agent_id: str, default: int = 999) -> int:
+        """Rang courant d'un agent classe (O(log n)), `default` sinon."""
+        entry = self._indexed.get(agent_id)
+        return self._index.bisect_left(entry) + 1 if entry is not None else default
+
+    def ordered(self) -> Iterator[Tuple[str, float]]:
+        """(agent, erreur moyenne) par rang croissant."""
+        for mean, agent_id in self._index:
+            yield agent_id, mean
+
+    def rankings(self, agent_positions: dict, default_error: Optional[float] = None) -> dict:
+        """Classement des agents de `agent_positions` (format historique des trackers).
+
+        Les agents sans erreur sont ignores, ou classes avec `default_error`.
+        """
+        entries = [(mean, agent_id) for agent_id, mean in self.ordered() if agent_id in agent_positions]
+        if default_error is not None:
+            missing = sorted((default_error, agent_id) for agent_id in agent_positions
+                             if agent_id not in self._indexed)
+            if missing:
+                entries = sorted(entries + missing)
+        rankings = {}
+        for rank, (mean, agent_id) in enumerate(entries, start=1):
+            stats = self._stats.get(agent_id)
+            rankings[agent_id] = {
+                'rank': rank,
+                'avg_error': mean,
+                'total_iterations': stats.count if stats is not None else 0,
+                'position': agent_positions[agent_id],
+            }
+        return rankings
+
+    def rank_changes(self, rankings: dict) -> List[dict]:
+        """Changements de rang depuis le precedent classement publie (qui devient celui-ci)."""
+        changes = []
+        current = {}
+        for agent_id, info in rankings.items():
+            rank = info.get('rank') if isinstance(info, dict) else None
+            if rank is None:
+                continue
+            current[agent_id] = rank
+            previous = self._published.get(agent_id)
+            if previous != rank:
+                changes.append({'agent_id': agent_id, 'previous_rank': previous, 'rank': rank})
+        for agent_id, previous in self._published.items():
+            if agent_id not in current:
+                changes.append({'agent_id': agent_id, 'previous_rank': previous, 'rank': None})
+        self._published = current
+        changes.sort(key=lambda c: (c['rank'] is None, c['rank'] or 0))
+        return changes
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""Declencheur de l'analyse O→N pilote par evenements (V5/V6).
+
+Remplace le sondage toutes les 2s de `periodic_on_task` / `periodic_quantum_on_task`.
+Les endpoints signalent l'activite (`/o/image`, `/o/agents`, `/n/w-data` et
+leurs equivalents /q/*) ; la tache O→N attend ces signaux, avec un debounce
+pour absorber les rafales, ou l'echeance du prochain timer (warmup,
+quiescence, age d'image). L'analyse part donc des que la quiescence est
+atteinte au lieu d'attendre le prochain tour de boucle.
+
+La machine d'etat est pure : toutes les durees passent par `clock` (monotone),
+ce qui permet de la tester avec une horloge factice.
+
+Etats : idle (pas d'image) → warmup → waiting (quiescence, image, seeds) → analyzing.
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Callable, Optional
+
+STATE_IDLE = "idle"
+STATE_WARMUP = "warmup"
+STATE_WAITING = "waiting"
+STATE_ANALYZING = "analyzing"
+
+# Marge ajoutee aux echeances pour que la condition soit vraie au reveil
+_EPSILON = 0.05
+
+
+class TriggerDecision:
+    """Resultat d'une evaluation : declencher, ou attendre (signal ou echeance)."""
+
+    __slots__ = ("fire", "key", "reason", "retry_in", "forced")
+
+    def __init__(self, fire: bool, key: str = "", reason: str = "",
+                 retry_in: Optional[float] = None, forced: bool = False) -> None:
+        self.fire = fire
+        self.key = key            # categorie stable (pour limiter les logs)
+        self.reason = reason      # message lisible
+        self.retry_in = retry_in  # None => seul un nouveau signal peut debloquer
+        self.forced = forced
+
+    def __repr__(self) -> str:
+        return f"TriggerDecision(fire={self.fire}, key={self.key!r}, retry_in={self.retry_in})"
+
+
+def min_agents_required(agents_count: int, ratio: float = 0.75) -> int:
+    """Nombre d'agents avec donnees requis pour la premiere analyse (1 en test, sinon ≥2 ou 75%)."""
+    if agents_count == 1:
+        return 1
+    return max(2, int(agents_count * ratio)) if agents_count > 0 else 2
+
+
+def _wait(key: str, reason: str, retry_in: Optional[float] = None) -> TriggerDecision:
+    if retry_in is not None:
+        retry_in = max(0.0, retry_in) + _EPSILON
+    return TriggerDecision(False, key, reason, retry_in)
+
+
+class AnalysisTrigger:
+    """Machine d'etat du declenchement O→N.
+
+    Un parametre a None desactive la verification correspondante (V6 n'utilise
+    ni l'age d'image ni les delais de premiere analyse).
+    """
+
+    def __init__(
+        self,
+        *,
+        clock: Callable[[], float] = time.monotonic,
+        warmup_delay: float = 30.0,
+        quiescence_first: float = 6.0,
+        quiescence: float = 5.0,
+        max_quiescence_wait: Optional[float] = 45.0,
+        max_image_age_first: Optional[float] = 30.0,
+        max_image_age: Optional[float] = 10.0,
+        max_image_wait: float = 60.0,
+        max_w_image_lag: Optional[float] = 2.0,
+        final_image_age: Optional[float] = 8.0,
+        first_analysis_timeout: Optional[float] = 20.0,
+        first_settle: Optional[float] = 3.0,
+        min_image_size: int = 1000,
+        debounce: float = 0.25,
+        max_debounce: float = 1.0,
+        idle_timeout: float = 10.0,
+        log_interval: float = 10.0,
+    ) -> None:
+        self._clock = clock
+        self.warmup_delay = warmup_delay
+        self.quiescence_first = quiescence_first
+        self.quiescence = quiescence
+        self.max_quiescence_wait = max_quiescence_wait
+        self.max_image_age_first = max_image_age_first
+        self.max_image_age = max_image_age
+        self.max_image_wait = max_image_wait
+        self.max_w_image_lag = max_w_image_lag
+        self.final_image_age = final_image_age
+        self.first_analysis_timeout = first_analysis_timeout
+        self.first_settle = first_settle
+        self.min_image_size = min_image_size
+        self.debounce = debounce
+        self.max_debounce = max_debounce
+        self.idle_timeout = idle_timeout
+        self.log_interval = log_interval
+
+        self.state = STATE_IDLE
+        self._event: Optional[asyncio.Event] = None
+        # Horodatages (horloge monotone)
+        self.first_o_at: Optional[float] = None       # premiere activite cote O
+        self.last_o_at: Optional[float] = None        # derniere image / nb agents recus
+        self.last_w_at: Optional[float] = None        # dernieres donnees W recues
+        # Timers explicites (remplacent les attributs hasattr de la boucle)
+        self.image_wait_start: Optional[float] = None
+        self.quiescence_start: Optional[float] = None
+        self.first_analysis_start: Optional[float] = None
+        self._last_log_key: Optional[str] = None
+        self._last_log_at = 0.0
+
+    # ------------------------------------------------------------------ signaux
+
+    def _signal(self) -> None:
+        if self._event is not None:
+            self._event.set()
+
+    def _touch_o(self) -> None:
+        now = self._clock()
+        self.last_o_at = now
+        if self.first_o_at is None:
+            self.first_o_at = now
+
+    def notify_image(self) -> None:
+        """Image recue (meme ignoree comme doublon : les agents sont actifs)."""
+        self._touch_o()
+        self._signal()
+
+    def notify_agents(self) -> None:
+        """Nombre d'agents mis a jour."""
+        self._touch_o()
+        self._signal()
+
+    def notify_w_data(self) -> None:
+        """Donnees W recues d'un agent."""
+        self.last_w_at = self._clock()
+        self._signal()
+
+    # ------------------------------------------------------------------ attente
+
+    async def wait(self, timeout: Optional[float] = None) -> bool:
+        """Attend un signal (puis debounce) ou l'echeance `timeout`.
+
+        Retourne True si un signal est arrive. Sans echeance, se reveille au
+        bout de `idle_timeout` pour la detection de deconnexion.
+        """
+        if self._event is None:
+            self._event = asyncio.Event()
+        timeout = self.idle_timeout if timeout is None else min(max(0.0, timeout), self.idle_timeout)
+        if not self._event.is_set():
+            try:
+                await asyncio.wait_for(self._event.wait(), timeout)
+            except asyncio.TimeoutError:
+                return False
+        # Debounce : attendre que la rafale retombe (borne par max_debounce)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_debounce
+        while True:
+            self._event.clear()
+            remaining = min(self.debounce, deadline - loop.time())
+            if remaining <= 0:
+                break
+            try:
+                await asyncio.wait_for(self._event.wait(), remaining)
+            except asyncio.TimeoutError:
+                break
+        return True
+
+    # ------------------------------------------------------------------ evaluation
+
+    def check_warmup(self, *, first_analysis: bool, agents_count: int, agents_with_data: int) -> TriggerDecision:
+        """Warmup avant la premiere analyse : laisser les seeds arriver."""
+        if not first_analysis or self.first_o_at is None:
+            return TriggerDecision(True)
+        elapsed = self._clock() - self.first_o_at
+        min_agents = min_agents_required(agents_count)
+        if elapsed < self.warmup_delay and agents_with_data < min_agents:
+            self.state = STATE_WARMUP
+            return _wait(
+                "warmup",
+                f"Warmup en cours ({elapsed:.1f}s / {self.warmup_delay}s, {agents_with_data}/{agents_count} "
+                f"agents avec données, min requis: {min_agents})...",
+                self.warmup_delay - elapsed,
+            )
+        return TriggerDecision(True)
+
+    def check_ready(
+        self,
+        *,
+        first_analysis: bool,
+        agents_count: int,
+        agents_with_data: int,
+        image_size: int,
+    ) -> TriggerDecision:
+        """Conditions de declenchement apres le warmup (quiescence W, fraicheur d'image...)."""
+        now = self._clock()
+        self.state = STATE_WAITING
+        n = agents_with_data
+
+        if n == 0 and not first_analysis:
+            return _wait("no_w_data", "Aucune donnée W disponible, attente données agents...")
+
+        q_delay = self.quiescence_first if first_analysis else self.quiescence
+        since_w = (now - self.last_w_at) if self.last_w_at is not None else float("inf")
+        all_finished = n == 0 or since_w >= q_delay
+
+        # Fraicheur de l'image (timer d'attente avec forcage)
+        image_forced = False
+        max_age = self.max_image_age_first if first_analysis else self.max_image_age
+        image_age = (now - self.last_o_at) if self.last_o_at is not None else 0.0
+        if max_age is not None and self.last_o_at is not None:
+            if image_age > max_age:
+                if self.image_wait_start is None:
+                    self.image_wait_start = now
+                image_wait = now - self.image_wait_start
+                if image_wait >= self.max_image_wait:
+                    image_forced = True
+                    self.image_wait_start = now
+                else:
+                    return _wait(
+                        "image_old",
+                        f"Image trop ancienne ({image_age:.1f}s > {max_age}s), attente mise à jour récente "
+                        f"({image_wait:.1f}s/{self.max_image_wait}s)...",
+                        self.max_image_wait - image_wait,
+                    )
+            else:
+                self.image_wait_start = None
+
+        # Delai jusqu'a ce que l'image devienne "ancienne" (debut du timer de forcage)
+        until_image_old = (self.last_o_at + max_age - now) if (max_age is not None and self.last_o_at is not None) else None
+
+        if not image_forced and self.max_w_image_lag is not None and self.last_w_at is not None and self.last_o_at is not None:
+            lag = self.last_w_at - self.last_o_at
+            if lag > self.max_w_image_lag:
+                return _wait(
+                    "w_newer",
+                    f"⏳ Données W plus récentes que l'image ({lag:.1f}s d'écart), attente mise à jour image...",
+                    until_image_old,
+                )
+
+        if not first_analysis:
+            self.first_analysis_start = None
+        else:
+            if self.first_analysis_start is None:
+                self.first_analysis_start = now
+            if agents_count > 0:
+                if n == 0:
+                    return _wait(
+                        "no_seed",
+                        f"⏳ Première analyse: {agents_count} agents actifs mais aucune donnée W reçue - attente seeds...",
+                    )
+                if self.first_analysis_timeout is not None and n < agents_count:
+                    waited = now - self.first_analysis_start
+                    if n < min_agents_required(agents_count) and waited < self.first_analysis_timeout:
+                        return _wait(
+                            "seeds_partial",
+                            f"⏳ Première analyse: {n}/{agents_count} agents ont envoyé leurs données "
+                            f"(attente {waited:.1f}s/{self.first_analysis_timeout}s)...",
+                            self.first_analysis_timeout - waited,
+                        )
+                if self.first_settle is not None and since_w < self.first_settle:
+                    return _wait(
+                        "seed_settle",
+                        f"⏳ Première analyse: dernière seed il y a {since_w:.1f}s < {self.first_settle}s - attente stabilisation...",
+                        self.first_settle - since_w,
+                    )
+
+        force_quiescence = False
+        if not all_finished:
+            if self.quiescence_start is None:
+                self.quiescence_start = now
+            waited = now - self.quiescence_start
+            if self.max_quiescence_wait is not None and waited >= self.max_quiescence_wait and n >= 2:
+                force_quiescence = True
+                self.quiescence_start = now
+            else:
+                retry = q_delay - since_w
+                if self.max_quiescence_wait is not None:
+                    retry = min(retry, self.max_quiescence_wait - waited)
+                limit = f"{self.max_quiescence_wait}s" if self.max_quiescence_wait is not None else "∞"
+                return _wait(
+                    "quiescence",
+                    f"Agents W encore actifs (dernière mise à jour W il y a {since_w:.1f}s < {q_delay}s, "
+                    f"attente quiescence {waited:.1f}s/{limit})...",
+                    retry,
+                )
+        else:
+            self.quiescence_start = None
+
+        if not image_forced and self.final_image_age is not None and self.last_o_at is not None:
+            if image_age > self.final_image_age:
+                return _wait(
+                    "image_final_old",
+                    f"⏳ Image finale trop ancienne ({image_age:.1f}s), attente mise à jour...",
+                    until_image_old,
+                )
+
+        if image_size < self.min_image_size:
+            return _wait(
+                "image_small",
+                f"Image trop petite ({image_size} bytes < {self.min_image_size} bytes), attente image valide...",
+            )
+
+        reason = ""
+        if image_forced:
+            reason = f"⚠️  Timeout image ({self.max_image_wait}s) - FORÇAGE analyse avec image de {image_age:.1f}s"
+        elif force_quiescence:
+            reason = f"⚠️  Timeout quiescence ({self.max_quiescence_wait}s) - FORÇAGE analyse avec {n} agents"
+        return TriggerDecision(True, "ready", reason, forced=image_forced or force_quiescence)
+
+    # ------------------------------------------------------------------ cycle
+
+    def begin_analysis(self) -> None:
+        self.state = STATE_ANALYZING
+
+    def should_log(self, decision: TriggerDecision) -> bool:
+        """Limite les logs d'attente : changement de motif ou toutes les `log_interval` s."""
+        now = self._clock()
+        if decision.key != self._last_log_key or (now - self._last_log_at) >= self.log_interval:
+            self._last_log_key = decision.key
+            self._last_log_at = now
+            return True
+        return False
+
+    def stats(self) -> dict:
+        now = self._clock()
+        return {
+            "state": self.state,
+            "since_last_image_s": round(now - self.last_o_at, 3) if self.last_o_at is not None else None,
+            "since_last_w_s": round(now - self.last_w_at, 3) if self.last_w_at is not None else None,
+            "quiescence_wait_s": round(now - self.quiescence_start, 3) if self.quiescence_start is not None else None,
+            "image_wait_s": round(now - self.image_wait_start, 3) if self.image_wait_start is not None else None,
+        }
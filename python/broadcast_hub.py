@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""Diffusion WebSocket vers les dashboards (metriques V5/V6, analytics).
+
+Chaque message est encode en JSON une seule fois, puis le texte est depose
+dans une file bornee par connexion ; une tache d'ecriture par connexion la
+vide. Le producteur (handler d'un agent W, boucle O/N) ne fait jamais
+d'`await` sur un client : un dashboard lent ne retarde plus personne.
+
+Politique quand la file d'un client est pleine (BROADCAST_POLICY) :
+
+- drop_oldest : le message le plus ancien est abandonne ;
+- coalesce    : un message a cle (`coalesce_key`, ex. etat global) remplace
+  celui de meme cle encore en attente ; si la file reste pleine, le plus
+  ancien est abandonne ;
+- disconnect  : le client est deconnecte (il se reconnectera et recevra
+  l'etat complet).
+
+Les envois restent dans l'ordre de diffusion pour chaque client. Un client
+peut s'abonner a un canal (`client.channel`, ex. protocole delta du serveur
+V5) pour ne recevoir que les diffusions de ce canal ; le canal "" est celui
+par defaut.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+from collections import deque
+from typing import Any, Awaitable, Callable, Optional
+
+POLICY_DROP_OLDEST = "drop_oldest"
+POLICY_COALESCE = "coalesce"
+POLICY_DISCONNECT = "disconnect"
+POLICIES = (POLICY_DROP_OLDEST, POLICY_COALESCE, POLICY_DISCONNECT)
+
+BROADCAST_QUEUE_SIZE = int(os.getenv("BROADCAST_QUEUE_SIZE", "256"))
+BROADCAST_POLICY = os.getenv("BROADCAST_POLICY", POLICY_COALESCE).strip().lower()
+BROADCAST_SEND_TIMEOUT = float(os.getenv("BROADCAST_SEND_TIMEOUT", "10"))
+
+
+def encode_message(message: Any) -> str:
+    """JSON compact (meme format que `WebSocket.send_json` de Starlette)."""
+    if isinstance(message, str):
+        return message
+    return json.dumps(message, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+class HubClient:
+    """Une connexion : file bornee de (cle, texte) + tache d'ecriture."""
+
+    __slots__ = ("name", "send", "close", "channel", "queue", "keys", "wakeup", "task",
+                 "closed", "sent", "dropped", "coalesced")
+
+    def __init__(self, send: Callable[[str], Awaitable[Any]],
+                 close: Optional[Callable[[], Awaitable[Any]]] = None, name: str = "") -> None:
+        self.name = name
+        self.send = send
+        self.close = close
+        self.channel = ""
+        self.queue: deque = deque()
+        self.keys: set = set()
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.closed = False
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self.queue)
+
+
+class BroadcastHub:
+    """Ensemble des clients d'un serveur ; `broadcast()` est synchrone et non bloquant."""
+
+    def __init__(self, name: str = "Hub", *, queue_size: Optional[int] = None,
+                 policy: Optional[str] = None, send_timeout: Optional[float] = None) -> None:
+        self.name = name
+        self.queue_size = max(1, queue_size or BROADCAST_QUEUE_SIZE)
+        self.policy = policy or BROADCAST_POLICY
+        if self.policy not in POLICIES:
+            print(f"[{name}] ⚠️  BROADCAST_POLICY inconnue '{self.policy}', utilisation de '{POLICY_COALESCE}'")
+            self.policy = POLICY_COALESCE
+        self.send_timeout = BROADCAST_SEND_TIMEOUT if send_timeout is None else send_timeout
+        self.clients: list = []
+        self.messages = 0
+        self.bytes_encoded = 0
+        self.deliveries = 0
+        self.bytes_sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.disconnected = 0
+        self.max_depth = 0
+
+    def __len__(self) -> int:
+        return len(self.clients)
+
+    def count(self, channel: str) -> int:
+        return sum(1 for c in self.clients if c.channel == channel)
+
+    def add(self, send: Callable[[str], Awaitable[Any]],
+            close: Optional[Callable[[], Awaitable[Any]]] = None, name: str = "") -> HubClient:
+        """Enregistre une connexion (`send(texte)` coroutine) et demarre son ecrivain."""
+        client = HubClient(send, close, name)
+        client.task = asyncio.get_running_loop().create_task(self._writer(client))
+        self.clients.append(client)
+        return client
+
+    def add_websocket(self, websocket, name: str = "") -> HubClient:
+        """FastAPI/Starlette (`send_text`) ou bibliotheque websockets (`send`)."""
+        send = getattr(websocket, "send_text", None) or websocket.send
+        return self.add(send, getattr(websocket, "close", None), name)
+
+    def remove(self, client: Optional[HubClient]) -> None:
+        """Retire un client (fin de connexion) ; sa file est abandonnee."""
+        if client is None or client.closed:
+            return
+        client.closed = True
+        client.queue.clear()
+        client.keys.clear()
+        if client in self.clients:
+            self.clients.remove(client)
+        if client.task is not None and client.task is not asyncio.current_task():
+            client.task.cancel()
+
+    def broadcast(self, message: Any, coalesce_key: Optional[str] = None,
+                  channel: Optional[str] = None) -> int:
+        """Encode une fois et met en file pour tous les clients (ou ceux de `channel`).
+
+        Retourne le nombre de clients servis.
+        """
+        targets = [c for c in self.clients if channel is None or c.channel == channel]
+        if not targets:
+            return 0
+        text = encode_message(message)
+        self.messages += 1
+        self.bytes_encoded += len(text)
+        for client in targets:
+            self._enqueue(client, text, coalesce_key)
+        return len(targets)
+
+    def send(self, client: HubClient, message: Any) -> None:
+        """Reponse a un seul client, ordonnee avec les diffusions."""
+        if client is not None and not client.closed:
+            self._enqueue(client, encode_message(message), None)
+
+    def _enqueue(self, client: HubClient, text: str, key: Optional[str]) -> None:
+        if client.closed:
+            return
+        queue = client.queue
+        if key is not None and self.policy == POLICY_COALESCE and key in client.keys:
+            # Le message le plus recent prend la place en fin de file (ordre causal preserve)
+            for i, (pending_key, _) in enumerate(queue):
+                if pending_key == key:
+                    del queue[i]
+                    break
+            client.coalesced += 1
+            self.coalesced += 1
+        elif len(queue) >= self.queue_size:
+            if self.policy == POLICY_DISCONNECT:
+                print(f"[{self.name}] ⚠️  Client {client.name or id(client)} trop lent, déconnexion")
+                self._disconnect(client)
+                return
+            old_key, _ = queue.popleft()
+            if old_key is not None:
+                client.keys.discard(old_key)
+            client.dropped += 1
+            self.dropped += 1
+        queue.append((key, text))
+        if key is not None:
+            client.keys.add(key)
+        if len(queue) > self.max_depth:
+            self.max_depth = len(queue)
+        client.wakeup.set()
+
+    def _disconnect(self, client: HubClient) -> None:
+        self.disconnected += 1
+        self.remove(client)
+        if client.close is not None:
+            asyncio.get_running_loop().create_task(self._close(client))
+
+    async def _close(self, client: HubClient) -> None:
+        try:
+            await asyncio.wait_for(client.close(), timeout=self.send_timeout or None)
+        except Exception:
+            pass
+
+    async def _writer(self, client: HubClient) -> None:
+        try:
+            while not client.closed:
+                if not client.queue:
+                    client.wakeup.clear()
+                    await client.wakeup.wait()
+                    continue
+                key, text = client.queue.popleft()
+                if key is not None:
+                    client.keys.discard(key)
+                if self.send_timeout:
+                    await asyncio.wait_for(client.send(text), timeout=self.send_timeout)
+                else:
+                    await client.send(text)
+                client.sent += 1
+                self.deliveries += 1
+                self.bytes_sent += len(text)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            # Connexion morte ou bloquee : le handler de reception fera le menage
+            if not client.closed:
+                print(f"[{self.name}] Client {client.name or id(client)} retiré: {type(e).__name__}")
+                self._disconnect(client)
+
+    def stats(self) -> dict:
+        return {
+            "clients": len(self.clients),
+            "policy": self.policy,
+            "queue_size": self.queue_size,
+            "messages": self.messages,
+            "bytes_encoded": self.bytes_encoded,
+            "deliveries": self.deliveries,
+            "bytes_sent": self.bytes_sent,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "disconnected": self.disconnected,
+            "max_depth": self.max_depth,
+            "pending": sum(len(c) for c in self.clients),
+        }
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""Bundle "Tableau parlant" en flux, avec pre-synthese TTS parallele (utterance_http).
+
+L'export construisait tout le zip en memoire et synthetisait les enonces un
+par un (un POST bloquant de 60 s max chacun, dans le handler async). Ici :
+
+- le zip est ecrit dans un puits non seekable et ses octets sont rendus au
+  fur et a mesure (generateur synchrone, itere par Starlette dans un thread) :
+  seuls l'entree en cours et les syntheses terminees non encore ecrites sont
+  en memoire ;
+- les syntheses passent par un pool borne (EXPORT_TTS_WORKERS threads, au
+  plus 2x autant de resultats en attente) ; chaque WAV est ajoute au zip des
+  qu'il est pret ;
+- un meme (voix, texte) n'est synthetise qu'une fois par export, et le cache
+  disque du serveur Piper est relu directement quand il a deja le WAV ;
+- `ExportProgress` : compteurs consultables pendant l'export (total, faits,
+  depuis le cache, echecs, octets envoyes).
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+import uuid
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+EXPORT_TTS_WORKERS = int(os.getenv("EXPORT_TTS_WORKERS", "4"))
+MAX_TRACKED_EXPORTS = 32
+
+# (nom dans le zip, texte, voix, langue)
+AudioJob = Tuple[str, str, str, str]
+
+
+class ExportProgress:
+    """Avancement d'un export (lu par GET /api/utterances/exports/{id}/progress)."""
+
+    def __init__(self, export_id: str, session_id: str) -> None:
+        self.export_id = export_id
+        self.session_id = session_id
+        self.started_at = time.time()
+        self.total = 0
+        self.done = 0
+        self.cached = 0
+        self.failed = 0
+        self.bytes_sent = 0
+        self.finished = False
+        self.error: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        return {
+            "export_id": self.export_id,
+            "session_id": self.session_id,
+            "audio_total": self.total,
+            "audio_done": self.done,
+            "audio_cached": self.cached,
+            "audio_failed": self.failed,
+            "bytes_sent": self.bytes_sent,
+            "elapsed": round(time.time() - self.started_at, 2),
+            "finished": self.finished,
+            "error": self.error,
+        }
+
+
+_exports: "OrderedDict[str, ExportProgress]" = OrderedDict()
+_exports_lock = threading.Lock()
+
+
+def start_progress(session_id: str, export_id: Optional[str] = None) -> ExportProgress:
+    progress = ExportProgress(export_id or uuid.uuid4().hex[:12], session_id)
+    with _exports_lock:
+        _exports[progress.export_id] = progress
+        while len(_exports) > MAX_TRACKED_EXPORTS:
+            _exports.popitem(last=False)
+    return progress
+
+
+def get_progress(export_id: str) -> Optional[ExportProgress]:
+    with _exports_lock:
+        return _exports.get(export_id)
+
+
+class _ChunkSink:
+    """Fichier en ecriture seule et non seekable : zipfile y ecrit, on recupere les octets."""
+
+    def __init__(self) -> None:
+        self._chunks: List[bytes] = []
+
+    def write(self, data) -> int:
+        if data:
+            self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _render(job_key: Tuple[str, str, str], synthesize: Callable[[str, str, str], Optional[bytes]],
+            lookup: Optional[Callable[[str, str], Optional[bytes]]]) -> Tuple[Optional[bytes], bool]:
+    text, voice, lang = job_key
+    if lookup is not None:
+        wav = lookup(text, voice)
+        if wav:
+            return wav, True
+    return synthesize(text, voice, lang), False
+
+
+def iter_bundle(files: Iterable[Tuple[str, bytes]], audio_jobs: List[AudioJob],
+                synthesize: Callable[[str, str, str], Optional[bytes]], *,
+                lookup: Optional[Callable[[str, str], Optional[bytes]]] = None,
+                progress: Optional[ExportProgress] = None,
+                workers: Optional[int] = None) -> Iterator[bytes]:
+    """Octets du zip : `files` d'abord, puis un WAV par job des que sa synthese est prete."""
+    progress = progress or ExportProgress("", "")
+    sink = _ChunkSink()
+    try:
+        with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as zf:
+            for name, data in files:
+                zf.writestr(name, data)
+                chunk = sink.take()
+                progress.bytes_sent += len(chunk)
+                yield chunk
+
+            # Un meme (texte, voix) pour plusieurs enonces : une seule synthese
+            names_by_key: "OrderedDict[Tuple[str, str, str], List[str]]" = OrderedDict()
+            for name, text, voice, lang in audio_jobs:
+                names_by_key.setdefault((text, voice, lang), []).append(name)
+            progress.total = len(audio_jobs)
+
+            workers = max(1, workers or EXPORT_TTS_WORKERS)
+            pending_keys = iter(names_by_key)
+            pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="export-tts")
+            try:
+                running = {}
+                while True:
+                    # Au plus 2 x workers resultats en vol (memoire bornee si le client lit lentement)
+                    while len(running) < 2 * workers:
+                        key = next(pending_keys, None)
+                        if key is None:
+                            break
+                        running[pool.submit(_render, key, synthesize, lookup)] = key
+                    if not running:
+                        break
+                    completed, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in completed:
+                        names = names_by_key[running.pop(future)]
+                        try:
+                            wav, cached = future.result()
+                        except Exception:
+                            wav, cached = None, False
+                        if wav:
+                            for name in names:
+                                zf.writestr(name, wav)
+                            if cached:
+                                progress.cached += len(names)
+                        else:
+                            progress.failed += len(names)
+                        progress.done += len(names)
+                    chunk = sink.take()
+                    if chunk:
+                        progress.bytes_sent += len(chunk)
+                        yield chunk
+            finally:
+                # Client deconnecte : les syntheses pas encore commencees sont abandonnees
+                pool.shutdown(wait=False, cancel_futures=True)
+        chunk = sink.take()
+        progress.bytes_sent += len(chunk)
+        yield chunk
+    except Exception as e:
+        progress.error = str(e)
+        raise
+    finally:
+        progress.finished = True
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""Stockage adresse par contenu des images de canevas (SessionRecorder V5).
+
+Une image est ecrite une seule fois sur disque sous son empreinte SHA-256
+(`<dir>/ab/abcdef...`) ; les evenements et `canvas_snapshots` ne gardent que
+l'empreinte. Deux snapshots identiques partagent le meme fichier. Le serveur
+de metriques sert les images par `/api/session/canvas/{empreinte}` avec un
+cache HTTP immuable.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+from pathlib import Path
+from typing import Optional
+
+from image_ingest import IMAGE_MAX_BYTES, decode_base64_image
+
+ROOT = Path(__file__).resolve().parent.parent
+CANVAS_BLOB_DIR = Path(os.getenv("CANVAS_BLOB_DIR", str(ROOT / "db" / "canvas_blobs")))
+
+_DIGEST = re.compile(r"^[0-9a-f]{64}$")
+_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF8", "image/gif"),
+)
+
+
+def is_digest(value: str) -> bool:
+    return isinstance(value, str) and bool(_DIGEST.match(value))
+
+
+def sniff_media_type(data: bytes) -> str:
+    for signature, media_type in _SIGNATURES:
+        if data.startswith(signature):
+            return media_type
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return "application/octet-stream"
+
+
+class CanvasBlobStore:
+    """Empreinte SHA-256 -> octets de l'image, dedupliques sur disque."""
+
+    def __init__(self, directory: Optional[Path] = None, max_bytes: Optional[int] = None) -> None:
+        self.directory = Path(directory or CANVAS_BLOB_DIR)
+        self.max_bytes = max_bytes or IMAGE_MAX_BYTES
+        self.writes = 0
+        self.dedup_hits = 0
+        self.bytes_written = 0
+
+    def path(self, digest: str) -> Path:
+        return self.directory / digest[:2] / digest
+
+    def put(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+        if path.exists():
+            self.dedup_hits += 1
+            return digest
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{digest}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)  # atomique : jamais de fichier partiel sous l'empreinte
+        self.writes += 1
+        self.bytes_written += len(data)
+        return digest
+
+    def put_base64(self, text: str) -> str:
+        """PNG en base64 (ou data URL), borne par IMAGE_MAX_BYTES. ImageUploadError (ValueError) si invalide."""
+        return self.put(decode_base64_image(text, self.max_bytes))
+
+    def get(self, digest: str) -> Optional[bytes]:
+        if not is_digest(digest):
+            return None
+        try:
+            return self.path(digest).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def stats(self) -> dict:
+        return {
+            "directory": str(self.directory),
+            "writes": self.writes,
+            "dedup_hits": self.dedup_hits,
+            "bytes_written": self.bytes_written,
+        }
@@ -0,0 +1,571 @@
+#!/usr/bin/env python3
+"""Canevas global tenu cote serveur (V5/V6).
+
+Le serveur O reconstruit lui-meme l'image globale au lieu de dependre du
+dernier PNG televerse par un client W :
+
+- etat = tableau numpy uint8[H, W, 3], un pixel par sous-cellule ; les grilles
+  20x20 sont disposees comme dans le viewer (cote impair 2*max|pos|+1,
+  origine au centre) ;
+- alimente par le WebSocket du jeu en mode observateur (initial_state,
+  cell_update, new_user, user_left, zoom_update) et/ou par les `pixels` des
+  donnees W ("x,y#HEX") ;
+- couleurs hexadecimales decodees en bloc (table de correspondance numpy) ;
+- rendu PNG a la demande (agrandissement plus proche voisin), mis en cache
+  par version du canevas ;
+- encodage incremental : le flux deflate du PNG est assemble a partir de
+  segments par rangee de grilles, caches par empreinte du contenu des grilles
+  de la rangee ; seules les rangees contenant une grille modifiee sont
+  recompressees. Les tuiles PNG par grille (sortie delta) sont cachees par
+  empreinte de grille.
+
+`CANVAS_SOURCE=server` fait utiliser ce canevas par l'analyse O a la place
+des images envoyees par les clients (`client`, defaut : comportement
+historique, le canevas reste alimente et consultable).
+"""
+from __future__ import annotations
+
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import struct
+import zlib
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+CANVAS_SOURCE = os.getenv("CANVAS_SOURCE", "client").strip().lower()
+GAME_WS_URL = os.getenv("GAME_WS_URL", "ws://localhost:3001/updates?mode=full&type=observer")
+CANVAS_PIXEL_SIZE = int(os.getenv("CANVAS_PIXEL_SIZE", "5"))  # 20x20 -> 100x100 par grille
+CANVAS_TILE_CACHE = int(os.getenv("CANVAS_TILE_CACHE", "1024"))  # segments de rangee + tuiles PNG
+CANVAS_PNG_LEVEL = int(os.getenv("CANVAS_PNG_LEVEL", "6"))
+
+GRID_PIXELS = 20
+
+# Table ASCII -> valeur hexadecimale (255 = caractere invalide)
+_HEX_LUT = np.full(256, 255, dtype=np.uint8)
+for _i, _c in enumerate(b"0123456789abcdef"):
+    _HEX_LUT[_c] = _i
+for _i, _c in enumerate(b"ABCDEF"):
+    _HEX_LUT[_c] = 10 + _i
+
+
+def _hex6(color) -> str:
+    """'#RRGGBB' / '#RGB' / 'RRGGBB' -> 6 chiffres ; sinon une valeur invalide."""
+    if isinstance(color, str):
+        c = color[1:] if color.startswith("#") else color
+        if len(c) == 6:
+            return c
+        if len(c) == 3:
+            return c[0] * 2 + c[1] * 2 + c[2] * 2
+    return "zzzzzz"
+
+
+def parse_hex_colors(colors: Iterable) -> Tuple[np.ndarray, np.ndarray]:
+    """Decode une liste de couleurs hex en bloc.
+
+    Retourne (rgb uint8[N, 3], valid bool[N]).
+    """
+    raw = "".join(_hex6(c) for c in colors).encode("ascii", "replace")
+    digits = _HEX_LUT[np.frombuffer(raw, dtype=np.uint8)].reshape(-1, 6)
+    valid = (digits != 255).all(axis=1)
+    rgb = (digits[:, 0::2] << 4) | digits[:, 1::2]
+    return rgb.astype(np.uint8), valid
+
+
+def parse_pixel_strings(pixels: Iterable) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Pixels W ("x,y#HEX" ou {x, y, color}) -> (xs, ys, rgb), entrees invalides ignorees."""
+    xs: List[int] = []
+    ys: List[int] = []
+    colors: List[str] = []
+    for p in pixels or ():
+        try:
+            if isinstance(p, str):
+                coords, sep, color = p.partition("#")
+                if not sep:
+                    continue
+                x, _, y = coords.partition(",")
+                xs.append(int(x))
+                ys.append(int(y))
+                colors.append(color)
+            elif isinstance(p, dict):
+                xs.append(int(p["x"]))
+                ys.append(int(p["y"]))
+                colors.append(p.get("color") or "")
+        except (KeyError, TypeError, ValueError):
+            del xs[len(colors):], ys[len(colors):]
+    rgb, valid = parse_hex_colors(colors)
+    xs_a = np.asarray(xs, dtype=np.int64)[valid]
+    ys_a = np.asarray(ys, dtype=np.int64)[valid]
+    return xs_a, ys_a, rgb[valid]
+
+
+def _parse_position(position) -> Optional[Tuple[int, int]]:
+    try:
+        return int(position[0]), int(position[1])
+    except (TypeError, ValueError, IndexError, KeyError):
+        return None
+
+
+def upscale(array: np.ndarray, factor: int) -> np.ndarray:
+    """Agrandissement plus proche voisin (chaque pixel -> bloc factor x factor)."""
+    if factor <= 1:
+        return array
+    return np.repeat(np.repeat(array, factor, axis=0), factor, axis=1)
+
+
+# ------------------------------------------------------------------ PNG par segments
+
+_ZLIB_HEADER = b"\x78\x01"
+_DEFLATE_END = b"\x03\x00"  # bloc final vide (Huffman fixe)
+_ADLER_BASE = 65521
+
+
+def adler32_combine(adler1: int, adler2: int, len2: int) -> int:
+    """Adler-32 de A+B a partir de adler(A), adler(B) et len(B) (cf. zlib)."""
+    rem = len2 % _ADLER_BASE
+    sum1 = adler1 & 0xFFFF
+    sum2 = (rem * sum1) % _ADLER_BASE
+    sum1 += (adler2 & 0xFFFF) + _ADLER_BASE - 1
+    sum2 += ((adler1 >> 16) & 0xFFFF) + ((adler2 >> 16) & 0xFFFF) + _ADLER_BASE - rem
+    if sum1 >= _ADLER_BASE:
+        sum1 -= _ADLER_BASE
+    if sum1 >= _ADLER_BASE:
+        sum1 -= _ADLER_BASE
+    if sum2 >= (_ADLER_BASE << 1):
+        sum2 -= (_ADLER_BASE << 1)
+    if sum2 >= _ADLER_BASE:
+        sum2 -= _ADLER_BASE
+    return sum1 | (sum2 << 16)
+
+
+def filtered_scanlines(strip: np.ndarray, factor: int) -> bytes:
+    """Lignes PNG filtrees d'une bande uint8[h, w, 3] agrandie factor fois.
+
+    Premiere ligne de chaque sous-cellule : filtre Sub (pixels repetes -> 0) ;
+    lignes repetees : filtre Up (tout a 0). Aucune ligne ne depend de la bande
+    precedente, donc chaque bande se compresse independamment.
+    """
+    factor = max(1, factor)
+    rows = np.repeat(strip, factor, axis=1).reshape(strip.shape[0], -1)
+    first = np.empty((rows.shape[0], rows.shape[1] + 1), dtype=np.uint8)
+    first[:, 0] = 1
+    first[:, 1:4] = rows[:, :3]
+    first[:, 4:] = rows[:, 3:] - rows[:, :-3]
+    out = np.zeros((rows.shape[0], factor, rows.shape[1] + 1), dtype=np.uint8)
+    out[:, 0] = first
+    out[:, 1:, 0] = 2
+    return out.tobytes()
+
+
+def deflate_segment(raw: bytes, level: int = CANVAS_PNG_LEVEL) -> Tuple[bytes, int, int]:
+    """Segment deflate brut aligne sur l'octet (concatenable) + (adler32, longueur)."""
+    c = zlib.compressobj(level, zlib.DEFLATED, -15)
+    return c.compress(raw) + c.flush(zlib.Z_FULL_FLUSH), zlib.adler32(raw), len(raw)
+
+
+def _png_chunk(tag: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+
+def assemble_png(width: int, height: int, segments: Iterable[Tuple[bytes, int, int]]) -> bytes:
+    """PNG RGB 8 bits dont le flux IDAT concatene des segments `deflate_segment`."""
+    adler = 1
+    parts = [_ZLIB_HEADER]
+    for data, seg_adler, seg_len in segments:
+        parts.append(data)
+        adler = adler32_combine(adler, seg_adler, seg_len)
+    parts.append(_DEFLATE_END)
+    parts.append(struct.pack(">I", adler))
+    return b"".join((
+        b"\x89PNG\r\n\x1a\n",
+        _png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)),
+        _png_chunk(b"IDAT", b"".join(parts)),
+        _png_chunk(b"IEND", b""),
+    ))
+
+
+def encode_png(array: np.ndarray, factor: int = 1) -> bytes:
+    """PNG de `array` agrandi factor fois (encodeur zlib, sans Pillow)."""
+    height, width = array.shape[:2]
+    segment = deflate_segment(filtered_scanlines(array, factor))
+    return assemble_png(width * factor, height * factor, [segment])
+
+
+class CanvasModel:
+    """Canevas global : une grille 20x20 par utilisateur + disposition par position."""
+
+    def __init__(self, pixel_size: Optional[int] = None) -> None:
+        self.pixel_size = max(1, pixel_size or CANVAS_PIXEL_SIZE)
+        self._cells: Dict[str, np.ndarray] = {}
+        self._positions: Dict[str, Tuple[int, int]] = {}
+        self._array: Optional[np.ndarray] = None
+        self._offset = 0
+        self._layout_dirty = True
+        self.version = 0
+        self._png_cache: Dict[int, Tuple[int, bytes]] = {}
+        self._hash_cache: Tuple[int, str] = (-1, "")
+        # Suivi des grilles modifiees (version de derniere modification, empreintes a recalculer)
+        self._cell_versions: Dict[str, int] = {}
+        self._cell_hashes: Dict[str, str] = {}
+        self._dirty: set = set()
+        self._layout_version = 0
+        self._band_cache: "OrderedDict[tuple, Tuple[bytes, int, int]]" = OrderedDict()
+        self._tile_cache: "OrderedDict[tuple, bytes]" = OrderedDict()
+        self.cache_size = max(1, CANVAS_TILE_CACHE)
+        self.cell_updates = 0
+        self.renders = 0
+        self.render_hits = 0
+        self.band_encodes = 0
+        self.band_hits = 0
+        self.tile_encodes = 0
+
+    # ------------------------------------------------------------------ disposition
+
+    @property
+    def side(self) -> int:
+        """Cote du canevas en grilles (impair, centre sur la position 0,0)."""
+        if not self._positions:
+            return 1
+        max_abs = max(max(abs(x), abs(y)) for x, y in self._positions.values())
+        return 2 * max_abs + 1
+
+    def _cell(self, user_id: str) -> np.ndarray:
+        cell = self._cells.get(user_id)
+        if cell is None:
+            cell = np.zeros((GRID_PIXELS, GRID_PIXELS, 3), dtype=np.uint8)
+            self._cells[user_id] = cell
+        return cell
+
+    def _touch(self) -> None:
+        self.version += 1
+
+    def _mark_layout(self) -> None:
+        self._layout_dirty = True
+        self._layout_version = self.version + 1
+
+    def _mark_cell(self, user_id: str) -> None:
+        self._dirty.add(user_id)
+        self._cell_versions[user_id] = self.version + 1
+
+    def set_position(self, user_id: str, position) -> bool:
+        pos = _parse_position(position)
+        if pos is None or self._positions.get(user_id) == pos:
+            return False
+        self._positions[user_id] = pos
+        self._cell(user_id)
+        self._mark_cell(user_id)
+        self._mark_layout()
+        self._touch()
+        return True
+
+    def remove_user(self, user_id: str) -> bool:
+        known = user_id in self._positions or user_id in self._cells
+        self._positions.pop(user_id, None)
+        self._cells.pop(user_id, None)
+        self._cell_versions.pop(user_id, None)
+        self._cell_hashes.pop(user_id, None)
+        self._dirty.discard(user_id)
+        if known:
+            self._mark_layout()
+            self._touch()
+        return known
+
+    def load_state(self, user_positions: dict, sub_cell_states: dict) -> None:
+        """Remplace tout l'etat (initial_state / zoom_update du jeu)."""
+        self._cells.clear()
+        self._positions.clear()
+        self._cell_versions.clear()
+        self._cell_hashes.clear()
+        self._dirty.clear()
+        for user_id, position in (user_positions or {}).items():
+            pos = _parse_position(position)
+            if pos is not None:
+                self._positions[user_id] = pos
+                self._cell(user_id)
+        for user_id, pixels in (sub_cell_states or {}).items():
+            if not isinstance(pixels, dict):
+                continue
+            self._write(user_id, [f"{k}#{_hex6(v)}" for k, v in pixels.items()])
+        for user_id in self._cells:
+            self._mark_cell(user_id)
+        self._mark_layout()
+        self._touch()
+
+    # ------------------------------------------------------------------ ecriture
+
+    def _write(self, user_id: str, pixels) -> int:
+        xs, ys, rgb = parse_pixel_strings(pixels)
+        inside = (xs >= 0) & (xs < GRID_PIXELS) & (ys >= 0) & (ys < GRID_PIXELS)
+        xs, ys, rgb = xs[inside], ys[inside], rgb[inside]
+        if not len(xs):
+            return 0
+        self._cell(user_id)[ys, xs] = rgb
+        self._mark_cell(user_id)
+        if not self._layout_dirty and self._array is not None and user_id in self._positions:
+            gx, gy = self._positions[user_id]
+            ox = (gx + self._offset) * GRID_PIXELS
+            oy = (gy + self._offset) * GRID_PIXELS
+            self._array[oy + ys, ox + xs] = rgb
+        self.cell_updates += len(xs)
+        return len(xs)
+
+    def apply_cell_update(self, user_id: str, x: int, y: int, color: str) -> bool:
+        if self._write(user_id, [f"{x},{y}#{_hex6(color)}"]):
+            self._touch()
+            return True
+        return False
+
+    def apply_w_pixels(self, user_id: str, position, pixels) -> int:
+        """Applique les pixels d'une iteration W ("x,y#HEX") a la grille de l'agent."""
+        if position is not None:
+            self.set_position(user_id, position)
+        written = self._write(user_id, pixels)
+        if written:
+            self._touch()
+        return written
+
+    def apply_game_message(self, message: dict) -> bool:
+        """Applique un message du WebSocket du jeu. Retourne True si le canevas a change."""
+        kind = message.get("type")
+        if kind == "cell_update":
+            user_id = message.get("user_id")
+            if not user_id:
+                return False
+            return self.apply_cell_update(
+                user_id, message.get("sub_x", -1), message.get("sub_y", -1), message.get("color"))
+        if kind in ("initial_state", "zoom_update"):
+            grid_state = message.get("grid_state") or {}
+            if isinstance(grid_state, str):
+                try:
+                    grid_state = json.loads(grid_state)
+                except ValueError:
+                    grid_state = {}
+            positions = grid_state.get("user_positions") or message.get("user_positions") or {}
+            self.load_state(positions, message.get("sub_cell_states") or {})
+            return True
+        if kind == "new_user":
+            return self.set_position(message.get("user_id"), message.get("position"))
+        if kind == "user_left":
+            return self.remove_user(message.get("user_id"))
+        return False
+
+    # ------------------------------------------------------------------ lecture
+
+    @property
+    def array(self) -> np.ndarray:
+        """Canevas uint8[H, W, 3] (1 pixel par sous-cellule), recompose si la disposition a change."""
+        if self._layout_dirty or self._array is None:
+            side = self.side
+            self._offset = side // 2
+            size = side * GRID_PIXELS
+            array = np.zeros((size, size, 3), dtype=np.uint8)
+            for user_id, (gx, gy) in self._positions.items():
+                cell = self._cells.get(user_id)
+                if cell is None:
+                    continue
+                ox = (gx + self._offset) * GRID_PIXELS
+                oy = (gy + self._offset) * GRID_PIXELS
+                array[oy:oy + GRID_PIXELS, ox:ox + GRID_PIXELS] = cell
+            self._array = array
+            self._layout_dirty = False
+        return self._array
+
+    @property
+    def users_count(self) -> int:
+        return len(self._positions)
+
+    def has_content(self) -> bool:
+        return bool(self._positions)
+
+    def content_hash(self) -> str:
+        version, digest = self._hash_cache
+        if version != self.version:
+            array = self.array
+            h = hashlib.sha256(f"{array.shape[1]}x{array.shape[0]}|".encode())
+            h.update(array.tobytes())
+            digest = "cv:" + h.hexdigest()
+            self._hash_cache = (self.version, digest)
+        return digest
+
+    def cell_hash(self, user_id: str) -> str:
+        """Empreinte du contenu d'une grille (recalculee seulement si modifiee)."""
+        if user_id in self._dirty or user_id not in self._cell_hashes:
+            cell = self._cells.get(user_id)
+            digest = hashlib.blake2b(cell.tobytes(), digest_size=16).hexdigest() if cell is not None else "-"
+            self._cell_hashes[user_id] = digest
+            self._dirty.discard(user_id)
+        return self._cell_hashes[user_id]
+
+    def _cache_put(self, cache: OrderedDict, key, value) -> None:
+        cache[key] = value
+        while len(cache) > self.cache_size:
+            cache.popitem(last=False)
+
+    def _band_segments(self, factor: int) -> List[Tuple[bytes, int, int]]:
+        """Un segment deflate par rangee de grilles ; seules les rangees modifiees sont recompressees."""
+        array = self.array
+        side = array.shape[0] // GRID_PIXELS
+        index: Dict[Tuple[int, int], str] = {}
+        for user_id, (gx, gy) in self._positions.items():
+            if user_id in self._cells:
+                index[(gx + self._offset, gy + self._offset)] = user_id
+        segments = []
+        for row in range(side):
+            key = (factor, side) + tuple(
+                self.cell_hash(index[(col, row)]) if (col, row) in index else ""
+                for col in range(side))
+            segment = self._band_cache.get(key)
+            if segment is None:
+                strip = array[row * GRID_PIXELS:(row + 1) * GRID_PIXELS]
+                segment = deflate_segment(filtered_scanlines(strip, factor))
+                self._cache_put(self._band_cache, key, segment)
+                self.band_encodes += 1
+            else:
+                self._band_cache.move_to_end(key)
+                self.band_hits += 1
+            segments.append(segment)
+        return segments
+
+    def render_png(self, pixel_size: Optional[int] = None) -> bytes:
+        """PNG du canevas agrandi (pixel_size px par sous-cellule), cache par version.
+
+        Le flux compresse est recompose a partir des segments de rangee caches.
+        """
+        factor = max(1, pixel_size or self.pixel_size)
+        cached = self._png_cache.get(factor)
+        if cached is not None and cached[0] == self.version:
+            self.render_hits += 1
+            return cached[1]
+        size = self.array.shape[0] * factor
+        png = assemble_png(size, size, self._band_segments(factor))
+        self._png_cache[factor] = (self.version, png)
+        self.renders += 1
+        return png
+
+    def tile_png(self, user_id: str, pixel_size: Optional[int] = None) -> Optional[bytes]:
+        """PNG d'une grille agrandie, cache par empreinte de contenu."""
+        cell = self._cells.get(user_id)
+        if cell is None:
+            return None
+        factor = max(1, pixel_size or self.pixel_size)
+        key = (self.cell_hash(user_id), factor)
+        png = self._tile_cache.get(key)
+        if png is None:
+            png = encode_png(cell, factor)
+            self._cache_put(self._tile_cache, key, png)
+            self.tile_encodes += 1
+        else:
+            self._tile_cache.move_to_end(key)
+        return png
+
+    def render_delta(self, since_version: int, pixel_size: Optional[int] = None) -> dict:
+        """Tuiles modifiees depuis `since_version`.
+
+        `full=True` (sans tuiles) si la disposition a change depuis : il faut
+        alors recharger l'image complete.
+        """
+        factor = max(1, pixel_size or self.pixel_size)
+        array = self.array
+        tile_px = GRID_PIXELS * factor
+        result = {
+            "version": self.version,
+            "since": since_version,
+            "full": since_version < self._layout_version,
+            "side": array.shape[0] // GRID_PIXELS,
+            "pixel_size": factor,
+            "width": array.shape[1] * factor,
+            "height": array.shape[0] * factor,
+            "tiles": [],
+        }
+        if result["full"] or since_version >= self.version:
+            return result
+        for user_id, changed_at in self._cell_versions.items():
+            pos = self._positions.get(user_id)
+            if changed_at <= since_version or pos is None:
+                continue
+            png = self.tile_png(user_id, factor)
+            result["tiles"].append({
+                "user_id": user_id,
+                "position": [pos[0], pos[1]],
+                "x": (pos[0] + self._offset) * tile_px,
+                "y": (pos[1] + self._offset) * tile_px,
+                "size": tile_px,
+                "png_base64": base64.b64encode(png).decode("ascii"),
+            })
+        return result
+
+    def to_base64(self, pixel_size: Optional[int] = None) -> str:
+        return base64.b64encode(self.render_png(pixel_size)).decode("ascii")
+
+    def stats(self) -> dict:
+        array = self._array
+        return {
+            "source": CANVAS_SOURCE,
+            "version": self.version,
+            "users": len(self._positions),
+            "side": self.side,
+            "size_px": (array.shape[1] * self.pixel_size) if array is not None else None,
+            "cell_updates": self.cell_updates,
+            "renders": self.renders,
+            "render_hits": self.render_hits,
+            "band_encodes": self.band_encodes,
+            "band_hits": self.band_hits,
+            "tile_encodes": self.tile_encodes,
+            "dirty_cells": len(self._dirty),
+        }
+
+
+class GameCanvasFeed:
+    """Observateur du WebSocket du jeu qui alimente un CanvasModel (reconnexion automatique)."""
+
+    def __init__(self, canvas: CanvasModel, url: Optional[str] = None,
+                 on_change: Optional[Callable[[], None]] = None) -> None:
+        self.canvas = canvas
+        self.url = GAME_WS_URL if url is None else url
+        self.on_change = on_change
+        self.connected = False
+        self.reconnect_delay = 5
+        self.messages = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def connect(self):
+        import websockets
+        from websockets.exceptions import ConnectionClosed, WebSocketException
+
+        while True:
+            try:
+                print(f"[Canvas] Connexion observateur au jeu {self.url}...")
+                async with websockets.connect(self.url, max_size=None) as ws:
+                    self.connected = True
+                    print("[Canvas] ✅ Connecté au WebSocket du jeu")
+                    async for raw in ws:
+                        try:
+                            message = json.loads(raw)
+                        except ValueError:
+                            continue
+                        self.messages += 1
+                        if isinstance(message, dict) and self.canvas.apply_game_message(message):
+                            if self.on_change:
+                                self.on_change()
+                print("[Canvas] Connexion fermée par le jeu")
+            except (ConnectionClosed, ConnectionRefusedError, OSError, WebSocketException) as e:
+                print(f"[Canvas] ⚠️ Erreur connexion jeu: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[Canvas] Erreur inattendue: {e}")
+            self.connected = False
+            await asyncio.sleep(self.reconnect_delay)
+
+    def start_background_connection(self):
+        if not self.url:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.connect())
+
+    def stats(self) -> dict:
+        return {"url": self.url, "connected": self.connected, "messages": self.messages}
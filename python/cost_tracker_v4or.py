@@ -8,7 +8,9 @@ reel est alors disponible dans `usage.cost`).
 
 Sert a la fois :
 - au panneau cout du front (GET /api/usage),
-- au kill-switch budget (MAX_SESSION_USD).
+- au kill-switch budget (MAX_SESSION_USD),
+- au suivi des economies de l'image O (octets et tokens image estimes, cf.
+  vision_payload).
 """
 from __future__ import annotations
 
@@ -38,6 +40,8 @@ class CostTracker:
         self._lock = Lock()
         # { session_id: { agent_id: { model: {calls, prompt_tokens, completion_tokens, cost_usd} } } }
         self._data: dict[str, dict[str, dict[str, dict]]] = {}
+        # { session_id: { agent_id: {calls, optimized, bytes_before, bytes_after, ...} } }
+        self._vision: dict[str, dict[str, dict]] = {}
         self._started_at = datetime.now(timezone.utc)
 
     @staticmethod
@@ -83,6 +87,41 @@ class CostTracker:
             cell["cost_usd"] = round(cell["cost_usd"] + cost_usd, 6)
             return dict(cell)
 
+    @staticmethod
+    def _empty_vision() -> dict:
+        return {
+            "calls": 0,
+            "optimized": 0,
+            "bytes_before": 0,
+            "bytes_after": 0,
+            "bytes_saved": 0,
+            "image_tokens_before": 0,
+            "image_tokens_after": 0,
+            "image_tokens_saved": 0,
+        }
+
+    def record_vision(
+        self,
+        session_id: Optional[str],
+        agent_id: Optional[str],
+        report: Optional[dict],
+    ) -> dict:
+        """Enregistre le rapport d'optimisation de l'image d'un appel. Retourne les cumuls."""
+        session_id = session_id or "default"
+        agent_id = agent_id or "unknown"
+        report = report or {}
+        with self._lock:
+            cell = self._vision.setdefault(session_id, {}).setdefault(agent_id, self._empty_vision())
+            cell["calls"] += 1
+            cell["optimized"] += 1 if report.get("applied") else 0
+            cell["bytes_before"] += _safe_int(report.get("bytes_before"))
+            cell["bytes_after"] += _safe_int(report.get("bytes_after"))
+            cell["bytes_saved"] += _safe_int(report.get("bytes_saved"))
+            cell["image_tokens_before"] += _safe_int(report.get("tokens_before"))
+            cell["image_tokens_after"] += _safe_int(report.get("tokens_after"))
+            cell["image_tokens_saved"] += _safe_int(report.get("tokens_saved"))
+            return dict(cell)
+
     def session_cost(self, session_id: Optional[str]) -> float:
         session_id = session_id or "default"
         with self._lock:
@@ -148,6 +187,9 @@ class CostTracker:
                     "by_model": by_model,
                     "total": session_total,
                 }
+                vision = self._vision.get(sid or "default")
+                if vision:
+                    out_sessions[sid]["vision"] = {aid: dict(c) for aid, c in vision.items()}
                 for k in grand_total:
                     grand_total[k] += session_total[k]
 
@@ -162,8 +204,10 @@ class CostTracker:
         with self._lock:
             if session_id is None:
                 self._data.clear()
+                self._vision.clear()
             else:
                 self._data.pop(session_id, None)
+                self._vision.pop(session_id, None)
 
 
 # Instance globale partagee par le serveur V4or
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""Reception des images de canevas (/o/image V5, /q/image V6).
+
+Trois formats acceptes, cout borne par IMAGE_MAX_BYTES :
+
+- JSON `{"image_base64": "...", "agents_count": N}` (historique) : decodage
+  valide en C par `binascii.a2b_base64(strict_mode=True)` au lieu d'un
+  parcours Python caractere par caractere ;
+- corps binaire brut (`Content-Type: image/png`) : `agents_count` en
+  parametre de requete ou en en-tete `X-Agents-Count` ;
+- multipart/form-data : champ fichier `image` (ou `file`) + champ
+  `agents_count` (necessite python-multipart).
+"""
+from __future__ import annotations
+
+import base64
+import binascii
+import os
+from typing import Optional
+
+from fastapi import Request
+
+IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", str(16 * 1024 * 1024)))
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+_RAW_TYPES = ("image/png", "application/octet-stream")
+
+
+class ImageUploadError(ValueError):
+    """Upload refuse : `code` est renvoye au client avec `status`."""
+
+    def __init__(self, code: str, status: int = 400) -> None:
+        super().__init__(code)
+        self.code = code
+        self.status = status
+
+
+class ImageUpload:
+    """Image recue : octets PNG + base64 (celui du client si fourni, sinon encode a la demande)."""
+
+    __slots__ = ("raw", "agents_count", "source", "_b64")
+
+    def __init__(self, raw: bytes, agents_count: Optional[int], source: str, b64: Optional[str] = None) -> None:
+        self.raw = raw
+        self.agents_count = agents_count
+        self.source = source
+        self._b64 = b64
+
+    @property
+    def base64(self) -> str:
+        if self._b64 is None:
+            self._b64 = base64.b64encode(self.raw).decode("ascii")
+        return self._b64
+
+
+def _int_or_none(value) -> Optional[int]:
+    if value is None or value == "":
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _check_png(raw: bytes, max_bytes: int) -> bytes:
+    if len(raw) > max_bytes:
+        raise ImageUploadError("too_large", 413)
+    if not raw.startswith(PNG_SIGNATURE):
+        raise ImageUploadError("not_png", 415)
+    return raw
+
+
+def decode_base64_image(text: str, max_bytes: int = IMAGE_MAX_BYTES) -> bytes:
+    """Base64 (avec ou sans prefixe data:) -> octets PNG, validation stricte."""
+    if not isinstance(text, str) or not text:
+        raise ImageUploadError("invalid_base64")
+    if text.startswith("data:"):
+        text = text.split(",", 1)[-1]
+    if len(text) > (max_bytes // 3 + 1) * 4:
+        raise ImageUploadError("too_large", 413)
+    try:
+        raw = binascii.a2b_base64(text, strict_mode=True)
+    except (binascii.Error, ValueError):
+        raise ImageUploadError("invalid_base64")
+    return _check_png(raw, max_bytes)
+
+
+async def read_image_upload(request: Request, max_bytes: int = IMAGE_MAX_BYTES) -> ImageUpload:
+    """Lit une image selon le Content-Type de la requete. Leve ImageUploadError."""
+    content_type = request.headers.get("content-type", "").split(";", 1)[0].strip().lower()
+    declared = _int_or_none(request.headers.get("content-length"))
+    # Marge pour l'encapsulation base64 / multipart
+    if declared is not None and declared > max_bytes * 4 // 3 + 64 * 1024:
+        raise ImageUploadError("too_large", 413)
+    header_count = _int_or_none(request.query_params.get("agents_count") or request.headers.get("x-agents-count"))
+
+    if content_type in _RAW_TYPES:
+        raw = await request.body()
+        return ImageUpload(_check_png(raw, max_bytes), header_count, "raw")
+
+    if content_type == "multipart/form-data":
+        try:
+            form = await request.form()
+        except AssertionError:
+            raise ImageUploadError("multipart_unavailable", 415)
+        field = form.get("image") or form.get("file")
+        count = _int_or_none(form.get("agents_count"))
+        if count is None:
+            count = header_count
+        if isinstance(field, str):
+            return ImageUpload(decode_base64_image(field, max_bytes), count, "multipart", field.split(",", 1)[-1])
+        if field is None:
+            raise ImageUploadError("missing_image")
+        raw = await field.read(max_bytes + 1)
+        return ImageUpload(_check_png(raw, max_bytes), count, "multipart")
+
+    try:
+        payload = await request.json()
+    except ValueError:
+        raise ImageUploadError("invalid_json")
+    if not isinstance(payload, dict):
+        raise ImageUploadError("invalid_json")
+    text = payload.get("image_base64") or ""
+    raw = decode_base64_image(text, max_bytes)
+    count = _int_or_none(payload.get("agents_count"))
+    return ImageUpload(raw, count if count is not None else header_count, "json", text.split(",", 1)[-1])
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""Detection de langue (fr/en) des enonces, precompilee et memoisee (utterance_store).
+
+- Un seul motif compile, un seul parcours des 400 premiers caracteres : les
+  mots-indices francais et anglais sont deux groupes d'une meme alternative
+  (memes listes et meme regle qu'avant : "fr" si fr >= en).
+- Cache LRU de LANG_CACHE_SIZE entrees, cle = empreinte blake2b de
+  l'echantillon : les textes repetes (strategies, recits recopies d'une
+  iteration a l'autre) ne sont analyses qu'une fois.
+- `detect_many` : lot de textes (back-fill des sidecars existants).
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Iterable, List, Optional
+
+LANG_CACHE_SIZE = int(os.getenv("LANG_CACHE_SIZE", "4096"))
+SAMPLE_CHARS = 400
+
+_FR_WORDS = ("le", "la", "les", "des", "une", "dans", "pour", "avec", "est")
+_EN_WORDS = ("the", "and", "with", "for", "agent", "is", "are")
+_HINTS = re.compile(r"\b(?:(%s)|(%s))\b" % ("|".join(_FR_WORDS), "|".join(_EN_WORDS)))
+
+
+def _classify(sample: str) -> str:
+    fr = en = 0
+    for match in _HINTS.finditer(sample):
+        if match.lastindex == 1:
+            fr += 1
+        else:
+            en += 1
+    return "fr" if fr >= en else "en"
+
+
+class LanguageDetector:
+    """`detect(text)` -> "fr" | "en", memoise par empreinte de l'echantillon."""
+
+    def __init__(self, cache_size: Optional[int] = None) -> None:
+        self.cache_size = max(1, cache_size or LANG_CACHE_SIZE)
+        self._cache: "OrderedDict[bytes, str]" = OrderedDict()
+        self._lock = threading.Lock()  # appele depuis la boucle et des threads (serveur IA V5)
+        self.hits = 0
+        self.misses = 0
+
+    def detect(self, text: str) -> str:
+        sample = (text or "")[:SAMPLE_CHARS].lower()
+        key = hashlib.blake2b(sample.encode("utf-8"), digest_size=8).digest()
+        with self._lock:
+            lang = self._cache.get(key)
+            if lang is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return lang
+        lang = _classify(sample)
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = lang
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return lang
+
+    def detect_many(self, texts: Iterable[str]) -> List[str]:
+        return [self.detect(text) for text in texts]
+
+    def stats(self) -> dict:
+        return {"cached": len(self._cache), "hits": self.hits, "misses": self.misses}
+
+
+detector = LanguageDetector()
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""Ordonnanceur asyncio des appels LLM (OpenRouter) avec voies de priorite.
+
+Toutes les requetes sortantes (machines O/N, seeds W, actions W) passent par
+un nombre borne d'appels simultanes. Quand un emplacement se libere, il est
+attribue par ordre de priorite des voies :
+
+    on (O/N)  >  w_seed  >  w_action
+
+A l'interieur d'une voie, les agents sont servis a tour de role (round-robin)
+pour qu'un agent tres bavard ne monopolise pas la voie.
+
+Reponse 429 : pause globale (Retry-After si fourni, sinon backoff exponentiel)
+et division par deux de la limite effective ; chaque serie de succes la fait
+remonter d'une unite (AIMD) jusqu'a `max_in_flight`.
+
+Les statistiques (profondeur des files, attente, backoff) sont exposees sur
+/api/usage par les serveurs V4or/V5/V6.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Optional
+
+LANE_ON = "on"
+LANE_W_SEED = "w_seed"
+LANE_W_ACTION = "w_action"
+LANES = (LANE_ON, LANE_W_SEED, LANE_W_ACTION)  # ordre de priorite decroissante
+
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "16"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "600"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "2.0"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "60.0"))
+
+
+def lane_from_request(body: dict) -> str:
+    """Voie d'une requete W proxifiee (champ `lane` ou `is_seed` envoye par le client)."""
+    lane = (body or {}).get("lane")
+    if lane in (LANE_W_SEED, LANE_W_ACTION):
+        return lane
+    if (body or {}).get("is_seed"):
+        return LANE_W_SEED
+    return LANE_W_ACTION
+
+
+def agent_from_request(body: dict, headers=None, client_host: Optional[str] = None) -> str:
+    """Cle de round-robin d'une requete W : `agent_id` du corps (adaptateurs V5/V6),
+    sinon en-tete X-Agent-Id, sinon hote du client (jamais le port : les agents d'un
+    navigateur partagent leurs connexions keep-alive, un agent en utilise plusieurs)."""
+    agent_id = (body or {}).get("agent_id") or (headers or {}).get("x-agent-id")
+    return str(agent_id or client_host or "W-agent")
+
+
+def _parse_retry_after(value) -> Optional[float]:
+    try:
+        delay = float(value)
+    except (TypeError, ValueError):
+        return None
+    return delay if delay >= 0 else None
+
+
+class _LaneStats:
+    __slots__ = ("count", "total_wait", "max_wait", "last_wait")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.last_wait = 0.0
+
+    def add(self, wait: float) -> None:
+        self.count += 1
+        self.total_wait += wait
+        self.last_wait = wait
+        if wait > self.max_wait:
+            self.max_wait = wait
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "avg_wait_s": round(self.total_wait / self.count, 3) if self.count else 0.0,
+            "max_wait_s": round(self.max_wait, 3),
+            "last_wait_s": round(self.last_wait, 3),
+        }
+
+
+class LLMScheduler:
+    """Limite de concurrence + files de priorite + backoff adaptatif sur 429."""
+
+    def __init__(
+        self,
+        max_in_flight: Optional[int] = None,
+        *,
+        queue_timeout: Optional[float] = None,
+        backoff_base: Optional[float] = None,
+        backoff_max: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_in_flight = max(1, max_in_flight or LLM_MAX_IN_FLIGHT)
+        self.queue_timeout = LLM_QUEUE_TIMEOUT if queue_timeout is None else queue_timeout
+        self.backoff_base = LLM_BACKOFF_BASE if backoff_base is None else backoff_base
+        self.backoff_max = LLM_BACKOFF_MAX if backoff_max is None else backoff_max
+        self._clock = clock
+
+        self.limit = self.max_in_flight  # limite effective (AIMD)
+        self.in_flight = 0
+        # {lane: OrderedDict{agent_id: deque[Future]}}
+        self._queues: dict[str, OrderedDict] = {lane: OrderedDict() for lane in LANES}
+        self._paused_until = 0.0
+        self._backoff = 0.0
+        self._successes = 0
+        self._wake_handle: Optional[asyncio.TimerHandle] = None
+
+        self.rate_limited_count = 0
+        self.timeouts_count = 0
+        self._wait_stats = {lane: _LaneStats() for lane in LANES}
+
+    # ------------------------------------------------------------------ files
+
+    def queue_depth(self, lane: Optional[str] = None) -> int:
+        lanes = (lane,) if lane else LANES
+        return sum(len(dq) for ln in lanes for dq in self._queues[ln].values())
+
+    def _enqueue(self, lane: str, agent_id: str, fut: asyncio.Future) -> None:
+        self._queues[lane].setdefault(agent_id, deque()).append(fut)
+
+    def _discard(self, lane: str, agent_id: str, fut: asyncio.Future) -> None:
+        dq = self._queues[lane].get(agent_id)
+        if dq is None:
+            return
+        try:
+            dq.remove(fut)
+        except ValueError:
+            pass
+        if not dq:
+            del self._queues[lane][agent_id]
+
+    def _pop_next(self) -> Optional[asyncio.Future]:
+        for lane in LANES:
+            agents = self._queues[lane]
+            while agents:
+                agent_id, dq = next(iter(agents.items()))
+                fut = dq.popleft()
+                if dq:
+                    agents.move_to_end(agent_id)  # round-robin entre agents
+                else:
+                    del agents[agent_id]
+                if not fut.done():
+                    return fut
+        return None
+
+    def _dispatch(self) -> None:
+        now = self._clock()
+        if now < self._paused_until:
+            self._schedule_wake(self._paused_until - now)
+            return
+        while self.in_flight < self.limit:
+            fut = self._pop_next()
+            if fut is None:
+                return
+            self.in_flight += 1
+            fut.set_result(None)
+
+    def _schedule_wake(self, delay: float) -> None:
+        if self._wake_handle is not None and not self._wake_handle.cancelled():
+            return
+        loop = asyncio.get_running_loop()
+
+        def _wake():
+            self._wake_handle = None
+            self._dispatch()
+
+        self._wake_handle = loop.call_later(max(0.0, delay), _wake)
+
+    def _release(self) -> None:
+        self.in_flight = max(0, self.in_flight - 1)
+        self._dispatch()
+
+    # ------------------------------------------------------------------ API
+
+    async def acquire(self, lane: str, agent_id: Optional[str] = None) -> float:
+        """Attend un emplacement. Retourne le temps d'attente (s).
+
+        Leve asyncio.TimeoutError si l'attente depasse `queue_timeout`.
+        """
+        if lane not in self._queues:
+            lane = LANE_W_ACTION
+        agent_id = agent_id or "anonymous"
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        start = self._clock()
+        self._enqueue(lane, agent_id, fut)
+        self._dispatch()
+        try:
+            if self.queue_timeout and self.queue_timeout > 0:
+                await asyncio.wait_for(fut, timeout=self.queue_timeout)
+            else:
+                await fut
+        except (asyncio.CancelledError, asyncio.TimeoutError) as e:
+            if fut.done() and not fut.cancelled():
+                # Emplacement attribue au moment de l'annulation : le rendre
+                self._release()
+            else:
+                self._discard(lane, agent_id, fut)
+            if isinstance(e, asyncio.TimeoutError):
+                self.timeouts_count += 1
+            raise
+        wait = self._clock() - start
+        self._wait_stats[lane].add(wait)
+        return wait
+
+    def release(self, status_code: Optional[int] = None, retry_after=None) -> None:
+        """Libere un emplacement et ajuste le backoff selon le statut HTTP."""
+        if status_code is not None:
+            self.report_status(status_code, retry_after)
+        self._release()
+
+    def report_status(self, status_code: int, retry_after=None) -> None:
+        if status_code == 429:
+            self.rate_limited_count += 1
+            self._successes = 0
+            self._backoff = min(self.backoff_max, max(self.backoff_base, self._backoff * 2))
+            delay = _parse_retry_after(retry_after)
+            if delay is None:
+                delay = self._backoff
+            self._paused_until = max(self._paused_until, self._clock() + delay)
+            self.limit = max(1, self.limit // 2)
+            print(f"[Scheduler] 429 upstream : pause {delay:.1f}s, limite effective {self.limit}/{self.max_in_flight}")
+        elif status_code < 400:
+            self._backoff = 0.0
+            if self.limit < self.max_in_flight:
+                self._successes += 1
+                if self._successes >= self.limit:
+                    self._successes = 0
+                    self.limit += 1
+
+    @asynccontextmanager
+    async def slot(self, lane: str, agent_id: Optional[str] = None):
+        """Contexte `async with scheduler.slot(lane, agent):` (statut non rapporte)."""
+        await self.acquire(lane, agent_id)
+        try:
+            yield self
+        finally:
+            self._release()
+
+    async def run(self, lane: str, agent_id: Optional[str], call: Callable[[], Awaitable]):
+        """Execute `call()` (retourne un httpx.Response) dans un emplacement.
+
+        Le statut de la reponse (429, Retry-After) alimente le backoff adaptatif.
+        """
+        await self.acquire(lane, agent_id)
+        status_code = None
+        retry_after = None
+        try:
+            resp = await call()
+            status_code = getattr(resp, "status_code", None)
+            headers = getattr(resp, "headers", None)
+            if headers is not None:
+                retry_after = headers.get("retry-after")
+            return resp
+        finally:
+            self.release(status_code, retry_after)
+
+    def stats(self) -> dict:
+        now = self._clock()
+        return {
+            "max_in_flight": self.max_in_flight,
+            "effective_limit": self.limit,
+            "in_flight": self.in_flight,
+            "queue_depth": {lane: self.queue_depth(lane) for lane in LANES},
+            "queue_depth_total": self.queue_depth(),
+            "wait": {lane: self._wait_stats[lane].as_dict() for lane in LANES},
+            "backoff_s": round(self._backoff, 3),
+            "paused_for_s": round(max(0.0, self._paused_until - now), 3),
+            "rate_limited_count": self.rate_limited_count,
+            "queue_timeouts_count": self.timeouts_count,
+        }
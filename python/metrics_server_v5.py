@@ -7,16 +7,27 @@ Agrège les évaluations O (C_d), N (C_w, erreurs prédiction), W (actions)
 V5.1: Ajout SessionRecorder pour collecte complète et export de sessions
 """
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+import asyncio
 import json
 from typing import Dict, List, Optional, Any
 from datetime import datetime
 import uuid
-import copy
 
 import utterance_store
+from agent_ranking import AgentRanking
+from broadcast_hub import BroadcastHub
+from canvas_blobs import CanvasBlobStore, is_digest, sniff_media_type
+from metrics_sessions import (DEFAULT_SESSION, METRICS_SHARD_INDEX, SessionRegistry, owner_url,
+                              valid_session_id)
+from ring_buffer import ColumnRing
+from session_export import gzip_chunks, iter_session_export
+from session_log import SessionEventLog
+from snapshot_feed import etag_matches
+from state_delta import PROTOCOL_DELTA, STATE_HISTORY_WINDOW, StateDeltaLog
+from stream_stats import KeyedStats, StreamingStats, is_number
 
 app = FastAPI(title="Poietic Metrics Server V5", version="5.1.0")
 
@@ -25,6 +36,11 @@ app = FastAPI(title="Poietic Metrics Server V5", version="5.1.0")
 # SESSION RECORDER - Collecte complète des données de session
 # ==============================================================================
 
+def canvas_url(canvas_hash: str) -> str:
+    """Chemin de l'image d'un snapshot sur ce serveur"""
+    return f"/api/session/canvas/{canvas_hash}"
+
+
 class SessionRecorder:
     """
     Enregistre tous les événements d'une session pour export et replay.
@@ -38,12 +54,26 @@ class SessionRecorder:
     - strategy, strategy_id, source_agents, rationale
     - pixels générés
     - ranking des agents
+    
+    Les événements vont dans un journal segmenté sur disque (session_log) :
+    seule une fenêtre récente reste en mémoire. Les images de canvas sont
+    stockées une fois par contenu (canvas_blobs), les événements n'en gardent
+    que l'empreinte.
+    
+    Les enregistrements (données d'agent, métriques globales, classements,
+    snapshots O/N) ne sont jamais modifiés après création : ils sont remplacés,
+    pas mis à jour. Ils sont donc partagés par référence entre last_agent_data,
+    le journal et les diffusions, sans copie profonde. Pour dériver un
+    enregistrement, faire une copie superficielle ({**data, "rank": r}).
     """
     
-    def __init__(self):
-        self.session_id = datetime.now().isoformat()
+    def __init__(self, blobs: Optional[CanvasBlobStore] = None, scope: Optional[str] = None):
+        self.scope = scope  # Id de la session de métriques (canevas), None = session par défaut
+        self.session_id = self._new_session_id()
         self.start_time = datetime.now()
-        self.events: List[dict] = []
+        self.blobs = blobs or CanvasBlobStore()
+        self.log = SessionEventLog(self.session_id)
+        self.global_metrics: List[dict] = []  # Une entrée par itération (export globalMetrics)
         self.agents_registry: Dict[str, dict] = {}  # {agent_id: {type, position, ...}}
         self.current_iteration = 0
         self.canvas_snapshots: List[dict] = []  # Snapshots canvas périodiques
@@ -91,7 +121,7 @@ class SessionRecorder:
         Args:
             version: Numéro d'itération global
             agents_data: Liste des données agents pour cette itération
-            canvas_snapshot: Base64 du canvas (optionnel, pour replay visuel)
+            canvas_snapshot: Empreinte (canvas_blobs) ou base64 du canvas (optionnel, pour replay visuel)
             o_snapshot: Snapshot O-machine complet (optionnel)
             n_snapshot: Snapshot N-machine complet (optionnel)
         """
@@ -99,8 +129,8 @@ class SessionRecorder:
             "type": "iteration",
             "version": version,
             "timestamp": datetime.now().isoformat(),
-            "global": copy.deepcopy(self.last_global_metrics),
-            "rankings": copy.deepcopy(self.last_rankings),
+            "global": self.last_global_metrics,  # Remplacés à chaque mise à jour, jamais modifiés
+            "rankings": self.last_rankings,
             "agents": agents_data,
             "agents_count": len(agents_data),
             "ai_agents_count": sum(1 for a in agents_data if a.get("type") == "ai"),
@@ -108,7 +138,11 @@ class SessionRecorder:
         }
         
         if canvas_snapshot:
-            event["canvas_snapshot"] = canvas_snapshot
+            # Seule l'empreinte est gardée ; l'image est dans le blob store
+            if not is_digest(canvas_snapshot):
+                canvas_snapshot = self.blobs.put_base64(canvas_snapshot)
+            event["canvas_hash"] = canvas_snapshot
+            event["canvas_url"] = canvas_url(canvas_snapshot)
         
         # V5.1: Inclure les snapshots O et N pour les verbatim
         if o_snapshot:
@@ -121,7 +155,13 @@ class SessionRecorder:
                 "narrative": n_snapshot.get("narrative", {})
             }
         
-        self.events.append(event)
+        self.log.append(event)
+        if event["global"]:
+            self.global_metrics.append({
+                "version": version,
+                **event["global"],
+                "timestamp": event["timestamp"]
+            })
         self.current_iteration = version
     
     def record_agent_action(self, agent_id: str, position: List[int],
@@ -176,59 +216,50 @@ class SessionRecorder:
             agent_data["pixels"] = pixels
         
         # V5.1: Stocker les dernières données complètes de l'agent
-        self.last_agent_data[agent_id] = copy.deepcopy(agent_data)
+        # (jamais modifiées ensuite : partagées avec le journal et les diffusions)
+        self.last_agent_data[agent_id] = agent_data
         
-        # V5.1: Enregistrer l'événement dans self.events pour l'export
-        self.events.append({
+        # V5.1: Enregistrer l'événement dans le journal pour l'export
+        self.log.append({
             "type": "agent",
             "timestamp": agent_data["timestamp"],
-            "data": copy.deepcopy(agent_data)
+            "data": agent_data
         })
         
         return agent_data
     
-    def add_canvas_snapshot(self, version: int, snapshot_base64: str):
-        """Ajoute un snapshot du canvas (pour replay visuel)"""
+    def add_canvas_snapshot(self, version: int, canvas_hash: str) -> dict:
+        """Ajoute un snapshot du canvas (pour replay visuel), déjà stocké dans self.blobs"""
         snapshot_data = {
             "version": version,
             "timestamp": datetime.now().isoformat(),
-            "data": snapshot_base64
+            "hash": canvas_hash,
+            "url": canvas_url(canvas_hash)
         }
         self.canvas_snapshots.append(snapshot_data)
         # Garder les 100 derniers snapshots
         if len(self.canvas_snapshots) > 100:
             self.canvas_snapshots = self.canvas_snapshots[-100:]
         
-        # V5.1: Enregistrer aussi dans self.events pour l'export
-        self.events.append({
+        # V5.1: Enregistrer aussi dans le journal pour l'export
+        self.log.append({
             "type": "canvas_snapshot",
             "timestamp": snapshot_data["timestamp"],
             "data": {
                 "version": version,
-                "snapshot": snapshot_base64  # Stocker seulement la référence, pas les données complètes
+                "hash": canvas_hash,  # Référence vers le blob store, pas les données
+                "url": snapshot_data["url"]
             }
         })
+        return snapshot_data
     
     def export_session(self) -> dict:
         """Exporte la session complète au format JSON"""
-        # Reconstruire agentMetrics à partir des événements
-        agent_metrics = {}
-        for event in self.events:
-            if event.get("type") == "agent" and event.get("data"):
-                agent_data = event["data"]
-                agent_id = agent_data.get("id")
-                if agent_id:
-                    agent_metrics[agent_id] = agent_data
-        
-        # Reconstruire globalMetrics à partir des événements d'itération
-        global_metrics = []
-        for event in self.events:
-            if event.get("type") == "iteration" and event.get("global"):
-                global_metrics.append({
-                    "version": event.get("version", 0),
-                    **event.get("global", {}),
-                    "timestamp": event.get("timestamp", "")
-                })
+        # agentMetrics (dernière action par agent) et globalMetrics sont tenus à jour
+        # à l'enregistrement : un seul parcours du journal pour les événements
+        events = list(self.log.iter_events())
+        agent_metrics = dict(self.last_agent_data)
+        global_metrics = list(self.global_metrics)
         
         return {
             "session_id": self.session_id,
@@ -236,23 +267,31 @@ class SessionRecorder:
                 "start_time": self.start_time.isoformat(),
                 "end_time": datetime.now().isoformat(),
                 "total_iterations": self.current_iteration,
-                "total_events": len(self.events),
+                "total_events": len(events),
                 "agents_registry": self.agents_registry,
                 "ai_agents_count": sum(1 for a in self.agents_registry.values() if a.get("type") == "ai"),
                 "human_agents_count": sum(1 for a in self.agents_registry.values() if a.get("type") == "human")
             },
-            "events": self.events,
+            "events": events,
             "globalMetrics": global_metrics,
             "agentMetrics": agent_metrics,
             "rankings": self.last_rankings,
             "canvasSnapshots": self.canvas_snapshots[-20:]  # Derniers 20 snapshots pour le replay
         }
     
+    def _new_session_id(self) -> str:
+        stamp = datetime.now().isoformat()
+        return f"{self.scope}:{stamp}" if self.scope else stamp
+    
     def clear(self):
         """Réinitialise la session"""
-        self.session_id = datetime.now().isoformat()
+        self.session_id = self._new_session_id()
         self.start_time = datetime.now()
-        self.events = []
+        # L'ancien journal reste sur disque (écritures en attente terminées par son thread,
+        # sans l'attendre : appelé depuis /api/session/clear, dans la boucle d'événements)
+        self.log.close(wait=False)
+        self.log = SessionEventLog(self.session_id)
+        self.global_metrics = []
         self.agents_registry = {}
         self.current_iteration = 0
         self.canvas_snapshots = []
@@ -262,13 +301,25 @@ class SessionRecorder:
         self.last_o_snapshot = {}
         self.last_n_snapshot = {}
     
+    def events_page(self, offset: int = 0, limit: int = 50, iteration: Optional[int] = None) -> dict:
+        """Page d'événements par position, ou à partir de l'événement d'itération `iteration`"""
+        if iteration is not None:
+            start = self.log.offset_for_iteration(iteration)
+            offset = len(self.log) if start is None else start
+        return {
+            "total": len(self.log),
+            "offset": offset,
+            "limit": limit,
+            "events": self.log.read(offset, limit)
+        }
+    
     def get_summary(self) -> dict:
         """Retourne un résumé de la session en cours"""
         return {
             "session_id": self.session_id,
             "start_time": self.start_time.isoformat(),
             "current_iteration": self.current_iteration,
-            "total_events": len(self.events),
+            "total_events": len(self.log),
             "agents_count": len(self.agents_registry),
             "ai_agents": sum(1 for a in self.agents_registry.values() if a.get("type") == "ai"),
             "human_agents": sum(1 for a in self.agents_registry.values() if a.get("type") == "human"),
@@ -288,6 +339,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Colonnes numériques des historiques (agrégats vectorisés)
+HISTORY_COLUMNS = ('agents_count', 'avg_delta_C_w', 'avg_delta_C_d', 'avg_U_after_expected',
+                   'avg_prediction_error', 'std_prediction_error', 'p50_prediction_error', 'p90_prediction_error')
+O_SNAPSHOT_COLUMNS = ('version', 'structures_count', 'C_d', 'C_d_machine', 'C_d_machine_tokens')
+N_SNAPSHOT_COLUMNS = ('version', 'C_w', 'narrative_length', 'agents_count', 'mean_prediction_error',
+                      'std_prediction_error', 'max_prediction_error', 'min_prediction_error',
+                      'p50_prediction_error', 'p90_prediction_error',
+                      'C_w_machine', 'C_w_machine_tokens', 'U_machine')
+# Valeurs courantes des agents agrégées en flux (une valeur par agent)
+AGENT_METRICS = ('delta_C_w', 'delta_C_d', 'U_after_expected', 'prediction_error')
+
+
 class GlobalSimplicityTrackerV5:
     """
     Tracker global pour métriques V5 (Architecture O-N-W)
@@ -304,10 +367,23 @@ class GlobalSimplicityTrackerV5:
     def __init__(self):
         self.agents: Dict[str, dict] = {}
         self.update_count = 0
-        self.history = []
-        self.o_snapshots = []  # Historique snapshots O (structures, C_d)
-        self.n_snapshots = []  # Historique snapshots N (narrative, C_w, erreurs avec std)
-        self.agent_error_history: Dict[str, List[float]] = {}  # Historique cumulatif des erreurs par agent
+        # Tampons circulaires en colonnes (ajout O(1), fenêtres sans copie, agrégats numpy)
+        self.history = ColumnRing(200, numeric=HISTORY_COLUMNS, keep_records=True)
+        self.o_snapshots = ColumnRing(100, numeric=O_SNAPSHOT_COLUMNS, keep_records=True)  # Historique snapshots O (structures, C_d)
+        self.n_snapshots = ColumnRing(100, numeric=N_SNAPSHOT_COLUMNS, keep_records=True)  # Historique snapshots N (narrative, C_w, erreurs avec std)
+        # Erreurs cumulées par agent (moyenne, variance) et classement incrémental des agents actifs
+        self.ranking = AgentRanking(auto_join=False)
+        # Moyenne, écart-type et quantiles des valeurs courantes des agents, mis à jour à chaque agent_update
+        self.agent_values = {name: KeyedStats() for name in AGENT_METRICS}
+        # Toutes les erreurs de prédiction reçues dans les snapshots N (session)
+        self.error_stats = StreamingStats()
+        # Protocole delta : changements accumulés depuis le dernier delta diffusé
+        self.delta_log = StateDeltaLog()
+        self._changed_agents = set()
+        self._removed_agents = set()
+        self._new_history = []
+        self._o_changed = False
+        self._n_changed = False
     
     def update_agent(self, user_id: str, position: List[int], 
                      delta_C_w: float, delta_C_d: float, U_after_expected: float, 
@@ -323,7 +399,16 @@ class GlobalSimplicityTrackerV5:
             'strategy': strategy or 'N/A',
             'timestamp': datetime.now().isoformat()
         }
+        agent = self.agents[user_id]
+        for name in AGENT_METRICS:
+            value = agent[name]
+            if name == 'prediction_error' and is_number(value) and value < 0:
+                value = None  # Erreurs négatives ignorées
+            self.agent_values[name].set(user_id, value)
         self.update_count += 1
+        self.ranking.join(user_id)
+        self._changed_agents.add(user_id)
+        self._removed_agents.discard(user_id)
     
     def store_o_snapshot(self, snapshot: dict):
         """Store O-machine snapshot (structures, C_d, formal_relations)"""
@@ -340,27 +425,16 @@ class GlobalSimplicityTrackerV5:
             if 'C_d_machine' in machine_metrics:
                 snapshot_data['C_d_machine'] = machine_metrics['C_d_machine'].get('value', 0)
                 snapshot_data['C_d_machine_tokens'] = machine_metrics['C_d_machine'].get('tokens', 0)
-        self.o_snapshots.append(snapshot_data)
-        # Garder seulement les 100 derniers snapshots
-        if len(self.o_snapshots) > 100:
-            self.o_snapshots = self.o_snapshots[-100:]
+        self.o_snapshots.append(snapshot_data)  # 100 derniers snapshots
+        self._o_changed = True
     
     def store_n_snapshot(self, snapshot: dict):
         """Store N-machine snapshot (narrative, C_w, prediction_errors)"""
         errors = snapshot.get('prediction_errors', {})
-        # CRITICAL FIX: Filtrer les valeurs non numériques (ex: "N/A", None, strings)
-        error_values = [
-            e.get('error', 0) 
-            for e in errors.values() 
-            if isinstance(e, dict) and isinstance(e.get('error', 0), (int, float))
-        ]
-        
-        # Calcul moyenne et écart-type
-        mean_error = sum(error_values) / len(error_values) if error_values else 0.0
-        std_error = 0.0
-        if len(error_values) > 1:
-            variance = sum([(e - mean_error) ** 2 for e in error_values]) / len(error_values)
-            std_error = variance ** 0.5
+        # Moyenne, écart-type, extrêmes et quantiles en une passe (valeurs non numériques ignorées)
+        error_values = [e.get('error', 0) for e in errors.values() if isinstance(e, dict)]
+        stats = StreamingStats().extend(error_values)
+        self.error_stats.extend(error_values)
         
         snapshot_data = {
             'timestamp': datetime.now().isoformat(),
@@ -368,10 +442,12 @@ class GlobalSimplicityTrackerV5:
             'C_w': snapshot.get('simplicity_assessment', {}).get('C_w_current', {}).get('value', 0),
             'narrative_length': len(snapshot.get('narrative', {}).get('summary', '')),
             'agents_count': len(errors),
-            'mean_prediction_error': mean_error,
-            'std_prediction_error': std_error,  # V5: Écart-type (fragmentation narrative)
-            'max_prediction_error': max(error_values) if error_values else 0.0,
-            'min_prediction_error': min(error_values) if error_values else 0.0
+            'mean_prediction_error': stats.mean,
+            'std_prediction_error': stats.std,  # V5: Écart-type (fragmentation narrative)
+            'max_prediction_error': stats.max if stats.count else 0.0,
+            'min_prediction_error': stats.min if stats.count else 0.0,
+            'p50_prediction_error': stats.quantile(0.5) if stats.count else 0.0,
+            'p90_prediction_error': stats.quantile(0.9) if stats.count else 0.0
         }
         # V5: Ajouter machine_metrics si disponibles
         if 'machine_metrics' in snapshot:
@@ -381,16 +457,17 @@ class GlobalSimplicityTrackerV5:
                 snapshot_data['C_w_machine_tokens'] = machine_metrics['C_w_machine'].get('tokens', 0)
             if 'U_machine' in machine_metrics:
                 snapshot_data['U_machine'] = machine_metrics['U_machine'].get('value', 0)
-        self.n_snapshots.append(snapshot_data)
-        # Garder seulement les 100 derniers snapshots
-        if len(self.n_snapshots) > 100:
-            self.n_snapshots = self.n_snapshots[-100:]
+        self.n_snapshots.append(snapshot_data)  # 100 derniers snapshots
+        self._n_changed = True
     
     def remove_agent(self, user_id: str):
         if user_id in self.agents:
             del self.agents[user_id]
-        if user_id in self.agent_error_history:
-            del self.agent_error_history[user_id]
+            self._changed_agents.discard(user_id)
+            self._removed_agents.add(user_id)
+        for values in self.agent_values.values():
+            values.discard(user_id)
+        self.ranking.remove(user_id)
     
     def calculate_agent_rankings(self, prediction_errors: dict, agent_positions: dict, version: int = 0) -> dict:
         """
@@ -405,119 +482,37 @@ class GlobalSimplicityTrackerV5:
         Returns:
             Dict {agent_id: {'rank': int, 'avg_error': float, 'total_iterations': int, 'position': [x,y]}}
         """
-        # Pour chaque agent, mettre à jour son historique d'erreurs
-        # On stocke maintenant (version, error) pour éviter les doublons
-        for agent_id, error_data in prediction_errors.items():
-            if not isinstance(error_data, dict):
-                continue
-            error = error_data.get('error', 1.0)
-            
-            # CRITICAL: Ne stocker que les valeurs numériques (ignorer "N/A", None, etc.)
-            if not isinstance(error, (int, float)):
-                continue
-            
-            # Initialiser si nécessaire
-            if agent_id not in self.agent_error_history:
-                self.agent_error_history[agent_id] = {}  # Dict {version: error} au lieu de liste
-            
-            # Ajouter l'erreur seulement si pas déjà enregistrée pour cette version
-            if version not in self.agent_error_history[agent_id]:
-                self.agent_error_history[agent_id][version] = error
-        
-        # Calculer moyenne cumulative pour chaque agent ACTIF uniquement
-        # (ne classer que les agents présents dans agent_positions)
-        agent_stats = {}
-        for agent_id, error_history in self.agent_error_history.items():
-            # Ignorer les agents qui ne sont pas actifs (pas dans agent_positions)
-            if agent_id not in agent_positions:
-                continue
-            if len(error_history) == 0:
-                continue
-            
-            # Moyenne cumulative sur toutes les itérations (valeurs du dict)
-            # CRITICAL: Filtrer les valeurs non numériques ("N/A", None, etc.)
-            errors = [e for e in error_history.values() if isinstance(e, (int, float))]
-            if len(errors) == 0:
-                continue  # Ignorer les agents sans erreurs numériques
-            avg_error = sum(errors) / len(errors)
-            position = agent_positions[agent_id]  # Garanti d'exister car on a vérifié ci-dessus
-            
-            agent_stats[agent_id] = {
-                'avg_error': avg_error,
-                'total_iterations': len(errors),
-                'position': position
-            }
-        
-        # Trier par erreur moyenne croissante (meilleur = erreur la plus basse)
-        sorted_agents = sorted(
-            agent_stats.items(),
-            key=lambda x: x[1]['avg_error']
-        )
-        
-        # Assigner les rangs
-        rankings = {}
-        for rank, (agent_id, stats) in enumerate(sorted_agents, start=1):
-            rankings[agent_id] = {
-                'rank': rank,
-                'avg_error': stats['avg_error'],
-                'total_iterations': stats['total_iterations'],
-                'position': stats['position']
-            }
-        
-        return rankings
+        # Une seule erreur par agent et par version (O(1) par erreur, rang en O(log n))
+        self.ranking.record_errors(prediction_errors, key=version)
+        # Ne classer que les agents actifs (présents dans agent_positions)
+        for agent_id in agent_positions:
+            self.ranking.join(agent_id)
+        return self.ranking.rankings(agent_positions)
     
     def calculate_average_metrics(self):
         """Calculate average deltas (ΔC_w, ΔC_d, U_after_expected), prediction_error, and std_dev of prediction errors"""
         if not self.agents:
             return None
         
-        agent_list = list(self.agents.values())
-        
-        # V5: Calcul moyennes des DELTAS (pas valeurs absolues)
-        # CRITICAL FIX: Filtrer les valeurs non numériques pour tous les deltas
-        delta_cw_values = [
-            a.get('delta_C_w', 0) 
-            for a in agent_list 
-            if isinstance(a.get('delta_C_w', 0), (int, float))
-        ]
-        delta_cd_values = [
-            a.get('delta_C_d', 0) 
-            for a in agent_list 
-            if isinstance(a.get('delta_C_d', 0), (int, float))
-        ]
-        u_after_values = [
-            a.get('U_after_expected', 0) 
-            for a in agent_list 
-            if isinstance(a.get('U_after_expected', 0), (int, float))
-        ]
-        # CRITICAL: Filtrer les valeurs non numériques (ex: "N/A")
-        prediction_errors = [
-            a.get('prediction_error', 0) 
-            for a in agent_list 
-            if isinstance(a.get('prediction_error', 0), (int, float)) and a.get('prediction_error', 0) >= 0
-        ]
-        
-        # Moyennes
-        avg_delta_cw = sum(delta_cw_values) / len(delta_cw_values) if delta_cw_values else 0
-        avg_delta_cd = sum(delta_cd_values) / len(delta_cd_values) if delta_cd_values else 0
-        avg_u_after = sum(u_after_values) / len(u_after_values) if u_after_values else 0
-        avg_error = sum(prediction_errors) / len(prediction_errors) if prediction_errors else 0
+        # V5: Moyennes des DELTAS (pas valeurs absolues), tenues à jour à chaque agent_update
+        # (valeurs non numériques et erreurs négatives déjà écartées)
+        values = self.agent_values
+        errors = values['prediction_error']
         
         # V5: Écart-type des erreurs de prédiction (mesure fragmentation narrative)
         # Un écart-type élevé = agents ont des visions divergentes de l'évolution du canvas
         # Un écart-type faible = agents ont une vision cohérente (narrative unifiée)
-        std_error = 0.0
-        if len(prediction_errors) > 1:
-            variance = sum([(e - avg_error) ** 2 for e in prediction_errors]) / len(prediction_errors)
-            std_error = variance ** 0.5
+        std_error = errors.std if len(errors) > 1 else 0.0
         
         return {
             'agents_count': len(self.agents),
-            'avg_delta_C_w': round(avg_delta_cw, 2),  # V5: Moyenne des deltas
-            'avg_delta_C_d': round(avg_delta_cd, 2),  # V5: Moyenne des deltas
-            'avg_U_after_expected': round(avg_u_after, 2),  # V5: Moyenne U attendu
-            'avg_prediction_error': round(avg_error, 3),
+            'avg_delta_C_w': round(values['delta_C_w'].mean, 2),  # V5: Moyenne des deltas
+            'avg_delta_C_d': round(values['delta_C_d'].mean, 2),  # V5: Moyenne des deltas
+            'avg_U_after_expected': round(values['U_after_expected'].mean, 2),  # V5: Moyenne U attendu
+            'avg_prediction_error': round(errors.mean, 3),
             'std_prediction_error': round(std_error, 3),  # V5: Écart-type (fragmentation narrative)
+            'p50_prediction_error': round(errors.quantile(0.5) or 0.0, 3),  # Médiane (quantile approché)
+            'p90_prediction_error': round(errors.quantile(0.9) or 0.0, 3),
             'timestamp': datetime.now().isoformat()
         }
     
@@ -533,44 +528,174 @@ class GlobalSimplicityTrackerV5:
             'n_snapshots_count': len(self.n_snapshots),
             'latest_o': self.o_snapshots[-1] if self.o_snapshots else None,
             'latest_n': self.n_snapshots[-1] if self.n_snapshots else None,
-            'history': self.history[-50:]  # Derniers 50 états
+            'history': self.history.records(STATE_HISTORY_WINDOW)  # Derniers 50 états
         }
     
+    def flush_state_delta(self) -> Optional[dict]:
+        """Message state_delta des changements depuis le précédent (None si rien n'a changé)"""
+        if not (self._changed_agents or self._removed_agents or self._new_history
+                or self._o_changed or self._n_changed):
+            return None
+        data = {
+            'agents': {uid: self.agents[uid] for uid in self._changed_agents if uid in self.agents},
+            'removed': sorted(self._removed_agents),
+            'history': self._new_history,
+            # Le dernier point d'historique est la moyenne courante (même calcul)
+            'averages': self._new_history[-1] if self._new_history else self.calculate_average_metrics(),
+            'update_count': self.update_count,
+            'o_snapshots_count': len(self.o_snapshots),
+            'n_snapshots_count': len(self.n_snapshots),
+        }
+        if self._o_changed:
+            data['latest_o'] = self.o_snapshots[-1] if self.o_snapshots else None
+        if self._n_changed:
+            data['latest_n'] = self.n_snapshots[-1] if self.n_snapshots else None
+        self._changed_agents = set()
+        self._removed_agents = set()
+        self._new_history = []
+        self._o_changed = self._n_changed = False
+        return self.delta_log.append(data)
+    
     def record_history(self):
         """Record current state in history"""
         avg = self.calculate_average_metrics()
         if avg:
-            self.history.append(avg)
-            # Garder seulement les 200 dernières entrées
-            if len(self.history) > 200:
-                self.history = self.history[-200:]
-
-tracker = GlobalSimplicityTrackerV5()
-
-# WebSocket connections actives
-connections: List[WebSocket] = []
+            self.history.append(avg)  # 200 dernières entrées
+            self._new_history.append(avg)
 
 # Paramètres de stratégie configurables (valeurs par défaut)
-strategy_params = {
+DEFAULT_STRATEGY_PARAMS = {
     'strategy_u_threshold': 70,
     'strategy_rank_divisor': 2,
     'strategy_error_threshold': 0.5
 }
 
+# Images des snapshots canvas : partagées par toutes les sessions (adressées par contenu)
+canvas_blobs = CanvasBlobStore()
+
+
+class MetricsSession:
+    """État d'un canevas : tracker, SessionRecorder, clients WebSocket, paramètres de stratégie"""
+    
+    def __init__(self, session_id: str):
+        default = session_id == DEFAULT_SESSION
+        self.session_id = session_id
+        self.tracker = GlobalSimplicityTrackerV5()
+        self.recorder = SessionRecorder(canvas_blobs, scope=None if default else session_id)
+        # WebSocket connections actives (file d'envoi bornée par client, JSON encodé une fois)
+        self.hub = BroadcastHub("MetricsV5" if default else f"MetricsV5:{session_id}")
+        self.strategy_params = dict(DEFAULT_STRATEGY_PARAMS)
+    
+    def busy(self) -> bool:
+        return len(self.hub) > 0
+    
+    def close(self):
+        # Appelé par l'éviction (boucle d'événements) : pas d'attente du thread d'écriture
+        self.recorder.log.close(wait=False)
+    
+    def publish_state(self, legacy: bool = True):
+        """Diffuse l'état : delta versionné aux clients 'delta', résumé complet aux autres"""
+        delta = self.tracker.flush_state_delta()
+        if delta is not None:
+            self.hub.broadcast(delta, channel=PROTOCOL_DELTA)
+        if legacy and self.hub.count(''):
+            self.hub.broadcast({
+                'type': 'state_update',
+                'data': self.tracker.get_state_summary()
+            }, coalesce_key='state_update', channel='')
+    
+    def info(self) -> dict:
+        return {
+            'session_id': self.session_id,
+            'clients': len(self.hub),
+            'agents': len(self.tracker.agents),
+            'update_count': self.tracker.update_count,
+            'recorder_session_id': self.recorder.session_id,
+            'events': len(self.recorder.log)
+        }
+
+
+# Sessions par canevas ; la session par défaut (/metrics) n'est jamais fermée
+sessions = SessionRegistry(MetricsSession, name="MetricsV5")
+default_session = sessions.open(DEFAULT_SESSION)
+tracker = default_session.tracker
+session_recorder = default_session.recorder
+hub = default_session.hub
+strategy_params = default_session.strategy_params
+
+
+def session_for_request(request: Request, session: Optional[str]) -> MetricsSession:
+    """Session d'une requête HTTP (?session=) : 400 si id invalide, 307 vers le processus propriétaire, 404 si inconnue"""
+    session_id = session or DEFAULT_SESSION
+    if not valid_session_id(session_id):
+        raise HTTPException(status_code=400, detail="Invalid session id")
+    target = owner_url(session_id)
+    if target:
+        raise HTTPException(status_code=307, detail=f"Session served by {target}",
+                            headers={"Location": f"{target}{request.url.path}?{request.url.query}"})
+    metrics = sessions.get(session_id)
+    if metrics is None:
+        raise HTTPException(status_code=404, detail=f"Unknown session: {session_id}")
+    return metrics
+
+
+async def _redirect_websocket(websocket: WebSocket, session_id: str, target: str):
+    """Session d'un autre processus : indiquer son URL puis fermer"""
+    ws_target = target.replace('https://', 'wss://').replace('http://', 'ws://')
+    await websocket.send_text(json.dumps({
+        'type': 'session_redirect',
+        'session_id': session_id,
+        'url': f"{ws_target}/metrics/{session_id}"
+    }))
+    await websocket.close(code=4307)
+
+
 @app.websocket("/metrics")
-async def metrics_endpoint(websocket: WebSocket):
+@app.websocket("/metrics/{session_id}")
+async def metrics_endpoint(websocket: WebSocket, session_id: Optional[str] = None, session: Optional[str] = None):
     await websocket.accept()
-    connections.append(websocket)
-    print(f"[MetricsV5] Client connecté. Total: {len(connections)}")
+    session_id = session_id or session or DEFAULT_SESSION
+    if not valid_session_id(session_id):
+        await websocket.close(code=1008)
+        return
+    target = owner_url(session_id)
+    if target:
+        await _redirect_websocket(websocket, session_id, target)
+        return
+    metrics = sessions.open(session_id)
+    tracker, session_recorder, hub = metrics.tracker, metrics.recorder, metrics.hub
+    strategy_params = metrics.strategy_params
+    client = hub.add_websocket(websocket)
+    print(f"[MetricsV5] Client connecté ({session_id}). Total: {len(hub)}")
     
     try:
         while True:
             data = await websocket.receive_text()
             msg = json.loads(data)
+            sessions.touch(metrics.session_id)
             
             msg_type = msg.get('type')
             
-            if msg_type == 'agent_update':
+            if msg_type == 'join_session':
+                # Routage par premier message : rattacher la connexion à la session d'un canevas
+                requested = msg.get('session_id') or DEFAULT_SESSION
+                if not valid_session_id(requested):
+                    hub.send(client, {'type': 'error', 'message': 'Invalid session id'})
+                    continue
+                target = owner_url(requested)
+                if target:
+                    hub.remove(client)
+                    await _redirect_websocket(websocket, requested, target)
+                    return
+                if requested != metrics.session_id:
+                    hub.remove(client)
+                    metrics = sessions.open(requested)
+                    tracker, session_recorder, hub = metrics.tracker, metrics.recorder, metrics.hub
+                    strategy_params = metrics.strategy_params
+                    client = hub.add_websocket(websocket)
+                hub.send(client, {'type': 'session_joined', 'session_id': metrics.session_id})
+            
+            elif msg_type == 'agent_update':
                 # Mise à jour agent W (V5: deltas au lieu de valeurs absolues)
                 user_id = msg.get('user_id')
                 position = msg.get('position', [0, 0])
@@ -591,36 +716,15 @@ async def metrics_endpoint(websocket: WebSocket):
                 signalling_tokens = msg.get('signalling_tokens')  # V5.1: Tokens de signalement réels
                 
                 # V5.1: Si l'agent recommence (iteration <= 1), réinitialiser son historique
-                if iteration <= 1 and user_id in tracker.agent_error_history:
-                    del tracker.agent_error_history[user_id]
+                if iteration <= 1 and user_id in tracker.ranking:
+                    tracker.ranking.reset(user_id)
                     print(f"[MetricsV5] Agent {user_id[:8]}... reset (iteration={iteration})")
                 
                 tracker.update_agent(user_id, position, delta_C_w, delta_C_d, U_after_expected, prediction_error, strategy)
                 tracker.record_history()
                 
-                # V5.1: Calculer le rank actuel de l'agent pour l'inclure dans les données
-                # On calcule un ranking temporaire basé sur l'erreur moyenne cumulative
-                # (sans modifier agent_error_history)
-                agent_stats = {}
-                for aid, error_history in tracker.agent_error_history.items():
-                    if aid not in tracker.agents:
-                        continue
-                    if len(error_history) == 0:
-                        continue
-                    # CRITICAL: Filtrer les valeurs non numériques
-                    errors = [e for e in error_history.values() if isinstance(e, (int, float))]
-                    if len(errors) == 0:
-                        continue
-                    avg_error = sum(errors) / len(errors)
-                    agent_stats[aid] = avg_error
-                
-                # Trier par erreur moyenne croissante
-                sorted_agents = sorted(agent_stats.items(), key=lambda x: x[1])
-                current_rank = 999
-                for rank, (aid, _) in enumerate(sorted_agents, start=1):
-                    if aid == user_id:
-                        current_rank = rank
-                        break
+                # V5.1: Rank actuel de l'agent (erreur moyenne cumulative, index incrémental)
+                current_rank = tracker.ranking.rank(user_id)
                 
                 # V5.1: Enregistrer dans SessionRecorder
                 agent_data = session_recorder.record_agent_action(
@@ -647,25 +751,12 @@ async def metrics_endpoint(websocket: WebSocket):
                     utterance_store.record_w_from_agent(agent_data)
                 
                 # Broadcast state to all connected clients
-                state = tracker.get_state_summary()
-                dead_connections = []
-                for conn in connections:
-                    try:
-                        await conn.send_json({
-                            'type': 'state_update',
-                            'data': state
-                        })
-                        # V5.1: Broadcast aussi l'événement agent pour ai-metrics.html
-                        await conn.send_json({
-                            'type': 'session_agent_event',
-                            'data': agent_data
-                        })
-                    except:
-                        dead_connections.append(conn)
-                # Nettoyer les connexions mortes
-                for conn in dead_connections:
-                    if conn in connections:
-                        connections.remove(conn)
+                metrics.publish_state()
+                # V5.1: Broadcast aussi l'événement agent pour ai-metrics.html
+                hub.broadcast({
+                    'type': 'session_agent_event',
+                    'data': agent_data
+                })
             
             elif msg_type == 'o_snapshot':
                 # Snapshot O-machine
@@ -673,7 +764,7 @@ async def metrics_endpoint(websocket: WebSocket):
                 tracker.store_o_snapshot(snapshot)
                 
                 # V5.1: Stocker le snapshot O complet pour l'événement d'itération
-                session_recorder.last_o_snapshot = copy.deepcopy(snapshot)
+                session_recorder.last_o_snapshot = snapshot  # Message désérialisé, jamais modifié
                 version = snapshot.get('version', 0)
                 if version != getattr(session_recorder, '_last_o_utterance_version', -1):
                     session_recorder._last_o_utterance_version = version
@@ -685,7 +776,6 @@ async def metrics_endpoint(websocket: WebSocket):
                 version = snapshot.get('version', 0)
                 
                 # Broadcast
-                dead_connections = []
                 # V5.1: Envoyer le snapshot O complet (pas seulement les métadonnées)
                 o_data = {
                     'version': version,
@@ -696,18 +786,10 @@ async def metrics_endpoint(websocket: WebSocket):
                 # V5: Ajouter machine_metrics si disponibles
                 if 'machine_metrics' in snapshot:
                     o_data['machine_metrics'] = snapshot.get('machine_metrics', {})
-                for conn in connections:
-                    try:
-                        await conn.send_json({
-                            'type': 'o_snapshot_update',
-                            'data': o_data
-                        })
-                    except:
-                        dead_connections.append(conn)
-                # Nettoyer les connexions mortes
-                for conn in dead_connections:
-                    if conn in connections:
-                        connections.remove(conn)
+                hub.broadcast({
+                    'type': 'o_snapshot_update',
+                    'data': o_data
+                }, coalesce_key='o_snapshot_update')
             
             elif msg_type == 'n_snapshot':
                 # Snapshot N-machine
@@ -721,22 +803,12 @@ async def metrics_endpoint(websocket: WebSocket):
                 U = simplicity.get('U_current', {}).get('value', 0)
                 version = snapshot.get('version', 0)
                 
-                # Calculer mean/std des erreurs de prédiction
+                # mean/std des erreurs de prédiction : déjà calculés par store_n_snapshot
                 errors = snapshot.get('prediction_errors', {})
-                # CRITICAL FIX: Filtrer les valeurs non numériques (ex: "N/A", None, strings)
-                error_values = [
-                    e.get('error', 0) 
-                    for e in errors.values() 
-                    if isinstance(e, dict) and isinstance(e.get('error', 0), (int, float))
-                ]
-                mean_error = sum(error_values) / len(error_values) if error_values else 0.0
-                std_error = 0.0
-                if len(error_values) > 1:
-                    variance = sum([(e - mean_error) ** 2 for e in error_values]) / len(error_values)
-                    std_error = variance ** 0.5
-                
-                session_recorder.update_global_metrics(C_w, C_d, U, mean_error, std_error, version)
-                session_recorder.last_n_snapshot = copy.deepcopy(snapshot)
+                latest_n = tracker.n_snapshots.last()
+                session_recorder.update_global_metrics(C_w, C_d, U, latest_n['mean_prediction_error'],
+                                                       latest_n['std_prediction_error'], version)
+                session_recorder.last_n_snapshot = snapshot  # Message désérialisé, jamais modifié
                 if version != getattr(session_recorder, '_last_n_utterance_version', -1):
                     session_recorder._last_n_utterance_version = version
                     utterance_store.record_n_from_snapshot(snapshot)
@@ -745,6 +817,13 @@ async def metrics_endpoint(websocket: WebSocket):
                 agent_positions = {aid: a.get('position', [0, 0]) for aid, a in tracker.agents.items()}
                 rankings = tracker.calculate_agent_rankings(errors, agent_positions, version)
                 session_recorder.update_rankings(rankings)
+                rank_changes = tracker.ranking.rank_changes(rankings)
+                if rank_changes:
+                    hub.broadcast({
+                        'type': 'rank_changes',
+                        'version': version,
+                        'changes': rank_changes
+                    })
                 
                 # V5.1: Enregistrer l'événement d'itération
                 # Utiliser les dernières données complètes stockées pour chaque agent
@@ -752,10 +831,10 @@ async def metrics_endpoint(websocket: WebSocket):
                 for agent_id in tracker.agents.keys():
                     if agent_id in session_recorder.last_agent_data:
                         # Utiliser les données complètes stockées (inclut tokens, pixels, etc.)
-                        agent_data = copy.deepcopy(session_recorder.last_agent_data[agent_id])
-                        # Mettre à jour le rank si disponible
+                        agent_data = session_recorder.last_agent_data[agent_id]
+                        # Mettre à jour le rank si disponible (copie superficielle, l'original est partagé)
                         if agent_id in rankings:
-                            agent_data["rank"] = rankings[agent_id].get('rank', 999)
+                            agent_data = {**agent_data, "rank": rankings[agent_id].get('rank', 999)}
                         agents_data.append(agent_data)
                     else:
                         # Fallback: construire à partir de tracker.agents si pas de données complètes
@@ -780,9 +859,6 @@ async def metrics_endpoint(websocket: WebSocket):
                 o_snapshot_data = None
                 n_snapshot_data = snapshot  # Le snapshot N vient d'être reçu
                 
-                # Stocker le snapshot N complet
-                session_recorder.last_n_snapshot = copy.deepcopy(snapshot)
-                
                 # Utiliser le dernier snapshot O stocké
                 if session_recorder.last_o_snapshot:
                     o_snapshot_data = {
@@ -799,7 +875,6 @@ async def metrics_endpoint(websocket: WebSocket):
                 )
                 
                 # Broadcast
-                dead_connections = []
                 # CRITICAL FIX: Envoyer le snapshot complet (combiné O+N) au lieu de tracker.n_snapshots[-1]
                 # tracker.n_snapshots[-1] ne contient pas structures ni formal_relations
                 # Le snapshot reçu contient toutes les données nécessaires (structures, formal_relations, narrative, prediction_errors, etc.)
@@ -816,41 +891,33 @@ async def metrics_endpoint(websocket: WebSocket):
                 # V5: Ajouter machine_metrics au snapshot N si disponibles
                 if 'machine_metrics' in snapshot:
                     n_data['machine_metrics'] = snapshot.get('machine_metrics', {})
-                for conn in connections:
-                    try:
-                        await conn.send_json({
-                            'type': 'n_snapshot_update',
-                            'data': n_data
-                        })
-                        # V5.1: Broadcast l'événement d'itération complet pour ai-metrics.html
-                        n_snapshot_data = {
-                            "narrative": snapshot.get('narrative', {})
-                        }
-                        # V5: Ajouter machine_metrics au n_snapshot si disponibles
-                        if 'machine_metrics' in snapshot:
-                            n_snapshot_data['machine_metrics'] = snapshot.get('machine_metrics', {})
-                        
-                        await conn.send_json({
-                            'type': 'session_iteration_event',
-                            'data': {
-                                'version': version,
-                                'global': session_recorder.last_global_metrics,
-                                'rankings': rankings,
-                                'agents': agents_data,  # V5.1: Inclure les données des agents
-                                'agents_count': len(agents_data),
-                                'ai_agents_count': sum(1 for a in agents_data if a.get("type") == "ai"),
-                                'human_agents_count': sum(1 for a in agents_data if a.get("type") == "human"),
-                                'o_snapshot': o_snapshot_data,  # V5.1: Inclure snapshot O
-                                'n_snapshot': n_snapshot_data,  # V5.1: Inclure snapshot N (narrative + machine_metrics)
-                                'timestamp': datetime.now().isoformat()
-                            }
-                        })
-                    except:
-                        dead_connections.append(conn)
-                # Nettoyer les connexions mortes
-                for conn in dead_connections:
-                    if conn in connections:
-                        connections.remove(conn)
+                hub.broadcast({
+                    'type': 'n_snapshot_update',
+                    'data': n_data
+                }, coalesce_key='n_snapshot_update')
+                # V5.1: Broadcast l'événement d'itération complet pour ai-metrics.html
+                n_snapshot_data = {
+                    "narrative": snapshot.get('narrative', {})
+                }
+                # V5: Ajouter machine_metrics au n_snapshot si disponibles
+                if 'machine_metrics' in snapshot:
+                    n_snapshot_data['machine_metrics'] = snapshot.get('machine_metrics', {})
+                
+                hub.broadcast({
+                    'type': 'session_iteration_event',
+                    'data': {
+                        'version': version,
+                        'global': session_recorder.last_global_metrics,
+                        'rankings': rankings,
+                        'agents': agents_data,  # V5.1: Inclure les données des agents
+                        'agents_count': len(agents_data),
+                        'ai_agents_count': sum(1 for a in agents_data if a.get("type") == "ai"),
+                        'human_agents_count': sum(1 for a in agents_data if a.get("type") == "human"),
+                        'o_snapshot': o_snapshot_data,  # V5.1: Inclure snapshot O
+                        'n_snapshot': n_snapshot_data,  # V5.1: Inclure snapshot N (narrative + machine_metrics)
+                        'timestamp': datetime.now().isoformat()
+                    }
+                })
             
             elif msg_type == 'disconnect':
                 user_id = msg.get('user_id')
@@ -858,39 +925,42 @@ async def metrics_endpoint(websocket: WebSocket):
                 tracker.record_history()
                 
                 # Broadcast
-                state = tracker.get_state_summary()
-                dead_connections = []
-                for conn in connections:
-                    try:
-                        await conn.send_json({
-                            'type': 'state_update',
-                            'data': state
-                        })
-                    except:
-                        dead_connections.append(conn)
-                # Nettoyer les connexions mortes
-                for conn in dead_connections:
-                    if conn in connections:
-                        connections.remove(conn)
+                metrics.publish_state()
             
             elif msg_type == 'get_state':
                 # Demande état complet
-                state = tracker.get_state_summary()
-                await websocket.send_json({
-                    'type': 'state_update',
-                    'data': state
-                })
+                if msg.get('protocol') == PROTOCOL_DELTA:
+                    # Snapshot versionné, puis deltas (les changements en attente partent d'abord)
+                    metrics.publish_state(legacy=False)
+                    client.channel = PROTOCOL_DELTA
+                    hub.send(client, tracker.delta_log.snapshot(tracker.get_state_summary()))
+                else:
+                    hub.send(client, {
+                        'type': 'state_update',
+                        'data': tracker.get_state_summary()
+                    })
                 # V5.1: Envoyer aussi le résumé de session
-                await websocket.send_json({
+                hub.send(client, {
                     'type': 'session_summary',
                     'data': session_recorder.get_summary()
                 })
                 # Envoyer les paramètres de stratégie actuels
-                await websocket.send_json({
+                hub.send(client, {
                     'type': 'strategy_params_update',
                     'params': strategy_params
                 })
             
+            elif msg_type == 'state_resync':
+                # Trou détecté par le client : deltas manquants si encore journalisés, sinon snapshot
+                client.channel = PROTOCOL_DELTA
+                missed = tracker.delta_log.since(int(msg.get('version', -1)))
+                if missed is None:
+                    metrics.publish_state(legacy=False)
+                    hub.send(client, tracker.delta_log.snapshot(tracker.get_state_summary()))
+                else:
+                    for delta in missed:
+                        hub.send(client, delta)
+            
             elif msg_type == 'set_strategy_params':
                 # Mise à jour des paramètres de stratégie
                 params = msg.get('params', {})
@@ -904,18 +974,10 @@ async def metrics_endpoint(websocket: WebSocket):
                 print(f"[MetricsV5] Strategy params updated: {strategy_params}")
                 
                 # Diffuser à tous les clients
-                dead_connections = []
-                for conn in connections:
-                    try:
-                        await conn.send_json({
-                            'type': 'strategy_params_update',
-                            'params': strategy_params
-                        })
-                    except:
-                        dead_connections.append(conn)
-                for conn in dead_connections:
-                    if conn in connections:
-                        connections.remove(conn)
+                hub.broadcast({
+                    'type': 'strategy_params_update',
+                    'params': strategy_params
+                }, coalesce_key='strategy_params_update')
             
             elif msg_type == 'human_pixels':
                 # V5.1: Pixels d'un agent humain (pas de métriques W)
@@ -932,18 +994,10 @@ async def metrics_endpoint(websocket: WebSocket):
                 )
                 
                 # Broadcast l'événement
-                dead_connections = []
-                for conn in connections:
-                    try:
-                        await conn.send_json({
-                            'type': 'session_agent_event',
-                            'data': agent_data
-                        })
-                    except:
-                        dead_connections.append(conn)
-                for conn in dead_connections:
-                    if conn in connections:
-                        connections.remove(conn)
+                hub.broadcast({
+                    'type': 'session_agent_event',
+                    'data': agent_data
+                })
             
             elif msg_type == 'canvas_snapshot':
                 # V5.1: Snapshot du canvas pour replay visuel
@@ -951,58 +1005,83 @@ async def metrics_endpoint(websocket: WebSocket):
                 snapshot_base64 = msg.get('data', '')
                 
                 if snapshot_base64:
-                    session_recorder.add_canvas_snapshot(version, snapshot_base64)
+                    # Décodage, empreinte et écriture disque hors de la boucle
+                    try:
+                        canvas_hash = await asyncio.to_thread(session_recorder.blobs.put_base64, snapshot_base64)
+                    except (ValueError, OSError) as e:
+                        print(f"[MetricsV5] ⚠️  Snapshot canvas ignoré: {e}")
+                        continue
+                    snapshot_data = session_recorder.add_canvas_snapshot(version, canvas_hash)
                     
                     # Broadcast
-                    dead_connections = []
-                    for conn in connections:
-                        try:
-                            await conn.send_json({
-                                'type': 'canvas_snapshot_update',
-                                'data': {
-                                    'version': version,
-                                    'timestamp': datetime.now().isoformat()
-                                }
-                            })
-                        except:
-                            dead_connections.append(conn)
-                    for conn in dead_connections:
-                        if conn in connections:
-                            connections.remove(conn)
+                    hub.broadcast({
+                        'type': 'canvas_snapshot_update',
+                        'data': {
+                            'version': version,
+                            'hash': canvas_hash,
+                            'url': snapshot_data['url'],
+                            'timestamp': snapshot_data['timestamp']
+                        }
+                    })
             
             elif msg_type == 'get_session_export':
-                # V5.1: Demande d'export de session via WebSocket
-                await websocket.send_json({
+                # V5.1: Demande d'export de session via WebSocket (ancien chemin, les tableaux de bord
+                # passent par /api/session/export en flux) : relecture du journal hors de la boucle
+                hub.send(client, {
                     'type': 'session_export',
-                    'data': session_recorder.export_session()
+                    'data': await asyncio.to_thread(session_recorder.export_session)
                 })
     
     except WebSocketDisconnect:
-        connections.remove(websocket)
-        print(f"[MetricsV5] Client déconnecté. Total: {len(connections)}")
+        hub.remove(client)
+        print(f"[MetricsV5] Client déconnecté ({metrics.session_id}). Total: {len(hub)}")
     except Exception as e:
         print(f"[MetricsV5] Erreur: {e}")
-        if websocket in connections:
-            connections.remove(websocket)
+        hub.remove(client)
 
 @app.get("/health")
-async def health():
-    return {"status": "ok", "version": "5.0.0", "clients": len(connections)}
+async def health(request: Request, session: Optional[str] = None):
+    metrics = session_for_request(request, session)
+    return {"status": "ok", "version": "5.0.0", "session": metrics.session_id, "clients": len(metrics.hub),
+            "broadcast": metrics.hub.stats(), "state": metrics.tracker.delta_log.stats(),
+            "session_log": metrics.recorder.log.stats(), "canvas_blobs": canvas_blobs.stats(),
+            "sessions": sessions.stats()}
+
+@app.get("/api/sessions")
+async def list_sessions():
+    """Sessions de métriques ouvertes dans ce processus"""
+    return {"shard": METRICS_SHARD_INDEX, "sessions": [sessions.get(sid).info() for sid in sessions.ids()]}
 
 @app.get("/state")
-async def get_state():
-    """HTTP endpoint pour récupérer l'état actuel"""
-    return tracker.get_state_summary()
+async def get_state(request: Request, session: Optional[str] = None):
+    """HTTP endpoint pour récupérer l'état actuel (?session= : canevas, session par défaut sinon)"""
+    return session_for_request(request, session).tracker.get_state_summary()
 
 @app.get("/o-history")
-async def get_o_history():
-    """Historique snapshots O"""
-    return {"o_snapshots": tracker.o_snapshots}
+async def get_o_history(request: Request, window: Optional[int] = None, session: Optional[str] = None):
+    """Historique snapshots O (?window=N : N derniers) et agrégats (moyenne, écart-type, min, max)"""
+    o_snapshots = session_for_request(request, session).tracker.o_snapshots
+    return {"o_snapshots": o_snapshots.records(window), "aggregates": o_snapshots.summary(window)}
 
 @app.get("/n-history")
-async def get_n_history():
-    """Historique snapshots N"""
-    return {"n_snapshots": tracker.n_snapshots}
+async def get_n_history(request: Request, window: Optional[int] = None, session: Optional[str] = None):
+    """Historique snapshots N (?window=N : N derniers), agrégats, et statistiques en flux de toutes les erreurs reçues (p50/p90, EWMA)"""
+    metrics_tracker = session_for_request(request, session).tracker
+    return {"n_snapshots": metrics_tracker.n_snapshots.records(window),
+            "aggregates": metrics_tracker.n_snapshots.summary(window),
+            "prediction_errors": metrics_tracker.error_stats.to_dict()}
+
+
+@app.on_event("startup")
+async def start_session_evictor():
+    """Ferme en tâche de fond les sessions de canevas inactives"""
+    asyncio.create_task(sessions.run_evictor())
+
+
+@app.on_event("startup")
+async def start_session_resolver():
+    """Rafraîchit en arrière-plan le session_id du recorder (jamais sur le chemin des énoncés)"""
+    await utterance_store.start_session_resolver()
 
 
 # ==============================================================================
@@ -1010,37 +1089,64 @@ async def get_n_history():
 # ==============================================================================
 
 @app.get("/api/session/export")
-async def export_session():
-    """Exporte la session complète au format JSON"""
-    return JSONResponse(
-        content=session_recorder.export_session(),
+async def export_session(request: Request, since_iteration: Optional[int] = None, include: Optional[str] = None,
+                         format: str = "json", gzip: bool = False, session: Optional[str] = None):
+    """Exporte la session en flux depuis le journal (JSON ou NDJSON, gzip optionnel)
+
+    ?since_iteration=N : à partir des actions de l'itération N
+    ?include=canvas,agents,global : sections exportées (toutes par défaut)
+    ?session=ID : canevas (session par défaut sinon)
+    """
+    session_recorder = session_for_request(request, session).recorder
+    fmt = "ndjson" if format == "ndjson" else "json"
+    chunks = iter_session_export(session_recorder, fmt=fmt, since_iteration=since_iteration, include=include)
+    filename = f"session_{session_recorder.session_id}.{fmt}"
+    media_type = "application/x-ndjson" if fmt == "ndjson" else "application/json"
+    if gzip:
+        chunks = gzip_chunks(chunks)
+        filename += ".gz"
+        media_type = "application/gzip"
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
         headers={
-            "Content-Disposition": f"attachment; filename=session_{session_recorder.session_id}.json"
+            "Content-Disposition": f"attachment; filename={filename}"
         }
     )
 
+@app.get("/api/session/canvas/{canvas_hash}")
+async def get_canvas_blob(canvas_hash: str, request: Request):
+    """Image d'un snapshot canvas par empreinte (contenu immuable : cache long)"""
+    etag = f'"{canvas_hash}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if not is_digest(canvas_hash):
+        return JSONResponse(status_code=404, content={"error": "not_found"})
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    data = await asyncio.to_thread(canvas_blobs.get, canvas_hash)
+    if data is None:
+        return JSONResponse(status_code=404, content={"error": "not_found"})
+    return Response(content=data, media_type=sniff_media_type(data), headers=headers)
+
 @app.get("/api/session/summary")
-async def get_session_summary():
+async def get_session_summary(request: Request, session: Optional[str] = None):
     """Retourne un résumé de la session en cours"""
-    return session_recorder.get_summary()
+    return session_for_request(request, session).recorder.get_summary()
 
 @app.post("/api/session/clear")
-async def clear_session():
+async def clear_session(request: Request, session: Optional[str] = None):
     """Réinitialise la session courante"""
+    session_recorder = session_for_request(request, session).recorder
     session_recorder.clear()
     return {"status": "ok", "message": "Session cleared", "new_session_id": session_recorder.session_id}
 
 @app.get("/api/session/events")
-async def get_session_events(limit: int = 50, offset: int = 0):
-    """Retourne les événements de la session avec pagination"""
-    events = session_recorder.events
-    total = len(events)
-    return {
-        "total": total,
-        "offset": offset,
-        "limit": limit,
-        "events": events[offset:offset + limit]
-    }
+async def get_session_events(request: Request, limit: int = 50, offset: int = 0, iteration: Optional[int] = None,
+                             session: Optional[str] = None):
+    """Retourne les événements de la session avec pagination (?offset= ou ?iteration=)"""
+    session_recorder = session_for_request(request, session).recorder
+    # Les pages anciennes sont relues sur disque : hors de la boucle asyncio
+    return await asyncio.to_thread(session_recorder.events_page, offset, limit, iteration)
 
 
 # ==============================================================================
@@ -1092,43 +1198,59 @@ async def narrative_proxy_o_image():
 
 @app.get("/api/utterances/sessions")
 async def list_utterance_sessions():
-    return {"sessions": utterance_store.list_session_ids()}
+    # flush() de la file d'écriture : hors de la boucle d'événements
+    return {"sessions": await asyncio.to_thread(utterance_store.list_session_ids)}
 
 
 @app.get("/api/utterances/{session_id}")
-async def get_utterances(session_id: str):
+async def get_utterances(session_id: str, since: Optional[str] = None, limit: Optional[int] = None):
+    """Énoncés triés par `ts` ; `?since=<cursor|id|ts>&limit=` pour ne lire que les nouveaux"""
+    utterances, total, cursor = await asyncio.to_thread(utterance_store.read_utterances, session_id, since, limit)
     return {
         "session_id": session_id,
-        "utterances": utterance_store.list_utterances(session_id),
+        "utterances": utterances,
+        "total": total,
+        "cursor": cursor,
     }
 
 
 @app.get("/api/utterances/{session_id}/export")
-async def export_utterances_bundle(session_id: str):
+async def export_utterances_bundle(session_id: str, export_id: Optional[str] = None):
     from utterance_http import export_bundle
 
-    return await export_bundle(session_id)
+    return await export_bundle(session_id, export_id)
+
+
+@app.get("/api/utterances/exports/{export_id}/progress")
+async def export_utterances_progress(export_id: str):
+    from utterance_http import export_progress
+
+    return await export_progress(export_id)
 
 
 if __name__ == "__main__":
+    import os
     import threading
     import uvicorn
     import utterance_http
 
-    threading.Thread(
-        target=utterance_http.run_server,
-        kwargs={"port": 5010},
-        daemon=True,
-    ).start()
+    # Un processus par shard (METRICS_SHARDS / METRICS_SHARD_INDEX) : chacun sur son port
+    port = int(os.getenv("METRICS_V5_PORT", "5005"))
+    if METRICS_SHARD_INDEX == 0:
+        threading.Thread(
+            target=utterance_http.run_server,
+            kwargs={"port": 5010},
+            daemon=True,
+        ).start()
 
     print("🚀 Démarrage Poietic Metrics Server V5.1 (O-N-W Architecture + SessionRecorder)")
-    print("   WebSocket: ws://localhost:5005/metrics")
-    print("   Health: http://localhost:5005/health")
-    print("   State: http://localhost:5005/state")
-    print("   O History: http://localhost:5005/o-history")
-    print("   N History: http://localhost:5005/n-history")
-    print("   Session Export: http://localhost:5005/api/session/export")
-    print("   Session Summary: http://localhost:5005/api/session/summary")
-    print("   Session Clear: POST http://localhost:5005/api/session/clear")
-    uvicorn.run(app, host="0.0.0.0", port=5005, log_level="info", access_log=False)
-
+    print(f"   WebSocket: ws://localhost:{port}/metrics (canevas: /metrics/<session>)")
+    print(f"   Health: http://localhost:{port}/health")
+    print(f"   Sessions: http://localhost:{port}/api/sessions")
+    print(f"   State: http://localhost:{port}/state")
+    print(f"   O History: http://localhost:{port}/o-history")
+    print(f"   N History: http://localhost:{port}/n-history")
+    print(f"   Session Export: http://localhost:{port}/api/session/export")
+    print(f"   Session Summary: http://localhost:{port}/api/session/summary")
+    print(f"   Session Clear: POST http://localhost:{port}/api/session/clear")
+    uvicorn.run(app, host="0.0.0.0", port=port, log_level="info", access_log=False)
@@ -12,40 +12,43 @@ Tracks quantum coherence metrics:
 """
 import asyncio
 import json
-import copy
 from datetime import datetime, timezone
 from typing import Dict, List, Optional, Set
-from collections import defaultdict
 import websockets
 from websockets.server import serve
 import threading
 
 import utterance_store
+from agent_ranking import AgentRanking
+from broadcast_hub import BroadcastHub
+from ring_buffer import ColumnRing
+from stream_stats import StreamingStats
 
 # ==============================================================================
 # QUANTUM SIMPLICITY TRACKER
 # ==============================================================================
 
+MAX_ERROR_HISTORY = 500
+MAX_HISTORY = 500
+HISTORY_METRICS = ('C_w', 'C_d', 'U', 'phi_coherence', 'xi_correlation', 'I_visibility',
+                   'tau_condensation', 'delta_S_entropy')
+HISTORY_KEYS = ('timestamps', 'versions') + HISTORY_METRICS
+
+
 class QuantumSimplicityTracker:
     """Tracks quantum metrics for the Q-machine system"""
     
     def __init__(self):
-        # History of metrics
-        self.history = {
-            'timestamps': [],
-            'versions': [],
-            'C_w': [],
-            'C_d': [],
-            'U': [],
-            'phi_coherence': [],
-            'xi_correlation': [],
-            'I_visibility': [],
-            'tau_condensation': [],
-            'delta_S_entropy': []
-        }
+        # History of metrics: one column per metric, O(1) append, last MAX_HISTORY snapshots
+        self.metrics = ColumnRing(MAX_HISTORY, numeric=HISTORY_METRICS, objects=('timestamps', 'versions'))
+        # Whole-session streaming stats per metric (Welford, min/max, EWMA, p50/p90)
+        self.metric_stats = {name: StreamingStats() for name in HISTORY_METRICS}
+        # Prediction errors of the latest snapshot (one pass, non-numeric values skipped)
+        self.last_error_stats = StreamingStats()
         
         # Agent-level tracking
-        self.agent_error_history: Dict[str, List[float]] = defaultdict(list)
+        # Per-agent running error stats over the last MAX_ERROR_HISTORY errors, incremental ranking
+        self.ranking = AgentRanking(window=MAX_ERROR_HISTORY)
         self.agent_quantum_measures: Dict[str, dict] = {}  # {agent_id: {psi, eta, lambda}}
         
         # Session info
@@ -57,76 +60,46 @@ class QuantumSimplicityTracker:
         self.snapshot_count += 1
         timestamp = datetime.now(timezone.utc).isoformat()
         
-        self.history['timestamps'].append(timestamp)
-        self.history['versions'].append(snapshot.get('version', self.snapshot_count))
-        
-        # Simplicity metrics
-        sa = snapshot.get('simplicity_assessment', {})
-        self.history['C_w'].append(sa.get('C_w_current', {}).get('value', 0))
-        self.history['C_d'].append(sa.get('C_d_current', {}).get('value', 0))
-        self.history['U'].append(sa.get('U_current', {}).get('value', 0))
-        
-        # Coherence observables
-        co = snapshot.get('coherence_observables', {})
-        self.history['phi_coherence'].append(co.get('phi_coherence', 0))
-        self.history['xi_correlation'].append(co.get('xi_correlation_length', 0))
-        self.history['I_visibility'].append(co.get('I_fringe_visibility', 0))
-        
-        # Emergence observables
-        eo = snapshot.get('emergence_observables', {})
-        self.history['tau_condensation'].append(eo.get('tau_condensation', 0))
-        self.history['delta_S_entropy'].append(eo.get('delta_S_entropy', 0))
+        sa = snapshot.get('simplicity_assessment', {})  # Simplicity metrics
+        co = snapshot.get('coherence_observables', {})  # Coherence observables
+        eo = snapshot.get('emergence_observables', {})  # Emergence observables
+        row = {
+            'timestamps': timestamp,
+            'versions': snapshot.get('version', self.snapshot_count),
+            'C_w': sa.get('C_w_current', {}).get('value', 0),
+            'C_d': sa.get('C_d_current', {}).get('value', 0),
+            'U': sa.get('U_current', {}).get('value', 0),
+            'phi_coherence': co.get('phi_coherence', 0),
+            'xi_correlation': co.get('xi_correlation_length', 0),
+            'I_visibility': co.get('I_fringe_visibility', 0),
+            'tau_condensation': eo.get('tau_condensation', 0),
+            'delta_S_entropy': eo.get('delta_S_entropy', 0)
+        }
+        self.metrics.append(row)
+        for name, stats in self.metric_stats.items():
+            stats.add(row[name])
         
         # Update agent errors
         prediction_errors = snapshot.get('prediction_errors', {})
-        for agent_id, err_data in prediction_errors.items():
-            if isinstance(err_data, dict) and 'error' in err_data:
-                error = err_data['error']
-                if isinstance(error, (int, float)):
-                    self.agent_error_history[agent_id].append(error)
-        
-        # Limit history length
-        max_history = 500
-        for key in self.history:
-            if len(self.history[key]) > max_history:
-                self.history[key] = self.history[key][-max_history:]
-        
-        for agent_id in list(self.agent_error_history.keys()):
-            if len(self.agent_error_history[agent_id]) > max_history:
-                self.agent_error_history[agent_id] = self.agent_error_history[agent_id][-max_history:]
+        self.ranking.record_errors(prediction_errors, default=None)
+        self.last_error_stats = StreamingStats().extend(
+            e.get('error', 0) for e in prediction_errors.values() if isinstance(e, dict))
     
     def calculate_agent_rankings(self, prediction_errors: dict, agent_positions: dict) -> dict:
         """Calculate agent rankings based on cumulative average error"""
-        # Update error history
-        for agent_id, err_data in prediction_errors.items():
-            if isinstance(err_data, dict) and 'error' in err_data:
-                error = err_data['error']
-                if isinstance(error, (int, float)):
-                    self.agent_error_history[agent_id].append(error)
-        
-        # Calculate average errors
-        avg_errors = {}
-        for agent_id in agent_positions.keys():
-            errors = self.agent_error_history.get(agent_id, [])
-            if errors:
-                avg_errors[agent_id] = sum(errors) / len(errors)
-            else:
-                avg_errors[agent_id] = 1.0  # Default high error
-        
-        # Sort by error (lower = better rank)
-        sorted_agents = sorted(avg_errors.items(), key=lambda x: x[1])
-        
-        # Build rankings
-        rankings = {}
-        for rank, (agent_id, avg_error) in enumerate(sorted_agents, 1):
-            rankings[agent_id] = {
-                'rank': rank,
-                'avg_error': avg_error,
-                'total_iterations': len(self.agent_error_history.get(agent_id, [])),
-                'position': agent_positions.get(agent_id, [0, 0])
-            }
-        
-        return rankings
+        # Update error history (O(1) per error, O(log n) per rank update)
+        self.ranking.record_errors(prediction_errors, default=None)
+        # Agents without errors get a default high error
+        return self.ranking.rankings(agent_positions, default_error=1.0)
+    
+    def error_history(self) -> Dict[str, List[float]]:
+        """Recent errors per agent (export format)"""
+        return {agent_id: self.ranking.errors(agent_id) for agent_id in self.ranking.agents()}
+    
+    @property
+    def history(self) -> Dict[str, list]:
+        """History as parallel lists (client format)"""
+        return self.metrics.as_lists(HISTORY_KEYS)
     
     def get_state(self) -> dict:
         """Get current tracker state for clients"""
@@ -134,21 +107,23 @@ class QuantumSimplicityTracker:
             'session_start': self.session_start.isoformat(),
             'snapshot_count': self.snapshot_count,
             'history': self.history,
-            'agent_count': len(self.agent_error_history),
+            'agent_count': len(self.ranking),
             'latest_metrics': {
-                'C_w': self.history['C_w'][-1] if self.history['C_w'] else 0,
-                'C_d': self.history['C_d'][-1] if self.history['C_d'] else 0,
-                'U': self.history['U'][-1] if self.history['U'] else 0,
-                'phi_coherence': self.history['phi_coherence'][-1] if self.history['phi_coherence'] else 0,
-                'tau_condensation': self.history['tau_condensation'][-1] if self.history['tau_condensation'] else 0
-            }
+                key: self.metrics.last_value(key, 0)
+                for key in ('C_w', 'C_d', 'U', 'phi_coherence', 'tau_condensation')
+            },
+            # Vectorized aggregates over the stored history (mean, std, min, max)
+            'aggregates': self.metrics.summary(),
+            # Whole-session streaming stats (EWMA, p50/p90)
+            'streaming': {name: stats.to_dict() for name, stats in self.metric_stats.items()}
         }
     
     def reset(self):
         """Reset all tracking data"""
-        for key in self.history:
-            self.history[key] = []
-        self.agent_error_history.clear()
+        self.metrics.clear()
+        self.metric_stats = {name: StreamingStats() for name in HISTORY_METRICS}
+        self.last_error_stats = StreamingStats()
+        self.ranking.clear()
         self.agent_quantum_measures.clear()
         self.session_start = datetime.now(timezone.utc)
         self.snapshot_count = 0
@@ -231,12 +206,13 @@ class SessionRecorder:
             if len(self.following_relations) > 2000:
                 self.following_relations = self.following_relations[-2000:]
         
-        self.last_agent_data[agent_id] = copy.deepcopy(agent_data)
+        # Never mutated after creation: shared by reference with events and broadcasts
+        self.last_agent_data[agent_id] = agent_data
         
         self.events.append({
             "type": "agent",
             "timestamp": agent_data["timestamp"],
-            "data": copy.deepcopy(agent_data)
+            "data": agent_data
         })
         
         # Limit events history
@@ -252,24 +228,18 @@ session_recorder = SessionRecorder()
 # WEBSOCKET SERVER
 # ==============================================================================
 
-connected_clients: Set[websockets.WebSocketServerProtocol] = set()
+# One encode per message, bounded per-client send queues (see broadcast_hub)
+hub = BroadcastHub("Q-Metrics")
+hub_clients: Dict[websockets.WebSocketServerProtocol, object] = {}
 
-async def broadcast(message: dict):
-    """Broadcast message to all connected clients"""
-    if not connected_clients:
-        return
-    
-    msg_json = json.dumps(message)
-    disconnected = set()
-    
-    for client in connected_clients:
-        try:
-            await client.send(msg_json)
-        except:
-            disconnected.add(client)
-    
-    for client in disconnected:
-        connected_clients.discard(client)
+def broadcast(message: dict, coalesce_key: Optional[str] = None):
+    """Broadcast message to all connected clients (non-blocking)"""
+    hub.broadcast(message, coalesce_key)
+
+
+def reply(websocket: websockets.WebSocketServerProtocol, message: dict):
+    """Send to one client, ordered with broadcasts"""
+    hub.send(hub_clients.get(websocket), message)
 
 
 async def handle_message(websocket: websockets.WebSocketServerProtocol, message: str):
@@ -290,7 +260,6 @@ async def handle_message(websocket: websockets.WebSocketServerProtocol, message:
                 utterance_store.record_n_from_snapshot(snapshot)
             
             # Extract data for V5-compatible events
-            prediction_errors = snapshot.get('prediction_errors', {})
             agent_rankings = snapshot.get('agent_rankings', {})
             sa = snapshot.get('simplicity_assessment', {})
             
@@ -299,17 +268,8 @@ async def handle_message(websocket: websockets.WebSocketServerProtocol, message:
             C_d = sa.get('C_d_current', {}).get('value', 0)
             U = sa.get('U_current', {}).get('value', 0)
             
-            # Calculate mean/std errors
-            error_values = [
-                e.get('error', 0) 
-                for e in prediction_errors.values() 
-                if isinstance(e, dict) and isinstance(e.get('error', 0), (int, float))
-            ]
-            mean_error = sum(error_values) / len(error_values) if error_values else 0.0
-            std_error = 0.0
-            if len(error_values) > 1:
-                variance = sum([(e - mean_error) ** 2 for e in error_values]) / len(error_values)
-                std_error = variance ** 0.5
+            # Mean/std/percentiles of errors (computed once by add_quantum_snapshot)
+            error_stats = tracker.last_error_stats
             
             # Build agent data from rankings
             agents_data = []
@@ -323,15 +283,23 @@ async def handle_message(websocket: websockets.WebSocketServerProtocol, message:
                     'timestamp': datetime.now(timezone.utc).isoformat()
                 })
             
+            rank_changes = tracker.ranking.rank_changes(agent_rankings)
+            if rank_changes:
+                broadcast({
+                    'type': 'rank_changes',
+                    'version': version,
+                    'changes': rank_changes
+                })
+            
             # Broadcast quantum snapshot
-            await broadcast({
+            broadcast({
                 'type': 'quantum_snapshot',
                 'snapshot': snapshot,
                 'state': tracker.get_state()
-            })
+            }, coalesce_key='quantum_snapshot')
             
             # Also broadcast V5-compatible iteration event for popups compatibility
-            await broadcast({
+            broadcast({
                 'type': 'session_iteration_event',
                 'data': {
                     'version': version,
@@ -339,8 +307,10 @@ async def handle_message(websocket: websockets.WebSocketServerProtocol, message:
                         'C_w': C_w,
                         'C_d': C_d,
                         'U': U,
-                        'mean_error': mean_error,
-                        'std_error': std_error
+                        'mean_error': error_stats.mean,
+                        'std_error': error_stats.std,
+                        'p50_error': error_stats.quantile(0.5),
+                        'p90_error': error_stats.quantile(0.9)
                     },
                     'rankings': agent_rankings,
                     'agents': agents_data,
@@ -359,23 +329,23 @@ async def handle_message(websocket: websockets.WebSocketServerProtocol, message:
             })
         
         elif msg_type == 'get_state':
-            await websocket.send(json.dumps({
+            reply(websocket, {
                 'type': 'state',
                 'state': tracker.get_state()
-            }))
+            })
         
         elif msg_type == 'reset':
             tracker.reset()
-            await broadcast({
+            broadcast({
                 'type': 'reset',
                 'state': tracker.get_state()
             })
         
         elif msg_type == 'get_history':
-            await websocket.send(json.dumps({
+            reply(websocket, {
                 'type': 'history',
                 'history': tracker.history
-            }))
+            })
         
         elif msg_type == 'get_session_export':
             # Build complete export from server-side data
@@ -385,14 +355,14 @@ async def handle_message(websocket: websockets.WebSocketServerProtocol, message:
                 'metadata': {
                     'export_time': datetime.now(timezone.utc).isoformat(),
                     'total_iterations': tracker.snapshot_count,
-                    'agents_count': len(tracker.agent_error_history),
+                    'agents_count': len(tracker.ranking),
                     'quantum_snapshots_count': tracker.snapshot_count,
                     'session_start': tracker.session_start.isoformat()
                 },
                 # Server-side tracker data
                 'tracker_state': tracker.get_state(),
                 'tracker_history': tracker.history,
-                'agent_error_history': dict(tracker.agent_error_history),
+                'agent_error_history': tracker.error_history(),
                 'agent_quantum_measures': tracker.agent_quantum_measures,
                 # Session recorder data
                 'events': session_recorder.events,
@@ -400,10 +370,10 @@ async def handle_message(websocket: websockets.WebSocketServerProtocol, message:
                 'following_relations': session_recorder.following_relations
             }
             
-            await websocket.send(json.dumps({
+            reply(websocket, {
                 'type': 'session_export',
                 'data': export_data
-            }))
+            })
         
         elif msg_type == 'agent_update':
             # Handle agent update from W-machines (like V5)
@@ -427,28 +397,13 @@ async def handle_message(websocket: websockets.WebSocketServerProtocol, message:
             
             # Update agent error history
             if prediction_error is not None and isinstance(prediction_error, (int, float)):
-                if iteration <= 1 and user_id in tracker.agent_error_history:
+                if iteration <= 1 and user_id in tracker.ranking:
                     # Reset if agent restarts
-                    tracker.agent_error_history[user_id] = []
-                tracker.agent_error_history[user_id].append(prediction_error)
-            
-            # Calculate current rank
-            agent_stats = {}
-            for aid, error_history in tracker.agent_error_history.items():
-                if len(error_history) == 0:
-                    continue
-                errors = [e for e in error_history if isinstance(e, (int, float))]
-                if len(errors) == 0:
-                    continue
-                avg_error = sum(errors) / len(errors)
-                agent_stats[aid] = avg_error
+                    tracker.ranking.reset(user_id)
+                tracker.ranking.record(user_id, prediction_error)
             
-            sorted_agents = sorted(agent_stats.items(), key=lambda x: x[1])
-            current_rank = 999
-            for rank, (aid, _) in enumerate(sorted_agents, start=1):
-                if aid == user_id:
-                    current_rank = rank
-                    break
+            # Current rank (incremental index, O(log n))
+            current_rank = tracker.ranking.rank(user_id)
             
             # Record agent action
             agent_data = session_recorder.record_agent_action(
@@ -475,7 +430,7 @@ async def handle_message(websocket: websockets.WebSocketServerProtocol, message:
                 utterance_store.record_w_from_agent(agent_data)
             
             # Broadcast agent event to all clients
-            await broadcast({
+            broadcast({
                 'type': 'session_agent_event',
                 'data': agent_data
             })
@@ -488,16 +443,16 @@ async def handle_message(websocket: websockets.WebSocketServerProtocol, message:
 
 async def handler(websocket: websockets.WebSocketServerProtocol, path: str = None):
     """Handle WebSocket connection"""
-    connected_clients.add(websocket)
     client_id = id(websocket)
-    print(f"[Q-Metrics] Client {client_id} connected ({len(connected_clients)} total)")
+    hub_clients[websocket] = hub.add_websocket(websocket, name=str(client_id))
+    print(f"[Q-Metrics] Client {client_id} connected ({len(hub)} total)")
     
     try:
         # Send current state on connect
-        await websocket.send(json.dumps({
+        reply(websocket, {
             'type': 'state',
             'state': tracker.get_state()
-        }))
+        })
         
         async for message in websocket:
             await handle_message(websocket, message)
@@ -505,8 +460,8 @@ async def handler(websocket: websockets.WebSocketServerProtocol, path: str = Non
     except websockets.exceptions.ConnectionClosed:
         pass
     finally:
-        connected_clients.discard(websocket)
-        print(f"[Q-Metrics] Client {client_id} disconnected ({len(connected_clients)} remaining)")
+        hub.remove(hub_clients.pop(websocket, None))
+        print(f"[Q-Metrics] Client {client_id} disconnected ({len(hub)} remaining)")
 
 
 def _start_utterance_http():
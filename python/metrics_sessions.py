@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""Sessions de metriques multiples dans un meme processus (serveur de metriques V5).
+
+Chaque canevas a sa session (tracker, SessionRecorder, hub de diffusion),
+identifiee par un id choisi par les clients :
+
+- routage : chemin WebSocket `/metrics/{session}` (ou `?session=`), ou premier
+  message `{"type": "join_session", "session_id": ...}` ; `/metrics` seul reste
+  la session par defaut (un seul canevas, comme avant) ;
+- les sessions sans client et inactives depuis METRICS_SESSION_IDLE_TIMEOUT
+  secondes sont fermees ; au-dela de METRICS_MAX_SESSIONS, la moins recemment
+  active sans client est fermee ;
+- repartition sur plusieurs processus : METRICS_SHARDS liste les URL de base
+  des processus (`http://hote:5005,http://hote:5015`), METRICS_SHARD_INDEX est
+  l'indice de celui-ci. Une session appartient au processus
+  `crc32(id) % nombre` ; les autres redirigent vers lui. La session par defaut
+  reste locale a chaque processus.
+
+Cote producteurs (serveur IA V5, clients JS) : `metrics_ws_url` donne l'URL de
+la session d'un canevas, `redirect_url` celle annoncee par un processus non
+proprietaire avant sa fermeture (code 4307).
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import re
+import time
+import zlib
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+METRICS_SESSION_IDLE_TIMEOUT = float(os.getenv("METRICS_SESSION_IDLE_TIMEOUT", "1800"))
+METRICS_MAX_SESSIONS = int(os.getenv("METRICS_MAX_SESSIONS", "32"))
+METRICS_SHARDS = [url.strip().rstrip("/") for url in os.getenv("METRICS_SHARDS", "").split(",") if url.strip()]
+METRICS_SHARD_INDEX = int(os.getenv("METRICS_SHARD_INDEX", "0"))
+
+DEFAULT_SESSION = "default"
+_SESSION_ID = re.compile(r"^[A-Za-z0-9_.:-]{1,64}$")
+
+
+def valid_session_id(session_id) -> bool:
+    return isinstance(session_id, str) and bool(_SESSION_ID.match(session_id))
+
+
+def shard_for(session_id: str, shard_count: Optional[int] = None) -> int:
+    """Indice du processus proprietaire (hachage stable entre processus et redemarrages)."""
+    count = len(METRICS_SHARDS) if shard_count is None else shard_count
+    if count <= 1 or session_id == DEFAULT_SESSION:
+        return METRICS_SHARD_INDEX if count > 1 else 0
+    return zlib.crc32(session_id.encode("utf-8")) % count
+
+
+def owner_url(session_id: str) -> Optional[str]:
+    """URL de base du processus proprietaire, None si c'est celui-ci."""
+    if len(METRICS_SHARDS) <= 1:
+        return None
+    shard = shard_for(session_id)
+    return None if shard == METRICS_SHARD_INDEX else METRICS_SHARDS[shard]
+
+
+def metrics_ws_url(base: str, session_id: Optional[str] = None) -> str:
+    """URL WebSocket d'une session (`/metrics` seul pour la session par defaut)."""
+    base = base.rstrip("/")
+    if not session_id or session_id == DEFAULT_SESSION:
+        return f"{base}/metrics"
+    if not valid_session_id(session_id):
+        raise ValueError(f"Invalid session id: {session_id!r}")
+    return f"{base}/metrics/{session_id}"
+
+
+def redirect_url(message) -> Optional[str]:
+    """URL annoncee par un message `session_redirect` (suivi de la fermeture 4307), None sinon."""
+    if isinstance(message, (str, bytes)):
+        try:
+            message = json.loads(message)
+        except ValueError:
+            return None
+    if isinstance(message, dict) and message.get("type") == "session_redirect":
+        return message.get("url") or None
+    return None
+
+
+class SessionRegistry:
+    """Sessions ouvertes a la demande, fermees apres inactivite.
+
+    `factory(session_id)` cree une session ; elle doit exposer `busy()` (des
+    clients sont connectes) et `close()`. La session par defaut n'est jamais
+    fermee.
+    """
+
+    def __init__(self, factory: Callable[[str], object], *, name: str = "Sessions",
+                 idle_timeout: Optional[float] = None, max_sessions: Optional[int] = None) -> None:
+        self.factory = factory
+        self.name = name
+        self.idle_timeout = METRICS_SESSION_IDLE_TIMEOUT if idle_timeout is None else idle_timeout
+        self.max_sessions = max_sessions or METRICS_MAX_SESSIONS
+        self._sessions: "OrderedDict[str, object]" = OrderedDict()  # du moins au plus recemment actif
+        self._last_active: Dict[str, float] = {}
+        self.created = 0
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
+    def ids(self) -> List[str]:
+        return list(self._sessions)
+
+    def get(self, session_id: str):
+        return self._sessions.get(session_id)
+
+    def touch(self, session_id: str) -> None:
+        if session_id in self._sessions:
+            self._sessions.move_to_end(session_id)
+            self._last_active[session_id] = time.monotonic()
+
+    def open(self, session_id: str):
+        """Session existante, ou nouvelle (en fermant la plus ancienne inactive si plein)."""
+        session = self._sessions.get(session_id)
+        if session is None:
+            if len(self._sessions) >= self.max_sessions:
+                self._evict_one()
+            session = self._sessions[session_id] = self.factory(session_id)
+            self.created += 1
+            print(f"[{self.name}] Session ouverte: {session_id} ({len(self._sessions)} actives)")
+        self.touch(session_id)
+        return session
+
+    def _evict_one(self) -> None:
+        for session_id, session in self._sessions.items():
+            if session_id != DEFAULT_SESSION and not session.busy():
+                self.close(session_id)
+                return
+        print(f"[{self.name}] ⚠️  {len(self._sessions)} sessions toutes occupées (max {self.max_sessions})")
+
+    def close(self, session_id: str) -> None:
+        session = self._sessions.pop(session_id, None)
+        self._last_active.pop(session_id, None)
+        if session is not None:
+            session.close()
+            self.evicted += 1
+            print(f"[{self.name}] Session fermée: {session_id}")
+
+    def evict_idle(self, now: Optional[float] = None) -> List[str]:
+        """Ferme les sessions sans client inactives depuis `idle_timeout`."""
+        now = time.monotonic() if now is None else now
+        idle = [
+            session_id for session_id, session in self._sessions.items()
+            if session_id != DEFAULT_SESSION and not session.busy()
+            and now - self._last_active.get(session_id, now) >= self.idle_timeout
+        ]
+        for session_id in idle:
+            self.close(session_id)
+        return idle
+
+    async def run_evictor(self, interval: Optional[float] = None) -> None:
+        interval = interval or max(1.0, min(60.0, self.idle_timeout / 4))
+        while True:
+            await asyncio.sleep(interval)
+            self.evict_idle()
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "sessions": len(self._sessions),
+            "created": self.created,
+            "evicted": self.evicted,
+            "idle_timeout": self.idle_timeout,
+            "max_sessions": self.max_sessions,
+            "shard": METRICS_SHARD_INDEX,
+            "shards": len(METRICS_SHARDS) or 1,
+            "idle_seconds": {sid: round(now - t, 1) for sid, t in self._last_active.items()},
+        }
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""Cache adresse par contenu des analyses O (V5).
+
+Cle = empreinte canonique du canevas (pixels RGB decodes, independante de
+l'encodage PNG) + empreinte du prompt final (version du template, nombre
+d'agents et positions injectes) + modele. Un canevas inchange ou quasi
+statique reutilise le dernier resultat O au lieu d'un nouvel appel
+multimodal.
+
+- LRU borne en nombre d'entrees et en octets, avec TTL.
+- Persistance disque optionnelle (O_CACHE_DIR) : un fichier JSON par cle.
+- `O_CACHE_QUANT_BITS` < 8 rend l'empreinte tolerante aux petites variations
+  de couleur (bits de poids faible ignores).
+"""
+from __future__ import annotations
+
+import base64
+import binascii
+import hashlib
+import io
+import json
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+O_CACHE_MAX_ENTRIES = int(os.getenv("O_CACHE_MAX_ENTRIES", "64"))
+O_CACHE_MAX_BYTES = int(os.getenv("O_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+O_CACHE_TTL = float(os.getenv("O_CACHE_TTL", "900"))
+O_CACHE_DIR = os.getenv("O_CACHE_DIR", "")
+O_CACHE_QUANT_BITS = int(os.getenv("O_CACHE_QUANT_BITS", "8"))
+
+
+def _strip_data_url(image_base64: str) -> str:
+    if image_base64.startswith("data:"):
+        return image_base64.split(",", 1)[-1]
+    return image_base64
+
+
+def canvas_hash(image_base64: str, quant_bits: int = 8) -> str:
+    """Empreinte canonique d'un canevas PNG base64 (pixels RGB + dimensions).
+
+    Sans Pillow, ou si l'image ne se decode pas, retombe sur le hash des octets.
+    """
+    raw = b""
+    try:
+        raw = base64.b64decode(_strip_data_url(image_base64 or ""))
+    except (binascii.Error, ValueError):
+        raw = (image_base64 or "").encode()
+    return canvas_hash_bytes(raw, quant_bits)
+
+
+def canvas_hash_bytes(raw: bytes, quant_bits: int = 8) -> str:
+    """Comme `canvas_hash`, a partir des octets PNG deja decodes."""
+    if PIL_AVAILABLE and raw:
+        try:
+            with Image.open(io.BytesIO(raw)) as img:
+                rgb = img.convert("RGB")
+                pixels = rgb.tobytes()
+                if quant_bits < 8:
+                    shift = 8 - max(1, quant_bits)
+                    pixels = pixels.translate(bytes(v >> shift for v in range(256)))
+                h = hashlib.sha256(f"{rgb.width}x{rgb.height}|".encode())
+                h.update(pixels)
+                return "px:" + h.hexdigest()
+        except Exception:
+            pass
+    return "raw:" + hashlib.sha256(raw).hexdigest()
+
+
+class OResultCache:
+    """LRU + TTL des resultats O, borne en entrees et en octets."""
+
+    def __init__(
+        self,
+        *,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        ttl: Optional[float] = None,
+        persist_dir: Optional[str] = None,
+        quant_bits: Optional[int] = None,
+    ) -> None:
+        self.max_entries = max(1, max_entries or O_CACHE_MAX_ENTRIES)
+        self.max_bytes = max_bytes or O_CACHE_MAX_BYTES
+        self.ttl = O_CACHE_TTL if ttl is None else ttl
+        self.quant_bits = O_CACHE_QUANT_BITS if quant_bits is None else quant_bits
+        persist = O_CACHE_DIR if persist_dir is None else persist_dir
+        self.persist_dir: Optional[Path] = Path(persist) if persist else None
+        # {key: (created_at wall-clock, json_text, tokens)}
+        self._entries: "OrderedDict[str, Tuple[float, str, Optional[int]]]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if self.persist_dir:
+            self.persist_dir.mkdir(parents=True, exist_ok=True)
+
+    # ------------------------------------------------------------------ cles
+
+    def make_key(self, image_base64: str, prompt: str, model: str) -> str:
+        h = hashlib.sha256()
+        h.update(canvas_hash(image_base64, self.quant_bits).encode())
+        h.update(b"|")
+        h.update(hashlib.sha256((prompt or "").encode()).digest())
+        h.update(b"|")
+        h.update((model or "").encode())
+        return h.hexdigest()
+
+    # ------------------------------------------------------------------ acces
+
+    def _expired(self, created_at: float) -> bool:
+        return bool(self.ttl) and (time.time() - created_at) > self.ttl
+
+    def get(self, key: str) -> Optional[Tuple[dict, Optional[int]]]:
+        """Retourne (resultat O, tokens) — copie fraiche, l'appelant peut la modifier."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            created_at, text, tokens = entry
+            if self._expired(created_at):
+                self._remove(key)
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return json.loads(text), tokens
+        disk = self._load(key)
+        if disk is not None:
+            created_at, text, tokens = disk
+            self._insert(key, created_at, text, tokens)
+            self.hits += 1
+            self.disk_hits += 1
+            return json.loads(text), tokens
+        self.misses += 1
+        return None
+
+    def put(self, key: str, result: dict, tokens: Optional[int] = None) -> None:
+        try:
+            text = json.dumps(result, ensure_ascii=False)
+        except (TypeError, ValueError):
+            return
+        created_at = time.time()
+        self._insert(key, created_at, text, tokens)
+        self._store(key, created_at, text, tokens)
+
+    def discard(self, key: str) -> None:
+        """Retire une entree (memoire et disque) : resultat refuse par l'appelant."""
+        self._remove(key)
+        path = self._path(key)
+        if path is not None:
+            try:
+                path.unlink(missing_ok=True)
+            except OSError:
+                pass
+
+    def _insert(self, key: str, created_at: float, text: str, tokens: Optional[int]) -> None:
+        if key in self._entries:
+            self._remove(key)
+        size = len(text.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (created_at, text, tokens)
+        self.bytes += size
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            old_key = next(iter(self._entries))
+            self._remove(old_key)
+            self.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= len(entry[1].encode("utf-8"))
+
+    # ------------------------------------------------------------------ disque
+
+    def _path(self, key: str) -> Optional[Path]:
+        return self.persist_dir / f"{key}.json" if self.persist_dir else None
+
+    def _load(self, key: str) -> Optional[Tuple[float, str, Optional[int]]]:
+        path = self._path(key)
+        if path is None or not path.exists():
+            return None
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            created_at = float(data["created_at"])
+            if self._expired(created_at):
+                path.unlink(missing_ok=True)
+                return None
+            return created_at, json.dumps(data["result"], ensure_ascii=False), data.get("tokens")
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _store(self, key: str, created_at: float, text: str, tokens: Optional[int]) -> None:
+        path = self._path(key)
+        if path is None:
+            return
+        try:
+            payload = '{"created_at": %r, "tokens": %s, "result": %s}' % (
+                created_at, json.dumps(tokens), text)
+            tmp = path.with_suffix(".tmp")
+            tmp.write_text(payload, encoding="utf-8")
+            tmp.replace(path)
+            self._prune_disk()
+        except OSError as e:
+            print(f"[O-cache] ⚠️  Écriture disque impossible: {e}")
+
+    def _prune_disk(self) -> None:
+        files = sorted(self.persist_dir.glob("*.json"), key=lambda p: p.stat().st_mtime)
+        for p in files[: max(0, len(files) - self.max_entries)]:
+            p.unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_s": self.ttl,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "persist_dir": str(self.persist_dir) if self.persist_dir else None,
+        }
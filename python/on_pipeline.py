@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""Pipeline O→N par etages (V5).
+
+Le tour k+1 peut lancer son observation O sur une image fraiche pendant que
+la narration N du tour k est encore en cours :
+
+    declencheur → etage O (inline) → file bornee → etage N (tache dediee) → store
+
+- Chaque tour recoit un numero croissant au moment du declenchement (version
+  de l'image observee) ; le store refuse un snapshot plus ancien que le
+  dernier publie, donc `set_snapshot` reste monotone.
+- La file entre O et N est bornee : si elle est pleine, le tour le plus
+  ancien est supersede (annule) au profit du plus recent. Un tour dont la
+  narration N a deja demarre n'est pas annule : il va au bout (sinon, sous
+  charge continue, aucune narration ne serait jamais publiee).
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from typing import Optional
+
+ON_PIPELINE_QUEUE = int(os.getenv("ON_PIPELINE_QUEUE", "1"))
+
+
+class AnalysisRound:
+    """Un tour d'analyse O→N (resultat O transmis a l'etage N)."""
+
+    __slots__ = ("round_id", "created_at", "agents_count", "o_result", "o_tokens", "cancelled")
+
+    def __init__(self, round_id: int, agents_count: int = 0) -> None:
+        self.round_id = round_id
+        self.created_at = time.monotonic()
+        self.agents_count = agents_count
+        self.o_result: Optional[dict] = None
+        self.o_tokens: Optional[dict] = None
+        self.cancelled = False
+
+
+class StagePipeline:
+    """Numerotation des tours + file bornee O→N avec remplacement des tours supersedes."""
+
+    def __init__(self, maxsize: Optional[int] = None) -> None:
+        self.maxsize = max(1, maxsize or ON_PIPELINE_QUEUE)
+        self._queue: Optional[asyncio.Queue] = None
+        self._next_round = 0
+        self.superseded_count = 0
+        self.stale_count = 0
+        self.in_progress: Optional[AnalysisRound] = None
+
+    def _q(self) -> asyncio.Queue:
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.maxsize)
+        return self._queue
+
+    def new_round(self, agents_count: int = 0) -> AnalysisRound:
+        self._next_round += 1
+        return AnalysisRound(self._next_round, agents_count)
+
+    def submit(self, rnd: AnalysisRound) -> Optional[AnalysisRound]:
+        """Place le tour dans la file O→N. Retourne le tour supersede s'il y en a un."""
+        q = self._q()
+        dropped = None
+        if q.full():
+            dropped = q.get_nowait()
+            q.task_done()
+            dropped.cancelled = True
+            self.superseded_count += 1
+        q.put_nowait(rnd)
+        return dropped
+
+    async def next(self) -> AnalysisRound:
+        """Prochain tour non annule pour l'etage N."""
+        q = self._q()
+        while True:
+            rnd = await q.get()
+            q.task_done()
+            if not rnd.cancelled:
+                self.in_progress = rnd
+                return rnd
+
+    def done(self, rnd: AnalysisRound, published: bool) -> None:
+        if not published:
+            self.stale_count += 1
+        if self.in_progress is rnd:
+            self.in_progress = None
+
+    def stats(self) -> dict:
+        return {
+            "rounds_started": self._next_round,
+            "queued": self._q().qsize() if self._queue is not None else 0,
+            "n_in_progress": self.in_progress.round_id if self.in_progress else None,
+            "superseded_count": self.superseded_count,
+            "stale_count": self.stale_count,
+        }
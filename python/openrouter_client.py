@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""Pool de connexions HTTP partage pour les appels OpenRouter (V4or/V5/V6).
+
+Un seul `httpx.AsyncClient` longue duree par processus serveur, cree dans le
+`lifespan` FastAPI et ferme a l'arret. Evite un handshake TCP+TLS par appel
+O, N ou W (les proxys W representent 25+ appels concurrents par tour).
+
+Points cles :
+- HTTP/2 si le paquet `h2` est installe (httpx[http2]), sinon HTTP/1.1.
+- Limites du pool et keep-alive configurables par variables d'environnement.
+- Timeouts par route ("o", "n", "w", "credits"), surchargeables par requete.
+"""
+from __future__ import annotations
+
+import importlib.util
+import os
+from typing import Optional
+
+import httpx
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except (TypeError, ValueError):
+        return default
+
+
+OPENROUTER_HTTP2 = os.getenv("OPENROUTER_HTTP2", "true").lower() in ("1", "true", "yes")
+OPENROUTER_POOL_MAX_CONNECTIONS = _env_int("OPENROUTER_POOL_MAX_CONNECTIONS", 100)
+OPENROUTER_POOL_MAX_KEEPALIVE = _env_int("OPENROUTER_POOL_MAX_KEEPALIVE", 40)
+OPENROUTER_KEEPALIVE_EXPIRY = _env_float("OPENROUTER_KEEPALIVE_EXPIRY", 60.0)
+OPENROUTER_CONNECT_TIMEOUT = _env_float("OPENROUTER_CONNECT_TIMEOUT", 30.0)
+
+# Timeout de lecture par route (secondes). W = 420s comme le timeout client Gemini.
+DEFAULT_ROUTE_TIMEOUTS = {
+    "o": _env_float("OPENROUTER_TIMEOUT_O", 120.0),
+    "n": _env_float("OPENROUTER_TIMEOUT_N", 120.0),
+    "w": _env_float("OPENROUTER_TIMEOUT_W", 420.0),
+    "credits": _env_float("OPENROUTER_TIMEOUT_CREDITS", 20.0),
+}
+DEFAULT_TIMEOUT = 180.0
+
+
+def http2_available() -> bool:
+    """True si le support HTTP/2 de httpx (paquet `h2`) est installe."""
+    return importlib.util.find_spec("h2") is not None
+
+
+class OpenRouterPool:
+    """Client httpx partage (pool de connexions) avec timeouts par route."""
+
+    def __init__(
+        self,
+        *,
+        http2: Optional[bool] = None,
+        max_connections: Optional[int] = None,
+        max_keepalive_connections: Optional[int] = None,
+        keepalive_expiry: Optional[float] = None,
+        connect_timeout: Optional[float] = None,
+        route_timeouts: Optional[dict] = None,
+    ) -> None:
+        want_http2 = OPENROUTER_HTTP2 if http2 is None else http2
+        self.http2 = bool(want_http2 and http2_available())
+        self.limits = httpx.Limits(
+            max_connections=max_connections or OPENROUTER_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=max_keepalive_connections or OPENROUTER_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=keepalive_expiry if keepalive_expiry is not None else OPENROUTER_KEEPALIVE_EXPIRY,
+        )
+        self.connect_timeout = connect_timeout if connect_timeout is not None else OPENROUTER_CONNECT_TIMEOUT
+        self.route_timeouts = {**DEFAULT_ROUTE_TIMEOUTS, **(route_timeouts or {})}
+        self._client: Optional[httpx.AsyncClient] = None
+        self.requests_count = 0
+
+    # ------------------------------------------------------------------ cycle de vie
+
+    async def start(self) -> httpx.AsyncClient:
+        """Cree le client partage (idempotent). Appele dans le lifespan."""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                http2=self.http2,
+                limits=self.limits,
+                timeout=httpx.Timeout(DEFAULT_TIMEOUT, connect=self.connect_timeout),
+            )
+            print(
+                f"[Pool] Client OpenRouter partage cree (http2={self.http2}, "
+                f"max_connections={self.limits.max_connections}, "
+                f"keepalive={self.limits.max_keepalive_connections}/{self.limits.keepalive_expiry}s)"
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        """Ferme le pool (arret du serveur)."""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+            print("[Pool] Client OpenRouter partage ferme")
+        self._client = None
+
+    @property
+    def is_started(self) -> bool:
+        return self._client is not None and not self._client.is_closed
+
+    # ------------------------------------------------------------------ requetes
+
+    def timeout_for(self, route: Optional[str]) -> httpx.Timeout:
+        read = self.route_timeouts.get(route or "", DEFAULT_TIMEOUT)
+        connect = min(self.connect_timeout, read)
+        return httpx.Timeout(read, connect=connect)
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        *,
+        route: Optional[str] = None,
+        timeout: Optional[httpx.Timeout] = None,
+        **kwargs,
+    ) -> httpx.Response:
+        """Requete via le pool. Demarre le client a la demande (hors lifespan, ex. tests)."""
+        client = await self.start()
+        self.requests_count += 1
+        return await client.request(method, url, timeout=timeout or self.timeout_for(route), **kwargs)
+
+    async def post(self, url: str, *, route: Optional[str] = None, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, route=route, **kwargs)
+
+    async def get(self, url: str, *, route: Optional[str] = None, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, route=route, **kwargs)
+
+    def stats(self) -> dict:
+        return {
+            "started": self.is_started,
+            "http2": self.http2,
+            "max_connections": self.limits.max_connections,
+            "max_keepalive_connections": self.limits.max_keepalive_connections,
+            "keepalive_expiry": self.limits.keepalive_expiry,
+            "route_timeouts": dict(self.route_timeouts),
+            "requests_count": self.requests_count,
+        }
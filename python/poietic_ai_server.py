@@ -21,8 +21,12 @@ import httpx
 import time
 from PIL import Image
 import io
+import numpy as np
 import base64
 
+from broadcast_hub import BroadcastHub
+from canvas_model import GRID_PIXELS, parse_pixel_strings, upscale
+
 app = FastAPI(title="Poietic AI Server", version="2.0.0")
 
 # Statistiques de performance Ollama (garder les 100 dernières requêtes)
@@ -64,7 +68,8 @@ class AnalyticsData(BaseModel):
 # === Stockage en mémoire ===
 
 agents_data: Dict[str, Dict[str, Any]] = {}
-connected_dashboards: List[WebSocket] = []
+# Dashboards connectés : file d'envoi bornée par client, JSON encodé une fois
+dashboard_hub = BroadcastHub("Analytics")
 
 # Limite de l'historique par agent (éviter la saturation mémoire)
 MAX_HISTORY_PER_AGENT = 100
@@ -74,19 +79,9 @@ MAX_HISTORY_PER_AGENT = 100
 def get_timestamp():
     return datetime.now(timezone.utc).isoformat()
 
-async def broadcast_to_dashboards(message: dict):
-    """Diffuse un message à tous les dashboards connectés"""
-    disconnected = []
-    for ws in connected_dashboards:
-        try:
-            await ws.send_json(message)
-        except:
-            disconnected.append(ws)
-    
-    # Nettoyer les connexions mortes
-    for ws in disconnected:
-        if ws in connected_dashboards:
-            connected_dashboards.remove(ws)
+def broadcast_to_dashboards(message: dict):
+    """Diffuse un message à tous les dashboards connectés (sans attendre les clients lents)"""
+    dashboard_hub.broadcast(message)
 
 # === Endpoints REST ===
 
@@ -204,7 +199,7 @@ async def receive_hypothesis(data: AnalyticsData):
         agents_data[agent_id]["iterations"] = agents_data[agent_id]["iterations"][-MAX_HISTORY_PER_AGENT:]
     
     # Diffuser aux dashboards
-    await broadcast_to_dashboards({
+    broadcast_to_dashboards({
         "type": "new_iteration",
         "agent_id": agent_id,
         "data": iteration_data
@@ -311,7 +306,7 @@ async def reset_data():
     """Réinitialiser toutes les données (utile pour tests)"""
     global agents_data
     agents_data = {}
-    await broadcast_to_dashboards({"type": "reset"})
+    broadcast_to_dashboards({"type": "reset"})
     return {"status": "ok", "message": "All data cleared"}
 
 # === Proxy LLM (éviter CORS) ===
@@ -424,51 +419,25 @@ async def global_canvas_image(request: Request):
         canvas_width = grid_size * cell_size
         canvas_height = grid_size * cell_size
         
-        # Créer l'image du canvas complet (fond noir)
-        canvas = Image.new('RGB', (canvas_width, canvas_height), color=(0, 0, 0))
+        # Composer le canvas à 1 pixel par sous-cellule (numpy, couleurs décodées en bloc),
+        # puis un seul agrandissement plus proche voisin
+        center = grid_size // 2
+        base = np.zeros((grid_size * GRID_PIXELS, grid_size * GRID_PIXELS, 3), dtype=np.uint8)
+        for user_id, grid_data in grids.items():
+            grid_x, grid_y = grid_data.get("position", [0, 0])
+            xs, ys, rgb = parse_pixel_strings(grid_data.get("pixels", []))
+            inside = (xs >= 0) & (xs < GRID_PIXELS) & (ys >= 0) & (ys < GRID_PIXELS)
+            px = (grid_x + center) * GRID_PIXELS + xs[inside]
+            py = (grid_y + center) * GRID_PIXELS + ys[inside]
+            visible = (px >= 0) & (px < base.shape[1]) & (py >= 0) & (py < base.shape[0])
+            base[py[visible], px[visible]] = rgb[inside][visible]
+        canvas = Image.fromarray(upscale(base, cell_size // GRID_PIXELS), "RGB")
         
-        # Remplir chaque grille
         for user_id, grid_data in grids.items():
-            position = grid_data.get("position", [0, 0])
-            pixels = grid_data.get("pixels", [])
-            
-            # Position de la grille dans le canvas global
-            grid_x = position[0]
-            grid_y = position[1]
-            
-            # Créer une image 20×20 pour cette grille
-            grid_img = Image.new('RGB', (20, 20), color=(0, 0, 0))
-            grid_pixels = grid_img.load()
-            
-            # Remplir avec les pixels de l'utilisateur
-            for pixel in pixels:
-                x = pixel.get('x')
-                y = pixel.get('y')
-                color = pixel.get('color')
-                
-                if x is None or y is None or color is None:
-                    continue
-                    
-                if 0 <= x < 20 and 0 <= y < 20:
-                    # Convertir #RRGGBB en RGB
-                    r = int(color[1:3], 16)
-                    g = int(color[3:5], 16)
-                    b = int(color[5:7], 16)
-                    grid_pixels[x, y] = (r, g, b)
-            
-            # Upscale la grille à 200×200
-            grid_img = grid_img.resize((cell_size, cell_size), Image.NEAREST)
-            
-            # Calculer la position dans le canvas global
-            # Convertir position de grille en coordonnées canvas
-            # Le centre du canvas est à (grid_size // 2, grid_size // 2)
-            center = grid_size // 2
+            grid_x, grid_y = grid_data.get("position", [0, 0])
             canvas_x = (grid_x + center) * cell_size
             canvas_y = (grid_y + center) * cell_size
             
-            # Coller la grille dans le canvas
-            canvas.paste(grid_img, (canvas_x, canvas_y))
-            
             # HIGHLIGHT: Si c'est la grille de l'agent actif, ajouter une bordure
             if my_user_id and user_id == my_user_id:
                 from PIL import ImageDraw
@@ -746,11 +715,11 @@ async def proxy_openai(request: Request):
 async def websocket_analytics(websocket: WebSocket):
     """WebSocket pour diffuser les données en temps réel aux dashboards"""
     await websocket.accept()
-    connected_dashboards.append(websocket)
+    client = dashboard_hub.add_websocket(websocket)
     
     # Envoyer l'état initial
     try:
-        await websocket.send_json({
+        dashboard_hub.send(client, {
             "type": "initial_state",
             "agent_count": len(agents_data),
             "agents": {
@@ -778,8 +747,7 @@ async def websocket_analytics(websocket: WebSocket):
     except WebSocketDisconnect:
         pass
     finally:
-        if websocket in connected_dashboards:
-            connected_dashboards.remove(websocket)
+        dashboard_hub.remove(client)
 
 # === Heartbeat pour nettoyer les agents inactifs ===
 
@@ -805,7 +773,7 @@ async def cleanup_inactive_agents():
         
         for agent_id in to_remove:
             del agents_data[agent_id]
-            await broadcast_to_dashboards({
+            broadcast_to_dashboards({
                 "type": "agent_removed",
                 "agent_id": agent_id
             })
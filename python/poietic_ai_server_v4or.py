@@ -29,6 +29,8 @@ import json
 import httpx
 
 from cost_tracker_v4or import cost_tracker
+from openrouter_client import OpenRouterPool
+from llm_scheduler import LLMScheduler, LANE_ON, LANE_W_ACTION, lane_from_request
 
 # ==============================================================================
 # CONFIG (env)
@@ -52,11 +54,18 @@ APP_URL = os.getenv("APP_URL", "http://localhost:3001")
 APP_TITLE = os.getenv("APP_TITLE", "Poietic Generator V4or")
 
 O_CADENCE_SECONDS = int(os.getenv("O_CADENCE_SECONDS", "25"))
+# Timeout de lecture des appels chat (O et proxy W), 180s historiquement
+CHAT_TIMEOUT_SECONDS = float(os.getenv("CHAT_TIMEOUT_SECONDS", "180"))
 # Session du banc : doit correspondre au ?session= du front (defaut "poietic-v4or").
 # La machine O (serveur) enregistre son cout sous cette session pour que le
 # panneau "Session cost" reflete le cout reel (W agents + O).
 BENCH_SESSION_ID = os.getenv("SESSION_ID", "poietic-v4or")
 
+# Pool de connexions OpenRouter partage (cree dans lifespan, ferme a l'arret)
+openrouter_pool = OpenRouterPool(route_timeouts={"o": CHAT_TIMEOUT_SECONDS, "w": CHAT_TIMEOUT_SECONDS})
+# Ordonnanceur des appels LLM : O prioritaire sur les seeds W, puis actions W
+llm_scheduler = LLMScheduler()
+
 # ==============================================================================
 # STORE O (repris de V4, simplifie)
 # ==============================================================================
@@ -184,10 +193,15 @@ async def call_openrouter(
     session_id: Optional[str] = None,
     agent_id: Optional[str] = None,
     temperature: float = 0.8,
-    timeout_s: float = 180.0,
+    timeout_s: Optional[float] = None,
+    route: str = "w",
+    lane: Optional[str] = None,
 ) -> tuple[Optional[dict], int, Optional[str]]:
     """Appelle OpenRouter (chat/completions). Retourne (json, status, error).
 
+    Passe par le pool partage ; `route` choisit le timeout ("o" ou "w"),
+    `timeout_s` le surcharge ponctuellement. L'appel attend son tour dans
+    `llm_scheduler` (voie `lane`, deduite de `route` par defaut).
     Enregistre l'usage/cout dans le cost_tracker (usage.include => usage.cost).
     """
     if not OPENROUTER_API_KEY:
@@ -208,9 +222,16 @@ async def call_openrouter(
         body["reasoning"] = reasoning
 
     try:
-        timeout_obj = httpx.Timeout(timeout_s, connect=30.0)
-        async with httpx.AsyncClient(timeout=timeout_obj) as client:
-            resp = await client.post(CHAT_COMPLETIONS_URL, headers=_openrouter_headers(), json=body)
+        timeout_obj = httpx.Timeout(timeout_s, connect=30.0) if timeout_s else None
+        resp = await llm_scheduler.run(
+            lane or (LANE_ON if route == "o" else LANE_W_ACTION),
+            agent_id,
+            lambda: openrouter_pool.post(
+                CHAT_COMPLETIONS_URL, route=route, timeout=timeout_obj, headers=_openrouter_headers(), json=body
+            ),
+        )
+    except asyncio.TimeoutError:
+        return None, 503, "File d'attente LLM saturee"
     except Exception as e:
         return None, 502, f"Erreur reseau OpenRouter: {e}"
 
@@ -276,6 +297,7 @@ async def call_openrouter_o(image_base64: str, agents_count: int) -> Optional[di
         session_id=BENCH_SESSION_ID,
         agent_id="O-machine",
         temperature=0.7,
+        route="o",
     )
     if err or not data:
         print(f"[O] Erreur OpenRouter ({status}): {err}")
@@ -374,8 +396,10 @@ async def lifespan(app: FastAPI):
     if not OPENROUTER_API_KEY:
         print("[V4or] ATTENTION : OPENROUTER_API_KEY non definie. Les appels LLM echoueront.")
     print(f"[V4or] base_url={OPENROUTER_BASE_URL} | O_MODEL={O_MODEL} | ENABLE_N={ENABLE_N} | MAX_SESSION_USD={MAX_SESSION_USD}")
+    await openrouter_pool.start()
     asyncio.create_task(periodic_o_task())
     yield
+    await openrouter_pool.aclose()
 
 
 app = FastAPI(title="Poietic AI Server V4or", version="4.1.0", lifespan=lifespan)
@@ -448,6 +472,7 @@ async def proxy_openrouter(request: Request):
         session_id=session_id,
         agent_id=agent_id,
         temperature=temperature,
+        lane=lane_from_request(body),
     )
 
     if err and not data:
@@ -461,7 +486,7 @@ async def proxy_openrouter(request: Request):
 
 @app.get("/api/usage")
 async def get_usage(session_id: Optional[str] = Query(None)):
-    return cost_tracker.snapshot(session_id)
+    return {**cost_tracker.snapshot(session_id), "scheduler": llm_scheduler.stats()}
 
 
 @app.get("/api/usage/openrouter")
@@ -475,8 +500,7 @@ async def get_openrouter_usage():
         return JSONResponse(status_code=400, content={"error": "OPENROUTER_API_KEY non definie"})
     url = f"{OPENROUTER_BASE_URL}/credits"
     try:
-        async with httpx.AsyncClient(timeout=httpx.Timeout(20.0, connect=10.0)) as client:
-            resp = await client.get(url, headers=_openrouter_headers())
+        resp = await openrouter_pool.get(url, route="credits", headers=_openrouter_headers())
     except Exception as e:
         return JSONResponse(status_code=502, content={"error": f"Erreur reseau credits: {e}"})
 
@@ -1,12 +1,11 @@
 #!/usr/bin/env python3
 from fastapi import FastAPI, Body, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from typing import Optional, Tuple, List
+from fastapi.responses import JSONResponse, Response
+from typing import Callable, Optional, Tuple, List
 from datetime import datetime, timezone
 from contextlib import asynccontextmanager
 import asyncio
-import httpx
 import json
 import os
 import base64
@@ -15,6 +14,14 @@ import websockets
 from websockets.exceptions import ConnectionClosed, WebSocketException
 
 import utterance_store
+from analysis_trigger import AnalysisTrigger, TriggerDecision
+from on_pipeline import StagePipeline
+from metrics_sessions import metrics_ws_url, redirect_url
+from o_result_cache import OResultCache, canvas_hash_bytes
+from image_ingest import ImageUploadError, read_image_upload
+from snapshot_feed import LATEST_LONG_POLL_MAX, SnapshotFeed
+from canvas_model import CANVAS_SOURCE, CanvasModel, GameCanvasFeed
+from vision_payload import VisionPayloadOptimizer
 
 # ==============================================================================
 # OPENROUTER (V5 route ses appels LLM via OpenRouter, pas Gemini en direct)
@@ -53,6 +60,12 @@ def _openrouter_headers():
 # Suivi de cout (reutilise le CostTracker generique de V4or)
 from cost_tracker_v4or import CostTracker
 cost_tracker = CostTracker()
+# Pool de connexions OpenRouter partage (cree dans lifespan, ferme a l'arret)
+from openrouter_client import OpenRouterPool
+openrouter_pool = OpenRouterPool()
+# Ordonnanceur des appels LLM : O/N prioritaires sur les seeds W, puis actions W
+from llm_scheduler import LLMScheduler, LANE_ON, agent_from_request, lane_from_request
+llm_scheduler = LLMScheduler()
 BENCH_SESSION_ID = 'poietic-v5'  # libelle de session fige (independant de SESSION_ID partage)
 MAX_SESSION_USD = float(os.getenv('MAX_SESSION_USD', '0') or '0')
 
@@ -251,29 +264,45 @@ class OSnapshotStore:
     def __init__(self):
         self.latest: Optional[dict] = None
         self.version: int = 0
+        self.round_id: int = 0  # Dernier tour O→N publié (pipeline)
         self.latest_image_base64: Optional[str] = None
+        self.latest_image_hash: Optional[str] = None  # Empreinte canonique du canevas (o_result_cache)
         self.agents_count: int = 0
         self.first_analysis_start_time: Optional[datetime] = None  # V5: Timestamp début attente première analyse
         self.last_update_time: Optional[datetime] = None
         self.first_update_time: Optional[datetime] = None
         self.updates_count: int = 0
-
-    def set_snapshot(self, snapshot: dict):
+        # Octets pré-sérialisés + long-poll pour /o/latest
+        self.feed = SnapshotFeed(default_error={
+            'error': 0.0,
+            'explanation': 'No previous prediction available (first action or no prediction data)'
+        }, etag_prefix='o')
+
+    def set_snapshot(self, snapshot: dict, round_id: Optional[int] = None) -> bool:
+        """Publie un snapshot. Refuse un tour plus ancien que le dernier publié
+        (pipeline O→N : les étages peuvent terminer dans le désordre)."""
+        if round_id is not None:
+            if round_id <= self.round_id:
+                return False
+            self.round_id = round_id
         self.version += 1
         snapshot['version'] = self.version
         snapshot['timestamp'] = datetime.now(timezone.utc).isoformat()
         self.latest = snapshot
+        self.feed.publish(snapshot)
         # V5: Réinitialiser timestamp première analyse après snapshot réussi
         if self.first_analysis_start_time is not None:
             self.first_analysis_start_time = None
+        return True
 
-    def set_image(self, image_base64: str):
+    def set_image(self, image_base64: str, image_hash: Optional[str] = None):
         # V5: Accepter toutes les images (tous les clients envoient leur vue)
         # Le serveur utilise simplement la dernière image reçue
         # NOTE: Tous les clients devraient voir la même chose via WebSocket,
         # donc leurs images devraient être identiques (ou très similaires)
         now = datetime.now(timezone.utc)
         self.latest_image_base64 = image_base64
+        self.latest_image_hash = image_hash
         self.last_update_time = now
         if self.first_update_time is None:
             self.first_update_time = self.last_update_time
@@ -304,15 +333,44 @@ class OSnapshotStore:
 # Instances globales
 store = OSnapshotStore()
 w_store = WAgentDataStore()
+# Déclencheur O→N (signalé par /o/image, /o/agents, /n/w-data)
+on_trigger = AnalysisTrigger()
+# Cache des analyses O adressé par contenu (canevas + prompt + modèle)
+o_cache = OResultCache()
+# Pipeline O→N : l'O du tour suivant démarre pendant le N du tour courant
+on_pipeline = StagePipeline()
+# Canevas global tenu côté serveur (WebSocket du jeu + pixels W) ;
+# source de l'image O quand CANVAS_SOURCE=server
+canvas = CanvasModel()
+canvas_feed = GameCanvasFeed(canvas, on_change=on_trigger.notify_image if CANVAS_SOURCE == "server" else None)
+# Prétraitement de l'image envoyée à O (réduction, recadrage, palette)
+vision_optimizer = VisionPayloadOptimizer()
+
+
+def publish_server_canvas() -> bool:
+    """CANVAS_SOURCE=server : publie le rendu du canevas serveur dans le store s'il a changé."""
+    if CANVAS_SOURCE != "server" or not canvas.has_content():
+        return False
+    img_hash = canvas.content_hash()
+    if img_hash == store.latest_image_hash:
+        return False
+    store.set_image(canvas.to_base64(), image_hash=img_hash)
+    return True
 
 # ==============================================================================
 # CLIENT SERVEUR DE MÉTRIQUES
 # ==============================================================================
 
+# Serveur de métriques : URL de base et session du canevas observé (vide = session par défaut).
+# Les snapshots O/N vont à /metrics/{METRICS_SESSION}, comme les agent_update des clients W.
+METRICS_WS_URL = os.getenv('METRICS_WS_URL', 'ws://localhost:5005').rstrip('/')
+METRICS_SESSION = os.getenv('METRICS_SESSION', '').strip()
+
+
 class MetricsClient:
     """Client WebSocket pour envoyer snapshots O/N au serveur de métriques"""
-    def __init__(self, url: str = "ws://localhost:5005/metrics"):
-        self.url = url
+    def __init__(self, url: Optional[str] = None):
+        self.url = url or metrics_ws_url(METRICS_WS_URL, METRICS_SESSION)
         self.websocket = None
         self.connected = False
         self.reconnect_delay = 5
@@ -335,7 +393,11 @@ class MetricsClient:
                     while True:
                         try:
                             message = await asyncio.wait_for(self.websocket.recv(), timeout=1.0)
-                            # Messages du serveur (pour debug, ignorés pour l'instant)
+                            # Session servie par un autre processus : il ferme (4307), on se reconnecte à son URL
+                            target = redirect_url(message)
+                            if target:
+                                print(f"[Metrics] ↪️  Session redirigée vers {target}")
+                                self.url = target
                         except asyncio.TimeoutError:
                             # Timeout normal, continuer à écouter
                             continue
@@ -686,8 +748,60 @@ def _truncate_predictions(predictions: dict, max_length: int = 150) -> dict:
             truncated[key] = value
     return truncated
 
-async def call_gemini_o(image_base64: str, agents_count: int, previous_snapshot: Optional[dict] = None, agent_positions: Optional[list] = None) -> Tuple[Optional[dict], Optional[int]]:
+def check_o_result(o_result: dict, agent_positions_list: Optional[list]) -> bool:
+    """Retire les positions qui ne sont pas celles des agents, puis vérifie qu'aucun agent n'est dans deux structures.
+    Modifie `o_result` ; False si le résultat doit être ignoré (et ne pas être mis en cache)."""
+    # V5: Valider que toutes les positions dans les structures sont valides
+    if agent_positions_list and len(agent_positions_list) > 0:
+        structures = o_result.get('structures', [])
+        invalid_positions = []
+        corrected_structures = []
+        
+        for struct in structures:
+            agent_positions = struct.get('agent_positions', [])
+            valid_positions = []
+            struct_invalid = False
+            
+            for pos in agent_positions:
+                if pos in agent_positions_list:
+                    valid_positions.append(pos)
+                else:
+                    invalid_positions.append(pos)
+                    struct_invalid = True
+            
+            # CRITICAL: Ne garder que les structures avec positions valides
+            if valid_positions:
+                struct['agent_positions'] = valid_positions
+                struct['size_agents'] = len(valid_positions)  # Corriger size_agents
+                corrected_structures.append(struct)
+            # Sinon, rejeter la structure complètement
+        
+        if invalid_positions:
+            print(f"[ON] ⚠️  ATTENTION: O a retourné {len(invalid_positions)} positions invalides: {invalid_positions}")
+            print(f"[ON] 📍 Positions valides: {agent_positions_list}")
+            print(f"[ON] 🔧 Structures corrigées: {len(corrected_structures)}/{len(structures)} conservées")
+        
+        # Remplacer les structures par les versions corrigées
+        o_result['structures'] = corrected_structures
+    
+    # V5: Valider qu'aucun agent n'apparaît dans plusieurs structures
+    is_valid, errors = validate_structures_no_overlap(o_result)
+    if not is_valid:
+        print("=" * 60)
+        print("[O] ⚠️  ERREUR VALIDATION: Agents apparaissant dans plusieurs structures:")
+        for err in errors:
+            print(f"[O]    {err}")
+        print("[O] ⚠️  Le résultat O sera ignoré, conservation snapshot précédent")
+        print("=" * 60)
+        return False
+    return True
+
+
+async def call_gemini_o(image_base64: str, agents_count: int, previous_snapshot: Optional[dict] = None, agent_positions: Optional[list] = None, use_cache: bool = True, accept: Optional[Callable[[dict], bool]] = None) -> Tuple[Optional[dict], Optional[int]]:
     """Appelle Gemini pour O-machine (observation des structures et calcul C_d)
+    use_cache=False force un nouvel appel (retry après résultat invalide) et remplace l'entrée du cache.
+    accept(résultat) : validation de l'appelant ; un résultat refusé est retourné comme un échec
+    et n'est jamais mis en cache (une entrée refusée est retirée du cache).
     Retourne: (résultat JSON, nombre de tokens de sortie)"""
     print(f"[O] 🚀 Début appel Gemini O (agents: {agents_count}, image: {len(image_base64)} bytes)")
     api_key = OPENROUTER_API_KEY
@@ -783,12 +897,27 @@ async def call_gemini_o(image_base64: str, agents_count: int, previous_snapshot:
     except Exception as e:
         pass
     
+    # Cache O : même canevas + même prompt final + même modèle => réutiliser l'analyse
+    # (empreinte = décodage PNG, hors de la boucle d'événements)
+    cache_key = await asyncio.to_thread(o_cache.make_key, image_base64, prompt, LLM_MODEL) if image_base64 else None
+    if cache_key and use_cache:
+        cached = o_cache.get(cache_key)
+        if cached is not None and (accept is None or accept(cached[0])):
+            print(f"[O] ♻️  Canevas inchangé : résultat O réutilisé depuis le cache (clé {cache_key[:12]})")
+            return cached
+        if cached is not None:
+            o_cache.discard(cache_key)
+    
     # Préparer le body
     parts = [{'text': prompt}]
     if image_base64:
-        clean_base64 = image_base64
-        if clean_base64.startswith('data:image/png;base64,'):
-            clean_base64 = clean_base64.replace('data:image/png;base64,', '')
+        # Réduction sans perte / recadrage / palette avant envoi (tokens image), dans un thread : décodage et ré-encodage PNG
+        clean_base64, mime_type, vision_report = await asyncio.to_thread(vision_optimizer.optimize, image_base64)
+        cost_tracker.record_vision(BENCH_SESSION_ID, 'O-machine', vision_report)
+        if vision_report['applied']:
+            print(f"[O] 🗜️  Image optimisée: {vision_report['size_before']}→{vision_report['size_after']}px, "
+                  f"{vision_report['bytes_before']}→{vision_report['bytes_after']} chars, "
+                  f"~{vision_report['tokens_saved']} tokens image économisés ({vision_report['elapsed_ms']}ms)")
         
         # Vérifier que l'image base64 est valide (non vide, longueur raisonnable)
         if len(clean_base64) < 100:
@@ -798,7 +927,7 @@ async def call_gemini_o(image_base64: str, agents_count: int, previous_snapshot:
         
         parts.append({
             'inline_data': {
-                'mime_type': 'image/png',
+                'mime_type': mime_type,
                 'data': clean_base64
             }
         })
@@ -816,54 +945,59 @@ async def call_gemini_o(image_base64: str, agents_count: int, previous_snapshot:
     }
     
     try:
-        timeout_obj = httpx.Timeout(120.0, connect=30.0)
-        async with httpx.AsyncClient(timeout=timeout_obj) as client:
-            resp = await client.post(url, headers=_openrouter_headers(), json=body)
-            if not resp.is_success:
-                error_text = resp.text
-                print(f"[O] Erreur HTTP {resp.status_code}: {error_text[:500]}")
-                return (None, None)
-            
-            raw = resp.json()
+        resp = await llm_scheduler.run(
+            LANE_ON, 'O-machine',
+            lambda: openrouter_pool.post(url, route='o', headers=_openrouter_headers(), json=body),
+        )
+        if not resp.is_success:
+            error_text = resp.text
+            print(f"[O] Erreur HTTP {resp.status_code}: {error_text[:500]}")
+            return (None, None)
+        
+        raw = resp.json()
+        text = ''
+        try:
+            text = (raw['choices'][0]['message']['content'] or '')
+        except (KeyError, IndexError, TypeError):
             text = ''
-            try:
-                text = (raw['choices'][0]['message']['content'] or '')
-            except (KeyError, IndexError, TypeError):
-                text = ''
-            # Remap usage OpenRouter -> format Gemini pour le code en aval (metriques)
-            _u = raw.get('usage', {}) if isinstance(raw, dict) else {}
-            data = {'usageMetadata': {
-                'candidatesTokenCount': _u.get('completion_tokens', 0),
-                'promptTokenCount': _u.get('prompt_tokens', 0),
-                'totalTokenCount': _u.get('total_tokens', 0),
-                'thoughtsTokenCount': 0,
-            }}
-            cost_tracker.record(BENCH_SESSION_ID, 'O-machine', LLM_MODEL, _u)
-            
-            if not text or len(text.strip()) < 10:
-                print(f"[O] ❌ Réponse Gemini vide ou trop courte (longueur: {len(text) if text else 0})")
-                print(f"[O] Status: {resp.status_code}, Headers: {dict(resp.headers)}")
-                print(f"[O] 🔍 Réponse JSON brute: {json.dumps(data, indent=2)[:1000]}")
-                if text:
-                    print(f"[O] Texte reçu: '{text}'")
-                return (None, None)
-            
-            # Parser JSON
-            result = parse_json_robust(text, "[O]")
-            # Extraire les tokens de sortie
-            usage_metadata = data.get('usageMetadata', {})
-            output_tokens = usage_metadata.get('candidatesTokenCount', 0) or usage_metadata.get('outputTokens', 0)
+        # Remap usage OpenRouter -> format Gemini pour le code en aval (metriques)
+        _u = raw.get('usage', {}) if isinstance(raw, dict) else {}
+        data = {'usageMetadata': {
+            'candidatesTokenCount': _u.get('completion_tokens', 0),
+            'promptTokenCount': _u.get('prompt_tokens', 0),
+            'totalTokenCount': _u.get('total_tokens', 0),
+            'thoughtsTokenCount': 0,
+        }}
+        cost_tracker.record(BENCH_SESSION_ID, 'O-machine', LLM_MODEL, _u)
+        
+        if not text or len(text.strip()) < 10:
+            print(f"[O] ❌ Réponse Gemini vide ou trop courte (longueur: {len(text) if text else 0})")
+            print(f"[O] Status: {resp.status_code}, Headers: {dict(resp.headers)}")
+            print(f"[O] 🔍 Réponse JSON brute: {json.dumps(data, indent=2)[:1000]}")
+            if text:
+                print(f"[O] Texte reçu: '{text}'")
+            return (None, None)
+        
+        # Parser JSON
+        result = parse_json_robust(text, "[O]")
+        # Extraire les tokens de sortie
+        usage_metadata = data.get('usageMetadata', {})
+        output_tokens = usage_metadata.get('candidatesTokenCount', 0) or usage_metadata.get('outputTokens', 0)
+        
+        thoughts_tokens = usage_metadata.get('thoughtsTokenCount', 0)
+        if result and accept is not None and not accept(result):
+            return (None, None)
+        if result:
+            print(f"[O] ✅ Gemini O réussi (longueur réponse: {len(text)} chars, output tokens: {output_tokens}, thoughts: {thoughts_tokens} tokens)")
+            if cache_key:
+                o_cache.put(cache_key, result, output_tokens)
+            # Avertir si thoughts consomment trop de tokens
+            if thoughts_tokens > 10000:
+                print(f"[O] ⚠️  ATTENTION: Thoughts très longs ({thoughts_tokens} tokens) - considérer optimisation prompt")
+        else:
+            print(f"[O] ❌ Parsing JSON échoué (thoughts: {thoughts_tokens} tokens)")
+        return (result, output_tokens if result else None)
             
-            thoughts_tokens = usage_metadata.get('thoughtsTokenCount', 0)
-            if result:
-                print(f"[O] ✅ Gemini O réussi (longueur réponse: {len(text)} chars, output tokens: {output_tokens}, thoughts: {thoughts_tokens} tokens)")
-                # Avertir si thoughts consomment trop de tokens
-                if thoughts_tokens > 10000:
-                    print(f"[O] ⚠️  ATTENTION: Thoughts très longs ({thoughts_tokens} tokens) - considérer optimisation prompt")
-            else:
-                print(f"[O] ❌ Parsing JSON échoué (thoughts: {thoughts_tokens} tokens)")
-            return (result, output_tokens if result else None)
-                
     except Exception as e:
         print(f"[O] Erreur appel Gemini: {e}")
         return (None, None)
@@ -954,63 +1088,64 @@ async def call_gemini_n(o_snapshot: dict, w_agents_data: dict, previous_combined
     }
     
     try:
-        timeout_obj = httpx.Timeout(120.0, connect=30.0)
-        async with httpx.AsyncClient(timeout=timeout_obj) as client:
-            resp = await client.post(url, headers=_openrouter_headers(), json=body)
-            if not resp.is_success:
-                error_text = resp.text
-                print(f"[N] Erreur HTTP {resp.status_code}: {error_text[:500]}")
-                return (None, None)
-            
-            raw = resp.json()
+        resp = await llm_scheduler.run(
+            LANE_ON, 'N-machine',
+            lambda: openrouter_pool.post(url, route='n', headers=_openrouter_headers(), json=body),
+        )
+        if not resp.is_success:
+            error_text = resp.text
+            print(f"[N] Erreur HTTP {resp.status_code}: {error_text[:500]}")
+            return (None, None)
+        
+        raw = resp.json()
+        text = ''
+        try:
+            text = (raw['choices'][0]['message']['content'] or '')
+        except (KeyError, IndexError, TypeError):
             text = ''
-            try:
-                text = (raw['choices'][0]['message']['content'] or '')
-            except (KeyError, IndexError, TypeError):
-                text = ''
-            # Remap usage OpenRouter -> format Gemini pour le code en aval (metriques)
-            _u = raw.get('usage', {}) if isinstance(raw, dict) else {}
-            data = {'usageMetadata': {
-                'candidatesTokenCount': _u.get('completion_tokens', 0),
-                'promptTokenCount': _u.get('prompt_tokens', 0),
-                'totalTokenCount': _u.get('total_tokens', 0),
-                'thoughtsTokenCount': 0,
-            }}
-            cost_tracker.record(BENCH_SESSION_ID, 'N-machine', LLM_MODEL, _u)
-            
-            if not text or len(text.strip()) < 10:
-                print(f"[N] ❌ Réponse Gemini vide ou trop courte (longueur: {len(text) if text else 0})")
-                print(f"[N] Status: {resp.status_code}, Headers: {dict(resp.headers)}")
-                print(f"[N] 🔍 Réponse JSON brute: {json.dumps(data, indent=2)[:1000]}")
-                if text:
-                    print(f"[N] Texte reçu: '{text}'")
-                return (None, None)
-            
-            # Parser JSON
-            result = parse_json_robust(text, "[N]")
-            # Extraire les tokens de sortie
-            usage_metadata = data.get('usageMetadata', {})
-            output_tokens = usage_metadata.get('candidatesTokenCount', 0) or usage_metadata.get('outputTokens', 0)
-            
-            thoughts_tokens = usage_metadata.get('thoughtsTokenCount', 0)
-            if result:
-                print(f"[N] ✅ Gemini N réussi (longueur réponse: {len(text)} chars, output tokens: {output_tokens}, thoughts: {thoughts_tokens} tokens)")
-                # Avertir si thoughts consomment trop de tokens
-                if thoughts_tokens > 10000:
-                    print(f"[N] ⚠️  ATTENTION: Thoughts très longs ({thoughts_tokens} tokens) - considérer optimisation prompt")
-                # Log aperçu des erreurs de prédiction retournées
-                pred_errors = result.get('prediction_errors', {})
-                if isinstance(pred_errors, dict):
-                    print(f"[N] 📊 Erreurs de prédiction retournées par Gemini: {len(pred_errors)} agents")
-                    for agent_id, err in list(pred_errors.items())[:3]:  # Max 3 pour lisibilité
-                        err_val = err.get('error', 'N/A') if isinstance(err, dict) else 'N/A'
-                        print(f"[N]    → Agent {agent_id[:8]}: error={err_val}")
-                else:
-                    print(f"[N] ⚠️  prediction_errors n'est pas un dict: {type(pred_errors)}")
+        # Remap usage OpenRouter -> format Gemini pour le code en aval (metriques)
+        _u = raw.get('usage', {}) if isinstance(raw, dict) else {}
+        data = {'usageMetadata': {
+            'candidatesTokenCount': _u.get('completion_tokens', 0),
+            'promptTokenCount': _u.get('prompt_tokens', 0),
+            'totalTokenCount': _u.get('total_tokens', 0),
+            'thoughtsTokenCount': 0,
+        }}
+        cost_tracker.record(BENCH_SESSION_ID, 'N-machine', LLM_MODEL, _u)
+        
+        if not text or len(text.strip()) < 10:
+            print(f"[N] ❌ Réponse Gemini vide ou trop courte (longueur: {len(text) if text else 0})")
+            print(f"[N] Status: {resp.status_code}, Headers: {dict(resp.headers)}")
+            print(f"[N] 🔍 Réponse JSON brute: {json.dumps(data, indent=2)[:1000]}")
+            if text:
+                print(f"[N] Texte reçu: '{text}'")
+            return (None, None)
+        
+        # Parser JSON
+        result = parse_json_robust(text, "[N]")
+        # Extraire les tokens de sortie
+        usage_metadata = data.get('usageMetadata', {})
+        output_tokens = usage_metadata.get('candidatesTokenCount', 0) or usage_metadata.get('outputTokens', 0)
+        
+        thoughts_tokens = usage_metadata.get('thoughtsTokenCount', 0)
+        if result:
+            print(f"[N] ✅ Gemini N réussi (longueur réponse: {len(text)} chars, output tokens: {output_tokens}, thoughts: {thoughts_tokens} tokens)")
+            # Avertir si thoughts consomment trop de tokens
+            if thoughts_tokens > 10000:
+                print(f"[N] ⚠️  ATTENTION: Thoughts très longs ({thoughts_tokens} tokens) - considérer optimisation prompt")
+            # Log aperçu des erreurs de prédiction retournées
+            pred_errors = result.get('prediction_errors', {})
+            if isinstance(pred_errors, dict):
+                print(f"[N] 📊 Erreurs de prédiction retournées par Gemini: {len(pred_errors)} agents")
+                for agent_id, err in list(pred_errors.items())[:3]:  # Max 3 pour lisibilité
+                    err_val = err.get('error', 'N/A') if isinstance(err, dict) else 'N/A'
+                    print(f"[N]    → Agent {agent_id[:8]}: error={err_val}")
             else:
-                print(f"[N] ❌ Parsing JSON échoué")
-            return (result, output_tokens if result else None)
-                
+                print(f"[N] ⚠️  prediction_errors n'est pas un dict: {type(pred_errors)}")
+        else:
+            print(f"[N] ❌ Parsing JSON échoué")
+        return (result, output_tokens if result else None)
+            
     except Exception as e:
         print(f"[N] Erreur appel Gemini: {e}")
         return (None, None)
@@ -1092,61 +1227,42 @@ def calculate_u_interpretation(u_value: float) -> str:
 # ==============================================================================
 
 async def periodic_on_task():
-    """Tâche périodique : O puis N puis combinaison
+    """Tâche O→N : O puis N puis combinaison
     Déclenche l'analyse O+N lorsque tous les agents W actifs ont terminé leurs actions.
+    Réveillée par les signaux de /o/image, /o/agents et /n/w-data (voir on_trigger)
+    ou par l'échéance du prochain timer (warmup, quiescence, âge d'image).
     """
-    print("[ON] 🚀 Tâche périodique O→N démarrée")
+    print("[ON] 🚀 Tâche O→N démarrée (déclenchement par événements)")
+    retry_in = None
     while True:
-        await asyncio.sleep(2)  # V5: Vérifier toutes les 2s si tous les agents W ont terminé
+        await on_trigger.wait(retry_in)
+        retry_in = None
+        publish_server_canvas()
         
         now = datetime.now(timezone.utc)
+        first_analysis = store.latest is None
         
         # Vérifications préalables
         if not store.latest_image_base64:
-            # Log seulement toutes les 10s pour éviter le spam (utiliser un compteur simple)
-            if not hasattr(periodic_on_task, '_last_no_image_log'):
-                periodic_on_task._last_no_image_log = now
-            last_log = periodic_on_task._last_no_image_log
-            if (now - last_log).total_seconds() >= 10:
-                print("[ON] Pas d'image disponible, attente...")
-                periodic_on_task._last_no_image_log = now
+            no_image = TriggerDecision(False, "no_image", "Pas d'image disponible, attente...")
+            if on_trigger.should_log(no_image):
+                print(f"[ON] {no_image.reason}")
             continue
         
-        # Warmup : attendre que les agents aient terminé leurs seeds
-        warmup_delay = 30  # V5: Augmenter à 30s pour laisser temps aux seeds d'être visibles et appliqués
-        warmup_timeout = 60  # CRITICAL: Timeout absolu de 60s pour éviter blocage infini
-        
+        # Warmup : attendre que les agents aient terminé leurs seeds (30s max)
         # V5: Vérifier le nombre d'agents qui ont envoyé des données W (plus fiable que updates_count)
         w_data = w_store.get_all_agents_data()
         agents_with_data = len(w_data)
-        
-        # Pour la première analyse, attendre qu'au moins 75% des agents aient envoyé leurs seeds
-        min_agents_ratio = 0.75
-        # Permettre 1 agent pour les tests, sinon minimum 2 ou 75% du total
-        if store.agents_count == 1:
-            min_agents_with_data = 1
-        else:
-            min_agents_with_data = max(2, int(store.agents_count * min_agents_ratio)) if store.agents_count > 0 else 2
-        
-        elapsed = (now - store.first_update_time).total_seconds() if store.first_update_time else 0
-        
-        # Sortir du warmup si :
-        # 1. On a assez d'agents avec données (75% ou au moins 2) ET assez de temps écoulé (warmup_delay)
-        # 2. OU timeout absolu atteint (warmup_timeout)
-        is_warmup = False
-        if store.latest is None:  # Première analyse seulement
-            if elapsed < warmup_delay and agents_with_data < min_agents_with_data:
-                is_warmup = True
-            elif elapsed >= warmup_timeout:
-                # Timeout absolu : forcer la sortie même si pas tous les agents ont envoyé
-                print(f"[ON] ⚠️  Warmup timeout ({elapsed:.1f}s ≥ {warmup_timeout}s) - FORÇAGE sortie avec {agents_with_data}/{store.agents_count} agents")
-                is_warmup = False
-            else:
-                is_warmup = False
-        
-        if is_warmup:
-            print(f"[ON] Warmup en cours ({elapsed:.1f}s / {warmup_delay}s, {agents_with_data}/{store.agents_count} agents avec données, min requis: {min_agents_with_data})...")
+        decision = on_trigger.check_warmup(
+            first_analysis=first_analysis,
+            agents_count=store.agents_count,
+            agents_with_data=agents_with_data,
+        )
+        if not decision.fire:
             # V5: Ne pas marquer les agents déconnectés pendant le warmup
+            if on_trigger.should_log(decision):
+                print(f"[ON] {decision.reason}")
+            retry_in = decision.retry_in
             continue
         
         # Vérifier obsolescence (agents déconnectés) - seulement après le warmup
@@ -1199,7 +1315,9 @@ async def periodic_on_task():
             print(f"[ON] Image obsolète mais données W récentes ({w_activity_delta:.1f}s < {timeout_seconds}s) - agents toujours actifs ({agents_with_data}/{store.agents_count})")
         
         if store.agents_count == 0:
-            print("[ON] Pas d'agents actifs, attente...")
+            no_agents = TriggerDecision(False, "no_agents", "Pas d'agents actifs, attente...")
+            if on_trigger.should_log(no_agents):
+                print(f"[ON] {no_agents.reason}")
             continue
         
         # V5: Vérifier qu'il y a des données W disponibles (au moins 1 agent a fait une action)
@@ -1215,156 +1333,33 @@ async def periodic_on_task():
                 print(f"[ON] ⚠️  Déconnexion détectée: seulement {agents_with_data}/{store.agents_count} agents avec données ({agents_ratio*100:.1f}%) - arrêt analyse")
                 store.set_agents_count(0)
                 continue
-        
-        if len(w_data) == 0 and store.latest is None:
-            # Première analyse : accepter même sans données W (seeds seulement)
-            pass
-        elif len(w_data) == 0 and store.latest is not None:
-            # Analyse suivante mais pas de données W : attendre
-            print(f"[ON] Aucune donnée W disponible, attente données agents...")
+                
+        # V5: Quiescence W, fraîcheur de l'image, seeds de la première analyse
+        # (timers et forçages gérés par la machine d'état on_trigger)
+        decision = on_trigger.check_ready(
+            first_analysis=first_analysis,
+            agents_count=store.agents_count,
+            agents_with_data=agents_with_data,
+            image_size=len(store.latest_image_base64 or ''),
+        )
+        if not decision.fire:
+            if on_trigger.should_log(decision):
+                print(f"[ON] {decision.reason}")
+            retry_in = decision.retry_in
             continue
+        if decision.reason:
+            print(f"[ON] {decision.reason}")
+        on_trigger.begin_analysis()
+        # Numéro de tour fixé au déclenchement : ordre de fraîcheur de l'image observée
+        rnd = on_pipeline.new_round(agents_count=store.agents_count)
         
-        # V5: CRITIQUE - Vérifier si tous les agents W actifs ont terminé leurs actions
-        # Quiescence : si aucun agent W n'a envoyé de données depuis quiescence_delay secondes,
-        # alors tous ont terminé et on peut déclencher l'analyse O+N
-        quiescence_delay = 6.0 if store.latest is None else 5.0  # 6s pour première analyse, 5s pour suivantes (augmenté pour laisser temps aux images)
-        all_finished, time_since_last_w_update = w_store.all_agents_finished(quiescence_delay=quiescence_delay)
-        
-        # V5: CRITIQUE - Vérifier que l'image a été mise à jour récemment ET après les données W
-        # L'image doit être récente (moins de max_image_age secondes) ET idéalement après la dernière donnée W
-        image_age = 0
-        image_timeout_forced = False  # Flag pour indiquer qu'on a forcé l'analyse
-        if store.last_update_time:
-            image_age = (now - store.last_update_time).total_seconds()
-            max_image_age = 30.0 if store.latest is None else 10.0  # Réduire à 10s pour analyses suivantes (plus strict)
-            # CRITICAL FIX: Timeout absolu pour éviter le blocage si les W-machines ne dessinent plus
-            # Si l'image est trop ancienne depuis trop longtemps, forcer l'analyse avec l'image disponible
-            max_wait_for_image = 60.0  # 60 secondes max d'attente pour une image récente
-            if not hasattr(periodic_on_task, '_image_wait_start'):
-                periodic_on_task._image_wait_start = now
-            
-            image_wait_time = (now - periodic_on_task._image_wait_start).total_seconds()
-            
-            if image_age > max_image_age:
-                if image_wait_time >= max_wait_for_image:
-                    # Timeout atteint, forcer l'analyse avec l'image disponible
-                    print(f"[ON] ⚠️  Timeout image ({image_wait_time:.1f}s ≥ {max_wait_for_image}s) - FORÇAGE analyse avec image de {image_age:.1f}s")
-                    periodic_on_task._image_wait_start = now  # Reset pour prochaine analyse
-                    image_timeout_forced = True  # Marquer qu'on a forcé
-                else:
-                    print(f"[ON] Image trop ancienne ({image_age:.1f}s > {max_image_age}s), attente mise à jour récente ({image_wait_time:.1f}s/{max_wait_for_image}s)...")
-                    continue
-            else:
-                # Image récente, reset le timer
-                if hasattr(periodic_on_task, '_image_wait_start'):
-                    delattr(periodic_on_task, '_image_wait_start')
-        
-        # V5: CRITIQUE - Vérifier que l'image a été mise à jour après ou en même temps que les dernières données W
-        # Si les données W sont plus récentes que l'image, attendre que l'image soit mise à jour
-        # SAUF si on a forcé l'analyse à cause du timeout image (image_timeout_forced)
-        if not image_timeout_forced and w_store.last_update_time and store.last_update_time:
-            w_update_time = w_store.last_update_time
-            image_update_time = store.last_update_time
-            time_diff = (w_update_time - image_update_time).total_seconds()
-            # Si les données W sont plus récentes que l'image de plus de 2s, attendre
-            if time_diff > 2.0:
-                print(f"[ON] ⏳ Données W plus récentes que l'image ({time_diff:.1f}s d'écart), attente mise à jour image...")
-                continue
-        
-        # CRITIQUE: Récupérer les données W juste avant de vérifier (pas au début de la boucle)
+        # CRITIQUE: Récupérer les données W juste avant l'analyse
         # car d'autres agents peuvent avoir envoyé leurs données entre-temps
         w_data_check = w_store.get_all_agents_data()
-        
-        # CRITIQUE: Pour la première analyse, attendre que les agents actifs aient envoyé au moins leur seed
-        if store.latest is None:
-            # Première analyse : initialiser le timestamp si c'est la première fois
-            if store.first_analysis_start_time is None:
-                store.first_analysis_start_time = now
-            
-            if store.agents_count > 0:
-                if len(w_data_check) == 0:
-                    # Aucune donnée W reçue alors que des agents sont actifs
-                    print(f"[ON] ⏳ Première analyse: {store.agents_count} agents actifs mais aucune donnée W reçue - attente seeds...")
-                    continue
-                
-                # Calculer temps d'attente depuis début attente première analyse
-                wait_time = (now - store.first_analysis_start_time).total_seconds()
-                min_agents_ratio = 0.75  # Accepter si 75% des agents ont envoyé leurs données
-                # Permettre 1 agent pour les tests, sinon minimum 2 ou 75% du total
-                if store.agents_count == 1:
-                    min_agents_count = 1
-                else:
-                    min_agents_count = max(2, int(store.agents_count * min_agents_ratio))  # Au moins 2 agents ou 75%
-                timeout_first_analysis = 20.0  # Timeout de 20s pour première analyse
-                
-                if len(w_data_check) < store.agents_count:
-                    # Pas tous les agents ont envoyé leurs données
-                    if len(w_data_check) >= min_agents_count:
-                        # On a assez d'agents (75% ou au moins 2) : accepter l'analyse
-                        print(f"[ON] ✅ Première analyse: {len(w_data_check)}/{store.agents_count} agents ont envoyé leurs données (≥{min_agents_count} requis) - analyse autorisée")
-                    elif wait_time >= timeout_first_analysis:
-                        # Timeout atteint : accepter avec les agents disponibles
-                        print(f"[ON] ⚠️  Première analyse: timeout ({wait_time:.1f}s ≥ {timeout_first_analysis}s) - analyse avec {len(w_data_check)}/{store.agents_count} agents disponibles")
-                    else:
-                        # Attendre encore
-                        print(f"[ON] ⏳ Première analyse: {len(w_data_check)}/{store.agents_count} agents ont envoyé leurs données (attente {wait_time:.1f}s/{timeout_first_analysis}s)...")
-                        continue
-                
-                # Vérifier aussi qu'on a attendu assez longtemps après la dernière mise à jour
-                if time_since_last_w_update < 3.0:  # Minimum 3s après dernière seed
-                    print(f"[ON] ⏳ Première analyse: dernière seed il y a {time_since_last_w_update:.1f}s < 3s - attente stabilisation...")
-                    continue
-        else:
-            # Analyses suivantes : vérification standard
-            if store.agents_count > 0 and len(w_data_check) == 0:
-                # Des agents sont actifs mais n'ont pas encore envoyé de données (en cours de démarrage/seed)
-                print(f"[ON] {store.agents_count} agents actifs mais aucune donnée W reçue - attente seed...")
-                continue
-        
-        # V5: Timeout absolu pour éviter l'attente indéfinie si un agent est bloqué
-        # Si on a des données W et que ça fait plus de 45s qu'on attend la quiescence, forcer l'analyse
-        max_quiescence_wait = 45.0  # 45 secondes max d'attente de quiescence
-        force_analysis = False
-        
-        if not all_finished:
-            # Calculer depuis combien de temps on attend
-            if not hasattr(periodic_on_task, '_quiescence_start'):
-                periodic_on_task._quiescence_start = now
-            
-            wait_for_quiescence = (now - periodic_on_task._quiescence_start).total_seconds()
-            
-            if wait_for_quiescence >= max_quiescence_wait and len(w_data_check) >= 2:
-                # Timeout atteint, forcer l'analyse avec les données disponibles
-                print(f"[ON] ⚠️  Timeout quiescence ({wait_for_quiescence:.1f}s ≥ {max_quiescence_wait}s) - FORÇAGE analyse avec {len(w_data_check)} agents")
-                force_analysis = True
-                periodic_on_task._quiescence_start = now  # Reset pour prochaine analyse
-            else:
-                # Des agents W sont encore en train d'agir, attendre
-                print(f"[ON] Agents W encore actifs (dernière mise à jour W il y a {time_since_last_w_update:.1f}s < {quiescence_delay}s, attente quiescence {wait_for_quiescence:.1f}s/{max_quiescence_wait}s)...")
-                continue
-        else:
-            # Quiescence atteinte, reset le timer
-            if hasattr(periodic_on_task, '_quiescence_start'):
-                delattr(periodic_on_task, '_quiescence_start')
-        
-        # V5: CRITIQUE - Vérification finale : s'assurer que l'image est vraiment récente
-        # (au cas où une nouvelle image serait arrivée pendant les vérifications précédentes)
-        # CRITICAL: Ignorer cette vérification si on a déjà forcé l'analyse avec timeout
-        now_final = datetime.now(timezone.utc)
-        if store.last_update_time and not image_timeout_forced:
-            final_image_age = (now_final - store.last_update_time).total_seconds()
-            if final_image_age > 8.0:  # Si l'image a plus de 8s, elle est probablement obsolète
-                print(f"[ON] ⏳ Image finale trop ancienne ({final_image_age:.1f}s), attente mise à jour...")
-                continue
-        
         img_size = len(store.latest_image_base64) if store.latest_image_base64 else 0
-        # V5: Vérifier taille minimale d'image (éviter images vides ou trop petites)
-        min_image_size = 1000  # 1KB minimum (une image 20x20 avec quelques pixels devrait faire ~2-5KB)
-        if img_size < min_image_size:
-            print(f"[ON] Image trop petite ({img_size} bytes < {min_image_size} bytes), attente image valide...")
-            continue
+        image_age = (now - store.last_update_time).total_seconds() if store.last_update_time else 0
         
-        print(f"[ON] Analyse avec Gemini ({store.agents_count} agents, image: {img_size} bytes, age: {image_age:.1f}s)...")
+        print(f"[ON] Tour {rnd.round_id}: analyse avec Gemini ({store.agents_count} agents, image: {img_size} bytes, age: {image_age:.1f}s)...")
         
         # Étape 1 : O analysis (structures + C_d + relations formelles)
         # CRITICAL: Extraire les positions AVANT de nettoyer les agents obsolètes
@@ -1405,58 +1400,12 @@ async def periodic_on_task():
         o_result = None
         o_tokens = None
         for attempt in range(3):  # Augmenter à 3 tentatives
-            o_result, o_tokens = await call_gemini_o(store.latest_image_base64, store.agents_count, store.latest, agent_positions_list)
+            # V5: positions invalides retirées, chevauchements refusés avant la mise en cache
+            o_result, o_tokens = await call_gemini_o(
+                store.latest_image_base64, store.agents_count, store.latest, agent_positions_list,
+                use_cache=(attempt == 0), accept=lambda result: check_o_result(result, agent_positions_list))
             if o_result:
-                # V5: Valider que toutes les positions dans les structures sont valides
-                if agent_positions_list and len(agent_positions_list) > 0:
-                    structures = o_result.get('structures', [])
-                    invalid_positions = []
-                    corrected_structures = []
-                    
-                    for struct in structures:
-                        agent_positions = struct.get('agent_positions', [])
-                        valid_positions = []
-                        struct_invalid = False
-                        
-                        for pos in agent_positions:
-                            if pos in agent_positions_list:
-                                valid_positions.append(pos)
-                            else:
-                                invalid_positions.append(pos)
-                                struct_invalid = True
-                        
-                        # CRITICAL: Ne garder que les structures avec positions valides
-                        if valid_positions:
-                            struct['agent_positions'] = valid_positions
-                            struct['size_agents'] = len(valid_positions)  # Corriger size_agents
-                            corrected_structures.append(struct)
-                        # Sinon, rejeter la structure complètement
-                    
-                    if invalid_positions:
-                        print(f"[ON] ⚠️  ATTENTION: O a retourné {len(invalid_positions)} positions invalides: {invalid_positions}")
-                        print(f"[ON] 📍 Positions valides: {agent_positions_list}")
-                        print(f"[ON] 🔧 Structures corrigées: {len(corrected_structures)}/{len(structures)} conservées")
-                    
-                    # Remplacer les structures par les versions corrigées
-                    o_result['structures'] = corrected_structures
-                
-                # V5: Valider qu'aucun agent n'apparaît dans plusieurs structures
-                is_valid, errors = validate_structures_no_overlap(o_result)
-                if not is_valid:
-                    print("=" * 60)
-                    print("[O] ⚠️  ERREUR VALIDATION: Agents apparaissant dans plusieurs structures:")
-                    for err in errors:
-                        print(f"[O]    {err}")
-                    print("[O] ⚠️  Le résultat O sera ignoré, conservation snapshot précédent")
-                    print("=" * 60)
-                    o_result = None  # Invalider le résultat
-                    if attempt < 2:
-                        delay = 3 * (attempt + 1)
-                        print(f"[O] Retry dans {delay}s...")
-                        await asyncio.sleep(delay)
-                        continue
-                else:
-                    break  # Résultat valide
+                break  # Résultat valide
             if attempt < 2:
                 delay = 3 * (attempt + 1)  # Délai progressif: 3s, 6s
                 print(f"[O] Tentative {attempt + 1} échouée, retry dans {delay}s...")
@@ -1483,12 +1432,32 @@ async def periodic_on_task():
                     },
                     'agents_count': store.agents_count
                 }
+                # Sans numéro de tour : le snapshot O+N d'un tour déjà en cours dans
+                # l'étage N ne doit pas être refusé comme obsolète à sa publication
                 store.set_snapshot(snapshot)
             continue
         
         # V5: Envoyer snapshot O au serveur de métriques
         await metrics_client.send_o_snapshot(o_result)
         
+        # Étape 2 (N) confiée à l'étage N : la tâche revient au déclencheur,
+        # l'O du tour suivant peut démarrer pendant la narration de celui-ci
+        rnd.o_result, rnd.o_tokens = o_result, o_tokens
+        superseded = on_pipeline.submit(rnd)
+        if superseded is not None:
+            print(f"[ON] Tour {superseded.round_id} supersédé par le tour {rnd.round_id} (N pas encore démarré)")
+
+
+async def n_stage_task():
+    """Étage N du pipeline O→N : narration N + combinaison + publication.
+    Tourne en parallèle de l'étage O du tour suivant (voir on_pipeline).
+    """
+    print("[N] 🚀 Étage N du pipeline O→N démarré")
+    while True:
+        rnd = await on_pipeline.next()
+        o_result, o_tokens = rnd.o_result, rnd.o_tokens
+        published = False
+        
         # Étape 2 : N analysis (narrative + C_w + erreurs prédiction)
         # CRITIQUE: Récupérer les données W JUSTE AVANT d'appeler N (pas au début de la boucle)
         # car d'autres agents peuvent avoir envoyé leurs données entre le début de la boucle et maintenant
@@ -1640,10 +1609,10 @@ async def periodic_on_task():
             if local_metrics_tracker:
                 # Supprimer les agents qui ne sont plus actifs de l'historique
                 inactive_agents = []
-                for agent_id in list(local_metrics_tracker.agent_error_history.keys()):
+                for agent_id in local_metrics_tracker.ranking.agents():
                     if agent_id not in active_agent_ids:
                         inactive_agents.append(agent_id)
-                        del local_metrics_tracker.agent_error_history[agent_id]
+                        local_metrics_tracker.ranking.remove(agent_id)
                 if inactive_agents:
                     print(f"[ON] 🧹 Nettoyage historique: {len(inactive_agents)} agents inactifs supprimés du ranking")
             
@@ -1704,8 +1673,11 @@ async def periodic_on_task():
             if machine_metrics_data:
                 combined_snapshot['machine_metrics'] = machine_metrics_data['machine_metrics']
             
-            store.set_snapshot(combined_snapshot)
-            print(f"[ON] Snapshot O+N combiné (version {store.version}, {len(combined_snapshot['structures'])} structures, U={u_value})")
+            published = store.set_snapshot(combined_snapshot, round_id=rnd.round_id)
+            if not published:
+                print(f"[ON] Tour {rnd.round_id} obsolète (tour {store.round_id} déjà publié), snapshot ignoré")
+                continue
+            print(f"[ON] Snapshot O+N combiné (tour {rnd.round_id}, version {store.version}, {len(combined_snapshot['structures'])} structures, U={u_value})")
 
             combined_snapshot['version'] = store.version
             combined_snapshot['timestamp'] = store.latest.get('timestamp') if store.latest else None
@@ -1719,6 +1691,8 @@ async def periodic_on_task():
         except Exception as e:
             print(f"[ON] Erreur combinaison O+N: {e}")
             # En cas d'erreur, conserver le snapshot précédent
+        finally:
+            on_pipeline.done(rnd, published)
 
 # ==============================================================================
 # FASTAPI APP
@@ -1726,11 +1700,20 @@ async def periodic_on_task():
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    # Pool de connexions OpenRouter partage (O, N et proxy W)
+    await openrouter_pool.start()
+    # session_id du recorder connu avant le premier énoncé O/N/W (sinon sidecar orphan_)
+    await utterance_store.start_session_resolver()
     # Démarrer la connexion au serveur de métriques
     metrics_client.start_background_connection()
+    # Canevas serveur : observer le WebSocket du jeu
+    if CANVAS_SOURCE == "server":
+        canvas_feed.start_background_connection()
     # Démarrer la tâche périodique O→N
     asyncio.create_task(periodic_on_task())
+    asyncio.create_task(n_stage_task())
     yield
+    await openrouter_pool.aclose()
 
 app = FastAPI(title="Poietic AI Server V5", version="5.0.0", lifespan=lifespan)
 app.add_middleware(
@@ -1742,8 +1725,19 @@ app.add_middleware(
 )
 
 @app.get("/o/latest")
-async def get_latest_o(agent_id: Optional[str] = Query(None)):
-    """Récupère le snapshot O+N, personnalisé si agent_id fourni"""
+async def get_latest_o(
+    request: Request,
+    agent_id: Optional[str] = Query(None),
+    wait_for_version: Optional[int] = Query(None, ge=0),
+    timeout: float = Query(LATEST_LONG_POLL_MAX, ge=0),
+):
+    """Récupère le snapshot O+N, personnalisé si agent_id fourni
+    
+    - ETag = version du snapshot ; If-None-Match identique -> 304.
+    - Long-poll : ?wait_for_version=N&timeout=s attend une version >= N.
+    """
+    if wait_for_version is not None:
+        await store.feed.wait_for_version(wait_for_version, timeout)
     snapshot = store.latest
     if not snapshot:
         return {
@@ -1763,55 +1757,45 @@ async def get_latest_o(agent_id: Optional[str] = Query(None)):
             '_pending': True
         }
     
-    # Personnaliser si agent_id fourni
-    if agent_id:
-        # Récupérer l'erreur de prédiction pour cet agent, ou utiliser valeur par défaut
-        all_errors = snapshot.get('prediction_errors', {})
-        agent_error = all_errors.get(agent_id)
-        if not agent_error:
-            # Pas d'erreur pour cet agent : utiliser valeur par défaut
-            agent_error = {
-                'error': 0.0,
-                'explanation': 'No previous prediction available (first action or no prediction data)'
-            }
-        # Inclure aussi le ranking de l'agent dans la réponse personnalisée
-        all_rankings = snapshot.get('agent_rankings', {})
-        agent_ranking = all_rankings.get(agent_id, {})
-        
-        personalized = {
-            **snapshot,
-            'prediction_errors': {
-                agent_id: agent_error
-            },
-            'agent_rankings': {
-                agent_id: agent_ranking  # Inclure le ranking de l'agent
-            } if agent_ranking else {}
-        }
-        return personalized
-    
-    return snapshot
+    headers = {'ETag': store.feed.etag, 'Cache-Control': 'no-cache'}
+    if store.feed.not_modified_for(request.headers.get('if-none-match')):
+        return Response(status_code=304, headers=headers)
+    # Octets partagés + fragment personnel (erreur de prédiction et ranking de l'agent)
+    body = store.feed.body(agent_id)
+    if body is None:
+        return JSONResponse(status_code=500, content={'error': 'snapshot_not_serializable'})
+    return Response(content=body, media_type='application/json', headers=headers)
 
 
 @app.post("/o/image")
-async def post_o_image(payload: dict = Body(...)):
+async def post_o_image(request: Request):
     """Recevoir l'image globale d'un agent W
     
+    Formats : JSON {image_base64, agents_count}, corps brut image/png
+    (?agents_count=N) ou multipart (champ `image`) — voir image_ingest.
+    
     NOTE: Tous les clients W envoient leur image. Le serveur utilise la dernière image reçue.
     Cela peut causer des problèmes si plusieurs clients envoient en même temps.
     Solution: Le serveur accepte toutes les images mais utilise la plus récente (par timestamp).
     """
-    img = payload.get('image_base64') or ''
-    agents = payload.get('agents_count')
-    if img.startswith('data:image/png;base64,'):
-        img = img.replace('data:image/png;base64,', '')
-    if not img or any(c not in 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/=' for c in img):
-        print(f"[O] ⚠️  Image invalide reçue: longueur={len(img)}, début={img[:50] if img else 'None'}")
-        return {'ok': False, 'error': 'invalid_base64'}
+    try:
+        upload = await read_image_upload(request)
+    except ImageUploadError as e:
+        print(f"[O] ⚠️  Image refusée: {e.code}")
+        return JSONResponse(status_code=e.status, content={'ok': False, 'error': e.code})
+    agents = upload.agents_count
+    if CANVAS_SOURCE == "server":
+        # L'image O est rendue par le serveur : l'envoi du client ne sert que de signal d'activité
+        store.last_update_time = datetime.now(timezone.utc)
+        if agents is not None:
+            store.set_agents_count(agents)
+        # Comme pour le canevas client : agents actifs et agents_count signalés au déclencheur
+        on_trigger.notify_agents()
+        return {'ok': True, 'timestamp': datetime.now(timezone.utc).isoformat(), 'agents_count': store.agents_count, 'ignored': True, 'source': 'server'}
     
-    # Vérifier si l'image est significativement différente de la précédente (pour éviter spam)
-    previous_size = len(store.latest_image_base64) if store.latest_image_base64 else 0
-    current_size = len(img)
-    size_diff = abs(current_size - previous_size)
+    # Vérifier si le canevas a changé (empreinte des pixels décodés, pas la taille du base64)
+    # Décodage PNG hors de la boucle d'événements
+    img_hash = await asyncio.to_thread(canvas_hash_bytes, upload.raw, o_cache.quant_bits)
     
     # CRITICAL: Mettre à jour last_update_time même si l'image est similaire
     # pour indiquer que les agents sont toujours actifs (évite fausses déconnexions)
@@ -1819,18 +1803,19 @@ async def post_o_image(payload: dict = Body(...)):
     store.last_update_time = now
     if store.first_update_time is None:
         store.first_update_time = now
+    on_trigger.notify_image()
     
-    # Accepter l'image si elle est nouvelle ou significativement différente
-    if not store.latest_image_base64 or size_diff > 100:  # Au moins 100 chars de différence
-        print(f"[O] 📥 Image reçue: {len(img)} chars base64, {agents} agents (diff: {size_diff} chars)")
-        store.set_image(img)
+    # Accepter l'image si elle est nouvelle ou si le canevas a changé
+    if not store.latest_image_base64 or img_hash != store.latest_image_hash:
+        print(f"[O] 📥 Image reçue ({upload.source}): {len(upload.raw)} octets, {agents} agents (empreinte {img_hash[3:15]})")
+        store.set_image(upload.base64, image_hash=img_hash)
         if agents is not None:
             store.set_agents_count(agents)
         return {'ok': True, 'timestamp': datetime.now(timezone.utc).isoformat(), 'agents_count': store.agents_count}
     else:
-        # Image très similaire à la précédente - probablement un doublon, ignorer l'image mais mettre à jour timestamp
+        # Canevas identique au précédent - doublon, ignorer l'image mais mettre à jour timestamp
         # CRITICAL: Mettre à jour last_update_time pour indiquer que les agents sont toujours actifs
-        print(f"[O] 📥 Image similaire ignorée (diff: {size_diff} chars < 100) mais timestamp mis à jour (agents actifs)")
+        print(f"[O] 📥 Image identique ignorée (même empreinte canevas) mais timestamp mis à jour (agents actifs)")
         if agents is not None:
             store.set_agents_count(agents)
         return {'ok': True, 'timestamp': datetime.now(timezone.utc).isoformat(), 'agents_count': store.agents_count, 'ignored': True}
@@ -1842,6 +1827,21 @@ async def get_o_image():
     return {'image_base64': store.latest_image_base64, 'timestamp': datetime.now(timezone.utc).isoformat()}
 
 
+@app.get("/o/canvas.png")
+async def get_o_canvas_png(pixel_size: Optional[int] = Query(None, ge=1, le=20)):
+    """Rendu PNG du canevas serveur (mis en cache par version)"""
+    if not canvas.has_content():
+        return JSONResponse(status_code=404, content={'error': 'empty_canvas'})
+    return Response(content=canvas.render_png(pixel_size), media_type='image/png',
+                    headers={'X-Canvas-Version': str(canvas.version)})
+
+
+@app.get("/o/canvas/delta")
+async def get_o_canvas_delta(since: int = Query(0, ge=0), pixel_size: Optional[int] = Query(None, ge=1, le=20)):
+    """Tuiles PNG des grilles modifiées depuis `since` (full=True : recharger /o/canvas.png)"""
+    return canvas.render_delta(since, pixel_size)
+
+
 @app.post("/o/agents")
 async def post_o_agents(payload: dict = Body(...)):
     """Mettre à jour le nombre d'agents actifs"""
@@ -1849,6 +1849,7 @@ async def post_o_agents(payload: dict = Body(...)):
     if n is None:
         return {'ok': False, 'error': 'missing_count'}
     store.set_agents_count(n)
+    on_trigger.notify_agents()
     return {'ok': True, 'agents_count': store.agents_count, 'timestamp': datetime.now(timezone.utc).isoformat()}
 
 
@@ -1860,6 +1861,9 @@ async def receive_w_data(payload: dict = Body(...)):
         return {'ok': False, 'error': 'missing_agent_id'}
     
     w_store.update_agent_data(agent_id, payload)
+    on_trigger.notify_w_data()
+    if canvas.apply_w_pixels(agent_id, payload.get('position'), payload.get('pixels') or []) and CANVAS_SOURCE == "server":
+        on_trigger.notify_image()
     agent_record = {
         'id': agent_id,
         'position': payload.get('position', [0, 0]),
@@ -1905,21 +1909,38 @@ async def proxy_openrouter_v5(request: Request):
     agent_id = body.get("agent_id") or "W-agent"
     if cost_tracker.is_over_budget(session_id, MAX_SESSION_USD):
         return JSONResponse(status_code=402, content={"error": "budget_exceeded", "session_cost_usd": cost_tracker.session_cost(session_id)})
+    lane = lane_from_request(body)
+    fair_key = agent_from_request(body, request.headers, request.client.host if request.client else None)
+    try:
+        resp = await llm_scheduler.run(
+            lane, fair_key,
+            lambda: openrouter_pool.post(OPENROUTER_CHAT_URL, route="w", headers=_openrouter_headers(), json=payload),
+        )
+    except asyncio.TimeoutError:
+        return JSONResponse(status_code=503, headers={"Retry-After": "10"}, content={"error": "file d'attente LLM saturee"})
+    except Exception as e:
+        return JSONResponse(status_code=502, content={"error": f"Erreur reseau OpenRouter: {e}"})
     try:
-        async with httpx.AsyncClient(timeout=httpx.Timeout(420.0, connect=30.0)) as client:
-            resp = await client.post(OPENROUTER_CHAT_URL, headers=_openrouter_headers(), json=payload)
         data = resp.json()
         if isinstance(data, dict) and data.get("usage"):
             cost_tracker.record(session_id, agent_id, model, data["usage"])
         return JSONResponse(status_code=resp.status_code, content=data)
     except Exception as e:
-        return JSONResponse(status_code=502, content={"error": f"Erreur reseau OpenRouter: {e}"})
+        return JSONResponse(status_code=502, content={"error": f"Reponse OpenRouter invalide: {e}"})
 
 
 @app.get("/api/usage")
 async def get_usage_v5(session_id: Optional[str] = Query(None)):
-    """Agregats de cout (session/agent/modele) : O, N et agents W."""
-    return cost_tracker.snapshot(session_id)
+    """Agregats de cout (session/agent/modele) : O, N et agents W + etat de l'ordonnanceur et du pipeline O→N."""
+    return {
+        **cost_tracker.snapshot(session_id),
+        "scheduler": llm_scheduler.stats(),
+        "o_cache": o_cache.stats(),
+        "pipeline": {**on_pipeline.stats(), "trigger": on_trigger.stats(), "published_round": store.round_id},
+        "canvas": {**canvas.stats(), "feed": canvas_feed.stats()},
+        "vision": vision_optimizer.stats(),
+        "latest_feed": store.feed.stats(),
+    }
 
 
 @app.get("/api/usage/openrouter")
@@ -1928,8 +1949,7 @@ async def get_openrouter_usage_v5():
     if not OPENROUTER_API_KEY:
         return JSONResponse(status_code=400, content={"error": "OPENROUTER_API_KEY non définie"})
     try:
-        async with httpx.AsyncClient(timeout=httpx.Timeout(20.0, connect=10.0)) as client:
-            resp = await client.get(f"{OPENROUTER_BASE_URL}/credits", headers=_openrouter_headers())
+        resp = await openrouter_pool.get(f"{OPENROUTER_BASE_URL}/credits", route="credits", headers=_openrouter_headers())
         payload = resp.json()
         d = payload.get("data", payload) if isinstance(payload, dict) else {}
         tc, tu = d.get("total_credits"), d.get("total_usage")
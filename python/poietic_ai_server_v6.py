@@ -10,12 +10,11 @@ Q-machine cycle: Ss → O → N → Ws → O → N → Ws → ...
 """
 from fastapi import FastAPI, Body, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from typing import Optional, Tuple, List, Dict
 from datetime import datetime, timezone
 from contextlib import asynccontextmanager
 import asyncio
-import httpx
 import json
 import os
 import base64
@@ -24,6 +23,12 @@ import math
 import websockets
 from websockets.exceptions import ConnectionClosed, WebSocketException
 
+from analysis_trigger import AnalysisTrigger
+from canvas_model import CANVAS_SOURCE, CanvasModel, GameCanvasFeed
+from image_ingest import ImageUploadError, read_image_upload
+from snapshot_feed import LATEST_LONG_POLL_MAX, SnapshotFeed
+from vision_payload import VisionPayloadOptimizer
+
 # ==============================================================================
 # CONFIGURATION
 # ==============================================================================
@@ -65,6 +70,12 @@ def _openrouter_headers():
 # Suivi de cout (reutilise le CostTracker generique de V4or)
 from cost_tracker_v4or import CostTracker
 cost_tracker = CostTracker()
+# Pool de connexions OpenRouter partage (cree dans lifespan, ferme a l'arret)
+from openrouter_client import OpenRouterPool
+openrouter_pool = OpenRouterPool()
+# Ordonnanceur des appels LLM : O/N prioritaires sur les seeds W, puis actions W
+from llm_scheduler import LLMScheduler, LANE_ON, agent_from_request, lane_from_request
+llm_scheduler = LLMScheduler()
 BENCH_SESSION_ID = 'poietic-v6'  # libelle de session fige (independant de SESSION_ID partage)
 MAX_SESSION_USD = float(os.getenv('MAX_SESSION_USD', '0') or '0')
 
@@ -164,11 +175,17 @@ class QuantumOSnapshotStore:
         self.latest: Optional[dict] = None
         self.version: int = 0
         self.latest_image_base64: Optional[str] = None
+        self.latest_image_hash: Optional[str] = None
         self.agents_count: int = 0
         self.first_analysis_start_time: Optional[datetime] = None
         self.last_update_time: Optional[datetime] = None
         self.first_update_time: Optional[datetime] = None
         self.updates_count: int = 0
+        # Pre-serialized bytes + long-poll for /q/latest
+        self.feed = SnapshotFeed(default_error={
+            'error': 0.0,
+            'explanation': 'No previous prediction (first measurement or no data)'
+        }, etag_prefix='q')
         
         # V6: Quantum coherence history
         self.coherence_history = {
@@ -183,6 +200,7 @@ class QuantumOSnapshotStore:
         snapshot['version'] = self.version
         snapshot['timestamp'] = datetime.now(timezone.utc).isoformat()
         self.latest = snapshot
+        self.feed.publish(snapshot)
         
         # Track coherence history
         coherence = snapshot.get('coherence_observables', {})
@@ -197,9 +215,10 @@ class QuantumOSnapshotStore:
         if self.first_analysis_start_time is not None:
             self.first_analysis_start_time = None
 
-    def set_image(self, image_base64: str):
+    def set_image(self, image_base64: str, image_hash: Optional[str] = None):
         now = datetime.now(timezone.utc)
         self.latest_image_base64 = image_base64
+        self.latest_image_hash = image_hash
         self.last_update_time = now
         if self.first_update_time is None:
             self.first_update_time = self.last_update_time
@@ -225,6 +244,34 @@ class QuantumOSnapshotStore:
 # Global instances
 store = QuantumOSnapshotStore()
 w_store = QuantumWAgentDataStore()
+# O→N trigger (signalled by /q/image, /q/agents, /q/w-data): quiescence only,
+# no image-age or first-analysis delays in V6
+on_trigger = AnalysisTrigger(
+    max_quiescence_wait=None,
+    max_image_age_first=None,
+    max_image_age=None,
+    max_w_image_lag=None,
+    final_image_age=None,
+    first_analysis_timeout=None,
+    first_settle=None,
+)
+# Server-side global canvas (game WebSocket + W pixels);
+# source of the O image when CANVAS_SOURCE=server
+canvas = CanvasModel()
+canvas_feed = GameCanvasFeed(canvas, on_change=on_trigger.notify_image if CANVAS_SOURCE == "server" else None)
+# O image preprocessing (downscale, crop, palette)
+vision_optimizer = VisionPayloadOptimizer()
+
+
+def publish_server_canvas() -> bool:
+    """CANVAS_SOURCE=server: publish the server canvas render to the store when it changed."""
+    if CANVAS_SOURCE != "server" or not canvas.has_content():
+        return False
+    img_hash = canvas.content_hash()
+    if img_hash == store.latest_image_hash:
+        return False
+    store.set_image(canvas.to_base64(), image_hash=img_hash)
+    return True
 
 # ==============================================================================
 # METRICS CLIENT (connects to quantum metrics server on port 5006)
@@ -445,12 +492,16 @@ async def call_gemini_o_quantum(image_base64: str, agents_count: int, previous_s
     # Prepare request
     parts = [{'text': prompt}]
     if image_base64:
-        clean_base64 = image_base64
-        if clean_base64.startswith('data:image/png;base64,'):
-            clean_base64 = clean_base64.replace('data:image/png;base64,', '')
+        # Lossless downscale / crop / palette before sending (image tokens), in a thread: PNG decode/re-encode
+        clean_base64, mime_type, vision_report = await asyncio.to_thread(vision_optimizer.optimize, image_base64)
+        cost_tracker.record_vision(BENCH_SESSION_ID, 'O-machine', vision_report)
+        if vision_report['applied']:
+            print(f"[Q-O] 🗜️  Image optimized: {vision_report['size_before']}→{vision_report['size_after']}px, "
+                  f"{vision_report['bytes_before']}→{vision_report['bytes_after']} chars, "
+                  f"~{vision_report['tokens_saved']} image tokens saved")
         parts.append({
             'inline_data': {
-                'mime_type': 'image/png',
+                'mime_type': mime_type,
                 'data': clean_base64
             }
         })
@@ -465,40 +516,41 @@ async def call_gemini_o_quantum(image_base64: str, agents_count: int, previous_s
     }
     
     try:
-        timeout_obj = httpx.Timeout(120.0, connect=30.0)
-        async with httpx.AsyncClient(timeout=timeout_obj) as client:
-            resp = await client.post(url, headers=_openrouter_headers(), json=body)
-            if not resp.is_success:
-                print(f"[Q-O] HTTP Error {resp.status_code}: {resp.text[:500]}")
-                return (None, None)
-            
-            raw = resp.json()
+        resp = await llm_scheduler.run(
+            LANE_ON, 'Q-O-machine',
+            lambda: openrouter_pool.post(url, route='o', headers=_openrouter_headers(), json=body),
+        )
+        if not resp.is_success:
+            print(f"[Q-O] HTTP Error {resp.status_code}: {resp.text[:500]}")
+            return (None, None)
+        
+        raw = resp.json()
+        text = ''
+        try:
+            text = (raw['choices'][0]['message']['content'] or '')
+        except (KeyError, IndexError, TypeError):
             text = ''
-            try:
-                text = (raw['choices'][0]['message']['content'] or '')
-            except (KeyError, IndexError, TypeError):
-                text = ''
-            _u = raw.get('usage', {}) if isinstance(raw, dict) else {}
-            data = {'usageMetadata': {
-                'candidatesTokenCount': _u.get('completion_tokens', 0),
-                'promptTokenCount': _u.get('prompt_tokens', 0),
-                'totalTokenCount': _u.get('total_tokens', 0),
-                'thoughtsTokenCount': 0,
-            }}
-            cost_tracker.record(BENCH_SESSION_ID, 'O-machine', LLM_MODEL, _u)
-
-            if not text or len(text.strip()) < 10:
-                print(f"[Q-O] ❌ Empty or too short Gemini response")
-                return (None, None)
-            
-            result = parse_json_robust(text, "[Q-O]")
-            usage_metadata = data.get('usageMetadata', {})
-            output_tokens = usage_metadata.get('candidatesTokenCount', 0)
+        _u = raw.get('usage', {}) if isinstance(raw, dict) else {}
+        data = {'usageMetadata': {
+            'candidatesTokenCount': _u.get('completion_tokens', 0),
+            'promptTokenCount': _u.get('prompt_tokens', 0),
+            'totalTokenCount': _u.get('total_tokens', 0),
+            'thoughtsTokenCount': 0,
+        }}
+        cost_tracker.record(BENCH_SESSION_ID, 'O-machine', LLM_MODEL, _u)
+
+        if not text or len(text.strip()) < 10:
+            print(f"[Q-O] ❌ Empty or too short Gemini response")
+            return (None, None)
+        
+        result = parse_json_robust(text, "[Q-O]")
+        usage_metadata = data.get('usageMetadata', {})
+        output_tokens = usage_metadata.get('candidatesTokenCount', 0)
+        
+        if result:
+            print(f"[Q-O] ✅ Quantum measurement successful (output: {output_tokens} tokens)")
+        return (result, output_tokens if result else None)
             
-            if result:
-                print(f"[Q-O] ✅ Quantum measurement successful (output: {output_tokens} tokens)")
-            return (result, output_tokens if result else None)
-                
     except Exception as e:
         print(f"[Q-O] Gemini call error: {e}")
         return (None, None)
@@ -563,40 +615,41 @@ async def call_gemini_n_quantum(o_snapshot: dict, w_agents_data: dict, previous_
     }
     
     try:
-        timeout_obj = httpx.Timeout(120.0, connect=30.0)
-        async with httpx.AsyncClient(timeout=timeout_obj) as client:
-            resp = await client.post(url, headers=_openrouter_headers(), json=body)
-            if not resp.is_success:
-                print(f"[Q-N] HTTP Error {resp.status_code}: {resp.text[:500]}")
-                return (None, None)
-            
-            raw = resp.json()
+        resp = await llm_scheduler.run(
+            LANE_ON, 'Q-N-machine',
+            lambda: openrouter_pool.post(url, route='n', headers=_openrouter_headers(), json=body),
+        )
+        if not resp.is_success:
+            print(f"[Q-N] HTTP Error {resp.status_code}: {resp.text[:500]}")
+            return (None, None)
+        
+        raw = resp.json()
+        text = ''
+        try:
+            text = (raw['choices'][0]['message']['content'] or '')
+        except (KeyError, IndexError, TypeError):
             text = ''
-            try:
-                text = (raw['choices'][0]['message']['content'] or '')
-            except (KeyError, IndexError, TypeError):
-                text = ''
-            _u = raw.get('usage', {}) if isinstance(raw, dict) else {}
-            data = {'usageMetadata': {
-                'candidatesTokenCount': _u.get('completion_tokens', 0),
-                'promptTokenCount': _u.get('prompt_tokens', 0),
-                'totalTokenCount': _u.get('total_tokens', 0),
-                'thoughtsTokenCount': 0,
-            }}
-            cost_tracker.record(BENCH_SESSION_ID, 'N-machine', LLM_MODEL, _u)
-
-            if not text or len(text.strip()) < 10:
-                print(f"[Q-N] ❌ Empty or too short Gemini response")
-                return (None, None)
-            
-            result = parse_json_robust(text, "[Q-N]")
-            usage_metadata = data.get('usageMetadata', {})
-            output_tokens = usage_metadata.get('candidatesTokenCount', 0)
+        _u = raw.get('usage', {}) if isinstance(raw, dict) else {}
+        data = {'usageMetadata': {
+            'candidatesTokenCount': _u.get('completion_tokens', 0),
+            'promptTokenCount': _u.get('prompt_tokens', 0),
+            'totalTokenCount': _u.get('total_tokens', 0),
+            'thoughtsTokenCount': 0,
+        }}
+        cost_tracker.record(BENCH_SESSION_ID, 'N-machine', LLM_MODEL, _u)
+
+        if not text or len(text.strip()) < 10:
+            print(f"[Q-N] ❌ Empty or too short Gemini response")
+            return (None, None)
+        
+        result = parse_json_robust(text, "[Q-N]")
+        usage_metadata = data.get('usageMetadata', {})
+        output_tokens = usage_metadata.get('candidatesTokenCount', 0)
+        
+        if result:
+            print(f"[Q-N] ✅ Quantum interpretation successful (output: {output_tokens} tokens)")
+        return (result, output_tokens if result else None)
             
-            if result:
-                print(f"[Q-N] ✅ Quantum interpretation successful (output: {output_tokens} tokens)")
-            return (result, output_tokens if result else None)
-                
     except Exception as e:
         print(f"[Q-N] Gemini call error: {e}")
         return (None, None)
@@ -643,12 +696,18 @@ def parse_json_robust(text: str, prefix: str = "") -> Optional[dict]:
 # ==============================================================================
 
 async def periodic_quantum_on_task():
-    """Periodic quantum measurement cycle: O (measurement) → N (interpretation)"""
-    print("[Q-ON] 🚀 Quantum O→N periodic task started")
+    """Quantum measurement cycle: O (measurement) → N (interpretation)
+    Woken by /q/image, /q/agents and /q/w-data signals (see on_trigger)
+    or by the next timer deadline (warmup, quiescence).
+    """
+    print("[Q-ON] 🚀 Quantum O→N task started (event-driven trigger)")
+    retry_in = None
     while True:
-        await asyncio.sleep(2)
+        await on_trigger.wait(retry_in)
+        retry_in = None
+        publish_server_canvas()
         
-        now = datetime.now(timezone.utc)
+        first_analysis = store.latest is None
         
         # Clean stale agents first
         w_store.clear_stale_agents(timeout=60)
@@ -661,6 +720,7 @@ async def periodic_quantum_on_task():
             # No active agents - skip and reset image state
             if store.latest_image_base64:
                 store.latest_image_base64 = None
+                store.latest_image_hash = None
                 store.agents_count = 0
                 print("[Q-ON] No active agents, waiting...")
             continue
@@ -669,42 +729,33 @@ async def periodic_quantum_on_task():
             continue
         
         # Warmup
-        warmup_delay = 30
-        warmup_timeout = 60
-        
-        min_agents_ratio = 0.75
-        if store.agents_count == 1:
-            min_agents_with_data = 1
-        else:
-            min_agents_with_data = max(2, int(store.agents_count * min_agents_ratio)) if store.agents_count > 0 else 2
-        
-        elapsed = (now - store.first_update_time).total_seconds() if store.first_update_time else 0
-        
-        is_warmup = False
-        if store.latest is None:
-            if elapsed < warmup_delay and agents_with_data < min_agents_with_data:
-                is_warmup = True
-            elif elapsed >= warmup_timeout:
-                print(f"[Q-ON] ⚠️ Warmup timeout ({elapsed:.1f}s) - forcing with {agents_with_data}/{store.agents_count} slits")
-                is_warmup = False
-        
-        if is_warmup:
-            print(f"[Q-ON] Warmup ({elapsed:.1f}s, {agents_with_data}/{store.agents_count} slits)...")
+        decision = on_trigger.check_warmup(
+            first_analysis=first_analysis,
+            agents_count=store.agents_count,
+            agents_with_data=agents_with_data,
+        )
+        if not decision.fire:
+            if on_trigger.should_log(decision):
+                print(f"[Q-ON] {decision.reason}")
+            retry_in = decision.retry_in
             continue
         
         if store.agents_count == 0:
             continue
         
-        # Check quiescence
-        quiescence_delay = 6.0 if store.latest is None else 5.0
-        all_finished, time_since_last = w_store.all_agents_finished(quiescence_delay=quiescence_delay)
-        
-        if not all_finished:
+        # Check quiescence (+ minimal image size)
+        decision = on_trigger.check_ready(
+            first_analysis=first_analysis,
+            agents_count=store.agents_count,
+            agents_with_data=agents_with_data,
+            image_size=len(store.latest_image_base64 or ''),
+        )
+        if not decision.fire:
+            retry_in = decision.retry_in
             continue
+        on_trigger.begin_analysis()
         
-        img_size = len(store.latest_image_base64) if store.latest_image_base64 else 0
-        if img_size < 1000:
-            continue
+        img_size = len(store.latest_image_base64)
         
         print(f"[Q-ON] Quantum measurement with Gemini ({store.agents_count} slits, image: {img_size} bytes)...")
         
@@ -848,9 +899,13 @@ async def periodic_quantum_on_task():
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    await openrouter_pool.start()
     metrics_client.start_background_connection()
+    if CANVAS_SOURCE == "server":
+        canvas_feed.start_background_connection()
     asyncio.create_task(periodic_quantum_on_task())
     yield
+    await openrouter_pool.aclose()
 
 app = FastAPI(title="Poietic AI Server V6 - Quantum", version="6.0.0", lifespan=lifespan)
 app.add_middleware(
@@ -862,8 +917,19 @@ app.add_middleware(
 )
 
 @app.get("/q/latest")
-async def get_latest_quantum(agent_id: Optional[str] = Query(None)):
-    """Get quantum O+N snapshot, personalized if agent_id provided"""
+async def get_latest_quantum(
+    request: Request,
+    agent_id: Optional[str] = Query(None),
+    wait_for_version: Optional[int] = Query(None, ge=0),
+    timeout: float = Query(LATEST_LONG_POLL_MAX, ge=0),
+):
+    """Get quantum O+N snapshot, personalized if agent_id provided
+    
+    - ETag = snapshot version; matching If-None-Match -> 304.
+    - Long-poll: ?wait_for_version=N&timeout=s waits for a version >= N.
+    """
+    if wait_for_version is not None:
+        await store.feed.wait_for_version(wait_for_version, timeout)
     snapshot = store.latest
     if not snapshot:
         return {
@@ -891,23 +957,14 @@ async def get_latest_quantum(agent_id: Optional[str] = Query(None)):
             '_pending': True
         }
     
-    if agent_id:
-        all_errors = snapshot.get('prediction_errors', {})
-        agent_error = all_errors.get(agent_id, {
-            'error': 0.0,
-            'explanation': 'No previous prediction (first measurement or no data)'
-        })
-        all_rankings = snapshot.get('agent_rankings', {})
-        agent_ranking = all_rankings.get(agent_id, {})
-        
-        personalized = {
-            **snapshot,
-            'prediction_errors': {agent_id: agent_error},
-            'agent_rankings': {agent_id: agent_ranking} if agent_ranking else {}
-        }
-        return personalized
-    
-    return snapshot
+    headers = {'ETag': store.feed.etag, 'Cache-Control': 'no-cache'}
+    if store.feed.not_modified_for(request.headers.get('if-none-match')):
+        return Response(status_code=304, headers=headers)
+    # Shared bytes + personal fragment (agent prediction error and ranking)
+    body = store.feed.body(agent_id)
+    if body is None:
+        return JSONResponse(status_code=500, content={'error': 'snapshot_not_serializable'})
+    return Response(content=body, media_type='application/json', headers=headers)
 
 
 @app.get("/q/coherence")
@@ -934,18 +991,28 @@ async def get_coherence_history():
 
 
 @app.post("/q/image")
-async def post_quantum_image(payload: dict = Body(...)):
-    """Receive global canvas image from W-instance"""
-    img = payload.get('image_base64') or ''
-    agents = payload.get('agents_count')
-    if img.startswith('data:image/png;base64,'):
-        img = img.replace('data:image/png;base64,', '')
-    if not img or any(c not in 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/=' for c in img):
-        return {'ok': False, 'error': 'invalid_base64'}
+async def post_quantum_image(request: Request):
+    """Receive global canvas image from W-instance
     
-    store.set_image(img)
+    Formats: JSON {image_base64, agents_count}, raw image/png body
+    (?agents_count=N) or multipart (`image` field) — see image_ingest.
+    """
+    try:
+        upload = await read_image_upload(request)
+    except ImageUploadError as e:
+        return JSONResponse(status_code=e.status, content={'ok': False, 'error': e.code})
+    agents = upload.agents_count
+    if CANVAS_SOURCE == "server":
+        # O image is rendered server-side: the client upload only signals activity
+        store.last_update_time = datetime.now(timezone.utc)
+        if agents is not None:
+            store.set_agents_count(agents)
+        return {'ok': True, 'timestamp': datetime.now(timezone.utc).isoformat(), 'agents_count': store.agents_count, 'ignored': True, 'source': 'server'}
+    
+    store.set_image(upload.base64)
     if agents is not None:
         store.set_agents_count(agents)
+    on_trigger.notify_image()
     return {'ok': True, 'timestamp': datetime.now(timezone.utc).isoformat(), 'agents_count': store.agents_count}
 
 
@@ -955,6 +1022,21 @@ async def get_quantum_image():
     return {'image_base64': store.latest_image_base64, 'timestamp': datetime.now(timezone.utc).isoformat()}
 
 
+@app.get("/q/canvas.png")
+async def get_quantum_canvas_png(pixel_size: Optional[int] = Query(None, ge=1, le=20)):
+    """PNG render of the server-side canvas (cached per version)"""
+    if not canvas.has_content():
+        return JSONResponse(status_code=404, content={'error': 'empty_canvas'})
+    return Response(content=canvas.render_png(pixel_size), media_type='image/png',
+                    headers={'X-Canvas-Version': str(canvas.version)})
+
+
+@app.get("/q/canvas/delta")
+async def get_quantum_canvas_delta(since: int = Query(0, ge=0), pixel_size: Optional[int] = Query(None, ge=1, le=20)):
+    """PNG tiles of grids changed since `since` (full=True: reload /q/canvas.png)"""
+    return canvas.render_delta(since, pixel_size)
+
+
 @app.post("/q/agents")
 async def post_quantum_agents(payload: dict = Body(...)):
     """Update active agent count"""
@@ -962,6 +1044,7 @@ async def post_quantum_agents(payload: dict = Body(...)):
     if n is None:
         return {'ok': False, 'error': 'missing_count'}
     store.set_agents_count(n)
+    on_trigger.notify_agents()
     return {'ok': True, 'agents_count': store.agents_count, 'timestamp': datetime.now(timezone.utc).isoformat()}
 
 
@@ -973,6 +1056,9 @@ async def receive_quantum_w_data(payload: dict = Body(...)):
         return {'ok': False, 'error': 'missing_agent_id'}
     
     w_store.update_agent_data(agent_id, payload)
+    on_trigger.notify_w_data()
+    if canvas.apply_w_pixels(agent_id, payload.get('position'), payload.get('pixels') or []) and CANVAS_SOURCE == "server":
+        on_trigger.notify_image()
     return {'ok': True, 'agent_id': agent_id, 'timestamp': datetime.now(timezone.utc).isoformat()}
 
 
@@ -1002,21 +1088,36 @@ async def proxy_openrouter_v6(request: Request):
     agent_id = body.get("agent_id") or "W-agent"
     if cost_tracker.is_over_budget(session_id, MAX_SESSION_USD):
         return JSONResponse(status_code=402, content={"error": "budget_exceeded", "session_cost_usd": cost_tracker.session_cost(session_id)})
+    lane = lane_from_request(body)
+    fair_key = agent_from_request(body, request.headers, request.client.host if request.client else None)
+    try:
+        resp = await llm_scheduler.run(
+            lane, fair_key,
+            lambda: openrouter_pool.post(OPENROUTER_CHAT_URL, route="w", headers=_openrouter_headers(), json=payload),
+        )
+    except asyncio.TimeoutError:
+        return JSONResponse(status_code=503, headers={"Retry-After": "10"}, content={"error": "file d'attente LLM saturee"})
+    except Exception as e:
+        return JSONResponse(status_code=502, content={"error": f"Erreur reseau OpenRouter: {e}"})
     try:
-        async with httpx.AsyncClient(timeout=httpx.Timeout(420.0, connect=30.0)) as client:
-            resp = await client.post(OPENROUTER_CHAT_URL, headers=_openrouter_headers(), json=payload)
         data = resp.json()
         if isinstance(data, dict) and data.get("usage"):
             cost_tracker.record(session_id, agent_id, model, data["usage"])
         return JSONResponse(status_code=resp.status_code, content=data)
     except Exception as e:
-        return JSONResponse(status_code=502, content={"error": f"Erreur reseau OpenRouter: {e}"})
+        return JSONResponse(status_code=502, content={"error": f"Reponse OpenRouter invalide: {e}"})
 
 
 @app.get("/api/usage")
 async def get_usage_v6(session_id: Optional[str] = Query(None)):
-    """Agregats de cout (session/agent/modele) : O, N et W-instances quantiques."""
-    return cost_tracker.snapshot(session_id)
+    """Agregats de cout (session/agent/modele) : O, N et W-instances quantiques + etat de l'ordonnanceur."""
+    return {
+        **cost_tracker.snapshot(session_id),
+        "scheduler": llm_scheduler.stats(),
+        "canvas": {**canvas.stats(), "feed": canvas_feed.stats()},
+        "vision": vision_optimizer.stats(),
+        "latest_feed": store.feed.stats(),
+    }
 
 
 @app.get("/api/usage/openrouter")
@@ -1025,8 +1126,7 @@ async def get_openrouter_usage_v6():
     if not OPENROUTER_API_KEY:
         return JSONResponse(status_code=400, content={"error": "OPENROUTER_API_KEY non définie"})
     try:
-        async with httpx.AsyncClient(timeout=httpx.Timeout(20.0, connect=10.0)) as client:
-            resp = await client.get(f"{OPENROUTER_BASE_URL}/credits", headers=_openrouter_headers())
+        resp = await openrouter_pool.get(f"{OPENROUTER_BASE_URL}/credits", route="credits", headers=_openrouter_headers())
         payload = resp.json()
         d = payload.get("data", payload) if isinstance(payload, dict) else {}
         tc, tu = d.get("total_credits"), d.get("total_usage")
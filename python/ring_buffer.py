@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""Tampon circulaire en colonnes pour les historiques de metriques (trackers V5, V6).
+
+Remplace les listes tronquees par `self.x = self.x[-N:]` (copie de toute la
+liste a chaque ajout au-dela de la limite) :
+
+- une colonne numpy par metrique (float64, ou objet pour les chaines) et,
+  optionnellement, les enregistrements d'origine (dicts jamais modifies) ;
+- ajout en O(1) : chaque valeur est ecrite deux fois, en `i` et en
+  `i + capacite` (tampon miroir), si bien que les N dernieres valeurs sont
+  toujours contigues : les fenetres sont des vues numpy, sans copie ;
+- agregats vectorises sur une fenetre (moyenne, ecart-type, min, max,
+  moyenne glissante), valeurs non numeriques ignorees (NaN).
+"""
+from __future__ import annotations
+
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+_RECORDS = "__records__"
+
+
+def _to_float(value) -> float:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return np.nan
+
+
+class ColumnRing:
+    """Les `capacity` derniers enregistrements, par colonnes.
+
+    `numeric` : colonnes float64 (agregats) ; `objects` : colonnes quelconques ;
+    `keep_records` : conserve aussi les dicts ajoutes (restitues tels quels).
+    """
+
+    def __init__(self, capacity: int, numeric: Sequence[str] = (), objects: Sequence[str] = (),
+                 keep_records: bool = False) -> None:
+        self.capacity = max(1, int(capacity))
+        self.numeric = tuple(numeric)
+        self.objects = tuple(objects)
+        self.keep_records = keep_records
+        self._columns: Dict[str, np.ndarray] = {}
+        for name in self.numeric:
+            self._columns[name] = np.full(2 * self.capacity, np.nan)
+        for name in self.objects + ((_RECORDS,) if keep_records else ()):
+            self._columns[name] = np.empty(2 * self.capacity, dtype=object)
+        self._next = 0  # prochaine case (0 <= _next < capacity)
+        self._size = 0
+        self.appended = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __bool__(self) -> bool:
+        return self._size > 0
+
+    def _bounds(self, n: Optional[int]) -> slice:
+        n = self._size if n is None else max(0, min(int(n), self._size))
+        end = self._next + self.capacity  # la derniere valeur est en end - 1
+        return slice(end - n, end)
+
+    def append(self, record: dict) -> None:
+        """Ajoute un enregistrement (colonnes absentes : NaN / None)."""
+        i, j = self._next, self._next + self.capacity
+        for name in self.numeric:
+            column = self._columns[name]
+            column[i] = column[j] = _to_float(record.get(name))
+        for name in self.objects:
+            column = self._columns[name]
+            column[i] = column[j] = record.get(name)
+        if self.keep_records:
+            column = self._columns[_RECORDS]
+            column[i] = column[j] = record
+        self._next = (self._next + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+        self.appended += 1
+
+    def clear(self) -> None:
+        self.__init__(self.capacity, self.numeric, self.objects, self.keep_records)
+
+    def column(self, name: str, n: Optional[int] = None) -> np.ndarray:
+        """Vue (lecture seule, sans copie) des `n` dernieres valeurs d'une colonne."""
+        view = self._columns[name][self._bounds(n)]
+        view.flags.writeable = False
+        return view
+
+    def records(self, n: Optional[int] = None) -> List[dict]:
+        """Les `n` derniers enregistrements (liste de references, pour la serialisation)."""
+        return self.column(_RECORDS, n).tolist()
+
+    def __iter__(self) -> Iterator[dict]:
+        return iter(self.records())
+
+    def __getitem__(self, index: int) -> dict:
+        """Enregistrement par position (negative depuis la fin), comme une liste."""
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("ColumnRing index out of range")
+        return self._columns[_RECORDS][self._next + self.capacity - self._size + index]
+
+    def last(self) -> Optional[dict]:
+        return self[-1] if self._size else None
+
+    def last_value(self, name: str, default=None):
+        if not self._size:
+            return default
+        value = self._columns[name][self._next + self.capacity - 1]
+        if name in self.numeric and np.isnan(value):
+            return default
+        return value
+
+    def as_lists(self, names: Optional[Iterable[str]] = None, n: Optional[int] = None) -> Dict[str, list]:
+        """{colonne: liste} des `n` dernieres valeurs (NaN -> None, pour JSON)."""
+        result = {}
+        for name in (self.numeric + self.objects) if names is None else names:
+            view = self.column(name, n)
+            if name in self.numeric and np.isnan(view).any():
+                result[name] = [None if np.isnan(v) else v for v in view.tolist()]
+            else:
+                result[name] = view.tolist()
+        return result
+
+    # ------------------------------------------------------------------
+    # Agregats vectorises (valeurs NaN ignorees)
+    # ------------------------------------------------------------------
+
+    def mean(self, name: str, n: Optional[int] = None) -> Optional[float]:
+        view = self.column(name, n)
+        valid = view[~np.isnan(view)]
+        return float(valid.mean()) if valid.size else None
+
+    def std(self, name: str, n: Optional[int] = None) -> Optional[float]:
+        view = self.column(name, n)
+        valid = view[~np.isnan(view)]
+        return float(valid.std()) if valid.size else None
+
+    def rolling_mean(self, name: str, window: int, n: Optional[int] = None) -> np.ndarray:
+        """Moyenne glissante sur `window` valeurs (une valeur par position complete)."""
+        view = self.column(name, n)
+        window = max(1, int(window))
+        if view.size < window:
+            return np.empty(0)
+        valid = ~np.isnan(view)
+        sums = np.concatenate(([0.0], np.cumsum(np.where(valid, view, 0.0))))
+        counts = np.concatenate(([0], np.cumsum(valid)))
+        total = sums[window:] - sums[:-window]
+        count = counts[window:] - counts[:-window]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(count > 0, total / np.maximum(count, 1), np.nan)
+
+    def summary(self, n: Optional[int] = None) -> Dict[str, dict]:
+        """{colonne numerique: {mean, std, min, max, count}} sur les `n` derniers."""
+        result = {}
+        for name in self.numeric:
+            view = self.column(name, n)
+            valid = view[~np.isnan(view)]
+            if valid.size:
+                result[name] = {
+                    "mean": float(valid.mean()),
+                    "std": float(valid.std()),
+                    "min": float(valid.min()),
+                    "max": float(valid.max()),
+                    "count": int(valid.size),
+                }
+        return result
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""Export de session en flux (/api/session/export du serveur de metriques V5).
+
+Le document est produit morceau par morceau depuis le journal d'evenements
+(session_log) : les lignes deja serialisees sont recopiees telles quelles,
+sans reconstruire le dict complet de la session en memoire. Starlette itere
+ce generateur synchrone dans un thread : la boucle du WebSocket de metriques
+n'est pas bloquee.
+
+Options :
+
+- `fmt` : "json" (meme structure que l'export historique) ou "ndjson"
+  (ligne `session`, une ligne par evenement, ligne `summary`) ;
+- `since_iteration` : evenements a partir des actions de cette iteration ;
+- `include` : projections parmi `agents` (evenements agent + agentMetrics),
+  `global` (evenements d'iteration + globalMetrics), `canvas` (evenements
+  canvas + canvasSnapshots) ; tout par defaut ;
+- compression gzip a la volee (`gzip_chunks`).
+"""
+from __future__ import annotations
+
+import json
+import re
+import zlib
+from datetime import datetime
+from typing import Iterable, Iterator, Optional, Set
+
+SECTIONS = ("agents", "global", "canvas")
+EVENT_SECTIONS = {"agent": "agents", "iteration": "global", "canvas_snapshot": "canvas"}
+
+_CHUNK_BYTES = 64 * 1024
+_TYPE_PREFIX = re.compile(rb'^\{"type":"([a-z_]+)"')
+
+
+def parse_include(include: Optional[str]) -> Set[str]:
+    """`"canvas,agents"` -> {"canvas", "agents"} ; vide ou absent = toutes les sections."""
+    if not include:
+        return set(SECTIONS)
+    wanted = {part.strip().lower() for part in include.split(",") if part.strip()}
+    return wanted & set(SECTIONS) or set(SECTIONS)
+
+
+def _dumps(value) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def _event_type(line: bytes) -> Optional[str]:
+    match = _TYPE_PREFIX.match(line)
+    if match:
+        return match.group(1).decode("ascii")
+    try:
+        return json.loads(line).get("type")
+    except ValueError:
+        return None
+
+
+def _selected_lines(recorder, start: int, stop: int, sections: Set[str]) -> Iterator[bytes]:
+    filtered = sections != set(SECTIONS)
+    for line in recorder.log.iter_lines(start, stop):
+        if filtered and EVENT_SECTIONS.get(_event_type(line)) not in sections:
+            continue
+        yield line.rstrip(b"\n")
+
+
+def _summary(recorder, since_iteration: Optional[int], sections: Set[str]) -> dict:
+    since = since_iteration or 0
+    summary = {"rankings": recorder.last_rankings}
+    if "global" in sections:
+        summary["globalMetrics"] = [g for g in list(recorder.global_metrics) if g.get("version", 0) >= since]
+    if "agents" in sections:
+        summary["agentMetrics"] = dict(recorder.last_agent_data)
+    if "canvas" in sections:
+        summary["canvasSnapshots"] = [c for c in recorder.canvas_snapshots[-20:] if c.get("version", 0) >= since]
+    return summary
+
+
+def _metadata(recorder, total_events: int, since_iteration: Optional[int], sections: Set[str]) -> dict:
+    registry = dict(recorder.agents_registry)
+    return {
+        "start_time": recorder.start_time.isoformat(),
+        "end_time": datetime.now().isoformat(),
+        "total_iterations": recorder.current_iteration,
+        "total_events": total_events,
+        "agents_registry": registry,
+        "ai_agents_count": sum(1 for a in registry.values() if a.get("type") == "ai"),
+        "human_agents_count": sum(1 for a in registry.values() if a.get("type") == "human"),
+        "since_iteration": since_iteration,
+        "include": sorted(sections),
+    }
+
+
+def _batched(parts: Iterable[bytes]) -> Iterator[bytes]:
+    buffer = bytearray()
+    for part in parts:
+        buffer += part
+        if len(buffer) >= _CHUNK_BYTES:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+def iter_session_export(recorder, *, fmt: str = "json", since_iteration: Optional[int] = None,
+                        include: Optional[str] = None) -> Iterator[bytes]:
+    """Octets de l'export (morceaux d'environ 64 Ko)."""
+    sections = parse_include(include)
+    # Bornes figees au depart : les evenements ajoutes pendant l'export n'y entrent pas
+    stop = len(recorder.log)
+    start = recorder.log.start_for_iteration(since_iteration) if since_iteration else 0
+    return _batched(_iter_ndjson(recorder, start, stop, since_iteration, sections) if fmt == "ndjson"
+                    else _iter_json(recorder, start, stop, since_iteration, sections))
+
+
+def _iter_json(recorder, start, stop, since_iteration, sections) -> Iterator[bytes]:
+    yield b'{"session_id":' + _dumps(recorder.session_id) + b',"events":['
+    total = 0
+    for line in _selected_lines(recorder, start, stop, sections):
+        yield (b"," + line) if total else line
+        total += 1
+    yield b"]"
+    for key, value in _summary(recorder, since_iteration, sections).items():
+        yield b"," + _dumps(key) + b":" + _dumps(value)
+    yield b',"metadata":' + _dumps(_metadata(recorder, total, since_iteration, sections)) + b"}"
+
+
+def _iter_ndjson(recorder, start, stop, since_iteration, sections) -> Iterator[bytes]:
+    yield _dumps({"type": "session", "session_id": recorder.session_id,
+                  "start_time": recorder.start_time.isoformat()}) + b"\n"
+    total = 0
+    for line in _selected_lines(recorder, start, stop, sections):
+        yield line + b"\n"
+        total += 1
+    summary = _summary(recorder, since_iteration, sections)
+    summary["metadata"] = _metadata(recorder, total, since_iteration, sections)
+    yield _dumps({"type": "summary", **summary}) + b"\n"
+
+
+def gzip_chunks(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Compression gzip en flux (un seul membre)."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""Journal d'evenements de session segmente, en ajout seul (SessionRecorder V5).
+
+- Chaque evenement est serialise une fois (JSON compact, une ligne) a l'ajout ;
+  l'ecriture disque se fait dans un thread dedie (l'appelant, la boucle du
+  WebSocket de metriques, ne fait jamais d'E/S).
+- Segments `seg-000001.jsonl`, ... de SESSION_LOG_SEGMENT_EVENTS evenements :
+  le segment d'un numero d'evenement est un simple quotient, et l'index des
+  positions (octets) de chaque ligne est tenu en memoire par segment
+  (`array('Q')`, 8 octets par evenement).
+- Seuls les SESSION_LOG_WINDOW derniers evenements restent en RAM ; les plus
+  anciens sont relus par `seek` + `readline` (pagination O(1) par position).
+- Index iteration -> numero du premier evenement de cette iteration
+  (pagination par `?iteration=`, export `since_iteration`) : versions triees
+  et numeros associes, recherche dichotomique.
+"""
+from __future__ import annotations
+
+import json
+import os
+import queue
+import threading
+from array import array
+from bisect import bisect_left
+from collections import deque
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+SESSION_LOG_DIR = Path(os.getenv("SESSION_LOG_DIR", str(ROOT / "db" / "session_logs")))
+SESSION_LOG_SEGMENT_EVENTS = int(os.getenv("SESSION_LOG_SEGMENT_EVENTS", "5000"))
+SESSION_LOG_WINDOW = int(os.getenv("SESSION_LOG_WINDOW", "2000"))
+
+
+def _dumps(event: dict) -> bytes:
+    return json.dumps(event, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8") + b"\n"
+
+
+def _safe_name(session_id: str) -> str:
+    return "".join(c if c.isalnum() or c in "-_" else "_" for c in session_id)
+
+
+class SessionEventLog:
+    """Evenements numerotes 0..n-1 : fenetre recente en RAM, le reste sur disque."""
+
+    def __init__(self, session_id: str, directory: Optional[Path] = None, *,
+                 segment_events: Optional[int] = None, window: Optional[int] = None) -> None:
+        self.session_id = session_id
+        self.directory = Path(directory or SESSION_LOG_DIR) / _safe_name(session_id)
+        self.segment_events = max(1, segment_events or SESSION_LOG_SEGMENT_EVENTS)
+        self.window = max(1, window or SESSION_LOG_WINDOW)
+        self._recent: deque = deque(maxlen=self.window)  # (numero, evenement, ligne JSON)
+        self._lock = threading.Lock()  # fenetre lue par les exports (threads)
+        self._offsets: List[array] = []  # par segment : position de chaque ligne
+        self._segment_size = 0  # octets du segment courant (positions calculees a l'ajout)
+        # Iterations : versions triees, numero de leur premier evenement, et
+        # plus grand de ces numeros jusqu'a chaque version incluse
+        self._iter_versions: List[int] = []
+        self._iter_seqs = array("Q")
+        self._iter_upto = array("Q")
+        self._count = 0
+        self.bytes_written = 0
+        self.disk_reads = 0
+        # Ecriture asynchrone : (segment, octets), None = arret
+        self._queue: "queue.Queue" = queue.Queue()
+        self._written = 0
+        self._write_error: Optional[str] = None
+        self._thread = threading.Thread(target=self._writer, name=f"session-log-{_safe_name(session_id)[:16]}",
+                                        daemon=True)
+        self._thread.start()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def segment_path(self, segment: int) -> Path:
+        return self.directory / f"seg-{segment + 1:06d}.jsonl"
+
+    def append(self, event: dict) -> int:
+        """Ajoute un evenement (ne plus le modifier ensuite). Retourne son numero."""
+        seq = self._count
+        segment, index = divmod(seq, self.segment_events)
+        if index == 0:
+            self._offsets.append(array("Q"))
+            self._segment_size = 0
+        line = _dumps(event)
+        self._offsets[segment].append(self._segment_size)
+        self._segment_size += len(line)
+        with self._lock:
+            self._recent.append((seq, event, line))
+        if event.get("type") == "iteration":
+            self._index_iteration(int(event.get("version", 0) or 0), seq)
+        self._count += 1
+        self._queue.put((segment, line))
+        return seq
+
+    def _index_iteration(self, version: int, seq: int) -> None:
+        with self._lock:
+            i = bisect_left(self._iter_versions, version)
+            if i < len(self._iter_versions) and self._iter_versions[i] == version:
+                return  # premier evenement de l'iteration deja connu
+            self._iter_versions.insert(i, version)
+            self._iter_seqs.insert(i, seq)
+            # Maxima recalcules a partir de la version inseree (une seule si croissantes)
+            del self._iter_upto[i:]
+            for later in self._iter_seqs[i:]:
+                self._iter_upto.append(max(later, self._iter_upto[-1]) if self._iter_upto else later)
+
+    def _writer(self) -> None:
+        handle = None
+        current = -1
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                segment, line = item
+                if segment != current:
+                    if handle is not None:
+                        handle.close()
+                    self.directory.mkdir(parents=True, exist_ok=True)
+                    handle = open(self.segment_path(segment), "ab")
+                    current = segment
+                handle.write(line)
+                if self._queue.empty():
+                    handle.flush()
+                self.bytes_written += len(line)
+                self._written += 1
+            except OSError as e:
+                self._write_error = str(e)
+                print(f"[SessionLog] ⚠️  Écriture impossible ({self.directory}): {e}")
+            finally:
+                if item is None and handle is not None:
+                    handle.close()
+                self._queue.task_done()
+
+    def flush(self) -> None:
+        """Attend que tous les evenements ajoutes soient sur disque."""
+        self._queue.join()
+
+    def close(self, wait: bool = True) -> None:
+        """Arrete l'ecriture. `wait=False` (boucle d'evenements) : le thread ecrit
+        les evenements en attente puis s'arrete, sans que l'appelant l'attende."""
+        self._queue.put(None)
+        if wait:
+            self._thread.join(timeout=10)
+
+    def _snapshot(self) -> list:
+        with self._lock:
+            return list(self._recent)
+
+    def _iter_disk(self, start: int, stop: int) -> Iterator[bytes]:
+        """Lignes [start, stop) des segments (seek direct sur la premiere ligne)."""
+        if stop > self._written:
+            self.flush()
+        seq = start
+        while seq < stop:
+            segment, index = divmod(seq, self.segment_events)
+            count = min(stop - seq, self.segment_events - index)
+            self.disk_reads += 1
+            with open(self.segment_path(segment), "rb") as f:
+                f.seek(self._offsets[segment][index])
+                for _ in range(count):
+                    yield f.readline()
+            seq += count
+
+    def _iter(self, start: int, stop: Optional[int], raw: bool) -> Iterator:
+        seq = max(0, start)
+        stop = self._count if stop is None else min(stop, self._count)
+        while seq < stop:
+            recent = self._snapshot()
+            first_recent = recent[0][0] if recent else stop
+            if seq < first_recent:
+                # La fenetre peut glisser pendant la lecture : on reboucle
+                end = min(stop, first_recent)
+                for line in self._iter_disk(seq, end):
+                    yield line if raw else json.loads(line)
+                seq = end
+                continue
+            for s, event, line in recent[seq - first_recent:stop - first_recent]:
+                yield line if raw else event
+                seq = s + 1
+            break
+
+    def iter_events(self, start: int = 0, stop: Optional[int] = None) -> Iterator[dict]:
+        """Parcours sequentiel des evenements [start, stop) : disque puis fenetre RAM."""
+        return self._iter(start, stop, raw=False)
+
+    def iter_lines(self, start: int = 0, stop: Optional[int] = None) -> Iterator[bytes]:
+        """Comme iter_events, mais lignes JSON deja serialisees (terminees par \\n)."""
+        return self._iter(start, stop, raw=True)
+
+    def read(self, offset: int = 0, limit: int = 50) -> List[dict]:
+        """Evenements [offset, offset + limit)."""
+        offset = max(0, offset)
+        return list(self.iter_events(offset, offset + max(0, limit)))
+
+    def offset_for_iteration(self, iteration: int) -> Optional[int]:
+        """Numero de l'evenement d'iteration `iteration` (ou du suivant enregistre)."""
+        with self._lock:
+            i = bisect_left(self._iter_versions, iteration)
+            return self._iter_seqs[i] if i < len(self._iter_seqs) else None
+
+    def start_for_iteration(self, iteration: int) -> int:
+        """Premier evenement posterieur a l'iteration `iteration - 1` (actions de `iteration` incluses)."""
+        with self._lock:
+            i = bisect_left(self._iter_versions, iteration)
+            return self._iter_upto[i - 1] + 1 if i else 0
+
+    def recent(self, limit: int) -> List[dict]:
+        return [e for _, e, _ in self._snapshot()[-limit:]] if limit > 0 else []
+
+    def stats(self) -> dict:
+        return {
+            "directory": str(self.directory),
+            "events": self._count,
+            "segments": len(self._offsets),
+            "in_memory": len(self._recent),
+            "pending_writes": self._count - self._written,
+            "bytes_written": self.bytes_written,
+            "disk_reads": self.disk_reads,
+            "write_error": self._write_error,
+        }
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""Resolution non bloquante du session_id courant du recorder Crystal (utterance_store).
+
+`append_utterance` est appele depuis les handlers async (metriques V5/V6,
+serveur IA V5) : il ne doit jamais faire d'E/S reseau. Le resolveur garde le
+dernier id connu et le rafraichit hors du chemin chaud :
+
+- `current()` retourne la valeur en cache sans attendre ; si elle est plus
+  vieille que SESSION_ID_REFRESH secondes, le thread de rafraichissement est
+  reveille (stale-while-revalidate) ;
+- mode push : le recorder notifie les changements de session
+  (POIETIC_SESSION_HOOKS cote Crystal -> `POST /api/utterances/current-session`),
+  `push()` met la valeur a jour immediatement ; tant que des notifications
+  arrivent, l'interrogation de `/api/current-session` n'est plus qu'un filet de
+  securite (SESSION_ID_PUSH_REFRESH secondes) ;
+- `subscribe(callback)` : `callback(nouvel_id, ancien_id)` a chaque changement ;
+- `await resolve()` : valeur fraiche pour un appelant async, via un executeur.
+
+Une fin de session (id absent) garde le dernier id connu, comme l'ancien cache.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import threading
+import time
+import urllib.request
+from typing import Callable, List, Optional
+
+SESSION_ID_REFRESH = float(os.getenv("SESSION_ID_REFRESH", "2.0"))
+SESSION_ID_PUSH_REFRESH = float(os.getenv("SESSION_ID_PUSH_REFRESH", "30"))
+SESSION_ID_TIMEOUT = float(os.getenv("SESSION_ID_TIMEOUT", "2.0"))
+
+
+class SessionIdResolver:
+    """Dernier session_id connu du recorder, rafraichi en arriere-plan.
+
+    `fetch()` (par defaut : GET `{recorder_url}/api/current-session`) n'est
+    appele que par le thread de rafraichissement, `refresh()` et `resolve()`.
+    """
+
+    def __init__(self, recorder_url: str, *, fetch: Optional[Callable[[], Optional[str]]] = None,
+                 refresh_interval: Optional[float] = None, push_refresh_interval: Optional[float] = None,
+                 timeout: Optional[float] = None) -> None:
+        self.recorder_url = recorder_url.rstrip("/")
+        self.fetch = fetch or self._fetch_recorder
+        self.refresh_interval = refresh_interval or SESSION_ID_REFRESH
+        self.push_refresh_interval = push_refresh_interval or SESSION_ID_PUSH_REFRESH
+        self.timeout = timeout or SESSION_ID_TIMEOUT
+        self._session_id: Optional[str] = None
+        self._updated_at = 0.0  # time.monotonic() de la derniere valeur confirmee
+        self._pushed_at: Optional[float] = None
+        self._attempted_at = 0.0  # dernier appel a fetch()
+        self._subscribers: List[Callable[[Optional[str], Optional[str]], None]] = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+        self.fetches = 0
+        self.fetch_errors = 0
+        self.pushes = 0
+
+    # ------------------------------------------------------------------
+    # Lecture (chemin chaud)
+    # ------------------------------------------------------------------
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self._updated_at if self._updated_at else float("inf")
+
+    def current(self) -> Optional[str]:
+        """Dernier id connu, sans E/S ; declenche un rafraichissement s'il est perime."""
+        if self._thread is None:
+            self.start()
+        if self.age >= self._interval():
+            self._wake.set()
+        return self._session_id
+
+    async def resolve(self, force: bool = False) -> Optional[str]:
+        """Id frais pour un appelant async (rafraichi dans un executeur si perime ou `force`)."""
+        if force or self._session_id is None or self.age >= self._interval():
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self.refresh)
+        return self._session_id
+
+    def _interval(self) -> float:
+        if self._pushed_at is not None and time.monotonic() - self._pushed_at < self.push_refresh_interval:
+            return self.push_refresh_interval
+        return self.refresh_interval
+
+    # ------------------------------------------------------------------
+    # Mises a jour
+    # ------------------------------------------------------------------
+
+    def push(self, session_id: Optional[str]) -> None:
+        """Notification de changement de session (recorder)."""
+        self.pushes += 1
+        self._pushed_at = time.monotonic()
+        self._set(session_id)
+
+    def refresh(self) -> Optional[str]:
+        """Interroge le recorder (bloquant : hors boucle d'evenements uniquement)."""
+        self.fetches += 1
+        self._attempted_at = time.monotonic()
+        try:
+            session_id = self.fetch()
+        except Exception:
+            self.fetch_errors += 1
+            return self._session_id
+        self._set(session_id)
+        return self._session_id
+
+    def _set(self, session_id: Optional[str]) -> None:
+        if not session_id:
+            return
+        session_id = str(session_id)
+        with self._lock:
+            previous = self._session_id
+            self._session_id = session_id
+            self._updated_at = time.monotonic()
+        if previous != session_id:
+            for callback in list(self._subscribers):
+                try:
+                    callback(session_id, previous)
+                except Exception:
+                    pass
+
+    def subscribe(self, callback: Callable[[Optional[str], Optional[str]], None]) -> None:
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback) -> None:
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    def _fetch_recorder(self) -> Optional[str]:
+        req = urllib.request.Request(
+            f"{self.recorder_url}/api/current-session",
+            headers={"Accept": "application/json"},
+        )
+        with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+            data = json.loads(resp.read().decode())
+        return data.get("session_id") or data.get("id")
+
+    # ------------------------------------------------------------------
+    # Thread de rafraichissement
+    # ------------------------------------------------------------------
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name="session-id-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped = True
+        self._wake.set()
+
+    def _run(self) -> None:
+        while not self._stopped:
+            # Valeur perimee, mais au plus un essai par refresh_interval (recorder injoignable)
+            due = max(self._updated_at + self._interval(), self._attempted_at + self.refresh_interval)
+            now = time.monotonic()
+            if now >= due:
+                self.refresh()
+                continue
+            self._wake.wait(due - now)
+            self._wake.clear()
+
+    def stats(self) -> dict:
+        return {
+            "session_id": self._session_id,
+            "age": None if self._updated_at == 0 else round(self.age, 2),
+            "mode": "push" if self._interval() == self.push_refresh_interval else "poll",
+            "fetches": self.fetches,
+            "fetch_errors": self.fetch_errors,
+            "pushes": self.pushes,
+        }
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""Diffusion du dernier snapshot O+N aux agents W (/o/latest V5, /q/latest V6).
+
+- Le snapshot est serialise une seule fois par version, sans les cles
+  personnelles (erreurs de prediction, classements) ; la reponse d'un agent
+  = octets partages + fragment personnel (cache par agent pour la version).
+- ETag = version du snapshot : `If-None-Match` identique -> 304 sans corps.
+- Long-poll : `wait_for_version(N, timeout)` attend qu'une version >= N soit
+  publiee (evenement remplace a chaque publication, reveille tous les
+  waiters).
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+from typing import Dict, Optional
+
+LATEST_LONG_POLL_MAX = float(os.getenv("LATEST_LONG_POLL_MAX", "30"))
+
+PERSONAL_KEYS = ("prediction_errors", "agent_rankings")
+
+
+def _dumps(value) -> bytes:
+    # Memes options que JSONResponse (compact, UTF-8, pas de NaN)
+    return json.dumps(value, ensure_ascii=False, allow_nan=False,
+                      separators=(",", ":"), default=str).encode("utf-8")
+
+
+def etag_matches(if_none_match: Optional[str], etag: Optional[str]) -> bool:
+    """Comparaison faible d'un en-tete If-None-Match (liste, W/, *) avec un ETag."""
+    if not if_none_match or not etag:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    bare = etag[2:] if etag.startswith("W/") else etag
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == bare:
+            return True
+    return False
+
+
+class SnapshotFeed:
+    """Octets pre-serialises du snapshot courant + attente de nouvelle version."""
+
+    def __init__(self, default_error: Optional[dict] = None, etag_prefix: str = "o") -> None:
+        self.default_error = default_error or {"error": 0.0, "explanation": ""}
+        self.etag_prefix = etag_prefix
+        self.version = 0
+        self._snapshot: Optional[dict] = None
+        self._full: Optional[bytes] = None
+        self._prefix: Optional[bytes] = None
+        self._fragments: Dict[str, bytes] = {}
+        self._changed = asyncio.Event()
+        self.serializations = 0
+        self.not_modified = 0
+        self.long_polls = 0
+        self.waiting = 0
+
+    @property
+    def etag(self) -> Optional[str]:
+        return f'"{self.etag_prefix}{self.version}"' if self._snapshot is not None else None
+
+    def publish(self, snapshot: dict) -> None:
+        """A appeler apres chaque nouveau snapshot (le snapshot ne doit plus etre modifie)."""
+        self._snapshot = snapshot
+        self.version = int(snapshot.get("version", self.version + 1))
+        try:
+            self._full = _dumps(snapshot)
+            shared = _dumps({k: v for k, v in snapshot.items() if k not in PERSONAL_KEYS})
+            self._prefix = shared[:-1] + (b"," if len(shared) > 2 else b"")
+            self.serializations += 1
+        except (TypeError, ValueError) as e:
+            print(f"[Latest] ⚠️  Snapshot non sérialisable: {e}")
+            self._full = self._prefix = None
+        self._fragments = {}
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def body(self, agent_id: Optional[str] = None) -> Optional[bytes]:
+        """Corps JSON complet, ou personnalise pour `agent_id`. None si non serialisable."""
+        if self._full is None:
+            return None
+        if not agent_id:
+            return self._full
+        fragment = self._fragments.get(agent_id)
+        if fragment is None:
+            errors = self._snapshot.get("prediction_errors") or {}
+            rankings = self._snapshot.get("agent_rankings") or {}
+            ranking = rankings.get(agent_id) or {}
+            fragment = (
+                b'"prediction_errors":' + _dumps({agent_id: errors.get(agent_id) or self.default_error})
+                + b',"agent_rankings":' + _dumps({agent_id: ranking} if ranking else {})
+                + b"}"
+            )
+            self._fragments[agent_id] = fragment
+        return self._prefix + fragment
+
+    def not_modified_for(self, if_none_match: Optional[str]) -> bool:
+        if etag_matches(if_none_match, self.etag):
+            self.not_modified += 1
+            return True
+        return False
+
+    async def wait_for_version(self, version: int, timeout: float) -> bool:
+        """Attend qu'une version >= `version` soit publiee. False si delai depasse."""
+        timeout = max(0.0, min(timeout, LATEST_LONG_POLL_MAX))
+        if self.version >= version or timeout <= 0:
+            return self.version >= version
+        self.long_polls += 1
+        self.waiting += 1
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        try:
+            while self.version < version:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return False
+                try:
+                    await asyncio.wait_for(self._changed.wait(), remaining)
+                except asyncio.TimeoutError:
+                    return self.version >= version
+            return True
+        finally:
+            self.waiting -= 1
+
+    def stats(self) -> dict:
+        return {
+            "version": self.version,
+            "serializations": self.serializations,
+            "not_modified": self.not_modified,
+            "long_polls": self.long_polls,
+            "waiting": self.waiting,
+            "cached_agents": len(self._fragments),
+        }
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""Protocole d'etat versionne du serveur de metriques V5 (port 5005).
+
+Au lieu de rediffuser `get_state_summary()` (tous les agents + 50 points
+d'historique) apres chaque `agent_update`, un client qui s'annonce avec
+`{"type": "get_state", "protocol": "delta"}` recoit :
+
+- `state_snapshot` : `{version, data}` avec `data` = resume complet ;
+- puis des `state_delta` : `{version, base, data}` ou `data` ne contient que
+  ce qui a change (`agents` modifies, `removed`, points `history` ajoutes,
+  `averages`, compteurs, `latest_o` / `latest_n`).
+
+Le client applique un delta si `base` == sa version ; sinon (message perdu,
+file du hub videe) il envoie `{"type": "state_resync", "version": v}` et recoit
+les deltas manquants s'ils sont encore dans le journal, ou un nouveau
+snapshot. Les clients qui n'ont pas choisi le protocole gardent
+`state_update` (resume complet).
+"""
+from __future__ import annotations
+
+import os
+from collections import deque
+from typing import List, Optional
+
+STATE_DELTA_BACKLOG = int(os.getenv("STATE_DELTA_BACKLOG", "256"))
+STATE_HISTORY_WINDOW = 50  # points d'historique dans un snapshot (get_state_summary)
+
+PROTOCOL_DELTA = "delta"
+
+
+class StateDeltaLog:
+    """Numerotation des deltas + journal borne pour rattraper un client en retard."""
+
+    def __init__(self, backlog: Optional[int] = None) -> None:
+        self.version = 0
+        self._log: deque = deque(maxlen=max(1, backlog or STATE_DELTA_BACKLOG))
+        self.deltas = 0
+        self.snapshots = 0
+        self.replays = 0
+
+    def append(self, data: dict) -> dict:
+        """Enregistre un delta et retourne le message a diffuser."""
+        self.version += 1
+        message = {"type": "state_delta", "version": self.version, "base": self.version - 1, "data": data}
+        self._log.append(message)
+        self.deltas += 1
+        return message
+
+    def since(self, version: int) -> Optional[List[dict]]:
+        """Deltas posterieurs a `version`, ou None si le journal ne remonte pas assez loin."""
+        if version > self.version or version < 0:
+            return None
+        if version == self.version:
+            return []
+        if not self._log or self._log[0]["base"] > version:
+            return None
+        self.replays += 1
+        return [m for m in self._log if m["version"] > version]
+
+    def snapshot(self, state: dict) -> dict:
+        self.snapshots += 1
+        return {"type": "state_snapshot", "version": self.version, "data": state}
+
+    def stats(self) -> dict:
+        return {
+            "version": self.version,
+            "deltas": self.deltas,
+            "snapshots": self.snapshots,
+            "replays": self.replays,
+            "backlog": len(self._log),
+        }
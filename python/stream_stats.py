@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""Statistiques en flux pour les metriques (erreurs de prediction, deltas, observables).
+
+Chaque valeur est integree en O(1), sans garder ni re-filtrer de liste :
+
+- `StreamingStats` : moyenne et variance (Welford), min/max, moyenne mobile
+  exponentielle (EWMA) et quantiles approches ;
+- `QuantileSketch` : quantiles a erreur relative bornee (seaux logarithmiques,
+  facon DDSketch) ; les valeurs peuvent aussi etre retirees ;
+- `KeyedStats` : derniere valeur par cle (par agent) ; remplacer ou retirer la
+  valeur d'un agent met a jour moyenne, ecart-type et quantiles de la
+  population courante.
+
+Les valeurs non numeriques ("N/A", None, chaines) sont ignorees.
+"""
+from __future__ import annotations
+
+import math
+import os
+from typing import Dict, Hashable, Iterable, Optional, Sequence
+
+STATS_EWMA_ALPHA = float(os.getenv("STATS_EWMA_ALPHA", "0.2"))
+STATS_SKETCH_ACCURACY = float(os.getenv("STATS_SKETCH_ACCURACY", "0.01"))
+DEFAULT_PERCENTILES = (50, 90)
+
+_ZERO = 1e-12
+
+
+def is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+class QuantileSketch:
+    """Quantiles approches (erreur relative `accuracy`), memoire en O(log(max/min))."""
+
+    __slots__ = ("accuracy", "_log_gamma", "_positive", "_negative", "zeros", "count")
+
+    def __init__(self, accuracy: Optional[float] = None) -> None:
+        self.accuracy = accuracy or STATS_SKETCH_ACCURACY
+        self._log_gamma = math.log((1 + self.accuracy) / (1 - self.accuracy))
+        self._positive: Dict[int, int] = {}
+        self._negative: Dict[int, int] = {}
+        self.zeros = 0
+        self.count = 0
+
+    def _key(self, value: float) -> int:
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def _value(self, key: int) -> float:
+        gamma = math.exp(self._log_gamma)
+        return 2 * gamma ** key / (gamma + 1)
+
+    def add(self, value: float, weight: int = 1) -> None:
+        if abs(value) < _ZERO:
+            self.zeros += weight
+        elif value > 0:
+            key = self._key(value)
+            self._positive[key] = self._positive.get(key, 0) + weight
+        else:
+            key = self._key(-value)
+            self._negative[key] = self._negative.get(key, 0) + weight
+        self.count += weight
+
+    def remove(self, value: float) -> None:
+        """Retire une valeur precedemment ajoutee."""
+        if abs(value) < _ZERO:
+            if self.zeros:
+                self.zeros -= 1
+                self.count -= 1
+            return
+        store = self._positive if value > 0 else self._negative
+        key = self._key(abs(value))
+        remaining = store.get(key, 0) - 1
+        if remaining < 0:
+            return
+        if remaining:
+            store[key] = remaining
+        else:
+            del store[key]
+        self.count -= 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Valeur au quantile q (0..1), None si vide."""
+        if not self.count:
+            return None
+        rank = max(0.0, min(1.0, q)) * (self.count - 1)
+        seen = 0
+        for key in sorted(self._negative, reverse=True):
+            seen += self._negative[key]
+            if seen > rank:
+                return -self._value(key)
+        seen += self.zeros
+        if seen > rank:
+            return 0.0
+        for key in sorted(self._positive):
+            seen += self._positive[key]
+            if seen > rank:
+                return self._value(key)
+        return self._value(max(self._positive)) if self._positive else 0.0
+
+    def percentiles(self, percentiles: Sequence[int] = DEFAULT_PERCENTILES) -> Dict[str, Optional[float]]:
+        return {f"p{p}": self.quantile(p / 100) for p in percentiles}
+
+
+class StreamingStats:
+    """Moyenne/variance (Welford), min, max, EWMA et quantiles d'un flux de valeurs."""
+
+    __slots__ = ("count", "mean", "m2", "min", "max", "ewma", "alpha", "sketch")
+
+    def __init__(self, alpha: Optional[float] = None, quantiles: bool = True) -> None:
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self.ewma: Optional[float] = None
+        self.alpha = alpha or STATS_EWMA_ALPHA
+        self.sketch: Optional[QuantileSketch] = QuantileSketch() if quantiles else None
+
+    def add(self, value) -> bool:
+        """Integre une valeur. False (ignoree) si elle n'est pas numerique."""
+        if not is_number(value):
+            return False
+        value = float(value)
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        self.ewma = value if self.ewma is None else self.alpha * value + (1 - self.alpha) * self.ewma
+        if self.sketch is not None:
+            self.sketch.add(value)
+        return True
+
+    def extend(self, values: Iterable) -> "StreamingStats":
+        for value in values:
+            self.add(value)
+        return self
+
+    def discard(self, value: float) -> None:
+        """Retire une valeur deja integree (Welford inverse, quantiles).
+
+        min, max et EWMA ne sont pas recalcules (ils restent ceux du flux).
+        """
+        if self.count <= 1:
+            self.count, self.mean, self.m2 = 0, 0.0, 0.0
+        else:
+            previous = self.mean
+            self.count -= 1
+            self.mean = (previous * (self.count + 1) - value) / self.count
+            self.m2 = max(0.0, self.m2 - (value - previous) * (value - self.mean))
+        if self.sketch is not None:
+            self.sketch.remove(value)
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / self.count if self.count else 0.0
+
+    @property
+    def std(self) -> float:
+        return self.variance ** 0.5
+
+    def quantile(self, q: float) -> Optional[float]:
+        return self.sketch.quantile(q) if self.sketch is not None else None
+
+    def to_dict(self, percentiles: Sequence[int] = DEFAULT_PERCENTILES) -> dict:
+        result = {
+            "count": self.count,
+            "mean": self.mean,
+            "std": self.std,
+            "min": self.min,
+            "max": self.max,
+            "ewma": self.ewma,
+        }
+        if self.sketch is not None:
+            result.update(self.sketch.percentiles(percentiles))
+        return result
+
+
+class KeyedStats:
+    """Population courante : une valeur par cle (agent), remplacable et retirable en O(1)."""
+
+    __slots__ = ("values", "stats")
+
+    def __init__(self, quantiles: bool = True) -> None:
+        self.values: Dict[Hashable, float] = {}
+        self.stats = StreamingStats(quantiles=quantiles)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def set(self, key: Hashable, value) -> bool:
+        """Remplace la valeur de `key` ; une valeur non numerique retire la cle."""
+        if not is_number(value):
+            self.discard(key)
+            return False
+        value = float(value)
+        previous = self.values.get(key)
+        if previous == value:
+            return True
+        if previous is not None:
+            self.stats.discard(previous)
+        self.values[key] = value
+        self.stats.add(value)
+        return True
+
+    def discard(self, key: Hashable) -> None:
+        previous = self.values.pop(key, None)
+        if previous is not None:
+            self.stats.discard(previous)
+
+    def clear(self) -> None:
+        self.__init__(self.stats.sketch is not None)
+
+    @property
+    def mean(self) -> float:
+        return self.stats.mean if self.values else 0.0
+
+    @property
+    def std(self) -> float:
+        return self.stats.std if self.values else 0.0
+
+    def quantile(self, q: float) -> Optional[float]:
+        return self.stats.quantile(q) if self.values else None
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark du chemin chaud du serveur de métriques V5 (handler WebSocket /metrics).
+
+Rejoue une charge de 49 agents W : pour chaque itération, 49 `agent_update`
+puis un `o_snapshot` et un `n_snapshot` (erreurs et classements des 49 agents),
+avec 3 dashboards connectés. Mesure le temps CPU du thread de la boucle
+(hors thread d'écriture du journal) par message et par type ; meilleure de
+`--repeat` passes.
+
+Les énoncés (utterance_store) sont neutralisés pour ne mesurer que le
+serveur de métriques ; le journal de session va dans un répertoire temporaire.
+
+Usage:
+    python python/tests/bench_metrics_hot_path.py [--iterations 30] [--agents 49] [--repeat 5]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+# Ajouter le répertoire parent au path pour les imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+os.environ.setdefault("SESSION_LOG_DIR", tempfile.mkdtemp(prefix="bench_session_log_"))
+
+import utterance_store  # noqa: E402
+
+for _name in ("record_w_from_agent", "record_o_from_snapshot", "record_n_from_snapshot"):
+    setattr(utterance_store, _name, lambda *args, **kwargs: None)
+
+from fastapi import WebSocketDisconnect  # noqa: E402
+
+import metrics_server_v5 as server  # noqa: E402
+
+
+class ReplaySocket:
+    """WebSocket simulé : rejoue une liste de messages, mesure le CPU entre deux réceptions."""
+
+    def __init__(self, messages):
+        self.messages = messages
+        self.index = 0
+        self.cpu = defaultdict(float)
+        self.count = defaultdict(int)
+        self._started = None
+
+    async def accept(self):
+        pass
+
+    async def receive_text(self):
+        now = time.thread_time()
+        if self._started is not None:
+            kind = self.messages[self.index - 1][0]
+            self.cpu[kind] += now - self._started
+            self.count[kind] += 1
+        if self.index >= len(self.messages):
+            raise WebSocketDisconnect()
+        kind, text = self.messages[self.index]
+        self.index += 1
+        self._started = time.thread_time()
+        return text
+
+    async def send_text(self, text):
+        pass
+
+    async def close(self):
+        pass
+
+
+class SinkSocket:
+    """Dashboard connecté qui consomme tout sans rien faire."""
+
+    async def send_text(self, text):
+        pass
+
+    async def close(self):
+        pass
+
+
+def build_messages(iterations, agents):
+    positions = [[i % 7 - 3, i // 7 - 3] for i in range(agents)]
+    pixels = [f"{x},{y}#A1B2C3" for x in range(20) for y in range(0, 20, 4)]
+    messages = []
+    for version in range(1, iterations + 1):
+        for i in range(agents):
+            messages.append(("agent_update", json.dumps({
+                "type": "agent_update", "user_id": f"agent-{i:02d}-0000", "position": positions[i],
+                "delta_C_w": 1.5, "delta_C_d": -2.0, "U_after_expected": 10.0,
+                "prediction_error": (i * 7 % 10) / 10, "strategy": "symétrie", "strategy_id": "sym",
+                "source_agents": [positions[(i + 1) % agents]], "rationale": "prolonger la ligne " * 8,
+                "verbatim_summary": "ligne diagonale", "iteration": version + 1, "pixels": pixels,
+                "tokens": {"input": 1200, "output": 300}, "signalling_tokens": {"total": 80},
+            })))
+        structures = [{"type": "ligne", "agent_positions": positions[:5], "salience": 0.5}] * 12
+        messages.append(("o_snapshot", json.dumps({"type": "o_snapshot", "snapshot": {
+            "version": version, "structures": structures,
+            "formal_relations": {"summary": "relations " * 40},
+            "simplicity_assessment": {"C_d_current": {"value": 42}},
+        }})))
+        messages.append(("n_snapshot", json.dumps({"type": "n_snapshot", "snapshot": {
+            "version": version, "structures": structures,
+            "formal_relations": {"summary": "relations " * 40},
+            "narrative": {"summary": "récit " * 200},
+            "prediction_errors": {f"agent-{i:02d}-0000": {"error": (i * 3 % 10) / 10, "explanation": "écart " * 10}
+                                  for i in range(agents)},
+            "simplicity_assessment": {"C_w_current": {"value": 30}, "C_d_current": {"value": 42},
+                                      "U_current": {"value": 12}},
+        }})))
+    return messages
+
+
+async def run(iterations, agents, dashboards):
+    sinks = [server.hub.add_websocket(SinkSocket()) for _ in range(dashboards)]
+    socket = ReplaySocket(build_messages(iterations, agents))
+    started = time.thread_time()
+    await server.metrics_endpoint(socket)
+    total = time.thread_time() - started
+    await asyncio.sleep(0.05)
+    for sink in sinks:
+        server.hub.remove(sink)
+    return socket, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--agents", type=int, default=49)
+    parser.add_argument("--dashboards", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    best = {}
+    messages = 0
+    for _ in range(max(1, args.repeat)):
+        server.session_recorder.clear()
+        socket, total = asyncio.run(run(args.iterations, args.agents, args.dashboards))
+        messages = sum(socket.count.values())
+        for kind, cpu in socket.cpu.items():
+            best[kind] = min(best.get(kind, cpu / socket.count[kind]), cpu / socket.count[kind])
+        best["total"] = min(best.get("total", total / messages), total / messages)
+    print(f"{messages} messages, {args.agents} agents, {args.iterations} itérations, "
+          f"{args.dashboards} dashboards, meilleure de {args.repeat} passes")
+    for kind in ("agent_update", "o_snapshot", "n_snapshot", "total"):
+        if kind in best:
+            print(f"  {kind:<13} {best[kind] * 1e6:9.1f} µs CPU/message")
+    server.session_recorder.log.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Tests du classement incrémental des agents (Welford, index ordonné, changements de rang).
+
+Usage:
+    python -m pytest python/tests/test_agent_ranking.py -q
+"""
+
+import random
+import statistics
+import sys
+from pathlib import Path
+
+# Ajouter le répertoire parent au path pour les imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import agent_ranking
+from agent_ranking import AgentRanking
+
+
+def _brute_force(history, active):
+    means = {aid: sum(errors) / len(errors) for aid, errors in history.items() if errors and aid in active}
+    return {aid: rank for rank, (aid, _) in enumerate(sorted(means.items(), key=lambda x: (x[1], x[0])), start=1)}
+
+
+def test_matches_full_recomputation_with_and_without_sortedcontainers(monkeypatch):
+    for available in (True, False):
+        if not available:
+            monkeypatch.setattr(agent_ranking, "SORTEDCONTAINERS_AVAILABLE", False)
+        rng = random.Random(7)
+        ranking = AgentRanking(window=20)
+        history = {}
+        for step in range(2000):
+            aid = f"agent-{rng.randrange(12):02d}"
+            error = round(rng.random(), 3)
+            if step % 97 == 0 and aid in ranking:
+                ranking.reset(aid)
+                history[aid] = []
+            ranking.record(aid, error)
+            history[aid] = (history.get(aid, []) + [error])[-20:]
+            if step % 50 == 0:
+                expected = _brute_force(history, history)
+                assert {aid: ranking.rank(aid) for aid in expected} == expected
+        for aid, errors in history.items():
+            stats = ranking.stats(aid)
+            assert stats.count == len(errors)
+            assert abs(stats.mean - statistics.fmean(errors)) < 1e-9
+            assert abs(stats.variance - statistics.pvariance(errors)) < 1e-9
+
+
+def test_v5_tracker_keeps_one_error_per_version_and_ranks_active_agents_only():
+    from metrics_server_v5 import GlobalSimplicityTrackerV5
+
+    tracker = GlobalSimplicityTrackerV5()
+    for aid in ("a", "b", "c"):
+        tracker.update_agent(aid, [0, 0], 0, 0, 0, 0, "s")
+    tracker.calculate_agent_rankings({"a": {"error": 0.9}, "b": {"error": 0.1}, "z": {"error": 0.0}},
+                                     {"a": [0, 0], "b": [1, 0], "c": [2, 0]}, version=1)
+    rankings = tracker.calculate_agent_rankings(
+        {"a": {"error": 0.0}, "b": {"error": 0.5}, "c": {"error": "N/A"}},
+        {"a": [0, 0], "b": [1, 0], "c": [2, 0]}, version=1)  # version deja vue : ignoree
+    assert [(aid, r["rank"]) for aid, r in rankings.items()] == [("b", 1), ("a", 2)]
+    assert rankings["a"]["total_iterations"] == 1
+    assert tracker.ranking.rank("z") == 999  # jamais actif
+
+    rankings = tracker.calculate_agent_rankings({"a": {"error": 0.0}}, {"a": [0, 0], "b": [1, 0]}, version=2)
+    assert rankings["a"] == {"rank": 2, "avg_error": 0.45, "total_iterations": 2, "position": [0, 0]}
+    tracker.remove_agent("a")
+    assert "a" not in tracker.ranking and tracker.ranking.rank("a") == 999
+
+
+def test_rank_changes_are_reported_once():
+    ranking = AgentRanking()
+    ranking.record("a", 0.2)
+    ranking.record("b", 0.4)
+    positions = {"a": [0, 0], "b": [1, 0]}
+    first = ranking.rank_changes(ranking.rankings(positions))
+    assert first == [{"agent_id": "a", "previous_rank": None, "rank": 1},
+                     {"agent_id": "b", "previous_rank": None, "rank": 2}]
+    assert ranking.rank_changes(ranking.rankings(positions)) == []
+    ranking.record("a", 0.9)
+    ranking.record("b", 0.0)
+    changes = ranking.rank_changes(ranking.rankings({"a": [0, 0], "b": [1, 0], "c": [2, 0]}))
+    assert changes == [{"agent_id": "b", "previous_rank": 2, "rank": 1},
+                       {"agent_id": "a", "previous_rank": 1, "rank": 2}]
+    assert ranking.rank_changes(ranking.rankings({"b": [1, 0]})) == [
+        {"agent_id": "a", "previous_rank": 2, "rank": None}]
+
+
+def test_v6_tracker_ranks_agents_without_errors_at_default():
+    from metrics_server_v6 import QuantumSimplicityTracker
+
+    tracker = QuantumSimplicityTracker()
+    rankings = tracker.calculate_agent_rankings({"a": {"error": 1.5}, "b": {"error": 0.5}},
+                                                {"a": [0, 0], "b": [1, 0], "c": [2, 0]})
+    assert [(aid, r["rank"], r["total_iterations"]) for aid, r in rankings.items()] == [
+        ("b", 1, 1), ("c", 2, 0), ("a", 3, 1)]
+    assert tracker.error_history() == {"a": [1.5], "b": [0.5]}
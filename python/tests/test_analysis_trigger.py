@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Tests de la machine d'état du déclencheur O→N (horloge factice).
+
+Usage:
+    python -m pytest python/tests/test_analysis_trigger.py -q
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+# Ajouter le répertoire parent au path pour les imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from analysis_trigger import STATE_ANALYZING, AnalysisTrigger
+
+
+class FakeClock:
+    def __init__(self, t: float = 1000.0):
+        self.t = t
+
+    def __call__(self) -> float:
+        return self.t
+
+    def advance(self, dt: float) -> None:
+        self.t += dt
+
+
+def _ready(trigger, first=False, agents=3, with_data=3, size=5000):
+    return trigger.check_ready(
+        first_analysis=first, agents_count=agents, agents_with_data=with_data, image_size=size
+    )
+
+
+def test_warmup_until_enough_seeds_or_delay():
+    clock = FakeClock()
+    trigger = AnalysisTrigger(clock=clock)
+    trigger.notify_image()
+    d = trigger.check_warmup(first_analysis=True, agents_count=4, agents_with_data=1)
+    assert not d.fire and d.key == "warmup"
+    assert abs(d.retry_in - 30.05) < 1e-6
+    # 75% des agents ont envoyé leur seed : fin du warmup
+    assert trigger.check_warmup(first_analysis=True, agents_count=4, agents_with_data=3).fire
+    clock.advance(30)
+    assert trigger.check_warmup(first_analysis=True, agents_count=4, agents_with_data=1).fire
+
+
+def test_fires_at_quiescence_deadline():
+    clock = FakeClock()
+    trigger = AnalysisTrigger(clock=clock)
+    trigger.notify_w_data()
+    clock.advance(1.0)
+    trigger.notify_image()
+    d = _ready(trigger)
+    assert not d.fire and d.key == "quiescence"
+    # Réveil prévu exactement à la quiescence (5s après la dernière donnée W)
+    assert abs(d.retry_in - 4.05) < 1e-6
+    clock.advance(d.retry_in)
+    d = _ready(trigger)
+    assert d.fire and not d.forced
+    assert trigger.quiescence_start is None
+
+
+def test_quiescence_forced_after_max_wait():
+    clock = FakeClock()
+    trigger = AnalysisTrigger(clock=clock, max_image_age=None, final_image_age=None)
+    for _ in range(46):
+        trigger.notify_w_data()
+        trigger.notify_image()
+        d = _ready(trigger)
+        if d.fire:
+            break
+        clock.advance(1.0)
+    assert d.fire and d.forced
+    assert d.key == "ready"
+
+
+def test_w_data_newer_than_image_waits_for_image():
+    clock = FakeClock()
+    trigger = AnalysisTrigger(clock=clock)
+    trigger.notify_image()
+    clock.advance(3.0)
+    trigger.notify_w_data()
+    clock.advance(5.0)
+    d = _ready(trigger)
+    assert not d.fire and d.key == "w_newer"
+    trigger.notify_image()
+    assert _ready(trigger).fire
+
+
+def test_stale_image_forced_after_max_image_wait():
+    clock = FakeClock()
+    trigger = AnalysisTrigger(clock=clock, max_w_image_lag=None)
+    trigger.notify_image()
+    trigger.notify_w_data()
+    clock.advance(11.0)
+    d = _ready(trigger)
+    assert not d.fire and d.key == "image_old"
+    clock.advance(60.0)
+    d = _ready(trigger)
+    assert d.fire and d.forced
+
+
+def test_first_analysis_waits_for_seeds_then_timeout():
+    clock = FakeClock()
+    trigger = AnalysisTrigger(clock=clock)
+    trigger.notify_w_data()
+    clock.advance(7.0)
+    trigger.notify_image()
+    d = _ready(trigger, first=True, agents=8, with_data=2)
+    assert not d.fire and d.key == "seeds_partial"
+    clock.advance(d.retry_in)
+    trigger.notify_image()
+    assert _ready(trigger, first=True, agents=8, with_data=2).fire
+
+
+def test_small_image_waits_for_signal():
+    clock = FakeClock()
+    trigger = AnalysisTrigger(clock=clock)
+    trigger.notify_image()
+    clock.advance(6.0)
+    trigger.notify_image()
+    d = _ready(trigger, size=200)
+    assert not d.fire and d.key == "image_small" and d.retry_in is None
+
+
+def test_wait_wakes_on_signal():
+    async def scenario():
+        trigger = AnalysisTrigger(debounce=0.01, max_debounce=0.05)
+        waiter = asyncio.create_task(trigger.wait(5.0))
+        await asyncio.sleep(0)
+        trigger.notify_w_data()
+        woke = await asyncio.wait_for(waiter, 1.0)
+        timed_out = await trigger.wait(0.01)
+        return woke, timed_out
+
+    assert asyncio.run(scenario()) == (True, False)
+
+
+def test_begin_analysis_state():
+    trigger = AnalysisTrigger(clock=FakeClock())
+    trigger.begin_analysis()
+    assert trigger.stats()["state"] == STATE_ANALYZING
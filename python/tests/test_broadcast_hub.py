@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Tests du hub de diffusion WebSocket (encodage unique, files bornées, politiques).
+
+Usage:
+    python -m pytest python/tests/test_broadcast_hub.py -q
+"""
+
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+# Ajouter le répertoire parent au path pour les imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from broadcast_hub import BroadcastHub
+
+
+class FakeSocket:
+    """Client WebSocket simulé ; `gate` bloque les envois tant qu'il n'est pas ouvert."""
+
+    def __init__(self, blocked=False):
+        self.received = []
+        self.closed = False
+        self.gate = asyncio.Event()
+        if not blocked:
+            self.gate.set()
+
+    async def send_text(self, text):
+        await self.gate.wait()
+        self.received.append(json.loads(text))
+
+    async def close(self):
+        self.closed = True
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0.005)
+
+
+def test_broadcast_encodes_once_and_preserves_order():
+    async def scenario():
+        hub = BroadcastHub("Test", queue_size=8, policy="drop_oldest")
+        sockets = [FakeSocket() for _ in range(3)]
+        clients = [hub.add_websocket(ws) for ws in sockets]
+        for i in range(4):
+            hub.broadcast({"type": "event", "i": i})
+        hub.send(clients[0], {"type": "reply"})
+        await _settle()
+        stats = hub.stats()
+        for c in clients:
+            hub.remove(c)
+        return sockets, stats
+
+    sockets, stats = asyncio.run(scenario())
+    assert stats["messages"] == 4
+    assert stats["deliveries"] == 13
+    assert [m.get("i") for m in sockets[1].received] == [0, 1, 2, 3]
+    assert sockets[0].received[-1] == {"type": "reply"}
+
+
+def test_slow_client_does_not_block_and_drops_oldest():
+    async def scenario():
+        hub = BroadcastHub("Test", queue_size=3, policy="drop_oldest")
+        slow, fast = FakeSocket(blocked=True), FakeSocket()
+        slow_client = hub.add_websocket(slow)
+        hub.add_websocket(fast)
+        await _settle()
+        for i in range(10):
+            hub.broadcast({"i": i})
+            await asyncio.sleep(0.002)  # le client rapide suit
+        slow.gate.set()
+        await _settle()
+        stats = hub.stats()
+        hub.remove(slow_client)
+        return slow, fast, stats
+
+    slow, fast, stats = asyncio.run(scenario())
+    assert [m["i"] for m in fast.received] == list(range(10))
+    # Le premier message etait deja en cours d'envoi ; puis les 3 plus recents
+    assert [m["i"] for m in slow.received] == [0, 7, 8, 9]
+    assert stats["dropped"] == 6
+
+
+def test_coalesce_keeps_latest_state_after_events():
+    async def scenario():
+        hub = BroadcastHub("Test", queue_size=16, policy="coalesce")
+        ws = FakeSocket(blocked=True)
+        hub.add_websocket(ws)
+        await _settle()
+        hub.broadcast({"type": "busy"})
+        await _settle()
+        hub.broadcast({"type": "state", "v": 1}, coalesce_key="state")
+        hub.broadcast({"type": "event", "e": 1})
+        hub.broadcast({"type": "state", "v": 2}, coalesce_key="state")
+        ws.gate.set()
+        await _settle()
+        return ws, hub.stats()
+
+    ws, stats = asyncio.run(scenario())
+    assert ws.received == [{"type": "busy"}, {"type": "event", "e": 1}, {"type": "state", "v": 2}]
+    assert stats["coalesced"] == 1
+
+
+def test_disconnect_policy_closes_slow_client():
+    async def scenario():
+        hub = BroadcastHub("Test", queue_size=2, policy="disconnect")
+        ws = FakeSocket(blocked=True)
+        hub.add_websocket(ws)
+        await _settle()
+        for i in range(4):
+            hub.broadcast({"i": i})
+        await _settle()
+        return ws, hub
+
+    ws, hub = asyncio.run(scenario())
+    assert ws.closed
+    assert len(hub) == 0
+    assert hub.stats()["disconnected"] == 1
+
+
+def test_failing_send_removes_client():
+    async def scenario():
+        hub = BroadcastHub("Test", queue_size=4)
+
+        async def broken(text):
+            raise RuntimeError("socket closed")
+
+        hub.add(broken)
+        hub.broadcast({"x": 1})
+        await _settle()
+        return hub
+
+    hub = asyncio.run(scenario())
+    assert len(hub) == 0
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Tests de l'export en flux du bundle d'énoncés (synthèse TTS parallèle, cache, avancement).
+
+Usage:
+    python -m pytest python/tests/test_bundle_export.py -q
+"""
+
+import io
+import json
+import sys
+import threading
+import time
+import zipfile
+from pathlib import Path
+
+# Ajouter le répertoire parent au path pour les imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fastapi.testclient import TestClient
+
+import bundle_export
+import tts_piper_server
+import utterance_http
+import utterance_store
+
+
+def test_syntheses_run_concurrently_and_stream(tmp_path):
+    active = {"now": 0, "max": 0}
+    lock = threading.Lock()
+    calls = []
+
+    def synthesize(text, voice, lang):
+        with lock:
+            calls.append(text)
+            active["now"] += 1
+            active["max"] = max(active["max"], active["now"])
+        time.sleep(0.05)
+        with lock:
+            active["now"] -= 1
+        return None if text == "échec" else f"RIFF-{voice}-{text}".encode()
+
+    texts = [f"énoncé {i}" for i in range(12)] + ["énoncé 0", "échec"]
+    jobs = [(f"audio/u{i}.wav", text, "fr_FR-siwis-medium", "fr") for i, text in enumerate(texts)]
+    progress = bundle_export.start_progress("session_1")
+    started = time.monotonic()
+    chunks = list(bundle_export.iter_bundle([("utterances.json", b"{}")], jobs, synthesize,
+                                            lookup=lambda text, voice: b"RIFF-cache" if text == "énoncé 11" else None,
+                                            progress=progress, workers=4))
+    elapsed = time.monotonic() - started
+
+    assert len(chunks) > 3  # rendu au fil des synthèses, pas en un bloc
+    assert active["max"] == 4 and elapsed < 12 * 0.05
+    assert sorted(calls) == sorted(set(texts) - {"énoncé 11"})  # doublon synthétisé une fois
+    archive = zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
+    assert archive.read("audio/u12.wav") == archive.read("audio/u0.wav") == b"RIFF-fr_FR-siwis-medium-\xc3\xa9nonc\xc3\xa9 0"
+    assert archive.read("audio/u11.wav") == b"RIFF-cache"
+    assert "audio/u13.wav" not in archive.namelist()
+    assert bundle_export.get_progress(progress.export_id).to_dict() | {"elapsed": 0} == {
+        "export_id": progress.export_id, "session_id": "session_1", "audio_total": 14, "audio_done": 14,
+        "audio_cached": 1, "audio_failed": 1, "bytes_sent": len(b"".join(chunks)), "elapsed": 0,
+        "finished": True, "error": None,
+    }
+
+
+def test_http_export_reuses_piper_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(utterance_store, "UTTERANCES_DIR", tmp_path / "utterances")
+    monkeypatch.setattr(tts_piper_server, "CACHE_DIR", tmp_path / "tts_cache")
+    monkeypatch.setattr(utterance_http, "_try_piper_wav", lambda text, voice, lang: None)  # Piper arrêté
+    record = utterance_store.append_utterance(source="N", text="Le récit continue", session_id="session_2")
+    cached = tts_piper_server.cached_wav_path("Le récit continue", "fr_FR-upmc-medium")
+    cached.parent.mkdir(parents=True)
+    cached.write_bytes(b"RIFF-piper")
+
+    client = TestClient(utterance_http.app)
+    response = client.get("/api/utterances/session_2/export", params={"export_id": "exp-1"})
+    assert response.headers["x-export-id"] == "exp-1"
+    archive = zipfile.ZipFile(io.BytesIO(response.content))
+    assert json.loads(archive.read("utterances.json"))["utterance_count"] == 1
+    assert archive.read(f"audio/{record['id']}.wav") == b"RIFF-piper"
+    progress = client.get("/api/utterances/exports/exp-1/progress").json()
+    assert progress["audio_cached"] == 1 and progress["finished"]
+    assert client.get("/api/utterances/exports/inconnu/progress").status_code == 404
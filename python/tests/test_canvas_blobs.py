@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Tests du stockage adressé par contenu des snapshots canvas (déduplication, endpoint, cache HTTP).
+
+Usage:
+    python -m pytest python/tests/test_canvas_blobs.py -q
+"""
+
+import base64
+import hashlib
+import sys
+from pathlib import Path
+
+import pytest
+
+# Ajouter le répertoire parent au path pour les imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import session_log
+from canvas_blobs import CanvasBlobStore, sniff_media_type
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 32
+
+
+def test_put_deduplicates_and_round_trips(tmp_path):
+    store = CanvasBlobStore(tmp_path)
+    digest = store.put_base64("data:image/png;base64," + base64.b64encode(PNG).decode())
+    assert digest == hashlib.sha256(PNG).hexdigest()
+    assert store.put(PNG) == digest
+    assert store.get(digest) == PNG
+    assert store.stats()["writes"] == 1 and store.stats()["dedup_hits"] == 1
+    assert store.get("../etc/passwd") is None
+    assert sniff_media_type(PNG) == "image/png"
+    with pytest.raises(ValueError):
+        store.put_base64("pas du base64 !")
+    with pytest.raises(ValueError):  # même borne que les images reçues (IMAGE_MAX_BYTES)
+        CanvasBlobStore(tmp_path, max_bytes=16).put_base64(base64.b64encode(PNG).decode())
+    assert store.stats()["writes"] == 1
+
+
+def test_recorder_keeps_only_hashes_and_endpoint_caches(tmp_path, monkeypatch):
+    monkeypatch.setattr(session_log, "SESSION_LOG_DIR", tmp_path / "log")
+    from fastapi.testclient import TestClient
+    import metrics_server_v5 as server
+
+    recorder = server.SessionRecorder(blobs=CanvasBlobStore(tmp_path / "blobs"))
+    monkeypatch.setattr(server, "canvas_blobs", recorder.blobs)
+    digest = recorder.blobs.put(PNG)
+    recorder.add_canvas_snapshot(3, digest)
+    recorder.record_iteration_event(3, [], canvas_snapshot=base64.b64encode(PNG).decode())
+    events = recorder.log.read(0, 2)
+    assert events[0]["data"] == {"version": 3, "hash": digest, "url": f"/api/session/canvas/{digest}"}
+    assert events[1]["canvas_hash"] == digest
+    assert "data" not in recorder.canvas_snapshots[0]
+
+    client = TestClient(server.app)
+    response = client.get(f"/api/session/canvas/{digest}")
+    assert response.status_code == 200
+    assert response.content == PNG
+    assert response.headers["content-type"] == "image/png"
+    assert "immutable" in response.headers["cache-control"]
+    cached = client.get(f"/api/session/canvas/{digest}", headers={"If-None-Match": response.headers["etag"]})
+    assert cached.status_code == 304
+    assert client.get("/api/session/canvas/" + "0" * 64).status_code == 404
+    recorder.log.close()
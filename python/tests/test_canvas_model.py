@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Tests du canevas global côté serveur (décodage hex vectorisé, messages du jeu, rendu PNG).
+
+Usage:
+    python -m pytest python/tests/test_canvas_model.py -q
+"""
+
+import base64
+import io
+import sys
+from pathlib import Path
+
+import numpy as np
+
+# Ajouter le répertoire parent au path pour les imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from canvas_model import CanvasModel, parse_hex_colors, parse_pixel_strings
+
+
+def test_parse_hex_colors_vectorized():
+    rgb, valid = parse_hex_colors(["#FF8000", "#0a0B0c", "#abc", "#zz0000", None])
+    assert valid.tolist() == [True, True, True, False, False]
+    assert rgb[0].tolist() == [255, 128, 0]
+    assert rgb[1].tolist() == [10, 11, 12]
+    assert rgb[2].tolist() == [0xAA, 0xBB, 0xCC]
+
+
+def test_parse_pixel_strings_skips_invalid():
+    xs, ys, rgb = parse_pixel_strings(["3,4#FF0000", "bad", "1,x#00FF00", {"x": 5, "y": 6, "color": "#0000FF"}])
+    assert xs.tolist() == [3, 5]
+    assert ys.tolist() == [4, 6]
+    assert rgb.tolist() == [[255, 0, 0], [0, 0, 255]]
+
+
+def test_game_messages_layout():
+    canvas = CanvasModel(pixel_size=1)
+    canvas.apply_game_message({
+        "type": "initial_state",
+        "grid_state": '{"user_positions": {"a": [0, 0], "b": [1, -1]}}',
+        "sub_cell_states": {"a": {"0,0": "#FF0000"}, "b": {"19,19": "#00FF00"}},
+    })
+    assert canvas.side == 3 and canvas.array.shape == (60, 60, 3)
+    # Grille (0,0) au centre, (1,-1) en haut à droite
+    assert canvas.array[20, 20].tolist() == [255, 0, 0]
+    assert canvas.array[19, 59].tolist() == [0, 255, 0]
+
+    version = canvas.version
+    assert canvas.apply_game_message({"type": "cell_update", "user_id": "a", "sub_x": 1, "sub_y": 2, "color": "#0000FF"})
+    assert canvas.version == version + 1
+    assert canvas.array[22, 21].tolist() == [0, 0, 255]
+    assert not canvas.apply_game_message({"type": "cell_update", "user_id": "a", "sub_x": 25, "sub_y": 0, "color": "#0000FF"})
+
+    canvas.apply_game_message({"type": "user_left", "user_id": "b"})
+    assert canvas.side == 1 and canvas.array.shape == (20, 20, 3)
+
+
+def test_w_pixels_and_png_cache():
+    from PIL import Image
+
+    canvas = CanvasModel(pixel_size=5)
+    assert canvas.apply_w_pixels("w1", [0, 0], ["0,0#FFFFFF", "19,0#123456"]) == 2
+    png = canvas.render_png()
+    assert canvas.render_png() is png and canvas.render_hits == 1
+    with Image.open(io.BytesIO(png)) as img:
+        assert img.size == (100, 100)
+        arr = np.asarray(img.convert("RGB"))
+    assert arr[0:5, 0:5].reshape(-1, 3).tolist() == [[255, 255, 255]] * 25
+    assert arr[0, 99].tolist() == [0x12, 0x34, 0x56]
+
+    h = canvas.content_hash()
+    canvas.apply_w_pixels("w1", [0, 0], ["1,1#FFFFFF"])
+    assert canvas.content_hash() != h
+    assert canvas.render_png() is not png
+
+
+def test_png_matches_upscaled_array():
+    import zlib
+    from PIL import Image
+
+    from canvas_model import adler32_combine, upscale
+
+    assert adler32_combine(zlib.adler32(b"abc"), zlib.adler32(b"defgh"), 5) == zlib.adler32(b"abcdefgh")
+    canvas = CanvasModel(pixel_size=3)
+    canvas.apply_w_pixels("a", [0, 0], [f"{i},{(i * 7) % 20}#{i * 12:02X}80{255 - i:02X}" for i in range(20)])
+    canvas.apply_w_pixels("b", [-1, 1], ["0,0#FFFFFF", "19,19#010203"])
+    with Image.open(io.BytesIO(canvas.render_png())) as img:
+        decoded = np.asarray(img.convert("RGB"))
+    assert np.array_equal(decoded, upscale(canvas.array, 3))
+
+
+def test_only_dirty_rows_reencoded():
+    canvas = CanvasModel(pixel_size=2)
+    for i, pos in enumerate([[-1, -1], [0, -1], [0, 0], [1, 1]]):
+        canvas.apply_w_pixels(f"u{i}", pos, [f"{i},{i}#FF00FF"])
+    canvas.render_png()
+    assert canvas.band_encodes == 3
+    canvas.apply_game_message({"type": "cell_update", "user_id": "u3", "sub_x": 5, "sub_y": 5, "color": "#00FF00"})
+    canvas.render_png()
+    assert canvas.band_encodes == 4 and canvas.band_hits == 2
+
+
+def test_delta_lists_changed_tiles_only():
+    from PIL import Image
+
+    canvas = CanvasModel(pixel_size=2)
+    canvas.apply_w_pixels("a", [0, 0], ["0,0#FF0000"])
+    canvas.apply_w_pixels("b", [1, 0], ["0,0#00FF00"])
+    since = canvas.version
+    assert canvas.render_delta(since)["tiles"] == []
+    canvas.apply_cell_update("b", 3, 3, "#0000FF")
+    delta = canvas.render_delta(since)
+    assert not delta["full"] and [t["user_id"] for t in delta["tiles"]] == ["b"]
+    tile = delta["tiles"][0]
+    assert (tile["x"], tile["y"], tile["size"]) == (80, 40, 40)
+    with Image.open(io.BytesIO(base64.b64decode(tile["png_base64"]))) as img:
+        assert img.size == (40, 40) and img.convert("RGB").getpixel((6, 6)) == (0, 0, 255)
+    # Changement de disposition : image complète à recharger
+    canvas.apply_w_pixels("c", [2, 2], ["0,0#FFFFFF"])
+    assert canvas.render_delta(since)["full"]
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Tests de la réception des images de canevas (base64 strict, corps brut, bornes de taille).
+
+Usage:
+    python -m pytest python/tests/test_image_ingest.py -q
+"""
+
+import base64
+import sys
+from pathlib import Path
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+# Ajouter le répertoire parent au path pour les imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from image_ingest import PNG_SIGNATURE, ImageUploadError, decode_base64_image, read_image_upload
+
+PNG = PNG_SIGNATURE + b"\x00" * 64
+
+app = FastAPI()
+
+
+@app.post("/image")
+async def post_image(request: Request):
+    try:
+        upload = await read_image_upload(request, max_bytes=1024)
+    except ImageUploadError as e:
+        return JSONResponse(status_code=e.status, content={"error": e.code})
+    return {"size": len(upload.raw), "agents_count": upload.agents_count, "source": upload.source,
+            "same_b64": upload.base64 == base64.b64encode(PNG).decode()}
+
+
+client = TestClient(app)
+
+
+def test_decode_base64_strict():
+    b64 = base64.b64encode(PNG).decode()
+    assert decode_base64_image("data:image/png;base64," + b64) == PNG
+    for bad in ("", b64[:-2] + "!!", b64 + "\n", base64.b64encode(b"GIF89a").decode()):
+        try:
+            decode_base64_image(bad)
+        except ImageUploadError as e:
+            assert e.status in (400, 415)
+        else:
+            raise AssertionError(f"accepté: {bad[:20]!r}")
+
+
+def test_json_upload():
+    b64 = base64.b64encode(PNG).decode()
+    r = client.post("/image", json={"image_base64": "data:image/png;base64," + b64, "agents_count": 4})
+    assert r.json() == {"size": len(PNG), "agents_count": 4, "source": "json", "same_b64": True}
+    r = client.post("/image", json={"image_base64": "not base64 at all"})
+    assert r.status_code == 400 and r.json()["error"] == "invalid_base64"
+
+
+def test_raw_png_upload():
+    r = client.post("/image?agents_count=9", content=PNG, headers={"Content-Type": "image/png"})
+    assert r.json() == {"size": len(PNG), "agents_count": 9, "source": "raw", "same_b64": True}
+    r = client.post("/image", content=b"x" * 10, headers={"Content-Type": "image/png", "X-Agents-Count": "2"})
+    assert r.status_code == 415
+
+
+def test_size_bound():
+    r = client.post("/image", content=PNG + b"\x00" * 2048, headers={"Content-Type": "image/png"})
+    assert r.status_code == 413 and r.json()["error"] == "too_large"
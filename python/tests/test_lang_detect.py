@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Tests de la détection de langue des énoncés (motif précompilé, cache, back-fill des sidecars).
+
+Usage:
+    python -m pytest python/tests/test_lang_detect.py -q
+"""
+
+import json
+import sys
+from pathlib import Path
+
+# Ajouter le répertoire parent au path pour les imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import utterance_store
+from lang_detect import LanguageDetector
+
+
+def test_same_rule_and_memoized():
+    detector = LanguageDetector(cache_size=2)
+    assert detector.detect("La ligne est dans le coin, avec une courbe") == "fr"
+    assert detector.detect("The agent is drawing a line with the others") == "en"
+    assert detector.detect("") == "fr"  # égalité : fr, comme avant
+    assert detector.detect("THE AGENT IS HERE AND THERE") == "en"
+    assert detector.detect("La ligne est dans le coin, avec une courbe") == "fr"
+    assert detector.stats() == {"cached": 2, "hits": 0, "misses": 5}  # LRU de 2 entrées
+    assert detector.detect_many(["the agent is here and there", "pour les agents"]) == ["en", "fr"]
+    assert detector.stats()["hits"] == 1  # même échantillon en minuscules
+
+
+def test_append_detects_once_and_backfill_fills_missing(tmp_path, monkeypatch):
+    monkeypatch.setattr(utterance_store, "UTTERANCES_DIR", tmp_path / "utterances")
+    record = utterance_store.record_w_from_agent({"strategy": "The agent extends the line", "iteration": 2,
+                                                  "id": "w1", "timestamp": "2026-01-01T00:00:01+00:00"},
+                                                 session_id="session_5")
+    assert record["lang"] == "en"
+
+    path = utterance_store._sidecar_path("session_5")
+    utterance_store.writer.flush()
+    with open(path, "ab") as f:  # énoncés anciens sans langue
+        f.write((json.dumps({"id": "old", "ts": "2026-01-01T00:00:00+00:00", "text": "une ligne dans le coin"},
+                            ensure_ascii=False) + "\n").encode("utf-8"))
+    assert utterance_store.list_utterances("session_5")[0].get("lang") is None
+
+    assert utterance_store.backfill_languages("session_5") == {"session_5": 1}
+    assert [u["lang"] for u in utterance_store.list_utterances("session_5")] == ["fr", "en"]
+    assert utterance_store.backfill_languages("session_5") == {"session_5": 0}
+
+    utterance_store.append_utterance(source="O", text="Le motif est stable", session_id="session_5",
+                                     ts="2026-01-01T00:00:02+00:00")
+    assert [u["lang"] for u in utterance_store.list_utterances("session_5")] == ["fr", "en", "fr"]
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Tests de l'ordonnanceur LLM (priorite des voies, round-robin, backoff 429).
+
+Usage:
+    python -m pytest python/tests/test_llm_scheduler.py -q
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+# Ajouter le répertoire parent au path pour les imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from llm_scheduler import LANE_ON, LANE_W_ACTION, LANE_W_SEED, LLMScheduler, agent_from_request, lane_from_request
+
+
+class _Resp:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+def test_priority_and_round_robin():
+    async def scenario():
+        sched = LLMScheduler(max_in_flight=1, queue_timeout=5)
+        order = []
+        await sched.acquire(LANE_ON, "holder")  # occupe l'unique emplacement
+
+        async def job(lane, agent, tag):
+            await sched.acquire(lane, agent)
+            order.append(tag)
+            sched.release(200)
+
+        tasks = [
+            asyncio.create_task(job(LANE_W_ACTION, "a", "a1")),
+            asyncio.create_task(job(LANE_W_ACTION, "a", "a2")),
+            asyncio.create_task(job(LANE_W_ACTION, "b", "b1")),
+            asyncio.create_task(job(LANE_W_SEED, "c", "seed")),
+            asyncio.create_task(job(LANE_ON, "O-machine", "O")),
+        ]
+        await asyncio.sleep(0)
+        assert sched.stats()["queue_depth_total"] == 5
+        sched.release(200)
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(scenario()) == ["O", "seed", "a1", "b1", "a2"]
+
+
+def test_seed_requests_of_49_agents_interleave():
+    # Corps envoyés par les adaptateurs V5/V6, tous par la même connexion keep-alive
+    bodies = [{"lane": "w_seed", "agent_id": "agent-0"} for _ in range(3)]
+    bodies += [{"lane": "w_seed", "agent_id": f"agent-{i}"} for i in range(1, 49)]
+    keys = [agent_from_request(body, {}, "10.0.0.7") for body in bodies]
+    assert agent_from_request({}, {"x-agent-id": "agent-9"}, "10.0.0.7") == "agent-9"
+    assert agent_from_request({}, {}, "10.0.0.7") == "10.0.0.7"
+
+    async def scenario():
+        sched = LLMScheduler(max_in_flight=1, queue_timeout=5)
+        order = []
+        await sched.acquire(LANE_ON, "holder")
+
+        async def job(body, key):
+            await sched.acquire(lane_from_request(body), key)
+            order.append(key)
+            sched.release(200)
+
+        tasks = [asyncio.create_task(job(body, key)) for body, key in zip(bodies, keys)]
+        await asyncio.sleep(0)
+        sched.release(200)
+        await asyncio.gather(*tasks)
+        return order
+
+    order = asyncio.run(scenario())
+    # agent-0 (3 seeds en tête de file) ne passe pas avant les 48 autres agents
+    assert order == ["agent-0"] + [f"agent-{i}" for i in range(1, 49)] + ["agent-0", "agent-0"]
+
+
+def test_429_pauses_and_halves_limit():
+    async def scenario():
+        now = [100.0]
+        sched = LLMScheduler(max_in_flight=4, backoff_base=2.0, clock=lambda: now[0])
+        resp = await sched.run(LANE_W_ACTION, "a", lambda: asyncio.sleep(0, _Resp(429, {"retry-after": "7"})))
+        assert resp.status_code == 429
+        stats = sched.stats()
+        assert stats["effective_limit"] == 2
+        assert stats["paused_for_s"] == 7.0
+        assert stats["rate_limited_count"] == 1
+
+        waiter = asyncio.create_task(sched.acquire(LANE_ON, "O-machine"))
+        await asyncio.sleep(0)
+        assert not waiter.done()  # pause en cours
+        now[0] += 8.0
+        sched._dispatch()
+        await waiter
+        sched.release(200)
+        return sched.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["in_flight"] == 0
+    assert stats["backoff_s"] == 0.0
+
+
+def test_cancelled_waiter_leaves_queue():
+    async def scenario():
+        sched = LLMScheduler(max_in_flight=1)
+        await sched.acquire(LANE_ON, "holder")
+        waiter = asyncio.create_task(sched.acquire(LANE_W_ACTION, "a"))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        depth = sched.queue_depth()
+        sched.release()
+        return depth, sched.in_flight
+
+    assert asyncio.run(scenario()) == (0, 0)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Tests des sessions de métriques par canevas (routage, isolation, éviction, répartition par hachage).
+
+Usage:
+    python -m pytest python/tests/test_metrics_sessions.py -q
+"""
+
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+# Ajouter le répertoire parent au path pour les imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import metrics_sessions
+import session_log
+from metrics_sessions import DEFAULT_SESSION, SessionRegistry, shard_for
+
+
+class FakeSession:
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.clients = 0
+        self.closed = False
+
+    def busy(self):
+        return self.clients > 0
+
+    def close(self):
+        self.closed = True
+
+
+def _agent_update(user_id):
+    return json.dumps({"type": "agent_update", "user_id": user_id, "position": [0, 0],
+                       "iteration": 2, "prediction_error": 0.3})
+
+
+def test_idle_sessions_are_evicted_but_not_default_or_busy():
+    registry = SessionRegistry(FakeSession, idle_timeout=10, max_sessions=3)
+    default = registry.open(DEFAULT_SESSION)
+    a, b = registry.open("a"), registry.open("b")
+    b.clients = 1
+    assert registry.evict_idle(now=float("inf")) == ["a"]
+    assert a.closed and not default.closed and "b" in registry
+    registry.open("c")
+    registry.open("d")  # plein : la moins récemment active sans client (c) est fermée
+    assert registry.ids() == [DEFAULT_SESSION, "b", "d"]
+    assert registry.stats()["evicted"] == 2
+
+
+def test_shard_is_stable_and_foreign_sessions_redirect(monkeypatch):
+    assert shard_for("canvas-1", 4) == shard_for("canvas-1", 4)
+    assert {shard_for(f"canvas-{i}", 4) for i in range(64)} == {0, 1, 2, 3}
+    shards = ["http://host:5005", "http://host:5015"]
+    monkeypatch.setattr(metrics_sessions, "METRICS_SHARDS", shards)
+    foreign = next(f"c{i}" for i in range(100) if shard_for(f"c{i}") == 1)
+    assert metrics_sessions.owner_url(foreign) == "http://host:5015"
+    assert metrics_sessions.owner_url(DEFAULT_SESSION) is None
+
+    from fastapi.testclient import TestClient
+    import metrics_server_v5 as server
+
+    client = TestClient(server.app)
+    response = client.get(f"/state?session={foreign}", follow_redirects=False)
+    assert response.status_code == 307
+    assert response.headers["location"] == f"http://host:5015/state?session={foreign}"
+    with client.websocket_connect(f"/metrics/{foreign}") as ws:
+        message = ws.receive_text()
+        assert json.loads(message) == {"type": "session_redirect", "session_id": foreign,
+                                       "url": f"ws://host:5015/metrics/{foreign}"}
+    # Producteur O/N (serveur IA V5) : se reconnecte à l'URL annoncée
+    assert metrics_sessions.redirect_url(message) == f"ws://host:5015/metrics/{foreign}"
+    assert metrics_sessions.redirect_url('{"type": "state_update"}') is None
+
+
+def test_producer_url_targets_the_canvas_session():
+    assert metrics_sessions.metrics_ws_url("ws://localhost:5005/", "canvas-7") == "ws://localhost:5005/metrics/canvas-7"
+    assert metrics_sessions.metrics_ws_url("ws://localhost:5005", "") == "ws://localhost:5005/metrics"
+    assert metrics_sessions.metrics_ws_url("ws://localhost:5005", DEFAULT_SESSION) == "ws://localhost:5005/metrics"
+    with pytest.raises(ValueError):
+        metrics_sessions.metrics_ws_url("ws://localhost:5005", "bad/id")
+
+
+def test_sessions_are_isolated_and_routed_by_path_or_first_message(tmp_path, monkeypatch):
+    monkeypatch.setattr(session_log, "SESSION_LOG_DIR", tmp_path)
+    from fastapi.testclient import TestClient
+    import metrics_server_v5 as server
+
+    client = TestClient(server.app)
+    assert client.get("/state?session=canvas-b").status_code == 404
+    assert client.get("/state?session=bad/id").status_code == 400
+    with client.websocket_connect("/metrics/canvas-a") as ws_a, client.websocket_connect("/metrics") as ws_b:
+        ws_b.send_text(json.dumps({"type": "join_session", "session_id": "canvas-b"}))
+        assert ws_b.receive_json() == {"type": "session_joined", "session_id": "canvas-b"}
+        ws_a.send_text(_agent_update("agent-in-a"))
+        assert ws_a.receive_json()["type"] == "state_update"
+        ws_b.send_text(_agent_update("agent-in-b"))
+        update = ws_b.receive_json()
+        assert update["type"] == "state_update"
+        assert set(update["data"]["agents"]) == {"agent-in-b"}
+
+    state_a = client.get("/state?session=canvas-a").json()
+    assert set(state_a["agents"]) == {"agent-in-a"}
+    assert "agent-in-a" not in server.tracker.agents
+    listed = {s["session_id"]: s for s in client.get("/api/sessions").json()["sessions"]}
+    assert listed["canvas-a"]["agents"] == 1 and listed["canvas-b"]["clients"] == 0
+    for session_id in ("canvas-a", "canvas-b"):
+        server.sessions.close(session_id)
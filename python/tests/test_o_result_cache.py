@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Tests du cache des analyses O (empreinte canonique, LRU/TTL, disque).
+
+Usage:
+    python -m pytest python/tests/test_o_result_cache.py -q
+"""
+
+import base64
+import io
+import sys
+from pathlib import Path
+
+import pytest
+
+# Ajouter le répertoire parent au path pour les imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import o_result_cache
+from o_result_cache import OResultCache, canvas_hash
+
+
+def _png_b64(color, compress_level=6, size=(20, 20)):
+    Image = pytest.importorskip("PIL.Image")
+    buf = io.BytesIO()
+    Image.new("RGB", size, color).save(buf, format="PNG", compress_level=compress_level)
+    return base64.b64encode(buf.getvalue()).decode()
+
+
+def test_canvas_hash_ignores_png_encoding():
+    a = _png_b64((10, 20, 30), compress_level=1)
+    b = _png_b64((10, 20, 30), compress_level=9)
+    assert a != b
+    assert canvas_hash(a) == canvas_hash(b)
+    assert canvas_hash(a) != canvas_hash(_png_b64((10, 20, 31)))
+    # Quantification : petites variations de couleur tolérées
+    assert canvas_hash(a, quant_bits=4) == canvas_hash(_png_b64((10, 20, 31)), quant_bits=4)
+
+
+def test_key_depends_on_prompt_and_model():
+    cache = OResultCache(persist_dir="")
+    img = _png_b64((0, 0, 0))
+    k = cache.make_key(img, "prompt v1", "m")
+    assert k == cache.make_key(img, "prompt v1", "m")
+    assert k != cache.make_key(img, "prompt v2", "m")
+    assert k != cache.make_key(img, "prompt v1", "other")
+
+
+def test_lru_eviction_and_fresh_copies():
+    cache = OResultCache(max_entries=2, persist_dir="")
+    cache.put("a", {"structures": [1]}, 10)
+    cache.put("b", {"structures": [2]}, 20)
+    result, tokens = cache.get("a")  # "a" devient le plus récent
+    result["structures"].append(99)  # l'appelant peut modifier sa copie
+    cache.put("c", {"structures": [3]}, 30)
+    assert cache.get("b") is None
+    assert cache.get("a") == ({"structures": [1]}, 10)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_bytes_bound_and_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(o_result_cache.time, "time", lambda: now[0])
+    cache = OResultCache(max_bytes=60, ttl=10, persist_dir="")
+    cache.put("a", {"x": "a" * 30})
+    cache.put("b", {"x": "b" * 30})
+    assert cache.get("a") is None and cache.get("b") is not None
+    now[0] += 11
+    assert cache.get("b") is None
+
+
+def test_disk_persistence(tmp_path):
+    first = OResultCache(persist_dir=str(tmp_path))
+    first.put("k", {"structures": []}, 7)
+    second = OResultCache(persist_dir=str(tmp_path))
+    assert second.get("k") == ({"structures": []}, 7)
+    assert second.stats()["disk_hits"] == 1
+    # Résultat refusé par la validation de l'appelant : retiré de la mémoire et du disque
+    second.discard("k")
+    assert second.get("k") is None
+    assert OResultCache(persist_dir=str(tmp_path)).get("k") is None
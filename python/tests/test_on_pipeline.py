@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Tests du pipeline O→N (file bornée, tours supersédés).
+
+Usage:
+    python -m pytest python/tests/test_on_pipeline.py -q
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+# Ajouter le répertoire parent au path pour les imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from on_pipeline import StagePipeline
+
+
+def test_rounds_are_numbered_in_trigger_order():
+    pipeline = StagePipeline(maxsize=1)
+    ids = [pipeline.new_round().round_id for _ in range(3)]
+    assert ids == [1, 2, 3]
+
+
+def test_full_queue_supersedes_oldest_round():
+    async def scenario():
+        pipeline = StagePipeline(maxsize=1)
+        r1, r2 = pipeline.new_round(), pipeline.new_round()
+        assert pipeline.submit(r1) is None
+        dropped = pipeline.submit(r2)
+        nxt = await pipeline.next()
+        return dropped, nxt, pipeline.stats()
+
+    dropped, nxt, stats = asyncio.run(scenario())
+    assert dropped.round_id == 1 and dropped.cancelled
+    assert nxt.round_id == 2
+    assert stats["superseded_count"] == 1
+    assert stats["n_in_progress"] == 2
+
+
+def test_done_counts_stale_rounds():
+    async def scenario():
+        pipeline = StagePipeline()
+        rnd = pipeline.new_round()
+        pipeline.submit(rnd)
+        await pipeline.next()
+        pipeline.done(rnd, published=False)
+        return pipeline.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["stale_count"] == 1 and stats["n_in_progress"] is None
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Tests du tampon circulaire en colonnes (historiques des trackers V5 et V6).
+
+Usage:
+    python -m pytest python/tests/test_ring_buffer.py -q
+"""
+
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+
+# Ajouter le répertoire parent au path pour les imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from ring_buffer import ColumnRing
+
+
+def test_wraparound_matches_truncated_list_and_windows_are_views():
+    ring = ColumnRing(7, numeric=("x",), objects=("label",), keep_records=True)
+    expected = []
+    for i in range(25):
+        record = {"x": i * 1.5 if i % 4 else "N/A", "label": f"r{i}"}
+        ring.append(record)
+        expected = (expected + [record])[-7:]
+        assert ring.records() == expected
+        assert ring[-1] is record and ring[0] is expected[0]
+    assert len(ring) == 7 and ring.appended == 25
+    assert ring.records(3) == expected[-3:]
+    assert ring.as_lists(["label", "x"], 3) == {"label": ["r22", "r23", "r24"], "x": [33.0, 34.5, None]}
+
+    window = ring.column("x", 5)
+    assert np.shares_memory(window, ring._columns["x"])
+    assert not window.flags.writeable
+    assert ring.mean("x", 3) == (33.0 + 34.5) / 2
+
+
+def test_aggregates_and_rolling_mean():
+    ring = ColumnRing(50, numeric=("v",))
+    values = [float(v) for v in range(60)]
+    for v in values:
+        ring.append({"v": v})
+    kept = np.array(values[-50:])
+    assert ring.mean("v") == kept.mean()
+    assert abs(ring.std("v", 10) - kept[-10:].std()) < 1e-12
+    rolling = ring.rolling_mean("v", 4)
+    assert np.allclose(rolling, np.convolve(kept, np.ones(4) / 4, mode="valid"))
+    assert ring.summary(5)["v"] == {"mean": 57.0, "std": float(kept[-5:].std()), "min": 55.0, "max": 59.0,
+                                    "count": 5}
+    ring.clear()
+    assert not ring and ring.mean("v") is None and ring.summary() == {}
+
+
+def test_trackers_expose_history_in_client_format():
+    from metrics_server_v5 import GlobalSimplicityTrackerV5
+    from metrics_server_v6 import QuantumSimplicityTracker
+
+    tracker = GlobalSimplicityTrackerV5()
+    for i in range(120):
+        tracker.update_agent(f"a{i % 5}", [0, 0], 1.0, 2.0, 3.0, 0.1, "s")
+        tracker.record_history()
+        tracker.store_n_snapshot({"version": i, "prediction_errors": {"a0": {"error": 0.5}}})
+    summary = json.loads(json.dumps(tracker.get_state_summary()))
+    assert len(summary["history"]) == 50 and summary["latest_n"]["version"] == 119
+    assert summary["n_snapshots_count"] == 100 and tracker.n_snapshots[0]["version"] == 20
+    assert tracker.n_snapshots.summary(10)["version"]["mean"] == 114.5
+
+    quantum = QuantumSimplicityTracker()
+    for i in range(3):
+        quantum.add_quantum_snapshot({"version": i, "coherence_observables": {"phi_coherence": i / 10}})
+    state = json.loads(json.dumps(quantum.get_state()))
+    assert list(state["history"])[:3] == ["timestamps", "versions", "C_w"]
+    assert state["history"]["versions"] == [0, 1, 2]
+    assert state["history"]["phi_coherence"] == [0.0, 0.1, 0.2]
+    assert state["latest_metrics"]["phi_coherence"] == 0.2
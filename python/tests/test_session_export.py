@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Tests de l'export de session en flux (JSON, NDJSON, gzip, since_iteration, include).
+
+Usage:
+    python -m pytest python/tests/test_session_export.py -q
+"""
+
+import gzip
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+# Ajouter le répertoire parent au path pour les imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import session_log
+from session_export import gzip_chunks, iter_session_export, parse_include
+
+
+@pytest.fixture
+def recorder(tmp_path, monkeypatch):
+    monkeypatch.setattr(session_log, "SESSION_LOG_DIR", tmp_path)
+    monkeypatch.setattr(session_log, "SESSION_LOG_WINDOW", 3)
+    from metrics_server_v5 import SessionRecorder
+
+    rec = SessionRecorder()
+    for version in range(1, 6):
+        rec.update_global_metrics(1.0, 2.0, 3.0, version=version)
+        data = rec.record_agent_action("agent-1", [0, 0], rationale="élan", iteration=version)
+        rec.add_canvas_snapshot(version, "iVBORw0KGgo=")
+        rec.record_iteration_event(version, [data])
+    yield rec
+    rec.log.close()
+
+
+def test_streamed_json_matches_in_memory_export(recorder):
+    streamed = json.loads(b"".join(iter_session_export(recorder)))
+    legacy = recorder.export_session()
+    assert streamed["events"] == legacy["events"]
+    assert streamed["globalMetrics"] == legacy["globalMetrics"]
+    assert streamed["agentMetrics"] == legacy["agentMetrics"]
+    assert streamed["canvasSnapshots"] == legacy["canvasSnapshots"]
+    assert streamed["metadata"]["total_events"] == 15
+
+
+def test_since_iteration_and_projection(recorder):
+    doc = json.loads(b"".join(iter_session_export(recorder, since_iteration=4, include="global,agents")))
+    assert [(e["type"], e.get("version")) for e in doc["events"]] == [
+        ("agent", None), ("iteration", 4), ("agent", None), ("iteration", 5)]
+    assert [g["version"] for g in doc["globalMetrics"]] == [4, 5]
+    assert "canvasSnapshots" not in doc
+    assert parse_include("bogus") == {"agents", "global", "canvas"}
+
+
+def test_ndjson_and_gzip(recorder):
+    raw = b"".join(gzip_chunks(iter_session_export(recorder, fmt="ndjson", include="canvas")))
+    lines = [json.loads(l) for l in gzip.decompress(raw).splitlines()]
+    assert lines[0]["type"] == "session"
+    assert [l["type"] for l in lines[1:-1]] == ["canvas_snapshot"] * 5
+    assert lines[-1]["type"] == "summary" and lines[-1]["metadata"]["total_events"] == 5
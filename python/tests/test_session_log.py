@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Tests du journal d'événements segmenté du SessionRecorder V5 (fenêtre RAM, pagination, itérations).
+
+Usage:
+    python -m pytest python/tests/test_session_log.py -q
+"""
+
+import sys
+from pathlib import Path
+
+# Ajouter le répertoire parent au path pour les imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from session_log import SessionEventLog
+
+
+def _fill(log, n):
+    for i in range(n):
+        if i % 10 == 9:
+            log.append({"type": "iteration", "version": i // 10 + 1, "i": i})
+        else:
+            log.append({"type": "agent", "data": {"id": f"a{i % 3}", "texte": "é" * (i % 7)}, "i": i})
+
+
+def test_pages_span_disk_segments_and_ram_window(tmp_path):
+    log = SessionEventLog("session:1", tmp_path, segment_events=16, window=20)
+    _fill(log, 100)
+    assert len(log) == 100
+    assert log.stats()["in_memory"] == 20
+    assert [e["i"] for e in log.read(10, 12)] == list(range(10, 22))  # deux segments
+    assert [e["i"] for e in log.read(75, 10)] == list(range(75, 85))  # disque + fenetre
+    assert [e["i"] for e in log.read(95, 50)] == list(range(95, 100))
+    assert log.read(200, 5) == []
+    assert [e["i"] for e in log.iter_events()] == list(range(100))
+    log.close()
+    assert len(list((tmp_path / "session_1").glob("seg-*.jsonl"))) == 7
+
+
+def test_iteration_index(tmp_path):
+    log = SessionEventLog("s", tmp_path, segment_events=8, window=4)
+    _fill(log, 50)
+    seq = log.offset_for_iteration(3)
+    event = log.read(seq, 1)[0]
+    assert event["type"] == "iteration" and event["version"] == 3
+    assert log.offset_for_iteration(99) is None
+    assert log.start_for_iteration(3) == 20  # après l'événement d'itération 2 (n° 19)
+    assert log.start_for_iteration(1) == 0
+
+    # Version arrivée en retard, versions manquantes : recherche dichotomique inchangée
+    log.append({"type": "iteration", "version": 12})  # n° 50
+    log.append({"type": "iteration", "version": 8})  # n° 51
+    assert log.offset_for_iteration(6) == log.offset_for_iteration(8) == 51
+    assert log.start_for_iteration(9) == 52 and log.start_for_iteration(8) == 50
+    assert log.offset_for_iteration(12) == 50
+    log.close(wait=False)  # sans attendre le thread d'écriture
+    log.flush()
+
+
+def test_recorder_uses_log_for_export_and_pages(tmp_path, monkeypatch):
+    import session_log
+    import session_log
+    monkeypatch.setattr(session_log, "SESSION_LOG_DIR", tmp_path)
+    monkeypatch.setattr(session_log, "SESSION_LOG_WINDOW", 5)
+    from metrics_server_v5 import SessionRecorder
+
+    recorder = SessionRecorder()
+    for version in range(1, 5):
+        recorder.update_global_metrics(1.0, 2.0, version, version=version)
+        data = recorder.record_agent_action("agent-1", [0, 0], prediction_error=0.1 * version, iteration=version)
+        recorder.record_iteration_event(version, [data])
+    export = recorder.export_session()
+    assert export["metadata"]["total_events"] == 8
+    assert [e["type"] for e in export["events"]] == ["agent", "iteration"] * 4
+    assert [g["version"] for g in export["globalMetrics"]] == [1, 2, 3, 4]
+    assert export["agentMetrics"]["agent-1"]["iteration"] == 4
+    page = recorder.events_page(iteration=2, limit=3)
+    assert page["offset"] == 3
+    assert [e["type"] for e in page["events"]] == ["iteration", "agent", "iteration"]
+    recorder.log.close()
+
+
+def test_records_are_shared_not_mutated(tmp_path, monkeypatch):
+    import json
+    import session_log
+    monkeypatch.setattr(session_log, "SESSION_LOG_DIR", tmp_path)
+    from fastapi.testclient import TestClient
+    import metrics_server_v5 as server
+
+    recorder = server.SessionRecorder()
+    monkeypatch.setattr(server.default_session, "recorder", recorder)
+    client = TestClient(server.app)
+    with client.websocket_connect("/metrics") as ws:
+        ws.send_text(json.dumps({"type": "agent_update", "user_id": "agent-shared-1", "position": [0, 0],
+                                 "iteration": 2, "prediction_error": 0.2, "pixels": ["0,0#FFFFFF"]}))
+        ws.send_text(json.dumps({"type": "n_snapshot", "snapshot": {
+            "version": 1, "prediction_errors": {"agent-shared-1": {"error": 0.2}}}}))
+        ws.send_text(json.dumps({"type": "get_state"}))
+        while ws.receive_json()["type"] != "strategy_params_update":
+            pass
+    stored = recorder.last_agent_data["agent-shared-1"]
+    action, iteration = recorder.log.read(0, 2)
+    assert action["data"] is stored  # partage par reference, pas de copie
+    ranked = next(a for a in iteration["agents"] if a["id"] == "agent-shared-1")
+    assert ranked is not stored  # rang de l'iteration : copie superficielle
+    assert ranked["pixels"] is stored["pixels"]
+    recorder.log.close()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Tests de la résolution non bloquante du session_id du recorder (utterance_store).
+
+Usage:
+    python -m pytest python/tests/test_session_resolver.py -q
+"""
+
+import asyncio
+import sys
+import threading
+import time
+from pathlib import Path
+
+# Ajouter le répertoire parent au path pour les imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import utterance_store
+from session_resolver import SessionIdResolver
+
+
+def _wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_append_never_waits_for_the_recorder(tmp_path, monkeypatch):
+    calls = []
+
+    def slow_fetch():
+        calls.append(time.monotonic())
+        time.sleep(1.0)
+        return "session_from_poll"
+
+    resolver = SessionIdResolver("http://recorder.invalid", fetch=slow_fetch, refresh_interval=60)
+    monkeypatch.setattr(utterance_store, "session_resolver", resolver)
+    monkeypatch.setattr(utterance_store, "UTTERANCES_DIR", tmp_path / "utterances")
+    monkeypatch.setattr(utterance_store, "EXPORTS_DIR", tmp_path / "exports")
+    resolver.push("session_42")
+
+    started = time.monotonic()
+    record = utterance_store.append_utterance(source="W", text="une ligne diagonale", iteration=3)
+    assert time.monotonic() - started < 0.5
+    assert record["session_id"] == "session_42"
+    assert utterance_store.list_utterances("session_42")[0]["text"] == "une ligne diagonale"
+    resolver.stop()
+
+
+def test_stale_value_is_served_while_revalidating():
+    source = {"id": "session_1"}
+    recorder_up = threading.Event()
+    changes = []
+
+    def fetch():
+        recorder_up.wait()
+        return source["id"]
+
+    resolver = SessionIdResolver("http://recorder.invalid", fetch=fetch, refresh_interval=0.05)
+    resolver.subscribe(lambda new, old: changes.append((new, old)))
+
+    assert resolver.current() is None  # recorder lent : pas d'attente, rafraîchi en arrière-plan
+    recorder_up.set()
+    assert _wait_for(lambda: resolver.current() == "session_1")
+    source["id"] = "session_2"
+    assert resolver.current() in ("session_1", "session_2")
+    assert _wait_for(lambda: resolver.current() == "session_2")
+    assert changes == [("session_1", None), ("session_2", "session_1")]
+    resolver.stop()
+
+
+def test_push_mode_and_failures_keep_last_known_id():
+    def failing_fetch():
+        raise OSError("recorder injoignable")
+
+    resolver = SessionIdResolver("http://recorder.invalid", fetch=failing_fetch,
+                                 refresh_interval=0.05, push_refresh_interval=30)
+    resolver.push("session_7")
+    assert resolver.stats()["mode"] == "push"
+    assert resolver.refresh() == "session_7"
+    assert resolver.stats()["fetch_errors"] == 1
+    resolver.push(None)  # fin de session : le dernier id connu reste
+    assert asyncio.run(resolver.resolve(force=True)) == "session_7"
+
+
+def test_startup_hook_resolves_before_first_utterance(tmp_path, monkeypatch):
+    # Processus sans start() préalable (serveur IA V5) : le hook de démarrage attend le premier id
+    resolver = SessionIdResolver("http://recorder.invalid", fetch=lambda: "session_boot", refresh_interval=60)
+    monkeypatch.setattr(utterance_store, "session_resolver", resolver)
+    monkeypatch.setattr(utterance_store, "UTTERANCES_DIR", tmp_path / "utterances")
+    monkeypatch.setattr(utterance_store, "EXPORTS_DIR", tmp_path / "exports")
+
+    assert asyncio.run(utterance_store.start_session_resolver()) == "session_boot"
+    record = utterance_store.append_utterance(source="O", text="premier énoncé", iteration=1)
+    assert record["session_id"] == "session_boot"
+    assert not any(sid.startswith("orphan_") for sid in utterance_store.list_session_ids())
+    resolver.stop()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Tests de la diffusion pré-sérialisée du snapshot (fragment par agent, ETag, long-poll).
+
+Usage:
+    python -m pytest python/tests/test_snapshot_feed.py -q
+"""
+
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+# Ajouter le répertoire parent au path pour les imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from snapshot_feed import SnapshotFeed, etag_matches
+
+SNAPSHOT = {
+    "version": 3,
+    "structures": [{"type": "ligne"}],
+    "prediction_errors": {"a": {"error": 0.4, "explanation": "x"}},
+    "agent_rankings": {"a": {"rank": 1}, "b": {"rank": 2}},
+    "narrative": {"summary": "é"},
+}
+
+
+def test_body_matches_personalized_dict():
+    feed = SnapshotFeed(default_error={"error": 0.0, "explanation": "none"})
+    feed.publish(dict(SNAPSHOT))
+    assert json.loads(feed.body()) == SNAPSHOT
+    assert json.loads(feed.body("a")) == {
+        **SNAPSHOT,
+        "prediction_errors": {"a": {"error": 0.4, "explanation": "x"}},
+        "agent_rankings": {"a": {"rank": 1}},
+    }
+    body_c = json.loads(feed.body("c"))
+    assert body_c["prediction_errors"] == {"c": {"error": 0.0, "explanation": "none"}}
+    assert body_c["agent_rankings"] == {}
+    assert feed.body("a") == feed.body("a") and feed.stats()["cached_agents"] == 2
+
+
+def test_etag_and_not_modified():
+    feed = SnapshotFeed(etag_prefix="q")
+    assert feed.etag is None and not feed.not_modified_for('"q0"')
+    feed.publish(dict(SNAPSHOT))
+    assert feed.etag == '"q3"'
+    assert feed.not_modified_for('W/"q3"') and feed.not_modified_for('"q1", "q3"')
+    assert not feed.not_modified_for('"q2"')
+    assert etag_matches("*", '"q3"')
+
+
+def test_long_poll_wakes_on_publish():
+    async def scenario():
+        feed = SnapshotFeed()
+        feed.publish({**SNAPSHOT, "version": 1})
+        assert await feed.wait_for_version(1, 5.0)
+        waiter = asyncio.create_task(feed.wait_for_version(2, 5.0))
+        await asyncio.sleep(0.01)
+        assert feed.stats()["waiting"] == 1
+        feed.publish({**SNAPSHOT, "version": 2})
+        woke = await asyncio.wait_for(waiter, 1.0)
+        timed_out = await feed.wait_for_version(5, 0.02)
+        return woke, timed_out
+
+    assert asyncio.run(scenario()) == (True, False)
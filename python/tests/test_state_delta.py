@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Tests du protocole d'état versionné du serveur de métriques V5 (snapshot, deltas, resync).
+
+Usage:
+    python -m pytest python/tests/test_state_delta.py -q
+"""
+
+import json
+import sys
+from pathlib import Path
+
+# Ajouter le répertoire parent au path pour les imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from state_delta import StateDeltaLog
+from metrics_server_v5 import GlobalSimplicityTrackerV5
+
+
+def _apply(state, delta):
+    """Même logique que les clients JS (ai-metrics.js, ai-player-v5.js)."""
+    data = delta["data"]
+    state["agents"].update(data["agents"])
+    for uid in data["removed"]:
+        state["agents"].pop(uid, None)
+    state["history"] = (state["history"] + data["history"])[-50:]
+    for key in ("averages", "update_count", "o_snapshots_count", "n_snapshots_count", "latest_o", "latest_n"):
+        if key in data:
+            state[key] = data[key]
+
+
+def test_log_replays_missing_deltas_or_requests_snapshot():
+    log = StateDeltaLog(backlog=3)
+    for i in range(5):
+        log.append({"i": i})
+    assert log.version == 5
+    assert [m["version"] for m in log.since(3)] == [4, 5]
+    assert log.since(5) == []
+    assert log.since(1) is None  # trop ancien : snapshot
+    assert log.since(9) is None
+
+
+def test_deltas_rebuild_the_full_summary():
+    tracker = GlobalSimplicityTrackerV5()
+    tracker.update_agent("a", [0, 0], 1.0, 2.0, 3.0, 0.2, "s")
+    tracker.record_history()
+    tracker.flush_state_delta()
+    client = json.loads(json.dumps(tracker.get_state_summary()))
+
+    tracker.update_agent("b", [1, 0], 0.5, 0.5, 0.5, 0.4, "s")
+    tracker.record_history()
+    tracker.store_o_snapshot({"version": 1, "structures": [1]})
+    d1 = tracker.flush_state_delta()
+    tracker.remove_agent("a")
+    tracker.record_history()
+    d2 = tracker.flush_state_delta()
+    assert tracker.flush_state_delta() is None
+    assert (d1["base"], d1["version"], d2["base"]) == (1, 2, 2)
+
+    for delta in (d1, d2):
+        _apply(client, json.loads(json.dumps(delta)))
+    expected = json.loads(json.dumps(tracker.get_state_summary()))
+    # Les moyennes sont recalculees (horodatage) par get_state_summary
+    client["averages"].pop("timestamp")
+    expected["averages"].pop("timestamp")
+    assert client == expected
+
+
+def test_delta_is_much_smaller_than_summary_for_49_agents():
+    tracker = GlobalSimplicityTrackerV5()
+    for i in range(49):
+        tracker.update_agent(f"agent-{i:02d}", [i % 7 - 3, i // 7 - 3], 1.5, -2.0, 10.0, 0.3, "strategie")
+        tracker.record_history()
+    tracker.flush_state_delta()
+    tracker.update_agent("agent-07", [0, -2], 2.0, -1.0, 11.0, 0.25, "strategie")
+    tracker.record_history()
+    delta_bytes = len(json.dumps(tracker.flush_state_delta()))
+    full_bytes = len(json.dumps({"type": "state_update", "data": tracker.get_state_summary()}))
+    assert full_bytes > 10 * delta_bytes
+
+
+def test_websocket_snapshot_delta_and_resync():
+    from fastapi.testclient import TestClient
+    import metrics_server_v5 as server
+
+    client = TestClient(server.app)
+    with client.websocket_connect("/metrics") as ws:
+        ws.send_text(json.dumps({"type": "get_state", "protocol": "delta"}))
+        snapshot = ws.receive_json()
+        assert snapshot["type"] == "state_snapshot"
+        ws.receive_json()
+        ws.receive_json()
+        ws.send_text(json.dumps({"type": "agent_update", "user_id": "agent-xyz-1", "position": [0, 0],
+                                 "iteration": 2, "prediction_error": 0.1}))
+        delta = ws.receive_json()
+        assert delta["type"] == "state_delta"
+        assert delta["base"] == snapshot["version"]
+        assert "agent-xyz-1" in delta["data"]["agents"]
+        assert ws.receive_json()["type"] == "session_agent_event"
+        ws.send_text(json.dumps({"type": "state_resync", "version": snapshot["version"]}))
+        replay = ws.receive_json()
+        assert replay == delta
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Tests des statistiques en flux (Welford, EWMA, quantiles approchés, population par agent).
+
+Usage:
+    python -m pytest python/tests/test_stream_stats.py -q
+"""
+
+import random
+import statistics
+import sys
+from pathlib import Path
+
+# Ajouter le répertoire parent au path pour les imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from stream_stats import KeyedStats, QuantileSketch, StreamingStats
+
+
+def _exact_quantile(values, q):
+    ordered = sorted(values)
+    return ordered[int(q * (len(ordered) - 1))]
+
+
+def test_streaming_stats_match_exact_values_and_skip_non_numeric():
+    rng = random.Random(3)
+    values = [rng.uniform(-5, 5) for _ in range(1000)]
+    stats = StreamingStats(alpha=0.5).extend(values + ["N/A", None, True, float("nan")])
+    assert stats.count == 1000
+    assert abs(stats.mean - statistics.fmean(values)) < 1e-9
+    assert abs(stats.std - statistics.pstdev(values)) < 1e-9
+    assert (stats.min, stats.max) == (min(values), max(values))
+    ewma = values[0]
+    for v in values[1:]:
+        ewma = 0.5 * v + 0.5 * ewma
+    assert abs(stats.ewma - ewma) < 1e-9
+    summary = stats.to_dict()
+    assert set(summary) >= {"p50", "p90", "ewma", "std"}
+
+
+def test_sketch_quantiles_have_bounded_relative_error():
+    rng = random.Random(5)
+    values = [rng.lognormvariate(0, 2) for _ in range(5000)] + [0.0] * 50 + [-rng.random() for _ in range(200)]
+    sketch = QuantileSketch(accuracy=0.01)
+    for v in values:
+        sketch.add(v)
+    for q in (0.01, 0.1, 0.5, 0.9, 0.99):
+        exact = _exact_quantile(values, q)
+        assert abs(sketch.quantile(q) - exact) <= 0.011 * abs(exact) + 1e-12
+    for v in values[:2500]:
+        sketch.remove(v)
+    rest = values[2500:]
+    assert sketch.count == len(rest)
+    assert abs(sketch.quantile(0.5) - _exact_quantile(rest, 0.5)) <= 0.011 * abs(_exact_quantile(rest, 0.5))
+
+
+def test_keyed_stats_follow_replacements_and_removals():
+    rng = random.Random(11)
+    keyed = KeyedStats()
+    current = {}
+    for step in range(5000):
+        key = f"agent-{rng.randrange(49)}"
+        if step % 13 == 0:
+            keyed.discard(key)
+            current.pop(key, None)
+        else:
+            value = round(rng.random(), 3) if step % 17 else "N/A"
+            keyed.set(key, value)
+            if value == "N/A":
+                current.pop(key, None)
+            else:
+                current[key] = value
+    assert len(keyed) == len(current)
+    assert abs(keyed.mean - statistics.fmean(current.values())) < 1e-9
+    assert abs(keyed.std - statistics.pstdev(current.values())) < 1e-9
+    median = _exact_quantile(list(current.values()), 0.5)
+    assert abs(keyed.quantile(0.5) - median) <= 0.011 * median
+
+
+def test_v5_averages_match_full_recomputation():
+    from metrics_server_v5 import GlobalSimplicityTrackerV5
+
+    rng = random.Random(2)
+    tracker = GlobalSimplicityTrackerV5()
+    for step in range(500):
+        uid = f"agent-{rng.randrange(20)}"
+        error = rng.choice([rng.random(), -1, "N/A"])
+        tracker.update_agent(uid, [0, 0], rng.uniform(-3, 3), rng.uniform(-3, 3), rng.random() * 10, error, "s")
+        if step % 50 == 49:
+            tracker.remove_agent(uid)
+    averages = tracker.calculate_average_metrics()
+    agents = tracker.agents.values()
+    errors = [a["prediction_error"] for a in agents
+              if isinstance(a["prediction_error"], float) and a["prediction_error"] >= 0]
+    assert averages["agents_count"] == len(tracker.agents)
+    assert averages["avg_delta_C_w"] == round(statistics.fmean(a["delta_C_w"] for a in agents), 2)
+    assert averages["avg_U_after_expected"] == round(statistics.fmean(a["U_after_expected"] for a in agents), 2)
+    assert averages["avg_prediction_error"] == round(statistics.fmean(errors), 3)
+    assert averages["std_prediction_error"] == round(statistics.pstdev(errors), 3)
+    assert abs(averages["p90_prediction_error"] - _exact_quantile(errors, 0.9)) <= 0.011 + 0.001
+
+    tracker.store_n_snapshot({"version": 1, "prediction_errors": {"a": {"error": 0.2}, "b": {"error": 0.6},
+                                                                 "c": {"error": "N/A"}, "d": "x"}})
+    latest = tracker.n_snapshots.last()
+    assert (latest["mean_prediction_error"], latest["min_prediction_error"], latest["max_prediction_error"]) == (
+        0.4, 0.2, 0.6)
+    assert abs(latest["std_prediction_error"] - 0.2) < 1e-12
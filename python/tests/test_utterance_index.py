@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Tests de l'index incrémental des sidecars d'énoncés (curseur d'arrivée since/limit, lecture par seek/mmap).
+
+Usage:
+    python -m pytest python/tests/test_utterance_index.py -q
+"""
+
+import json
+import sys
+from pathlib import Path
+
+# Ajouter le répertoire parent au path pour les imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fastapi.testclient import TestClient
+
+import utterance_http
+import utterance_store
+from utterance_index import SidecarIndex
+
+
+def _write(path, records, tail=b""):
+    with open(path, "ab") as f:
+        for record in records:
+            f.write((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+        f.write(tail)
+
+
+def test_only_appended_lines_are_parsed(tmp_path):
+    path = tmp_path / "session_1.jsonl"
+    _write(path, [{"id": f"u{i}", "ts": f"2026-01-01T00:00:{i:02d}", "text": f"é{i}"} for i in range(5)])
+    for use_mmap in (False, True):
+        index = SidecarIndex(path, use_mmap=use_mmap)
+        utterances, total, cursor = index.read()
+        assert [u["id"] for u in utterances] == ["u0", "u1", "u2", "u3", "u4"] and total == 5
+        assert cursor == "5"
+
+    # Ligne plus ancienne (ts) ajoutée en fin de fichier, et une ligne en cours d'écriture
+    _write(path, [{"id": "late", "ts": "2026-01-01T00:00:01.5"}], tail=b'{"id": "partial"')
+    utterances, total, _ = index.read()
+    assert [u["id"] for u in utterances] == ["u0", "u1", "late", "u2", "u3", "u4"]
+    assert index.stats()["lines_parsed"] == 6
+
+    with open(path, "ab") as f:
+        f.write(b', "ts": "2026-01-01T00:00:09"}\n')
+    assert [u["id"] for u in index.read(since="u4")[0]] == ["late", "partial"]  # arrivés après u4
+    assert index.stats()["lines_parsed"] == 7
+
+
+def test_cursor_by_id_or_timestamp(tmp_path):
+    path = tmp_path / "session_2.jsonl"
+    _write(path, [{"id": f"u{i}", "ts": f"2026-01-01T00:00:{i:02d}"} for i in range(10)])
+    index = SidecarIndex(path)
+    assert [u["id"] for u in index.read(since="u3", limit=2)[0]] == ["u4", "u5"]
+    assert [u["id"] for u in index.read(since="2026-01-01T00:00:07")[0]] == ["u8", "u9"]
+    assert index.read(since="u9") == ([], 10, "u9")
+    assert [u["id"] for u in index.read(since="8")[0]] == ["u8", "u9"]
+    path.write_text("")  # fichier remplacé : index reconstruit
+    assert index.read() == ([], 0, None)
+
+
+def test_late_utterance_with_earlier_ts_is_not_skipped(tmp_path):
+    path = tmp_path / "session_4.jsonl"
+    _write(path, [{"id": f"u{i}", "ts": f"2026-01-01T00:00:{i:02d}"} for i in (0, 5, 9)])
+    index = SidecarIndex(path)
+    utterances, _, cursor = index.read(limit=2)
+    assert [u["id"] for u in utterances] == ["u0", "u5"]
+
+    # Arrivé après la page, mais horodaté avant son dernier énoncé
+    _write(path, [{"id": "late", "ts": "2026-01-01T00:00:03"}])
+    utterances, total, cursor = index.read(since=cursor)
+    assert [u["id"] for u in utterances] == ["late", "u9"]  # page triée par ts
+    assert total == 4
+    assert index.read(since=cursor) == ([], 4, cursor)
+
+
+def test_http_pagination(tmp_path, monkeypatch):
+    monkeypatch.setattr(utterance_store, "UTTERANCES_DIR", tmp_path / "utterances")
+    for i in range(4):
+        utterance_store.append_utterance(source="N", text=f"récit {i}", session_id="session_3",
+                                         iteration=i, ts=f"2026-01-01T00:00:0{i}+00:00")
+    client = TestClient(utterance_http.app)
+    first = client.get("/api/utterances/session_3", params={"limit": 3}).json()
+    assert [u["text"] for u in first["utterances"]] == ["récit 0", "récit 1", "récit 2"]
+    assert first["total"] == 4
+    rest = client.get("/api/utterances/session_3", params={"since": first["cursor"]}).json()
+    assert [u["text"] for u in rest["utterances"]] == ["récit 3"]
+    assert client.get("/api/utterances/session_3", params={"since": rest["cursor"]}).json()["utterances"] == []
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Tests de l'écriture groupée des sidecars d'énoncés (file bornée, lots, fichiers ouverts, callbacks, verrou du back-fill).
+
+Usage:
+    python -m pytest python/tests/test_utterance_writer.py -q
+"""
+
+import json
+import sys
+import threading
+from pathlib import Path
+
+# Ajouter le répertoire parent au path pour les imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import utterance_store
+from utterance_writer import UtteranceWriter
+
+
+def _line(record):
+    return (json.dumps(record) + "\n").encode("utf-8")
+
+
+def test_burst_is_group_committed_per_session(tmp_path):
+    seen = []
+    writer = UtteranceWriter(batch_size=100, batch_delay=0.2, fsync="batch",
+                             callbacks=[lambda record: seen.append((record["n"], threading.get_ident()))])
+    paths = [tmp_path / "session_a.jsonl", tmp_path / "session_b.jsonl"]
+    for n in range(49):
+        record = {"n": n}
+        writer.submit(paths[n % 2], _line(record), record)
+    writer.flush()
+
+    assert writer.stats()["batches"] == 1
+    assert writer.stats()["open_files"] == 2
+    lines_a = [json.loads(line)["n"] for line in paths[0].read_text().splitlines()]
+    assert lines_a == list(range(0, 49, 2))
+    assert [n for n, _ in seen] == list(range(49))
+    assert {ident for _, ident in seen} == {writer._thread.ident}  # hors du thread appelant
+
+    writer.submit(paths[0], _line({"n": 49}), {"n": 49})
+    writer.close()
+    assert json.loads(paths[0].read_text().splitlines()[-1]) == {"n": 49}
+    assert writer.stats()["open_files"] == 0
+
+
+def test_open_files_are_bounded(tmp_path):
+    writer = UtteranceWriter(batch_delay=0, max_open_files=1)
+    for n in range(6):
+        writer.submit(tmp_path / f"s{n % 3}.jsonl", _line({"n": n}), {"n": n})
+        writer.flush()
+    assert writer.stats()["open_files"] == 1
+    assert writer.stats()["lines_written"] == 6
+    assert (tmp_path / "s0.jsonl").read_text().count("\n") == 2
+    writer.close()
+
+
+def test_full_queue_drops_instead_of_blocking(tmp_path):
+    writer = UtteranceWriter(queue_size=2, batch_delay=0)
+    path = tmp_path / "session_a.jsonl"
+    busy, release = threading.Event(), threading.Event()
+
+    def slow_disk():
+        busy.set()
+        release.wait(5)
+
+    blocker = threading.Thread(target=writer.exclusive, args=(path, slow_disk))
+    blocker.start()
+    assert busy.wait(2)  # thread d'écriture occupé, file vide
+
+    results = [writer.submit(path, _line({"n": n}), {"n": n}) for n in range(3)]
+    assert results == [True, True, False]  # pas d'attente : la 3e ligne est perdue et comptée
+    assert writer.stats()["dropped"] == 1
+
+    release.set()
+    blocker.join(2)
+    writer.flush()
+    assert [json.loads(line)["n"] for line in path.read_text().splitlines()] == [0, 1]
+    writer.close()
+
+
+def test_backfill_keeps_lines_of_another_writer(tmp_path):
+    # Deux écrivains sur le même sidecar, comme deux processus (flock : par fichier ouvert)
+    other, local = UtteranceWriter(batch_delay=0), UtteranceWriter(batch_delay=0)
+    path = tmp_path / "session_6.jsonl"
+    texts = [f"the agent draws a line {n}" for n in range(120)]
+    other.submit(path, _line({"n": 0, "text": texts[0]}), {})
+    other.flush()  # fichier ouvert par l'autre écrivain avant le remplacement
+
+    def keep_appending():
+        for n in range(1, 120):
+            other.submit(path, _line({"n": n, "text": texts[n]}), {})
+            if n % 10 == 0:
+                other.flush()
+
+    appender = threading.Thread(target=keep_appending)
+    appender.start()
+    for _ in range(5):
+        local.exclusive(path, lambda: utterance_store._backfill_sidecar(path, overwrite=False))
+    appender.join()
+    other.flush()
+    local.exclusive(path, lambda: utterance_store._backfill_sidecar(path, overwrite=False))
+
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert sorted(record["n"] for record in records) == list(range(120))  # aucun ajout perdu
+    assert {record["lang"] for record in records} == {"en"}
+    other.close()
+    local.close()
+
+
+def test_store_reads_its_own_writes(tmp_path, monkeypatch):
+    monkeypatch.setattr(utterance_store, "UTTERANCES_DIR", tmp_path / "utterances")
+    monkeypatch.setattr(utterance_store, "EXPORTS_DIR", tmp_path / "exports")
+    for i in range(3):
+        utterance_store.append_utterance(source="W", text=f"énoncé {i}", session_id="session_9",
+                                         iteration=i, ts=f"2026-01-01T00:00:0{i}+00:00")
+    assert [u["text"] for u in utterance_store.list_utterances("session_9")] == ["énoncé 0", "énoncé 1", "énoncé 2"]
+    assert "session_9" in utterance_store.list_session_ids()
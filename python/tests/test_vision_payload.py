@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Tests du prétraitement de l'image O (réduction sans perte, recadrage centré, palette).
+
+Usage:
+    python -m pytest python/tests/test_vision_payload.py -q
+"""
+
+import base64
+import io
+import sys
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+# Ajouter le répertoire parent au path pour les imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from cost_tracker_v4or import CostTracker
+from vision_payload import VisionPayloadOptimizer, detect_block_size, estimate_image_tokens
+
+
+def _canvas_b64(side_grids=5, block=10, occupied=((0, 0), (1, -1))):
+    """Canevas 20x20 par grille agrandi `block` fois, centre = grille side//2."""
+    base = np.zeros((side_grids * 20, side_grids * 20, 3), dtype=np.uint8)
+    center = side_grids // 2
+    for i, (gx, gy) in enumerate(occupied):
+        ox, oy = (gx + center) * 20, (gy + center) * 20
+        base[oy:oy + 20, ox:ox + 20] = (40 * (i + 1), 0, 255 - 40 * i)
+        base[oy + 3, ox + 7] = (255, 255, 255)
+    big = np.repeat(np.repeat(base, block, axis=0), block, axis=1)
+    buffer = io.BytesIO()
+    Image.fromarray(big, "RGB").save(buffer, format="PNG")
+    return base64.b64encode(buffer.getvalue()).decode(), base
+
+
+def _decode(b64):
+    with Image.open(io.BytesIO(base64.b64decode(b64))) as img:
+        return np.asarray(img.convert("RGB"))
+
+
+def test_estimate_and_block_detection():
+    assert estimate_image_tokens(300, 300) == 258
+    assert estimate_image_tokens(1000, 1000) == 4 * 258
+    _, base = _canvas_b64()
+    assert detect_block_size(np.repeat(np.repeat(base, 7, axis=0), 7, axis=1)) == 7
+
+
+def test_downscale_crop_is_lossless_and_centered():
+    b64, base = _canvas_b64(side_grids=5, block=10)
+    optimizer = VisionPayloadOptimizer(enabled=True, cell_px=60, fmt="png", crop=True, palette_colors=256)
+    out, mime, report = optimizer.optimize("data:image/png;base64," + b64)
+    assert mime == "image/png" and report["applied"]
+    assert report["block"] == 10 and report["cropped"]
+    # 5x5 grilles -> 3x3 (occupation à 1 grille du centre), 60 px par grille
+    assert report["size_before"] == [1000, 1000] and report["size_after"] == [180, 180]
+    assert report["tokens_saved"] == 4 * 258 - 258
+    decoded = _decode(out)
+    expected = np.repeat(np.repeat(base[20:80, 20:80], 3, axis=0), 3, axis=1)
+    assert np.array_equal(decoded, expected)
+
+
+def test_never_worse_and_memoized():
+    b64, _ = _canvas_b64(side_grids=1, block=1, occupied=((0, 0),))
+    optimizer = VisionPayloadOptimizer(enabled=True, cell_px=200, crop=True)
+    out, _, report = optimizer.optimize(b64)
+    # Déjà 20x20 : agrandir coûterait plus d'octets pour le même nombre de tokens
+    assert not report["applied"] and out == b64
+    b64, _ = _canvas_b64()
+    first = optimizer.optimize(b64)
+    assert optimizer.optimize(b64) is first
+    assert optimizer.stats()["calls"] == 3 and optimizer.stats()["applied"] == 2
+
+
+def test_cost_tracker_vision_savings():
+    tracker = CostTracker()
+    tracker.record("s", "O-machine", "m", {"prompt_tokens": 10})
+    tracker.record_vision("s", "O-machine", {"applied": True, "bytes_before": 1000, "bytes_after": 200,
+                                             "bytes_saved": 800, "tokens_before": 1032, "tokens_after": 258,
+                                             "tokens_saved": 774})
+    vision = tracker.snapshot("s")["sessions"]["s"]["vision"]["O-machine"]
+    assert vision["bytes_saved"] == 800 and vision["image_tokens_saved"] == 774 and vision["optimized"] == 1
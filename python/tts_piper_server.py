@@ -23,6 +23,7 @@ from pydantic import BaseModel
 ROOT = Path(__file__).resolve().parent.parent
 CACHE_DIR = ROOT / "db" / "tts_cache"
 VOICES_DIR = Path(os.environ.get("PIPER_VOICES_DIR", str(ROOT / "voices")))
+MAX_TEXT_CHARS = 10000
 
 VOICE_CATALOG = {
     "fr_FR-siwis-medium": "fr",
@@ -46,6 +47,11 @@ def _cache_key(text: str, voice: str) -> str:
     return h
 
 
+def cached_wav_path(text: str, voice: str) -> Path:
+    """WAV en cache pour un texte tel que reçu par POST /tts (lu aussi par l'export des énoncés)."""
+    return CACHE_DIR / f"{_cache_key((text or '').strip()[:MAX_TEXT_CHARS], voice)}.wav"
+
+
 def _silent_wav(duration_sec: float = 0.3, sample_rate: int = 22050) -> bytes:
     """WAV PCM 16-bit mono minimal."""
     import struct
@@ -92,8 +98,7 @@ def _voice_model_path(voice: str) -> Path | None:
 
 def synthesize_piper(text: str, voice: str) -> bytes:
     CACHE_DIR.mkdir(parents=True, exist_ok=True)
-    key = _cache_key(text, voice)
-    cached = CACHE_DIR / f"{key}.wav"
+    cached = cached_wav_path(text, voice)
     if cached.exists():
         return cached.read_bytes()
 
@@ -149,8 +154,8 @@ async def tts(req: TtsRequest):
     text = (req.text or "").strip()
     if not text:
         raise HTTPException(400, "text required")
-    if len(text) > 10000:
-        text = text[:10000]
+    if len(text) > MAX_TEXT_CHARS:
+        text = text[:MAX_TEXT_CHARS]
     voice = req.voice if req.voice in VOICE_CATALOG else "fr_FR-siwis-medium"
     try:
         wav = synthesize_piper(text, voice)
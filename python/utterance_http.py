@@ -6,18 +6,17 @@ Port par défaut : 5010
 from __future__ import annotations
 
 import asyncio
-import io
 import json
 import os
-import zipfile
 from pathlib import Path
 from typing import AsyncGenerator, List
 
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 
+import bundle_export
 import utterance_store as store
 
 app = FastAPI(title="Poietic Utterances API", version="1.0.0")
@@ -42,6 +41,12 @@ async def startup():
     global _loop
     _loop = asyncio.get_event_loop()
     store.register_on_append(_on_store_append)
+    await store.start_session_resolver()
+
+
+class SessionChangeIn(BaseModel):
+    session_id: str | None = None
+    type: str | None = None
 
 
 class UtteranceIn(BaseModel):
@@ -71,17 +76,43 @@ async def _broadcast_live(record: dict) -> None:
 
 @app.get("/health")
 async def health():
-    return {"status": "ok", "service": "utterance_http"}
+    return {
+        "status": "ok",
+        "service": "utterance_http",
+        "recorder_session": store.session_resolver.stats(),
+        "writer": store.writer.stats(),
+    }
+
+
+@app.post("/api/utterances/current-session")
+async def push_current_session(body: SessionChangeIn):
+    """Changement de session notifié par le recorder (POIETIC_SESSION_HOOKS)."""
+    store.session_resolver.push(body.session_id)
+    return {"ok": True, "session_id": store.session_resolver.current()}
 
 
 @app.get("/api/utterances/sessions")
 async def list_sessions():
-    return {"sessions": store.list_session_ids()}
+    return {"sessions": await asyncio.to_thread(store.list_session_ids)}
 
 
 @app.get("/api/utterances/{session_id}")
-async def get_utterances(session_id: str):
-    return {"session_id": session_id, "utterances": store.list_utterances(session_id)}
+async def get_utterances(session_id: str, since: str | None = None, limit: int | None = None):
+    """Énoncés triés par `ts` ; `?since=<cursor|id|ts>&limit=` pour ne lire que les nouveaux."""
+    utterances, total, cursor = await asyncio.to_thread(store.read_utterances, session_id, since, limit)
+    return {
+        "session_id": session_id,
+        "utterances": utterances,
+        "total": total,
+        "cursor": cursor,
+    }
+
+
+@app.post("/api/utterances/lang/backfill")
+async def backfill_languages(session_id: str | None = None, overwrite: bool = False):
+    """Complète (ou recalcule avec `overwrite`) la langue des énoncés déjà enregistrés."""
+    updated = await asyncio.to_thread(store.backfill_languages, session_id, overwrite)
+    return {"ok": True, "updated": updated, "detector": store.lang_detector.stats()}
 
 
 @app.post("/api/utterances")
@@ -118,44 +149,66 @@ def _try_piper_wav(text: str, voice: str, lang: str) -> bytes | None:
         return None
 
 
+def _cached_piper_wav(text: str, voice: str) -> bytes | None:
+    """WAV déjà synthétisé par le serveur Piper local (son cache disque), sans requête."""
+    from tts_piper_server import cached_wav_path
+
+    try:
+        return cached_wav_path(text, voice).read_bytes()
+    except OSError:
+        return None
+
+
+def _voice_for(utterance: dict) -> tuple[str, str]:
+    lang = utterance.get("lang") or "fr"
+    voice = "fr_FR-siwis-medium" if lang == "fr" else "en_US-lessac-medium"
+    if utterance.get("source") == "N":
+        voice = "fr_FR-upmc-medium" if lang == "fr" else "en_GB-alba-medium"
+    return voice, lang
+
+
 @app.get("/api/utterances/{session_id}/export")
-async def export_bundle(session_id: str):
-    utterances = store.list_utterances(session_id)
-    buf = io.BytesIO()
-    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
-        manifest = {
-            "session_id": session_id,
-            "utterance_count": len(utterances),
-            "utterances": utterances,
-        }
-        zf.writestr("utterances.json", json.dumps(manifest, ensure_ascii=False, indent=2))
-
-        html = _bundle_index_html(session_id)
-        zf.writestr("index.html", html)
-
-        engine_src = Path(__file__).resolve().parent.parent / "public/js/tts/speech-engine.js"
-        if engine_src.exists():
-            zf.writestr("js/speech-engine.js", engine_src.read_text(encoding="utf-8"))
-
-        prebake = os.environ.get("EXPORT_PREBAKE_TTS", "1") == "1"
-        if prebake:
-            for u in utterances:
-                lang = u.get("lang") or "fr"
-                voice = "fr_FR-siwis-medium" if lang == "fr" else "en_US-lessac-medium"
-                if u.get("source") == "N":
-                    voice = "fr_FR-upmc-medium" if lang == "fr" else "en_GB-alba-medium"
-                wav = _try_piper_wav(u.get("text", ""), voice, lang)
-                if wav:
-                    zf.writestr(f"audio/{u['id']}.wav", wav)
-
-    buf.seek(0)
+async def export_bundle(session_id: str, export_id: str | None = None):
+    """Zip en flux ; audio pré-synthétisé en parallèle, avancement via X-Export-Id."""
+    utterances = await asyncio.to_thread(store.list_utterances, session_id)
+    manifest = {
+        "session_id": session_id,
+        "utterance_count": len(utterances),
+        "utterances": utterances,
+    }
+    files = [
+        ("utterances.json", json.dumps(manifest, ensure_ascii=False, indent=2).encode("utf-8")),
+        ("index.html", _bundle_index_html(session_id).encode("utf-8")),
+    ]
+    engine_src = Path(__file__).resolve().parent.parent / "public/js/tts/speech-engine.js"
+    if engine_src.exists():
+        files.append(("js/speech-engine.js", engine_src.read_bytes()))
+
+    audio_jobs = []
+    if os.environ.get("EXPORT_PREBAKE_TTS", "1") == "1":
+        for u in utterances:
+            voice, lang = _voice_for(u)
+            audio_jobs.append((f"audio/{u['id']}.wav", u.get("text", ""), voice, lang))
+
+    progress = bundle_export.start_progress(session_id, export_id)
     return StreamingResponse(
-        buf,
+        bundle_export.iter_bundle(files, audio_jobs, _try_piper_wav, lookup=_cached_piper_wav, progress=progress),
         media_type="application/zip",
-        headers={"Content-Disposition": f'attachment; filename="tableau-parlant-{session_id}.zip"'},
+        headers={
+            "Content-Disposition": f'attachment; filename="tableau-parlant-{session_id}.zip"',
+            "X-Export-Id": progress.export_id,
+        },
     )
 
 
+@app.get("/api/utterances/exports/{export_id}/progress")
+async def export_progress(export_id: str):
+    progress = bundle_export.get_progress(export_id)
+    if progress is None:
+        raise HTTPException(404, "unknown export")
+    return progress.to_dict()
+
+
 def _bundle_index_html(session_id: str) -> str:
     return f"""<!DOCTYPE html>
 <html lang="fr">
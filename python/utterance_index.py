@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""Index incremental d'un sidecar JSONL d'enonces (lectures `list_utterances`).
+
+Les vues live (Tableau parlant) interrogent `/api/utterances/{session}` en
+boucle ; relire et re-parser tout le fichier a chaque appel coute
+O(taille de la session). Par sidecar :
+
+- seules les lignes ajoutees depuis la derniere lecture sont parcourues (le
+  fichier peut aussi etre ecrit par un autre processus) : position en octets,
+  `ts` et `id` de chaque ligne sont retenus, la ligne n'est plus re-parsee ;
+- ordre de lecture (ts, numero de ligne) tenu a jour par insertion
+  dichotomique (en fin de liste dans le cas courant) ;
+- `read(since, limit)` : la pagination suit l'ordre d'arrivee (numero de
+  ligne), chaque page est rendue triee par `ts` ; lecture par `seek` sur
+  chaque ligne retenue (ou `mmap` si UTTERANCE_READ_MMAP=1).
+
+Curseur `since` : le `cursor` d'une page precedente (numero de la ligne
+suivante), l'id d'un enonce (lignes arrivees apres lui) ou un horodatage ISO
+(lignes de `ts` posterieur). Un enonce arrive en retard avec un `ts` anterieur
+est donc rendu a la page suivante, pas saute.
+
+Aucun verrou partage avec l'ecriture : une ligne incomplete en fin de fichier
+est ignoree jusqu'a la lecture suivante.
+"""
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import threading
+from array import array
+from bisect import bisect_right, insort
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+UTTERANCE_READ_MMAP = os.getenv("UTTERANCE_READ_MMAP", "0").lower() in ("1", "true", "yes")
+
+
+class SidecarIndex:
+    """Positions, horodatages et ids des lignes d'un sidecar, tenus a jour par la fin."""
+
+    def __init__(self, path: Path, use_mmap: Optional[bool] = None) -> None:
+        self.path = Path(path)
+        self.use_mmap = UTTERANCE_READ_MMAP if use_mmap is None else use_mmap
+        self._lock = threading.Lock()  # lecteurs concurrents (threads uvicorn)
+        self._reset()
+
+    def _reset(self) -> None:
+        self._offsets = array("Q")  # numero de ligne -> position
+        self._order: List[Tuple[str, int]] = []  # (ts, numero de ligne), trie
+        self._ts: List[str] = []  # numero de ligne -> ts
+        self._seqs: Dict[str, int] = {}  # id -> numero de ligne
+        self._size = 0  # octets deja indexes (fin de la derniere ligne complete)
+        self._inode = None
+        self.lines_parsed = 0
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def refresh(self) -> int:
+        """Indexe les lignes ajoutees depuis le dernier appel. Retourne leur nombre."""
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            self._reset()
+            return 0
+        size = stat.st_size
+        if size < self._size or stat.st_ino != self._inode:  # fichier tronque ou remplace
+            self._reset()
+            self._inode = stat.st_ino
+        if size == self._size:
+            return 0
+        added = 0
+        with open(self.path, "rb") as f:
+            f.seek(self._size)
+            position = self._size
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # ligne en cours d'ecriture
+                start, position = position, position + len(line)
+                self._size = position
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                self.lines_parsed += 1
+                seq = len(self._offsets)
+                self._offsets.append(start)
+                self._ts.append(str(record.get("ts") or ""))
+                insort(self._order, (self._ts[seq], seq))
+                if record.get("id"):
+                    self._seqs.setdefault(str(record["id"]), seq)
+                added += 1
+        return added
+
+    def _after(self, since: Optional[str]) -> Sequence[int]:
+        """Numeros des lignes apres le curseur, dans l'ordre d'arrivee."""
+        if not since:
+            return range(len(self._offsets))
+        if since.isdigit():  # curseur rendu par `read` (fichier raccourci depuis : tout relire)
+            start = int(since)
+            return range(start if start <= len(self._offsets) else 0, len(self._offsets))
+        seq = self._seqs.get(since)
+        if seq is not None:
+            return range(seq + 1, len(self._offsets))
+        # Horodatage : enonces strictement posterieurs
+        start = bisect_right(self._order, (since, len(self._offsets)))
+        return sorted(seq for _, seq in self._order[start:])
+
+    def read(self, since: Optional[str] = None,
+             limit: Optional[int] = None) -> Tuple[List[dict], int, Optional[str]]:
+        """(enonces apres le curseur, dans l'ordre des `ts`, total indexe, curseur suivant)."""
+        with self._lock:
+            self.refresh()
+            seqs = self._after(since)
+            if limit is not None:
+                seqs = seqs[:max(0, limit)]
+            cursor = str(seqs[-1] + 1) if seqs else since
+            keys = sorted((self._ts[seq], seq) for seq in seqs)
+            offsets = [self._offsets[seq] for _, seq in keys]
+            total = len(self._order)
+        return self._read_lines(offsets), total, cursor
+
+    def _read_lines(self, offsets: List[int]) -> List[dict]:
+        if not offsets:
+            return []
+        out = []
+        with open(self.path, "rb") as f:
+            if self.use_mmap:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                    for offset in offsets:
+                        out.append(json.loads(view[offset:view.find(b"\n", offset) + 1]))
+            else:
+                for offset in offsets:
+                    f.seek(offset)
+                    out.append(json.loads(f.readline()))
+        return out
+
+    def stats(self) -> dict:
+        return {
+            "lines": len(self._order),
+            "indexed_bytes": self._size,
+            "lines_parsed": self.lines_parsed,
+            "mmap": self.use_mmap,
+        }
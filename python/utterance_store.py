@@ -8,10 +8,14 @@ import hashlib
 import json
 import os
 import threading
-import urllib.request
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
+
+from lang_detect import detector as lang_detector
+from session_resolver import SessionIdResolver
+from utterance_index import SidecarIndex
+from utterance_writer import UtteranceWriter, close_at_exit, lock_current, unlock
 
 ROOT = Path(__file__).resolve().parent.parent
 UTTERANCES_DIR = ROOT / "db" / "utterances"
@@ -20,11 +24,19 @@ EXPORTS_DIR = ROOT / "db" / "exports"
 RECORDER_URL = os.environ.get("POIETIC_RECORDER_URL", "http://localhost:3001")
 MAX_TEXT_LEN = int(os.environ.get("UTTERANCE_MAX_TEXT", "50000"))
 
-_lock = threading.Lock()
-_session_cache: Optional[str] = None
-_session_cache_at: float = 0.0
 _on_append_callbacks: list = []
 
+# Sidecars écrits par lots dans un thread dédié, callbacks d'ajout appelés après écriture
+writer = UtteranceWriter(callbacks=_on_append_callbacks)
+close_at_exit(writer)
+
+# Index incrémental (positions, ts, ids) par sidecar, pour les lectures paginées
+_indexes: Dict[Path, SidecarIndex] = {}
+_indexes_lock = threading.Lock()
+
+# Session courante du recorder : cache rafraîchi hors du chemin chaud (et notifié par le recorder)
+session_resolver = SessionIdResolver(RECORDER_URL)
+
 
 def _now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
@@ -41,35 +53,26 @@ def _sidecar_path(session_id: str) -> Path:
 
 
 def fetch_current_session_id(force_refresh: bool = False) -> Optional[str]:
-    global _session_cache, _session_cache_at
-    import time
-
-    now = time.time()
-    if not force_refresh and _session_cache and (now - _session_cache_at) < 2.0:
-        return _session_cache
-
-    try:
-        req = urllib.request.Request(
-            f"{RECORDER_URL}/api/current-session",
-            headers={"Accept": "application/json"},
-        )
-        with urllib.request.urlopen(req, timeout=2) as resp:
-            data = json.loads(resp.read().decode())
-        sid = data.get("session_id") or data.get("id")
-        if sid:
-            _session_cache = str(sid)
-            _session_cache_at = now
-            return _session_cache
-    except Exception:
-        pass
-    return _session_cache
+    """Session courante du recorder.
+
+    Sans `force_refresh`, valeur en cache sans E/S (rafraîchie en arrière-plan
+    par `session_resolver`) ; avec, interrogation bloquante du recorder.
+    """
+    if force_refresh:
+        return session_resolver.refresh()
+    return session_resolver.current()
+
+
+async def start_session_resolver() -> Optional[str]:
+    """Hook de démarrage des serveurs qui enregistrent des énoncés : lance le
+    rafraîchissement et attend un premier session_id (au plus SESSION_ID_TIMEOUT),
+    pour que les premiers énoncés n'aillent pas dans un sidecar `orphan_`."""
+    session_resolver.start()
+    return await session_resolver.resolve()
 
 
 def detect_lang(text: str) -> str:
-    sample = (text or "")[:400].lower()
-    fr = len(__import__("re").findall(r"\b(le|la|les|des|une|dans|pour|avec|est)\b", sample))
-    en = len(__import__("re").findall(r"\b(the|and|with|for|agent|is|are)\b", sample))
-    return "fr" if fr >= en else "en"
+    return lang_detector.detect(text)
 
 
 def append_utterance(
@@ -111,16 +114,9 @@ def append_utterance(
         "session_id": sid,
     }
 
-    _ensure_dirs()
-    line = json.dumps(record, ensure_ascii=False) + "\n"
-    with _lock:
-        with open(_sidecar_path(sid), "a", encoding="utf-8") as f:
-            f.write(line)
-    for cb in list(_on_append_callbacks):
-        try:
-            cb(record)
-        except Exception:
-            pass
+    # Écriture (et callbacks) par le thread d'écriture groupée : pas d'E/S ici
+    line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+    writer.submit(_sidecar_path(sid), line, record)
     return record
 
 
@@ -128,26 +124,89 @@ def register_on_append(callback) -> None:
     _on_append_callbacks.append(callback)
 
 
-def list_utterances(session_id: str) -> List[dict]:
+def _index(session_id: str) -> SidecarIndex:
     path = _sidecar_path(session_id)
-    if not path.exists():
-        return []
-    out: List[dict] = []
-    with _lock:
-        with open(path, encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                if not line:
-                    continue
-                try:
-                    out.append(json.loads(line))
-                except json.JSONDecodeError:
-                    continue
-    out.sort(key=lambda u: u.get("ts", ""))
-    return out
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None:
+            index = _indexes[path] = SidecarIndex(path)
+        return index
+
+
+def read_utterances(
+    session_id: str, since: Optional[str] = None, limit: Optional[int] = None
+) -> Tuple[List[dict], int, Optional[str]]:
+    """(énoncés après le curseur `since` — curseur, id ou horodatage —, triés par `ts`,
+    total de la session, curseur de la page suivante)."""
+    writer.flush()
+    return _index(session_id).read(since, limit)
+
+
+def list_utterances(session_id: str, since: Optional[str] = None, limit: Optional[int] = None) -> List[dict]:
+    return read_utterances(session_id, since, limit)[0]
+
+
+def _backfill_sidecar(path: Path, overwrite: bool) -> int:
+    """Réécrit le sidecar avec la langue des lignes qui n'en ont pas (toutes si `overwrite`).
+
+    Sous le verrou du sidecar : les écrivains des autres processus attendent,
+    puis rouvrent le fichier remplacé (voir utterance_writer).
+    """
+    while True:
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            return 0
+        with f:
+            if not lock_current(f, path):
+                continue  # remplacé entre-temps (autre back-fill) : rouvrir
+            try:
+                return _rewrite_langs(path, f.read(), overwrite)
+            finally:
+                unlock(f)
+
+
+def _rewrite_langs(path: Path, data: bytes, overwrite: bool) -> int:
+    lines = data.splitlines(keepends=True)
+    pending = []  # (numéro de ligne, enregistrement)
+    for i, line in enumerate(lines):
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(record, dict) and (overwrite or not record.get("lang")):
+            pending.append((i, record))
+    langs = lang_detector.detect_many(record.get("text") or "" for _, record in pending)
+    changed = 0
+    for (i, record), lang in zip(pending, langs):
+        if record.get("lang") != lang:
+            record["lang"] = lang
+            lines[i] = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+            changed += 1
+    if changed:
+        tmp = path.with_suffix(".jsonl.tmp")
+        tmp.write_bytes(b"".join(lines))
+        os.replace(tmp, path)
+    return changed
+
+
+def backfill_languages(session_id: Optional[str] = None, overwrite: bool = False) -> Dict[str, int]:
+    """Complète la langue des énoncés déjà écrits (une session, ou toutes), en lot.
+
+    La réécriture passe par le thread d'écriture et prend le verrou du sidecar :
+    aucun ajout concurrent (de ce processus ou d'un autre) n'est perdu.
+    Retourne {session: lignes modifiées}.
+    """
+    ids = [session_id] if session_id else list_session_ids()
+    result = {}
+    for sid in ids:
+        path = _sidecar_path(sid)
+        result[sid] = writer.exclusive(path, lambda path=path: _backfill_sidecar(path, overwrite))
+    return result
 
 
 def list_session_ids() -> List[str]:
+    writer.flush()
     _ensure_dirs()
     ids = []
     for p in UTTERANCES_DIR.glob("*.jsonl"):
@@ -189,7 +248,6 @@ def record_o_from_snapshot(snapshot: dict, session_id: Optional[str] = None) ->
         text=text,
         session_id=session_id,
         iteration=int(snapshot.get("version") or 0),
-        lang=detect_lang(text),
         ts=snapshot.get("timestamp"),
     )
 
@@ -203,7 +261,6 @@ def record_n_from_snapshot(snapshot: dict, session_id: Optional[str] = None) ->
         text=text,
         session_id=session_id,
         iteration=int(snapshot.get("version") or 0),
-        lang=detect_lang(text),
         ts=snapshot.get("timestamp"),
     )
 
@@ -219,6 +276,5 @@ def record_w_from_agent(agent_data: dict, session_id: Optional[str] = None) -> O
         iteration=int(agent_data.get("iteration") or 0),
         agent_id=agent_data.get("id"),
         position=agent_data.get("position"),
-        lang=detect_lang(text),
         ts=agent_data.get("timestamp"),
     )
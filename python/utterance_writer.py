@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""Ecriture groupee des sidecars JSONL d'enonces (utterance_store).
+
+`append_utterance` est appele depuis la boucle des serveurs de metriques
+(49 agents W qui rapportent en meme temps) : il ne fait plus qu'enfiler la
+ligne deja serialisee. Un thread dedie :
+
+- vide la file par lots (group commit) : un lot part des que
+  UTTERANCE_BATCH_SIZE lignes sont en attente, ou UTTERANCE_BATCH_DELAY
+  secondes apres la premiere ; les lignes d'une meme session sont ecrites en
+  un seul `write` ;
+- garde les fichiers ouverts par session (au plus UTTERANCE_MAX_OPEN_FILES,
+  le moins recemment utilise est ferme) ;
+- UTTERANCE_FSYNC : `none` (flush seulement, comme avant) ou `batch`
+  (`os.fsync` de chaque fichier touche, une fois par lot) ;
+- appelle ensuite les callbacks d'ajout (flux SSE live...) avec les
+  enregistrements du lot, hors du thread de l'appelant.
+
+Plusieurs processus (serveurs de metriques, serveur IA) ajoutent aux memes
+sidecars, et le back-fill les remplace (`os.replace`). Chaque lot est ecrit
+sous verrou exclusif (`flock`, via `lock_current`, que le back-fill prend
+aussi) et seulement si le fichier ouvert est encore celui du chemin (meme
+inode) ; sinon il est rouvert. Sans `fcntl` (Windows), seul ce controle
+d'inode reste.
+
+La file est bornee (UTTERANCE_QUEUE_SIZE) et `submit` n'attend jamais (il est
+appele depuis la boucle d'evenements) : si le disque ne suit plus et que la
+file est pleine, la ligne est abandonnee, comptee (`dropped` dans `stats()`)
+et signalee dans les logs (premiere perte puis toutes les 100). Seul
+`exclusive`, appele depuis un thread, attend une place dans la file.
+"""
+from __future__ import annotations
+
+import atexit
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas de verrou inter-processus
+    fcntl = None
+
+UTTERANCE_QUEUE_SIZE = int(os.getenv("UTTERANCE_QUEUE_SIZE", "10000"))
+UTTERANCE_BATCH_SIZE = int(os.getenv("UTTERANCE_BATCH_SIZE", "256"))
+UTTERANCE_BATCH_DELAY = float(os.getenv("UTTERANCE_BATCH_DELAY", "0.05"))
+UTTERANCE_MAX_OPEN_FILES = int(os.getenv("UTTERANCE_MAX_OPEN_FILES", "16"))
+UTTERANCE_FSYNC = os.getenv("UTTERANCE_FSYNC", "none").lower()
+
+_STOP = object()
+
+
+def lock_current(handle, path: Path) -> bool:
+    """Verrou exclusif sur `handle`. False (verrou rendu) si `path` designe un autre fichier."""
+    if fcntl is not None:
+        fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+    try:
+        current = os.stat(path).st_ino
+    except FileNotFoundError:
+        current = None
+    if current == os.fstat(handle.fileno()).st_ino:
+        return True
+    unlock(handle)
+    return False
+
+
+def unlock(handle) -> None:
+    if fcntl is not None:
+        fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+
+
+class UtteranceWriter:
+    """File bornee de lignes `(chemin, octets, enregistrement)`, ecrites par lots."""
+
+    def __init__(self, *, queue_size: Optional[int] = None, batch_size: Optional[int] = None,
+                 batch_delay: Optional[float] = None, max_open_files: Optional[int] = None,
+                 fsync: Optional[str] = None,
+                 callbacks: Optional[List[Callable[[dict], None]]] = None) -> None:
+        self.batch_size = max(1, batch_size or UTTERANCE_BATCH_SIZE)
+        self.batch_delay = UTTERANCE_BATCH_DELAY if batch_delay is None else batch_delay
+        self.max_open_files = max(1, max_open_files or UTTERANCE_MAX_OPEN_FILES)
+        self.fsync = (fsync or UTTERANCE_FSYNC).lower()
+        self.callbacks = callbacks if callbacks is not None else []
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_size or UTTERANCE_QUEUE_SIZE)
+        self._handles: "OrderedDict[Path, object]" = OrderedDict()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.batches = 0
+        self.lines_written = 0
+        self.bytes_written = 0
+        self.write_error: Optional[str] = None
+        self.dropped = 0
+
+    def start(self) -> None:
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="utterance-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, path: Path, line: bytes, record) -> bool:
+        """Enfile une ligne sans attendre. False si la file est pleine (ligne perdue)."""
+        if self._thread is None:
+            self.start()
+        try:
+            self._queue.put_nowait((path, line, record))
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 100 == 0:
+                print(f"[Utterances] ⚠️  File d'écriture pleine : {self.dropped} énoncé(s) perdu(s) ({path.name})")
+            return False
+        return True
+
+    def exclusive(self, path: Path, operation: Callable[[], object]):
+        """Execute `operation` dans le thread d'ecriture, entre deux lots, fichier `path` ferme.
+
+        Les lignes enfilees avant sont ecrites, celles enfilees apres attendent :
+        `operation` peut reecrire le fichier (back-fill). Retourne son resultat.
+        """
+        if self._thread is None:
+            self.start()
+        future: Future = Future()
+        self._queue.put((path, None, (operation, future)))
+        return future.result()
+
+    def flush(self) -> None:
+        """Attend que toutes les lignes enfilees soient ecrites (et les callbacks appeles)."""
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout=10)
+        self._thread = None
+
+    # ------------------------------------------------------------------
+    # Thread d'ecriture
+    # ------------------------------------------------------------------
+
+    def _next_batch(self) -> Tuple[list, bool]:
+        first = self._queue.get()
+        if first is _STOP:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.batch_delay
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch, stopping = self._next_batch()
+            try:
+                lines = []
+                for item in batch:
+                    if item[1] is None:
+                        self._write(lines)
+                        lines = []
+                        self._run_exclusive(*item)
+                    else:
+                        lines.append(item)
+                self._write(lines)
+            finally:
+                for _ in range(len(batch) + (1 if stopping else 0)):
+                    self._queue.task_done()
+        self._close_handles()
+
+    def _write(self, lines: list) -> None:
+        if lines:
+            self._commit(lines)
+            self._dispatch(lines)
+
+    def _run_exclusive(self, path: Path, _, task) -> None:
+        operation, future = task
+        handle = self._handles.pop(path, None)
+        if handle is not None:
+            handle.close()
+        try:
+            future.set_result(operation())
+        except Exception as e:
+            future.set_exception(e)
+
+    def _handle(self, path: Path):
+        handle = self._handles.get(path)
+        if handle is not None:
+            self._handles.move_to_end(path)
+            return handle
+        if len(self._handles) >= self.max_open_files:
+            _, oldest = self._handles.popitem(last=False)
+            oldest.close()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        handle = self._handles[path] = open(path, "ab")
+        return handle
+
+    def _locked_handle(self, path: Path):
+        """Fichier ouvert sur le sidecar actuel de `path`, verrouille (rouvert s'il a ete remplace)."""
+        while True:
+            handle = self._handle(path)
+            if lock_current(handle, path):
+                return handle
+            self._handles.pop(path, None)
+            handle.close()
+
+    def _commit(self, batch: list) -> None:
+        lines_by_path: "OrderedDict[Path, List[bytes]]" = OrderedDict()
+        for path, line, _ in batch:
+            lines_by_path.setdefault(path, []).append(line)
+        for path, lines in lines_by_path.items():
+            data = b"".join(lines)
+            try:
+                handle = self._locked_handle(path)
+                try:
+                    handle.write(data)
+                    handle.flush()
+                    if self.fsync == "batch":
+                        os.fsync(handle.fileno())
+                finally:
+                    unlock(handle)
+            except OSError as e:
+                self.write_error = str(e)
+                print(f"[Utterances] ⚠️  Écriture impossible ({path}): {e}")
+                stale = self._handles.pop(path, None)
+                if stale is not None:
+                    stale.close()
+                continue
+            self.lines_written += len(lines)
+            self.bytes_written += len(data)
+        self.batches += 1
+
+    def _dispatch(self, batch: list) -> None:
+        for _, _, record in batch:
+            for callback in list(self.callbacks):
+                try:
+                    callback(record)
+                except Exception:
+                    pass
+
+    def _close_handles(self) -> None:
+        while self._handles:
+            _, handle = self._handles.popitem()
+            try:
+                handle.close()
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        return {
+            "pending": self._queue.qsize(),
+            "batches": self.batches,
+            "lines_written": self.lines_written,
+            "bytes_written": self.bytes_written,
+            "open_files": len(self._handles),
+            "fsync": self.fsync,
+            "write_error": self.write_error,
+            "dropped": self.dropped,
+        }
+
+
+def close_at_exit(writer: UtteranceWriter) -> None:
+    """Vide la file a l'arret du processus (le thread est un daemon)."""
+    atexit.register(writer.close)
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""Optimisation de l'image envoyee a la machine O (V5/V6).
+
+Les tokens image dominent le cout du prompt O. Avant l'appel, le canevas est :
+
+1. ramene sans perte a 1 pixel par sous-cellule (taille de bloc detectee par
+   PGCD des transitions de couleur : image agrandie au plus proche voisin) ;
+2. recadre sur l'etendue occupee, symetriquement autour de la grille centrale
+   (le prompt O annonce "[0,0] is CENTER") ;
+3. re-agrandi a VISION_CELL_PX pixels par grille 20x20, borne par VISION_MAX_SIDE ;
+4. converti en palette (exacte si <= VISION_PALETTE_COLORS couleurs, sinon
+   quantifiee) puis encode en PNG ou WebP sans perte.
+
+Le resultat n'est retenu que s'il est plus leger (tokens estimes puis octets)
+que l'original ; sinon l'image d'origine part telle quelle.
+"""
+from __future__ import annotations
+
+import base64
+import binascii
+import hashlib
+import io
+import math
+import os
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+
+try:
+    from PIL import Image, features
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+VISION_OPTIMIZE = os.getenv("VISION_OPTIMIZE", "1").strip().lower() not in ("0", "false", "no", "off", "")
+VISION_CELL_PX = int(os.getenv("VISION_CELL_PX", "60"))  # pixels par grille 20x20 envoyes au modele
+VISION_MAX_SIDE = int(os.getenv("VISION_MAX_SIDE", "1536"))
+VISION_PALETTE_COLORS = int(os.getenv("VISION_PALETTE_COLORS", "256"))  # 0 = RGB
+VISION_FORMAT = os.getenv("VISION_FORMAT", "png").strip().lower()  # png | webp (sans perte)
+VISION_CROP = os.getenv("VISION_CROP", "1").strip().lower() not in ("0", "false", "no", "off", "")
+# Estimation Gemini : <= 384px de cote = 1 tuile, sinon tuiles de 768px ; 258 tokens par tuile
+VISION_TOKENS_PER_TILE = int(os.getenv("VISION_TOKENS_PER_TILE", "258"))
+
+GRID_PIXELS = 20
+_SMALL_IMAGE_PX = 384
+_TILE_PX = 768
+
+
+def estimate_image_tokens(width: int, height: int, tokens_per_tile: int = VISION_TOKENS_PER_TILE) -> int:
+    if width <= 0 or height <= 0:
+        return 0
+    if width <= _SMALL_IMAGE_PX and height <= _SMALL_IMAGE_PX:
+        return tokens_per_tile
+    return math.ceil(width / _TILE_PX) * math.ceil(height / _TILE_PX) * tokens_per_tile
+
+
+def detect_block_size(array: np.ndarray) -> int:
+    """Taille du bloc d'agrandissement : PGCD des positions de transition et des dimensions.
+
+    Sous-echantillonner par ce facteur est sans perte par construction.
+    """
+    height, width = array.shape[:2]
+    col_changes = np.flatnonzero(np.any(array[:, 1:] != array[:, :-1], axis=(0, 2))) + 1
+    row_changes = np.flatnonzero(np.any(array[1:] != array[:-1], axis=(1, 2))) + 1
+    values = np.concatenate((col_changes, row_changes, [width, height])).astype(np.int64)
+    return max(1, int(np.gcd.reduce(values)))
+
+
+def crop_to_occupied(array: np.ndarray) -> Tuple[np.ndarray, bool]:
+    """Recadre (1 px par sous-cellule) sur les grilles occupees, centre conserve."""
+    height, width = array.shape[:2]
+    if height % GRID_PIXELS or width % GRID_PIXELS:
+        return array, False
+    ny, nx = height // GRID_PIXELS, width // GRID_PIXELS
+    occupied = array.reshape(ny, GRID_PIXELS, nx, GRID_PIXELS, 3).any(axis=(1, 3, 4))
+    iy, ix = np.nonzero(occupied)
+    if not len(iy):
+        return array, False
+    cy, cx = ny // 2, nx // 2
+    k = int(max(np.abs(iy - cy).max(), np.abs(ix - cx).max()))
+    y0, y1 = max(0, cy - k), min(ny, cy + k + 1)
+    x0, x1 = max(0, cx - k), min(nx, cx + k + 1)
+    if (y0, y1, x0, x1) == (0, ny, 0, nx):
+        return array, False
+    return array[y0 * GRID_PIXELS:y1 * GRID_PIXELS, x0 * GRID_PIXELS:x1 * GRID_PIXELS], True
+
+
+def _strip_data_url(image_base64: str) -> str:
+    if image_base64.startswith("data:"):
+        return image_base64.split(",", 1)[-1]
+    return image_base64
+
+
+class VisionPayloadOptimizer:
+    """Pretraitement configurable de l'image O + compteurs d'economie."""
+
+    def __init__(
+        self,
+        *,
+        enabled: Optional[bool] = None,
+        cell_px: Optional[int] = None,
+        max_side: Optional[int] = None,
+        palette_colors: Optional[int] = None,
+        fmt: Optional[str] = None,
+        crop: Optional[bool] = None,
+    ) -> None:
+        self.enabled = (VISION_OPTIMIZE if enabled is None else enabled) and PIL_AVAILABLE
+        self.cell_px = max(GRID_PIXELS, cell_px or VISION_CELL_PX)
+        self.max_side = max(GRID_PIXELS, max_side or VISION_MAX_SIDE)
+        self.palette_colors = min(256, VISION_PALETTE_COLORS if palette_colors is None else palette_colors)
+        self.fmt = (fmt or VISION_FORMAT)
+        if self.fmt == "webp" and not (PIL_AVAILABLE and features.check("webp")):
+            self.fmt = "png"
+        self.crop = VISION_CROP if crop is None else crop
+        # Memo du dernier resultat (les reessais O renvoient la meme image)
+        self._last: Optional[Tuple[str, Tuple[str, str, dict]]] = None
+        self.calls = 0
+        self.applied = 0
+        self.bytes_saved = 0
+        self.tokens_saved = 0
+
+    def optimize(self, image_base64: str) -> Tuple[str, str, dict]:
+        """Retourne (base64, mime_type, rapport). Ne degrade jamais le cout estime."""
+        clean = _strip_data_url(image_base64 or "")
+        report = {"applied": False, "bytes_before": len(clean), "bytes_after": len(clean),
+                  "bytes_saved": 0, "tokens_before": 0, "tokens_after": 0, "tokens_saved": 0}
+        if not self.enabled or not clean:
+            return clean, "image/png", report
+        self.calls += 1
+        digest = hashlib.sha1(clean.encode("ascii", "replace")).hexdigest()
+        if self._last is not None and self._last[0] == digest:
+            return self._account(self._last[1])
+        started = time.perf_counter()
+        try:
+            raw = base64.b64decode(clean)
+            with Image.open(io.BytesIO(raw)) as img:
+                source_size = img.size
+                array = np.asarray(img.convert("RGB"))
+        except (binascii.Error, ValueError, OSError) as e:
+            print(f"[Vision] ⚠️  Image non décodable, envoyée telle quelle: {e}")
+            return clean, "image/png", report
+
+        block = detect_block_size(array)
+        small = array[::block, ::block]
+        cropped = False
+        gridded = small.shape[0] % GRID_PIXELS == 0 and small.shape[1] % GRID_PIXELS == 0
+        if gridded and self.crop:
+            small, cropped = crop_to_occupied(small)
+
+        # Palette sur l'image reduite (exacte si possible), puis agrandissement des indices
+        packed = (small[..., 0].astype(np.uint32) << 16) | (small[..., 1].astype(np.uint32) << 8) | small[..., 2]
+        colors, inverse = np.unique(packed, return_inverse=True)
+        inverse = inverse.reshape(packed.shape)
+        # Sans structure de grilles reconnue : resolution d'origine (palette + compression seules)
+        factor = max(1, self.cell_px // GRID_PIXELS) if gridded else block
+        while factor > 1 and max(small.shape[:2]) * factor > self.max_side:
+            factor -= 1
+        if self.palette_colors and len(colors) <= self.palette_colors:
+            palette = np.stack(((colors >> 16) & 0xFF, (colors >> 8) & 0xFF, colors & 0xFF), axis=1)
+            indices = np.repeat(np.repeat(inverse.astype(np.uint8), factor, axis=0), factor, axis=1)
+            out = Image.fromarray(indices, "P")
+            out.putpalette(palette.astype(np.uint8).tobytes())
+            palette_mode = "exact"
+        else:
+            out = Image.fromarray(np.repeat(np.repeat(small, factor, axis=0), factor, axis=1), "RGB")
+            palette_mode = "rgb"
+            if self.palette_colors:
+                out = out.quantize(colors=self.palette_colors, method=Image.Quantize.FASTOCTREE)
+                palette_mode = "quantized"
+        if max(out.size) > self.max_side:
+            scale = self.max_side / max(out.size)
+            out = out.resize((max(1, int(out.width * scale)), max(1, int(out.height * scale))), Image.NEAREST)
+
+        buffer = io.BytesIO()
+        if self.fmt == "webp":
+            out.save(buffer, format="WEBP", lossless=True, quality=100, method=6)
+            mime = "image/webp"
+        else:
+            out.save(buffer, format="PNG", optimize=True)
+            mime = "image/png"
+        candidate = base64.b64encode(buffer.getvalue()).decode("ascii")
+
+        tokens_before = estimate_image_tokens(*source_size)
+        tokens_after = estimate_image_tokens(*out.size)
+        report.update({
+            "tokens_before": tokens_before,
+            "tokens_after": tokens_before,
+            "size_before": list(source_size),
+            "size_after": list(source_size),
+            "block": block,
+            "cropped": cropped,
+            "colors": int(len(colors)),
+            "palette": palette_mode,
+            "format": mime,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        })
+        result = (clean, "image/png", report)
+        if (tokens_after, len(candidate)) < (tokens_before, len(clean)):
+            report.update({
+                "applied": True,
+                "bytes_after": len(candidate),
+                "bytes_saved": len(clean) - len(candidate),
+                "tokens_after": tokens_after,
+                "tokens_saved": tokens_before - tokens_after,
+                "size_after": list(out.size),
+            })
+            result = (candidate, mime, report)
+        self._last = (digest, result)
+        return self._account(result)
+
+    def _account(self, result: Tuple[str, str, dict]) -> Tuple[str, str, dict]:
+        report = result[2]
+        if report["applied"]:
+            self.applied += 1
+            self.bytes_saved += report["bytes_saved"]
+            self.tokens_saved += report["tokens_saved"]
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "cell_px": self.cell_px,
+            "format": self.fmt,
+            "palette_colors": self.palette_colors,
+            "crop": self.crop,
+            "calls": self.calls,
+            "applied": self.applied,
+            "bytes_saved": self.bytes_saved,
+            "tokens_saved_est": self.tokens_saved,
+        }
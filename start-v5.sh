@@ -72,7 +72,9 @@ cleanup() {
 trap cleanup EXIT INT TERM
 
 echo "=== Lancement serveur jeu (port 3001) ==="
-"$ROOT/bin/poietic-generator-api" --port 3001 &
+# Changements de session notifiés aux énoncés (utterance_store, sans interrogation du recorder)
+POIETIC_SESSION_HOOKS="${POIETIC_SESSION_HOOKS:-http://localhost:5010/api/utterances/current-session}" \
+  "$ROOT/bin/poietic-generator-api" --port 3001 &
 API_PID=$!
 
 echo "=== Lancement recorder-server / player (port 3002) ==="